@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Persistent command channels to the LAN9662 boards
+
+Opening a new SSH connection or serial session per command costs hundreds
+of milliseconds. These channels keep one shell open and run commands
+through it, delimiting each command's output with an end marker, so
+pollers can issue many commands per second and batch several commands in
+a single round trip.
+"""
+
+import os
+import subprocess
+import threading
+import time
+
+# Overridable so the scripts can run against board_sim.py
+RECEIVER_HOST = os.environ.get("FRER_RECEIVER_HOST", "169.254.100.2")
+SERIAL_PORT = os.environ.get("FRER_SERIAL_PORT", "/dev/ttyUSB0")
+SERIAL_BAUDRATE = 115200
+
+END_MARKER = "__FRER_END__"
+# Split with an empty quote so the echoed command line never contains the
+# marker itself; only the shell's output does
+END_COMMAND = 'echo __FRER_""END__'
+
+
+class ChannelError(Exception):
+    """Raised when a board channel is closed or times out"""
+
+
+class ShellChannel:
+    """Run commands through one long-lived shell subprocess
+
+    argv defaults to an SSH session to the receiver board; any command that
+    reads shell commands on stdin works (e.g. the board simulator).
+    """
+
+    def __init__(self, argv=None, host=RECEIVER_HOST, user="root", timeout=5):
+        if argv is None:
+            argv = ["ssh", "-T", "-o", f"ConnectTimeout={timeout}", "-o", "BatchMode=yes",
+                    "-o", "ServerAliveInterval=5", f"{user}@{host}", "sh"]
+        self.argv = argv
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._proc = None
+
+    def _start(self):
+        self._proc = subprocess.Popen(self.argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL, text=True, bufsize=1)
+
+    def _read_until_marker(self, deadline):
+        lines = []
+        stdout = self._proc.stdout
+        while True:
+            # readline blocks; the watchdog in run_batch kills the process on timeout
+            line = stdout.readline()
+            if not line:
+                raise ChannelError(f"Channel closed: {' '.join(self.argv)}")
+            if line.rstrip('\r\n') == END_MARKER:
+                return ''.join(lines)
+            lines.append(line)
+            if time.monotonic() > deadline:
+                raise ChannelError("Timed out waiting for command output")
+
+    def run_batch(self, commands):
+        """Run several commands in one write and return their outputs in order"""
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            script = ''.join(f"{cmd} 2>&1\n{END_COMMAND}\n" for cmd in commands)
+            watchdog = threading.Timer(self.timeout, self._proc.kill)
+            watchdog.start()
+            try:
+                self._proc.stdin.write(script)
+                self._proc.stdin.flush()
+                deadline = time.monotonic() + self.timeout
+                return [self._read_until_marker(deadline) for _ in commands]
+            except (OSError, ChannelError):
+                self._proc.kill()
+                self._proc = None
+                raise ChannelError(f"Command failed: {commands[0]}")
+            finally:
+                watchdog.cancel()
+
+    def run(self, command):
+        """Run one command and return its output"""
+        return self.run_batch([command])[0]
+
+    def close(self):
+        with self._lock:
+            if self._proc is not None:
+                try:
+                    self._proc.stdin.close()
+                    self._proc.wait(timeout=2)
+                except (OSError, subprocess.TimeoutExpired):
+                    self._proc.kill()
+                self._proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SerialChannel:
+    """Run commands over the board's serial console"""
+
+    def __init__(self, port=SERIAL_PORT, baudrate=SERIAL_BAUDRATE, timeout=5):
+        import serial
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._ser = serial.Serial(port, baudrate, timeout=0.1)
+        self._ser.reset_input_buffer()
+
+    def run_batch(self, commands):
+        """Run several commands in one write and return their outputs in order"""
+        with self._lock:
+            script = ''.join(f"{cmd} 2>&1; {END_COMMAND}\n" for cmd in commands)
+            self._ser.write(script.encode())
+            deadline = time.monotonic() + self.timeout
+            buffer = ''
+            outputs = []
+            while len(outputs) < len(commands):
+                if time.monotonic() > deadline:
+                    raise ChannelError("Timed out waiting for serial output")
+                buffer += self._ser.read(self._ser.in_waiting or 1).decode('utf-8', errors='ignore')
+                while END_MARKER + '\n' in buffer.replace('\r\n', '\n'):
+                    buffer = buffer.replace('\r\n', '\n')
+                    chunk, buffer = buffer.split(END_MARKER + '\n', 1)
+                    # Drop the echoed command line (it ends with the split marker)
+                    lines = [line for line in chunk.split('\n') if END_COMMAND not in line]
+                    outputs.append('\n'.join(lines))
+            return outputs
+
+    def run(self, command):
+        """Run one command and return its output"""
+        return self.run_batch([command])[0]
+
+    def close(self):
+        with self._lock:
+            self._ser.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CallableChannel:
+    """Channel backed by a Python function, for fakes and local tests"""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def run_batch(self, commands):
+        return [self.handler(cmd) for cmd in commands]
+
+    def run(self, command):
+        return self.handler(command)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Board CPU, memory and interrupt sampling
+
+The report used to show a made-up CPU load and memory figure for the
+boards. This sampler measures them: each interval it reads /proc/stat,
+/proc/meminfo, /proc/interrupts and the channel shell's own
+/proc/$$/stat with a single `cat` over the persistent board channel (one
+round trip, one fork on the board) and turns the deltas into gauges:
+
+- board.cpu_percent, board.cpu<N>_percent: busy share per core
+- board.irq_cpu_percent: share spent in hard and soft interrupts
+- board.memory_used_mb: MemTotal - MemAvailable
+- board.irq_per_s and board.irq.<name>: interrupt rates
+- board.channel_cpu_percent: CPU used by the management channel shell
+  and the commands it ran (this sampler and any poller sharing the
+  channel), as a share of the board's total CPU
+
+The channel share is the sampling overhead; it is checked against a 1%
+budget. The gauges go into the same RollupStore as the FRER counters, so
+report_derive.py reports them with the run.
+
+Usage:
+    python3 board_resources.py                      # receiver, 1 s interval
+    python3 board_resources.py --sim receiver --count 5
+    python3 board_resources.py --interval 5 --top 10
+"""
+
+import argparse
+import sys
+import time
+
+from board_channel import RECEIVER_HOST, SERIAL_PORT, ShellChannel
+from frer_counters import CounterPoller
+
+SAMPLE_COMMAND = "cat /proc/stat /proc/meminfo /proc/interrupts /proc/$$/stat"
+OVERHEAD_BUDGET_PERCENT = 1.0
+# Polls before the overhead is judged against the budget
+WARN_AFTER_POLLS = 10
+
+# /proc/stat cpu columns: user nice system idle iowait irq softirq steal
+# (guest time is already included in user)
+_IDLE, _IOWAIT, _IRQ, _SOFTIRQ = 3, 4, 5, 6
+
+
+class Snapshot:
+    """One parsed read of the /proc files"""
+
+    def __init__(self):
+        self.cpus = {}        # "cpu" (all cores) / "cpu0"... -> [jiffies]
+        self.interrupts = 0
+        self.context_switches = 0
+        self.meminfo = {}     # name -> kB
+        self.irqs = {}        # name -> count summed over cores
+        self.channel_ticks = None
+
+
+def _irq_name(label, description, irqs):
+    """Device name for numbered IRQs, the label (IPI0, LOC...) otherwise"""
+    if not label.isdigit() or not description:
+        return label
+    name = description[-1]
+    return f"{name}-{label}" if name in irqs else name
+
+
+def parse_resources(text):
+    """Parse the concatenated SAMPLE_COMMAND output into a Snapshot"""
+    snapshot = Snapshot()
+    ncpu = None
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields:
+            continue
+        head = fields[0]
+        if head.startswith("cpu") and (head == "cpu" or head[3:].isdigit()):
+            snapshot.cpus[head] = [int(value) for value in fields[1:9]]
+        elif head == "intr" and len(fields) > 1:
+            snapshot.interrupts = int(fields[1])
+        elif head == "ctxt" and len(fields) > 1:
+            snapshot.context_switches = int(fields[1])
+        elif head.endswith(":") and len(fields) == 3 and fields[2] == "kB":
+            snapshot.meminfo[head[:-1]] = int(fields[1])
+        elif head == "CPU0":
+            ncpu = len(fields)
+        elif head.isdigit() and len(fields) > 1 and fields[1].startswith("("):
+            # /proc/<pid>/stat: fields after the command name, from the state
+            stat = line.rsplit(")", 1)[1].split()
+            if len(stat) > 14:
+                snapshot.channel_ticks = sum(int(value) for value in stat[11:15])
+        elif ncpu and head.endswith(":") and head != "Err:" and head != "MIS:":
+            counts = [int(value) for value in fields[1:1 + ncpu] if value.isdigit()]
+            if counts:
+                label = head[:-1]
+                name = _irq_name(label, fields[1 + len(counts):], snapshot.irqs)
+                snapshot.irqs[name] = sum(counts)
+    return snapshot
+
+
+def _busy(current, previous):
+    """(total, busy, interrupt) jiffies between two cpu rows"""
+    deltas = [max(0, now - before) for now, before in zip(current, previous)]
+    total = sum(deltas)
+    busy = total - deltas[_IDLE] - deltas[_IOWAIT]
+    return total, busy, deltas[_IRQ] + deltas[_SOFTIRQ]
+
+
+class ResourceSampler:
+    """Turns successive Snapshots into board.* gauges
+
+    The first sample only sets the baseline; rates and CPU shares need two.
+    overhead is the channel's CPU share since the baseline: a single
+    interval is only a few jiffies, too coarse to hold to a 1% budget.
+    """
+
+    def __init__(self):
+        self.first = None
+        self.previous = None
+        self.previous_ts = None
+        self.overhead = None
+
+    def update(self, ts, snapshot):
+        """Fold a Snapshot taken at ts (epoch seconds); returns {metric: value}"""
+        metrics = {}
+        memory = snapshot.meminfo
+        if "MemTotal" in memory:
+            available = memory.get("MemAvailable")
+            if available is None:
+                available = memory.get("MemFree", 0) + memory.get("Buffers", 0) + memory.get("Cached", 0)
+            metrics["board.memory_used_mb"] = (memory["MemTotal"] - available) / 1024
+
+        previous, elapsed = self.previous, ts - (self.previous_ts or ts)
+        self.previous, self.previous_ts = snapshot, ts
+        self.first = self.first or snapshot
+        if previous is None or elapsed <= 0:
+            return metrics
+
+        for cpu, jiffies in snapshot.cpus.items():
+            if cpu not in previous.cpus:
+                continue
+            total, busy, interrupt = _busy(jiffies, previous.cpus[cpu])
+            if not total:
+                continue
+            if cpu == "cpu":
+                metrics["board.cpu_percent"] = 100.0 * busy / total
+                metrics["board.irq_cpu_percent"] = 100.0 * interrupt / total
+                if snapshot.channel_ticks is not None and previous.channel_ticks is not None:
+                    metrics["board.channel_cpu_percent"] = \
+                        100.0 * max(0, snapshot.channel_ticks - previous.channel_ticks) / total
+                    self._update_overhead(snapshot)
+            else:
+                metrics[f"board.{cpu}_percent"] = 100.0 * busy / total
+
+        metrics["board.irq_per_s"] = max(0, snapshot.interrupts - previous.interrupts) / elapsed
+        metrics["board.context_switches_per_s"] = \
+            max(0, snapshot.context_switches - previous.context_switches) / elapsed
+        for name, count in snapshot.irqs.items():
+            before = previous.irqs.get(name)
+            if before is not None and count:
+                metrics[f"board.irq.{name}"] = max(0, count - before) / elapsed
+        return metrics
+
+    def _update_overhead(self, snapshot):
+        first = self.first
+        if first.channel_ticks is None or "cpu" not in first.cpus:
+            return
+        total, _, _ = _busy(snapshot.cpus["cpu"], first.cpus["cpu"])
+        if total:
+            self.overhead = 100.0 * max(0, snapshot.channel_ticks - first.channel_ticks) / total
+
+
+def read_resources(channel):
+    """One batched read of the board's /proc files: a Snapshot"""
+    return parse_resources(channel.run(SAMPLE_COMMAND))
+
+
+class ResourcePoller(CounterPoller):
+    """Background thread sampling board resources at a fixed rate
+
+    Subscribers are called with (ts_ns, metrics) like CounterPoller's, with
+    the board.* gauges of the last interval. The channel may be shared with
+    a CounterPoller; ShellChannel serializes the two.
+    """
+
+    def __init__(self, channel, interval=1.0):
+        super().__init__(channel, streams=None, interval=interval)
+        self.sampler = ResourceSampler()
+        self._warned = False
+
+    def poll_once(self):
+        snapshot = read_resources(self.channel)
+        ts_ns = time.time_ns()
+        metrics = self.sampler.update(ts_ns / 1e9, snapshot)
+        self.polls += 1
+        overhead = self.sampler.overhead
+        if (overhead is not None and overhead > OVERHEAD_BUDGET_PERCENT and not self._warned
+                and self.polls >= WARN_AFTER_POLLS):
+            self._warned = True
+            print(f"Board channel uses {overhead:.2f}% of the board CPU "
+                  f"(budget {OVERHEAD_BUDGET_PERCENT:.0f}%); poll less often", file=sys.stderr)
+        for callback in self.subscribers:
+            callback(ts_ns, metrics)
+        return ts_ns, metrics
+
+
+def print_metrics(board, metrics, overhead, top):
+    if "board.cpu_percent" not in metrics:
+        print(f"{board}: memory used {metrics.get('board.memory_used_mb', 0):.1f} MB (baseline sample)")
+        return
+    cores = sorted(name for name in metrics
+                   if name.startswith("board.cpu") and name[9:-8].isdigit())
+    per_core = ', '.join(f"{name[6:-8]} {metrics[name]:.1f}%" for name in cores)
+    print(f"{board}: CPU {metrics['board.cpu_percent']:5.1f}% ({per_core}), "
+          f"irq/softirq {metrics['board.irq_cpu_percent']:.1f}%, "
+          f"memory used {metrics.get('board.memory_used_mb', 0):.1f} MB")
+    irqs = sorted(((value, name[10:]) for name, value in metrics.items() if name.startswith("board.irq.")),
+                  reverse=True)[:top]
+    print(f"  interrupts {metrics['board.irq_per_s']:.0f}/s: "
+          + ', '.join(f"{name} {value:.0f}/s" for value, name in irqs))
+    if overhead is not None:
+        status = "OK" if overhead <= OVERHEAD_BUDGET_PERCENT else "OVER BUDGET"
+        print(f"  channel overhead {overhead:.3f}% of board CPU since start "
+              f"(budget {OVERHEAD_BUDGET_PERCENT:.0f}%) {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample board CPU, memory and interrupt rates")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--host", default=RECEIVER_HOST, help="board reached over SSH")
+    source.add_argument("--serial", nargs="?", const=SERIAL_PORT, help="board on a serial console")
+    source.add_argument("--sim", choices=["sender", "receiver"], help="in-process board simulator")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between samples (default: 1)")
+    parser.add_argument("--count", type=int, default=0, help="number of samples (0: until Ctrl-C)")
+    parser.add_argument("--top", type=int, default=5, help="busiest interrupts to show")
+    args = parser.parse_args()
+
+    if args.sim:
+        from board_sim import Simulator
+        from board_channel import CallableChannel
+        simulator = Simulator()
+        channel = CallableChannel(lambda command: simulator.run(args.sim, command)[0])
+        board = f"sim-{args.sim}"
+    elif args.serial:
+        from board_channel import SerialChannel
+        channel = SerialChannel(args.serial)
+        board = args.serial
+    else:
+        channel = ShellChannel(host=args.host)
+        board = args.host
+
+    poller = ResourcePoller(channel, args.interval)
+    poller.subscribe(lambda ts_ns, metrics: print_metrics(board, metrics, poller.sampler.overhead, args.top))
+    try:
+        # Baseline, then one line per interval
+        poller.poll_once()
+        samples = 0
+        while not args.count or samples < args.count:
+            time.sleep(args.interval)
+            poller.poll_once()
+            samples += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        channel.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1023 @@
+#!/usr/bin/env python3
+"""
+LAN9662 board simulator speaking the frer/vcap/bridge/ip CLI
+
+Simulates the sender and receiver boards with the command output formats of
+the real boards (see test_results/*_board_statistics.txt). Counters advance
+from a traffic model evaluated lazily on each command, so rates of millions
+of frames per second cost nothing between commands.
+
+Usage:
+    python3 board_sim.py serve --rate 17297 --serial-link /tmp/ttyFRER0
+        Run both boards behind a Unix socket and a pty serial console.
+    python3 board_sim.py ssh root@169.254.100.2 'frer cs 0 --cnt'
+        ssh stand-in; talks to the running server (or a one-off board).
+    python3 board_sim.py shell --board receiver
+        Line-oriented shell on stdin/stdout (usable by board_channel).
+    python3 board_sim.py install-ssh /tmp/frer-sim-bin
+        Write an `ssh` wrapper; put the directory first on PATH to run the
+        existing scripts offline.
+"""
+
+import argparse
+import json
+import os
+import re
+import shlex
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+# The host the scripts' ShellChannel connects to, FRER_RECEIVER_HOST included
+from board_channel import RECEIVER_HOST
+from vcap_table import rule_matches
+
+DEFAULT_SOCKET = os.environ.get("FRER_SIM_SOCKET", "/tmp/frer_sim.sock")
+
+FRAME_BYTES = 1514
+RTAG_FRAME_BYTES = 1532
+
+CS_COUNTERS = ["OutOfOrderPackets", "RoguePackets", "PassedPackets", "DiscardedPackets",
+               "LostPackets", "TaglessPackets", "Resets"]
+MS_COUNTERS = CS_COUNTERS[:-1]
+
+# Field widths printed by `vcap get`
+VCAP_WIDTHS = {
+    "IF_IGR_PORT_MASK": 9, "ETYPE": 16, "LOOKUP_INDEX": 2, "TYPE": 1, "VID": 12,
+    "ISDX_ADD_VAL": 8, "ISDX_REPLACE_ENA": 1, "VID_REPLACE_ENA": 1, "VID_VAL": 12,
+    "L4_DPORT": 16, "L4_SPORT": 16, "L3_IP4_SIP": 32, "L3_IP4_DIP": 32, "PCP_VAL": 3,
+}
+
+# /proc model of the single Cortex-A7 core: clock ticks per second, CPU
+# shares of the idle system (user, system, irq, softirq), ticks each shell
+# command costs (fork/exec and the command itself) and memory in kB
+CLK_TCK = 100
+IDLE_LOAD = (0.010, 0.015, 0.002, 0.003)
+COMMAND_TICKS = 0.08
+MEM_TOTAL_KB = 507904
+MEM_USED_KB = 61440
+
+# Cables between the test PC ("pc") and board ports, as in the README
+DEFAULT_CABLING = {
+    ("pc", "enp2s0"): ("sender", "eth3"),
+    ("sender", "eth1"): ("receiver", "eth1"),
+    ("sender", "eth2"): ("receiver", "eth2"),
+    ("receiver", "eth3"): ("pc", "enp15s0"),
+    ("pc", "enp11s0"): ("receiver", "eth0"),
+}
+
+# Classification fields of the test PC's iperf3 flow, used when none are given
+IPERF_FIELDS = {"ETYPE": 0x0800, "L4_DPORT": 5001}
+
+
+def _hex(value, width):
+    if width == 1:
+        return str(value)
+    if width % 4 == 0 and width <= 16:
+        return f"0x{value:0{width // 4}x}"
+    return f"0x{value:x}"
+
+
+class Port:
+    """Link counters of one board port"""
+
+    FIELDS = ["rx_packets", "tx_packets", "rx_bytes", "tx_bytes", "rx_errors", "tx_errors",
+              "rx_dropped", "tx_dropped", "multicast", "collisions", "rx_crc_errors"]
+
+    def __init__(self, name, index, mac):
+        self.name = name
+        self.index = index
+        self.mac = mac
+        self.up = True
+        self.master = "br0"
+        self.flood = True
+        self.counters = dict.fromkeys(self.FIELDS, 0)
+
+    def rx(self, frames, size):
+        self.counters["rx_packets"] += frames
+        self.counters["rx_bytes"] += frames * size
+
+    def tx(self, frames, size):
+        self.counters["tx_packets"] += frames
+        self.counters["tx_bytes"] += frames * size
+
+    def rx_corrupt(self, frames):
+        """Frames that arrived with a bad FCS and were dropped by the MAC"""
+        self.counters["rx_errors"] += frames
+        self.counters["rx_crc_errors"] += frames
+
+
+class VcapRule:
+    """One IS1 rule as created by `vcap add`"""
+
+    def __init__(self, rule_id, vcap, priority, lookup, keyset, keys, actionset, actions, address):
+        self.rule_id = rule_id
+        self.vcap = vcap
+        self.priority = priority
+        self.lookup = lookup
+        self.keyset = keyset
+        self.keys = keys
+        self.actionset = actionset
+        self.actions = actions
+        self.address = address
+        self.counter = 0
+
+    def format(self):
+        lines = [f"Rule: {self.rule_id}, {self.vcap}, priority: {self.priority}, lookup: {self.lookup}, "
+                 f"address: {self.address}-{self.address + 1} (X2), Counter: {self.counter}, "
+                 f"Hit: {1 if self.counter else 0}",
+                 f"  Keyset: {self.keyset}"]
+        keys = dict(self.keys)
+        keys.setdefault("TYPE", (0, 1))
+        for name in sorted(keys):
+            value, mask = keys[name]
+            width = VCAP_WIDTHS.get(name, 16)
+            lines.append(f"    KEY: {name}: W{width}, {_hex(value, width)}/{_hex(mask, width)}")
+        lines.append(f"  Actionset: {self.actionset}")
+        for name in sorted(self.actions):
+            lines.append(f"    ACTION: {name}: W{VCAP_WIDTHS.get(name, 8)}, {self.actions[name]}")
+        return '\n'.join(lines)
+
+
+class SimulatedBoard:
+    """State and CLI of one LAN9662 board"""
+
+    def __init__(self, name, role, mac_prefix, preconfigured=True):
+        self.name = name
+        self.role = role
+        self.ports = {f"eth{i}": Port(f"eth{i}", i + 1, f"{mac_prefix}:f{i}") for i in range(4)}
+        self.bridge_vlans = {}
+        self.fdb = []
+        # Source MAC -> bridge port it was last seen on
+        self.learned = {}
+        self.started = time.monotonic()
+        self.commands = 0
+        self.addresses = {}
+        self.neighbors = []
+        self.vcap = {}
+        self.iflows = {}
+        self.cs = {}
+        self.ms = {}
+        self.frer_vlans = {}
+        self._next_address = 764
+        if preconfigured:
+            self._apply_default_config()
+
+    def _apply_default_config(self):
+        """The README configuration for this board's role"""
+        script = ["bridge vlan add dev eth1 vid 10", "bridge vlan add dev eth2 vid 10",
+                  "bridge vlan add dev eth3 vid 10 pvid untagged"]
+        if self.role == "sender":
+            script += [
+                "vcap add 1001 is1 10 1 VCAP_KFS_NORMAL IF_IGR_PORT_MASK 0x008 0x1ff ETYPE 0x0800 = "
+                "VCAP_AFS_S1 VID_REPLACE_ENA 1 VID_VAL 10 ISDX_REPLACE_ENA 1 ISDX_ADD_VAL 1",
+                "frer iflow 1 --generation 1 --dev1 eth1 --dev2 eth2",
+            ]
+        else:
+            script += [
+                "vcap add 1001 is1 11 1 VCAP_KFS_NORMAL IF_IGR_PORT_MASK 0x001 0x1ff "
+                "VCAP_AFS_S1 ISDX_REPLACE_ENA 1 ISDX_ADD_VAL 3",
+                "vcap add 1002 is1 12 1 VCAP_KFS_NORMAL IF_IGR_PORT_MASK 0x002 0x1ff "
+                "VCAP_AFS_S1 ISDX_REPLACE_ENA 1 ISDX_ADD_VAL 4",
+                "frer cs 0 --enable 1 --alg 0 --hlen 10 --reset_time 500",
+                "frer ms eth1 28 --enable 1 --alg 1 --reset_time 500 --cs_id 0",
+                "frer ms eth2 30 --enable 1 --alg 1 --reset_time 500 --cs_id 0",
+                "frer iflow 3 --ms_enable 1 --ms_id 28 --pop 1 --dev1 eth3",
+                "frer iflow 4 --ms_enable 1 --ms_id 30 --pop 1 --dev1 eth3",
+            ]
+        for command in script:
+            self.execute(command)
+
+    # ---- traffic -----------------------------------------------------------
+
+    def _isdx_for_port(self, port, fields=None):
+        fields = IPERF_FIELDS if fields is None else fields
+        hits = [rule for rule in self.vcap.values() if rule_matches(rule, port, fields)]
+        if not hits:
+            return None, None
+        rule = min(hits, key=lambda r: r.priority)
+        if rule.actions.get("ISDX_REPLACE_ENA"):
+            return rule, rule.actions.get("ISDX_ADD_VAL", 0)
+        return rule, None
+
+    def bridge(self, port, src_mac, frames, size):
+        """Unknown-unicast/broadcast frames arriving on port; returns the ports flooded to
+
+        Bridge ports learn the source MAC; eth0 (management) is not bridged.
+        """
+        self.ports[port].rx(frames, size)
+        if port == "eth0":
+            return []
+        self.learned[src_mac] = port
+        out = [name for name, egress in self.ports.items()
+               if name not in ("eth0", port) and egress.up and egress.flood]
+        for name in out:
+            self.ports[name].tx(frames, size)
+        return out
+
+    def generate(self, frames, fields=None, size=FRAME_BYTES):
+        """Sender: frames arriving on eth3 from the PC; returns frames per path
+
+        fields ({"ETYPE": ..., "L4_DPORT": ...}) are matched against the
+        rule keys; the default is the iperf3 flow (IPERF_FIELDS).
+        """
+        eth3 = self.ports["eth3"]
+        eth3.rx(frames, size)
+        rule, isdx = self._isdx_for_port("eth3", fields)
+        if rule is not None:
+            rule.counter += frames
+        flow = self.iflows.get(isdx) if isdx is not None else None
+        if not flow or not flow.get("generation"):
+            return {}
+        out = {}
+        for key in ("dev1", "dev2"):
+            dev = flow.get(key)
+            if dev in self.ports:
+                self.ports[dev].tx(frames, size + RTAG_FRAME_BYTES - FRAME_BYTES)
+                out[dev] = frames
+        return out
+
+    def receive(self, per_port, sent, both_lost, ooo, fields=None, size=FRAME_BYTES):
+        """Receiver: R-TAG frames per ingress port out of `sent` sequence numbers
+
+        both_lost sequence numbers were lost on every path. Returns the
+        number of frames passed to the egress port.
+        """
+        by_cs = {}
+        for port, frames in per_port.items():
+            self.ports[port].rx(frames, size + RTAG_FRAME_BYTES - FRAME_BYTES)
+            rule, isdx = self._isdx_for_port(port, fields)
+            if rule is None:
+                continue
+            rule.counter += frames
+            flow = self.iflows.get(isdx)
+            if not flow or not flow.get("ms_enable"):
+                continue
+            ms = self.ms.get((port, flow.get("ms_id")))
+            if ms is None or not ms["config"].get("enable"):
+                continue
+            ms["cnt"]["PassedPackets"] += frames
+            by_cs.setdefault(ms["config"].get("cs_id", 0), []).append((ms, flow, frames))
+
+        passed = 0
+        for cs_id, members in by_cs.items():
+            cs = self.cs.get(cs_id)
+            if cs is None or not cs["config"].get("enable"):
+                continue
+            received = sum(frames for _, _, frames in members)
+            if len(members) == 1:
+                unique, lost = received, sent - received
+            else:
+                # Every sequence number that arrived on at least one path passes once
+                unique, lost = sent - both_lost, both_lost
+            cs["cnt"]["PassedPackets"] += unique
+            cs["cnt"]["DiscardedPackets"] += max(0, received - unique)
+            cs["cnt"]["LostPackets"] += lost
+            cs["cnt"]["OutOfOrderPackets"] += ooo
+            for index, (ms, _, _) in enumerate(members):
+                ms["cnt"]["OutOfOrderPackets"] += ooo // len(members) + (1 if index < ooo % len(members) else 0)
+            passed += unique
+            dev = members[0][1].get("dev1")
+            if dev in self.ports:
+                self.ports[dev].tx(unique, size)
+        return passed
+
+    # ---- CLI ---------------------------------------------------------------
+
+    def execute(self, line):
+        """Run one simple command (no shell operators); returns (output, status)"""
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            return f"sh: syntax error: {e}\n", 2
+        if not argv:
+            return "", 0
+        handler = getattr(self, f"_cmd_{argv[0].replace('-', '_')}", None)
+        if handler is None:
+            return f"sh: {argv[0]}: not found\n", 127
+        self.commands += 1
+        try:
+            result = handler(argv[1:])
+        except (IndexError, ValueError, KeyError) as e:
+            return f"{argv[0]}: invalid arguments ({e})\n", 1
+        if isinstance(result, tuple):
+            return result
+        return ("" if result is None else result), 0
+
+    @staticmethod
+    def _options(args):
+        options = {}
+        i = 0
+        while i < len(args):
+            if args[i].startswith("--"):
+                key = args[i][2:]
+                if i + 1 < len(args) and not args[i + 1].startswith("--"):
+                    value = args[i + 1]
+                    options[key] = int(value) if re.fullmatch(r"-?\d+", value) else value
+                    i += 2
+                    continue
+                options[key] = True
+            i += 1
+        return options
+
+    @staticmethod
+    def _dump(items, width=21):
+        return ''.join(f"{key + ':':<{width}} {value}\n" for key, value in items)
+
+    @staticmethod
+    def _cnt(counters, names):
+        return ''.join(f"{name:<18}: {counters.get(name, 0):>16}\n" for name in names)
+
+    def _cmd_frer(self, args):
+        sub = args[0]
+        if sub == "cs":
+            cs_id = int(args[1])
+            options = self._options(args[2:])
+            cs = self.cs.setdefault(cs_id, {"config": {"enable": 0, "alg": 0, "hlen": 10,
+                                                       "take_no_sequence": 0, "reset_time": 500},
+                                            "cnt": dict.fromkeys(CS_COUNTERS, 0)})
+            return self._frer_stream("cs", cs_id, cs, options, CS_COUNTERS)
+        if sub == "ms":
+            dev, ms_id = args[1], int(args[2])
+            options = self._options(args[3:])
+            ms = self.ms.setdefault((dev, ms_id), {"config": {"enable": 0, "alg": 1,
+                                                              "take_no_sequence": 0, "reset_time": 500,
+                                                              "cs_id": 0},
+                                                   "cnt": dict.fromkeys(MS_COUNTERS, 0)})
+            return self._frer_stream("ms", ms_id, ms, options, MS_COUNTERS)
+        if sub == "iflow":
+            flow_id = int(args[1])
+            options = self._options(args[2:])
+            flow = self.iflows.setdefault(flow_id, {"ms_enable": 0, "ms_id": 0, "generation": 0,
+                                                    "pop": 0, "dev1": "none", "dev2": "none"})
+            if options:
+                flow.update({key: value for key, value in options.items() if key in flow})
+                return None
+            # Numbers start in column 22, device names are right-aligned
+            return ''.join(f"{key}:{value:>18}\n" if key.startswith("dev") else
+                           f"{key + ':':<21} {value}\n" for key, value in flow.items())
+        if sub == "vlan":
+            self.frer_vlans[int(args[1])] = self._options(args[2:])
+            return None
+        return f"frer: unknown command '{sub}'\n", 1
+
+    def _frer_stream(self, kind, stream_id, stream, options, names):
+        if options.get("cnt"):
+            return self._cnt(stream["cnt"], names)
+        if options.get("clr"):
+            for name in names:
+                if name != "Resets":
+                    stream["cnt"][name] = 0
+            return None
+        settable = {key: value for key, value in options.items() if key in stream["config"]}
+        if settable:
+            stream["config"].update(settable)
+            return None
+        cnt = stream["cnt"]
+        items = [(f"{kind}_id", stream_id)] + list(stream["config"].items())
+        items += [(f"{kind}_recovered", 0),
+                  (f"{kind}_out_of_order_packets", cnt["OutOfOrderPackets"])]
+        if kind == "cs":
+            items.append(("cs_misordered_packets", 0))
+        else:
+            items.append(("ms_rogue_packets", cnt["RoguePackets"]))
+        items += [(f"{kind}_passed_packets", cnt["PassedPackets"]),
+                  (f"{kind}_discarded_packets", cnt["DiscardedPackets"]),
+                  (f"{kind}_lost_packets", cnt["LostPackets"]),
+                  (f"{kind}_tagless_packets", cnt["TaglessPackets"])]
+        if kind == "cs":
+            items.append(("cs_resets", cnt["Resets"]))
+        return self._dump(items)
+
+    def _cmd_vcap(self, args):
+        sub = args[0]
+        if sub == "add":
+            rule_id, vcap, priority, lookup, keyset = int(args[1]), args[2], int(args[3]), int(args[4]), args[5]
+            rest = args[6:]
+            split = next(i for i, token in enumerate(rest) if token.startswith("VCAP_AFS"))
+            keys, i = {}, 0
+            key_tokens = rest[:split]
+            while i < len(key_tokens):
+                name, value = key_tokens[i], int(key_tokens[i + 1], 0)
+                mask_token = key_tokens[i + 2] if i + 2 < len(key_tokens) else "="
+                width = VCAP_WIDTHS.get(name, 16)
+                mask = (1 << width) - 1 if mask_token == "=" else int(mask_token, 0)
+                keys[name] = (value, mask)
+                i += 3
+            actionset = rest[split]
+            action_tokens = rest[split + 1:]
+            actions = {action_tokens[j]: int(action_tokens[j + 1], 0)
+                       for j in range(0, len(action_tokens) - 1, 2)}
+            if rule_id in self.vcap:
+                return f"vcap: rule {rule_id} already exists\n", 1
+            self.vcap[rule_id] = VcapRule(rule_id, vcap, priority, lookup, keyset, keys,
+                                          actionset, actions, self._next_address)
+            self._next_address -= 2
+            return None
+        if sub == "get":
+            rule = self.vcap.get(int(args[1]))
+            if rule is None:
+                return f"vcap: rule {args[1]} not found\n", 1
+            return rule.format() + "\n"
+        if sub == "del":
+            if self.vcap.pop(int(args[1]), None) is None:
+                return f"vcap: rule {args[1]} not found\n", 1
+            return None
+        if sub == "list":
+            return ''.join(f"{rule_id}\n" for rule_id in sorted(self.vcap))
+        return f"vcap: unknown command '{sub}'\n", 1
+
+    def _cmd_bridge(self, args):
+        obj, action = args[0], args[1] if len(args) > 1 else "show"
+        if obj == "vlan":
+            if action == "show":
+                rows = ["port              vlan-id  flags"]
+                ports = [args[args.index("dev") + 1]] if "dev" in args else \
+                    sorted(self.bridge_vlans) + ["br0"]
+                for port in ports:
+                    if port == "br0":
+                        rows.append(f"{'br0':<18}{'1':<9}PVID Egress Untagged")
+                        continue
+                    for vid, flags in sorted(self.bridge_vlans.get(port, {}).items()):
+                        rows.append(f"{port:<18}{vid:<9}{flags}".rstrip())
+                return '\n'.join(rows) + "\n"
+            dev, vid = args[args.index("dev") + 1], int(args[args.index("vid") + 1])
+            vlans = self.bridge_vlans.setdefault(dev, {})
+            if action == "add":
+                vlans[vid] = "PVID Egress Untagged" if "pvid" in args else ""
+            elif action == "del":
+                vlans.pop(vid, None)
+            return None
+        if obj == "fdb":
+            rows = [f"{port.mac} dev {port.name} vlan 10 master br0 permanent"
+                    for port in self.ports.values() if port.name != "eth0"]
+            rows += [f"{mac} dev {port} master br0" for mac, port in self.learned.items()]
+            return '\n'.join(rows + self.fdb) + "\n"
+        if obj == "link":
+            if action == "set":
+                port = self.ports[args[args.index("dev") + 1]]
+                if "flood" in args:
+                    port.flood = args[args.index("flood") + 1] == "on"
+                return None
+            return ''.join(f"{port.index}: {port.name}: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 "
+                           f"master br0 state forwarding priority 32 cost 4\n"
+                           for port in self.ports.values() if port.name != "eth0")
+        return f"bridge: unknown object '{obj}'\n", 1
+
+    def _link_header(self, port):
+        return (f"{port.index}: {port.name}: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc mq "
+                f"master br0 state {'UP' if port.up else 'DOWN'}\n"
+                f"    link/ether {port.mac} brd ff:ff:ff:ff:ff:ff\n")
+
+    def _link_json(self, port, stats, details):
+        """One `ip -j link` entry in iproute2's layout"""
+        entry = {"ifindex": port.index, "ifname": port.name,
+                 "flags": ["BROADCAST", "MULTICAST", "UP", "LOWER_UP"] if port.up else ["BROADCAST", "MULTICAST"],
+                 "mtu": 1500, "qdisc": "mq", "master": "br0", "operstate": "UP" if port.up else "DOWN",
+                 "link_type": "ether", "address": port.mac, "broadcast": "ff:ff:ff:ff:ff:ff"}
+        if stats:
+            c = port.counters
+            rx = {"bytes": c["rx_bytes"], "packets": c["rx_packets"], "errors": c["rx_errors"],
+                  "dropped": c["rx_dropped"], "over_errors": 0, "multicast": c["multicast"]}
+            tx = {"bytes": c["tx_bytes"], "packets": c["tx_packets"], "errors": c["tx_errors"],
+                  "dropped": c["tx_dropped"], "carrier_errors": 0, "collisions": c["collisions"]}
+            if details:
+                rx.update(length_errors=0, crc_errors=c["rx_crc_errors"], frame_errors=0,
+                          fifo_errors=0, missed_errors=0)
+                tx.update(aborted_errors=0, fifo_errors=0, window_errors=0, heartbeat_errors=0,
+                          carrier_changes=1)
+            entry["stats64"] = {"rx": rx, "tx": tx}
+        return entry
+
+    def _cmd_ip(self, args):
+        stats = "-s" in args
+        details = args.count("-s") > 1
+        as_json = "-j" in args
+        args = [a for a in args if a not in ("-s", "-d", "-j")]
+        obj = args[0]
+        if obj == "link":
+            action = args[1] if len(args) > 1 else "show"
+            if action in ("set", "add", "del"):
+                if action == "set" and args[2] in self.ports:
+                    if "up" in args:
+                        self.ports[args[2]].up = True
+                    if "down" in args:
+                        self.ports[args[2]].up = False
+                return None
+            names = [a for a in args[2:] if a != "dev"] or list(self.ports)
+            out = []
+            for name in names:
+                port = self.ports.get(name)
+                if port is None:
+                    return f'Device "{name}" does not exist.\n', 1
+                if as_json:
+                    out.append(self._link_json(port, stats, details))
+                    continue
+                out.append(self._link_header(port))
+                if stats:
+                    c = port.counters
+                    out.append("    RX:  bytes    packets errors dropped  missed   mcast\n")
+                    out.append(f"    {c['rx_bytes']:>9} {c['rx_packets']:>8} {c['rx_errors']:>6} "
+                               f"{c['rx_dropped']:>7} {0:>8} {c['multicast']:>8}\n")
+                    out.append("    TX:  bytes    packets errors dropped carrier collsns\n")
+                    out.append(f"    {c['tx_bytes']:>9} {c['tx_packets']:>8} {c['tx_errors']:>6} "
+                               f"{c['tx_dropped']:>7} {0:>8} {c['collisions']:>8}\n")
+            if as_json:
+                return json.dumps(out) + "\n"
+            return ''.join(out)
+        if obj == "addr":
+            action = args[1] if len(args) > 1 else "show"
+            if action == "add":
+                self.addresses.setdefault(args[args.index("dev") + 1], []).append(args[2])
+                return None
+            if action == "del":
+                dev = args[args.index("dev") + 1]
+                if args[2] not in self.addresses.get(dev, []):
+                    return "RTNETLINK answers: Cannot assign requested address\n", 2
+                self.addresses[dev].remove(args[2])
+                return None
+            out = []
+            for dev, addrs in self.addresses.items():
+                for addr in addrs:
+                    out.append(f"    inet {addr} scope global {dev}\n")
+            return ''.join(out)
+        if obj == "neigh":
+            return ''.join(f"{line}\n" for line in self.neighbors)
+        return f'Object "{obj}" is unknown, try "ip help".\n', 255
+
+    def _cmd_ethtool(self, args):
+        if args and args[0] == "-S":
+            port = self.ports.get(args[1])
+            if port is None:
+                return "Cannot get stats strings information: No such device\n", 1
+            return "NIC statistics:\n" + ''.join(
+                f"     {name}: {value}\n" for name, value in port.counters.items())
+        port = self.ports.get(args[0])
+        if port is None:
+            return "No data available\n", 75
+        return (f"Settings for {port.name}:\n\tSpeed: 1000Mb/s\n\tDuplex: Full\n"
+                f"\tLink detected: {'yes' if port.up else 'no'}\n")
+
+    def _cmd_echo(self, args):
+        return ' '.join(args) + "\n"
+
+    def _cmd_true(self, args):
+        return None
+
+    def _cmd_false(self, args):
+        return "", 1
+
+    def _cmd_sleep(self, args):
+        return None
+
+    def _cmd_hostname(self, args):
+        return f"{self.name}\n"
+
+    def _proc(self, path):
+        """Contents of the simulated /proc files (cat /proc/$$/stat is the shell)"""
+        elapsed = time.monotonic() - self.started
+        ticks = elapsed * CLK_TCK
+        command_ticks = self.commands * COMMAND_TICKS
+        user, system, irq, softirq = (share * ticks for share in IDLE_LOAD)
+        system += command_ticks
+        idle = max(0.0, ticks - user - system - irq - softirq)
+        frames = sum(port.counters["rx_packets"] for port in self.ports.values())
+        if path == "/proc/stat":
+            times = ' '.join(str(int(value)) for value in (user, 0, system, idle, 0, irq, softirq, 0, 0, 0))
+            interrupts = int(elapsed * CLK_TCK) + self.commands * 2 + frames // 4096
+            return (f"cpu  {times}\ncpu0 {times}\nintr {interrupts}\nctxt {interrupts * 3}\n"
+                    f"btime {int(time.time() - elapsed)}\nprocesses {self.commands + 120}\n"
+                    f"procs_running 1\nprocs_blocked 0\n")
+        if path == "/proc/meminfo":
+            used = MEM_USED_KB + int(elapsed) % 64 * 4
+            return (f"MemTotal:       {MEM_TOTAL_KB:>8} kB\nMemFree:        {MEM_TOTAL_KB - used - 40960:>8} kB\n"
+                    f"MemAvailable:   {MEM_TOTAL_KB - used:>8} kB\nBuffers:        {4096:>8} kB\n"
+                    f"Cached:         {36864:>8} kB\n")
+        if path == "/proc/interrupts":
+            return ("           CPU0       \n"
+                    f" 11: {int(elapsed * CLK_TCK):>10}     GICv2  27 Level     arch_timer\n"
+                    f" 27: {self.commands * 2:>10}     GICv2  62 Level     eth0\n"
+                    f" 29: {frames // 4096:>10}     GICv2  40 Level     lan966x-xtr\n"
+                    f" 31: {0:>10}     GICv2  41 Level     lan966x-ana\n"
+                    f"IPI0: {0:>10}       Rescheduling interrupts\n"
+                    f"Err: {0:>10}\n")
+        if path == "/proc/$$/stat":
+            shell = int(command_ticks * 0.1)
+            return (f"812 (sh) S 1 812 812 0 -1 4194560 {self.commands} 0 0 0 {shell} {shell} "
+                    f"{int(command_ticks * 0.4)} {int(command_ticks * 0.4)} 20 0 1 0 1200 2506752 180\n")
+        return None
+
+    def _cmd_cat(self, args):
+        out = []
+        for path in args:
+            text = self._proc(path)
+            if text is None:
+                return ''.join(out) + f"cat: can't open '{path}': No such file or directory\n", 1
+            out.append(text)
+        return ''.join(out)
+
+
+class Simulator:
+    """Sender and receiver boards joined by a traffic model"""
+
+    def __init__(self, rate_fps=17297.0, loss_eth1=0.0, loss_eth2=0.0, ooo_probability=0.0,
+                 preconfigured=True, start_traffic=True, cabling=None):
+        self.rate_fps = rate_fps
+        self.loss = {"eth1": loss_eth1, "eth2": loss_eth2}
+        self.ooo_probability = ooo_probability
+        self.boards = {
+            "sender": SimulatedBoard("lan9662-sender", "sender", "22:f7:00:32:c9", preconfigured),
+            "receiver": SimulatedBoard("lan9662", "receiver", "22:f7:00:32:d1", preconfigured),
+        }
+        self.lock = threading.RLock()
+        self.running = start_traffic
+        self.frames_sent = 0
+        self.cables = {}
+        for a, b in (DEFAULT_CABLING if cabling is None else cabling).items():
+            self.cables[a], self.cables[b] = b, a
+        for (node, port), (peer, peer_port) in self.cables.items():
+            if node in self.boards and peer in self.boards and port != "eth0":
+                # Link-local chatter (LLDP, STP) teaches each board its neighbour's port MAC
+                self.boards[node].learned[self.boards[peer].ports[peer_port].mac] = port
+        # The test PC: its interfaces count what the cabled board ports send and receive
+        self.pc = SimulatedBoard("frer-pc", "pc", "00:e0:4c:68:00", preconfigured=False)
+        self.pc.ports = {name: Port(name, index + 2, f"00:e0:4c:68:00:{index + 1:02x}")
+                         for index, name in enumerate(sorted(port for node, port in self.cables if node == "pc"))}
+        self._last = time.monotonic()
+        self._carry = 0.0
+        self._fractions = {}
+
+    def _expected(self, key, count, probability):
+        """Deterministic share of count with probability, carrying fractions"""
+        value = self._fractions.get(key, 0.0) + count * probability
+        whole = int(value)
+        self._fractions[key] = value - whole
+        return whole
+
+    def advance(self):
+        """Run the traffic model up to now"""
+        with self.lock:
+            now = time.monotonic()
+            elapsed, self._last = now - self._last, now
+            if not self.running:
+                return 0
+            self._carry += elapsed * self.rate_fps
+            frames = int(self._carry)
+            self._carry -= frames
+            if frames:
+                self.inject(frames)
+            return frames
+
+    def inject(self, frames, fields=None, size=FRAME_BYTES):
+        """Push frames from the sender PC through both boards
+
+        fields are the classification keys of the frames (one flow); the
+        VLAN of the sender's VID_REPLACE action is applied before the
+        receiver classifies them.
+        """
+        with self.lock:
+            self.frames_sent += frames
+            sender = self.boards["sender"]
+            per_path = sender.generate(frames, fields, size)
+            if fields is not None:
+                rule, _ = sender._isdx_for_port("eth3", fields)
+                if rule is not None and rule.actions.get("VID_REPLACE_ENA"):
+                    fields = dict(fields, VID=rule.actions.get("VID_VAL", 0))
+            lost = {dev: self._expected(f"loss_{dev}", n, self.loss.get(dev, 0.0))
+                    for dev, n in per_path.items()}
+            both_lost = self._expected("loss_both", frames,
+                                       self.loss["eth1"] * self.loss["eth2"]) if len(per_path) > 1 else 0
+            received = {dev: n - lost[dev] for dev, n in per_path.items()}
+            for dev, n in lost.items():
+                # Path loss is modelled as frames corrupted on the cable
+                self.boards["receiver"].ports[dev].rx_corrupt(n)
+            ooo = self._expected("ooo", frames, self.ooo_probability)
+            self.boards["receiver"].receive(received, frames, both_lost, ooo, fields, size)
+
+    def probe(self, iface, src_mac, frames=1, size=64):
+        """Broadcast frames from a PC interface through the cabling
+
+        Each board bridges the frames once; returns the frames arriving
+        back at PC interfaces.
+        """
+        with self.lock:
+            arrivals, seen = {}, set()
+            pending = [("pc", iface)]
+            while pending:
+                peer = self.cables.get(pending.pop(0))
+                if peer is None:
+                    continue
+                node, port = peer
+                if node == "pc":
+                    arrivals[port] = arrivals.get(port, 0) + frames
+                    continue
+                if node in seen:
+                    # Flooded copies over a second link: counted, not bridged again
+                    self.boards[node].ports[port].rx(frames, size)
+                    continue
+                seen.add(node)
+                pending += [(node, out) for out in self.boards[node].bridge(port, src_mac, frames, size)]
+            return arrivals
+
+    def run(self, board, line):
+        """Run a shell line on a board and return (output, status)"""
+        self.advance()
+        with self.lock:
+            if board == "pc":
+                self._mirror_pc()
+                return run_shell_line(self.pc, line)
+            return run_shell_line(self.boards[board], line)
+
+    def _mirror_pc(self):
+        for name, port in self.pc.ports.items():
+            node, peer_port = self.cables.get(("pc", name), (None, None))
+            if node not in self.boards:
+                continue
+            peer = self.boards[node].ports[peer_port].counters
+            port.counters.update(rx_packets=peer["tx_packets"], rx_bytes=peer["tx_bytes"],
+                                 tx_packets=peer["rx_packets"] + peer["rx_errors"], tx_bytes=peer["rx_bytes"])
+
+
+# ---- mini shell ----------------------------------------------------------------
+
+def _split_unquoted(line, separators):
+    """Split on separators outside quotes, keeping the separator tokens"""
+    parts, current, quote, i = [], "", None, 0
+    while i < len(line):
+        ch = line[i]
+        if quote:
+            current += ch
+            if ch == quote:
+                quote = None
+            i += 1
+            continue
+        if ch in "'\"":
+            quote = ch
+            current += ch
+            i += 1
+            continue
+        for sep in separators:
+            if line.startswith(sep, i):
+                parts.append(current)
+                parts.append(sep)
+                current = ""
+                i += len(sep)
+                break
+        else:
+            current += ch
+            i += 1
+    parts.append(current)
+    return parts
+
+
+def _filter(output, argv):
+    """Apply a pipeline filter (grep/head/tail/wc) to text"""
+    name, args = argv[0], argv[1:]
+    lines = output.splitlines()
+    if name == "grep":
+        flags, context, patterns = set(), {"A": 0, "B": 0}, []
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            i += 1
+            if not arg.startswith("-") or arg == "-":
+                patterns.append(arg)
+                continue
+            # Flags may be grouped (-vi) and -A/-B take N attached or next
+            for j, flag in enumerate(arg[1:], 1):
+                if flag in context:
+                    value = arg[j + 1:]
+                    if not value:
+                        value, i = args[i], i + 1
+                    context[flag] = int(value)
+                    break
+                flags.add(flag)
+        regex = re.compile(patterns[0] if "E" in flags else re.escape(patterns[0]),
+                           re.IGNORECASE if "i" in flags else 0)
+        invert = "v" in flags
+        matched = [bool(regex.search(line)) != invert for line in lines]
+        keep = [line for index, line in enumerate(lines)
+                if any(matched[max(0, index - context["A"]):index + context["B"] + 1])]
+        status = 0 if any(matched) else 1
+        if "q" in flags:
+            return "", status
+        if "c" in flags:
+            return f"{sum(matched)}\n", status
+        return ''.join(f"{line}\n" for line in keep), status
+    if name in ("head", "tail"):
+        count = 10
+        for i, a in enumerate(args):
+            if a == "-n":
+                count = int(args[i + 1])
+            elif re.fullmatch(r"-\d+", a):
+                count = int(a[1:])
+        chosen = lines[:count] if name == "head" else lines[-count:]
+        return ''.join(f"{line}\n" for line in chosen), 0
+    if name == "wc":
+        return f"{len(lines)}\n", 0
+    return f"sh: {name}: not found\n", 127
+
+
+def run_shell_line(board, line):
+    """Run a shell line with ;, &&, ||, pipes and redirections"""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return "", 0
+    if line.endswith("&"):
+        line = line[:-1]
+    output, status = "", 0
+    tokens = _split_unquoted(line, ["&&", "||", ";"])
+    for index in range(0, len(tokens), 2):
+        op = tokens[index - 1] if index else ";"
+        if op == "&&" and status != 0 or op == "||" and status == 0:
+            continue
+        segment = tokens[index]
+        discard_errors = bool(re.search(r"2>\s*/dev/null", segment))
+        discard_output = bool(re.search(r"(?<![2&])>\s*/dev/null", segment))
+        segment = re.sub(r"\d?>\s*/dev/null|2>&1", "", segment)
+        stages = [s for s in _split_unquoted(segment, ["|"]) if s != "|"]
+        text, status = board.execute(stages[0])
+        if status and discard_errors:
+            text = ""
+        for stage in stages[1:]:
+            text, status = _filter(text, shlex.split(stage))
+        if not discard_output:
+            output += text
+    return output, status
+
+
+# ---- transports ----------------------------------------------------------------
+
+class _SocketHandler(socketserver.StreamRequestHandler):
+    """First line: JSON header {"board": ..., "exec": optional command}"""
+
+    def handle(self):
+        sim = self.server.simulator
+        header = json.loads(self.rfile.readline() or b"{}")
+        board = header.get("board", "receiver")
+        if "exec" in header:
+            output, status = sim.run(board, header["exec"])
+            self.wfile.write(json.dumps({"output": output, "status": status}).encode() + b"\n")
+            return
+        for raw in self.rfile:
+            output, _ = sim.run(board, raw.decode(errors="replace"))
+            self.wfile.write(output.encode())
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_serial(simulator, board, link):
+    """Serve a board console on a pty; link is a symlink to the slave device"""
+    import pty
+    import tty
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    slave_name = os.ttyname(slave)
+    if link:
+        if os.path.islink(link):
+            os.unlink(link)
+        os.symlink(slave_name, link)
+
+    def loop():
+        buffer = b""
+        os.write(master, b"# ")
+        while True:
+            try:
+                data = os.read(master, 4096)
+            except OSError:
+                return
+            # Console echo, like a real serial getty
+            os.write(master, data.replace(b"\n", b"\r\n"))
+            buffer += data.replace(b"\r", b"\n")
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                if not line.strip():
+                    continue
+                output, _ = simulator.run(board, line.decode(errors="replace"))
+                os.write(master, output.replace("\n", "\r\n").encode() + b"# ")
+
+    threading.Thread(target=loop, daemon=True).start()
+    return slave_name, slave
+
+
+def serve(args):
+    simulator = Simulator(args.rate, args.loss_eth1, args.loss_eth2, args.ooo)
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    server = _UnixServer(args.socket, _SocketHandler)
+    server.simulator = simulator
+    print(f"Board simulator: {args.rate:g} fps, socket {args.socket}")
+    if args.serial_link:
+        slave_name, _ = serve_serial(simulator, args.serial_board, args.serial_link)
+        print(f"  {args.serial_board} serial console: {args.serial_link} -> {slave_name}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+
+
+def _connect(socket_path, header):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socket_path)
+    sock.sendall(json.dumps(header).encode() + b"\n")
+    return sock
+
+
+def shell(board, socket_path):
+    """Interactive line shell on stdin/stdout, via the server if running"""
+    if os.path.exists(socket_path):
+        sock = _connect(socket_path, {"board": board})
+
+        def pump():
+            for line in sys.stdin:
+                sock.sendall(line.encode())
+            sock.shutdown(socket.SHUT_WR)
+
+        threading.Thread(target=pump, daemon=True).start()
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                return 0
+            sys.stdout.write(data.decode(errors="replace"))
+            sys.stdout.flush()
+
+    simulator = Simulator()
+    for line in sys.stdin:
+        output, _ = simulator.run(board, line)
+        sys.stdout.write(output)
+        sys.stdout.flush()
+    return 0
+
+
+def ssh(argv, socket_path):
+    """ssh stand-in: [options] [user@]host [command ...]"""
+    options_with_value = set("bcDEeFIiJLlmOopQRSWw")
+    i = 0
+    while i < len(argv) and argv[i].startswith("-"):
+        flag = argv[i]
+        i += 2 if len(flag) == 2 and flag[1] in options_with_value else 1
+    host = argv[i].split("@")[-1]
+    command = ' '.join(argv[i + 1:])
+    board = "receiver" if host == RECEIVER_HOST else "sender"
+    if command in ("", "sh", "bash"):
+        return shell(board, socket_path)
+    if os.path.exists(socket_path):
+        sock = _connect(socket_path, {"board": board, "exec": command})
+        reply = json.loads(sock.makefile().readline())
+        sock.close()
+    else:
+        output, status = Simulator().run(board, command)
+        reply = {"output": output, "status": status}
+    sys.stdout.write(reply["output"])
+    return reply["status"]
+
+
+def install_ssh(directory):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "ssh")
+    with open(path, "w") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" ssh "$@"\n')
+    os.chmod(path, 0o755)
+    print(f"Installed {path}; run scripts with PATH={directory}:$PATH")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "ssh":
+        # Parsed by hand: ssh options must not be taken for ours
+        sys.exit(ssh(sys.argv[2:], DEFAULT_SOCKET))
+
+    parser = argparse.ArgumentParser(description="LAN9662 FRER board simulator")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("serve", help="run both boards behind a socket (and a pty)")
+    p.add_argument("--rate", type=float, default=17297.0, help="frames per second")
+    p.add_argument("--loss-eth1", type=float, default=0.0)
+    p.add_argument("--loss-eth2", type=float, default=0.0)
+    p.add_argument("--ooo", type=float, default=0.0, help="out-of-order probability per frame")
+    p.add_argument("--serial-link", default=None, help="symlink to create for the pty console")
+    p.add_argument("--serial-board", default="sender")
+    p = sub.add_parser("shell", help="line shell on stdin/stdout")
+    p.add_argument("--board", default="receiver", choices=["sender", "receiver"])
+    p = sub.add_parser("install-ssh", help="write an ssh wrapper into a directory")
+    p.add_argument("directory")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args)
+    elif args.command == "shell":
+        sys.exit(shell(args.board, args.socket))
+    elif args.command == "install-ssh":
+        install_ssh(args.directory)
+
+
+if __name__ == "__main__":
+    main()
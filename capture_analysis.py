@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+"""
+Sharded capture analysis with mergeable partial states
+
+A capture is cut into byte-range shards whose boundaries are resynced onto
+record boundaries (pcap records carry no sync marker, so a candidate
+header is accepted only when the following records chain to valid
+headers). Every shard is analyzed in a process pool over the same
+read-only mmap of the file, and the per-shard states are merged in file
+order into exactly the result of one sequential pass:
+
+- frame and byte counts per interface
+- R-TAG sequence gaps, out-of-order frames, duplicates and wraps per
+  interface (SequenceTracker semantics)
+- path skew histograms: arrival time differences of the copies of one
+  sequence number on two interfaces within MATCH_WINDOW_NS
+- frame and byte counters per stream (IPv4 source, destination, ports)
+
+Within a shard the record headers are located without copying frames and
+the fixed-offset fields (EtherType, R-TAG sequence, IPv4 addresses, proto
+and ports) are read in numpy batches; stream names are formatted once per
+distinct raw key. Only sequence tracking and copy pairing run per frame.
+
+Shard boundaries are checked after the fact: a shard whose walk does not
+end exactly where the next one starts raises an error rather than
+returning counts of misparsed records. Timestamps are assumed to be in
+capture order, as tcpdump and pcap_merge write them.
+
+Usage:
+    python3 capture_analysis.py /tmp/enp11s0_capture.pcap [--shards 16] [--workers 8]
+    python3 capture_analysis.py merged.pcapng --json analysis.json --check
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from pcap_io import BLOCK_EPB, BLOCK_IDB, BLOCK_SPB, PcapReader, open_capture
+from pcap_merge import list_sources
+from rtag_frames import ETHERTYPE_OFFSET, IP_OFFSET, RTAG_ETHERTYPE, SEQ_OFFSET, SequenceTracker, seq_delta
+
+MATCH_WINDOW_NS = 50_000_000
+HIST_BIN_NS = 10_000
+# Frames per interface and shard replayed at merge time
+HEAD_FRAMES = 64
+# Records that must chain after a resync candidate
+CHAIN_RECORDS = 8
+MAX_RESYNC_SCAN = 1 << 20
+MAX_FRAME = 262144
+# Records whose fixed-offset fields are parsed in one numpy batch
+BATCH_FRAMES = 65536
+
+ETHERTYPE_IPV4 = 0x0800
+# Block types a pcapng shard may start at (IDB, NRB, SPB, ISB, EPB, DSB)
+_SYNC_BLOCKS = {BLOCK_IDB, 0x4, BLOCK_SPB, 0x5, BLOCK_EPB, 0xA}
+
+_walker = None
+_names = None
+
+
+class ShardBoundaryError(Exception):
+    """A shard did not end on the next shard's first record"""
+
+
+# --- shard boundaries -------------------------------------------------------
+
+class RecordWalker:
+    """Record boundary arithmetic over an open capture reader"""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.buf = reader._map
+        self.size = len(self.buf)
+        self.endian = reader._endian
+        self.pcap = isinstance(reader, PcapReader)
+        if self.pcap:
+            self.first = 24
+            self.first_sec = struct.unpack_from(self.endian + 'I', self.buf, 24)[0] \
+                if self.size >= 40 else 0
+            self.snaplen = reader.interfaces[0].snaplen or MAX_FRAME
+        else:
+            self.first = next((pkt.offset for pkt in reader), self.size)
+
+    def record_size(self, offset):
+        """Length of a plausible record (pcap) or block (pcapng) at offset, or None"""
+        if self.pcap:
+            if offset + 16 > self.size:
+                return None
+            sec, frac, incl_len, orig_len = struct.unpack_from(self.endian + 'IIII', self.buf, offset)
+            if frac >= (1_000_000_000 if self.reader.nanosecond else 1_000_000):
+                return None
+            if not 0 < incl_len <= min(self.snaplen, orig_len) or orig_len > MAX_FRAME:
+                return None
+            if abs(sec - self.first_sec) > 86400 or offset + 16 + incl_len > self.size:
+                return None
+            return 16 + incl_len
+        if offset + 12 > self.size:
+            return None
+        block_type, total = struct.unpack_from(self.endian + 'II', self.buf, offset)
+        if block_type not in _SYNC_BLOCKS or total < 12 or total % 4 or offset + total > self.size:
+            return None
+        if struct.unpack_from(self.endian + 'I', self.buf, offset + total - 4)[0] != total:
+            return None
+        if block_type == BLOCK_EPB:
+            iface, _, _, cap_len = struct.unpack_from(self.endian + 'IIII', self.buf, offset + 8)
+            if iface >= len(self.reader.interfaces) or cap_len > total - 32:
+                return None
+        return total
+
+    def resync(self, offset):
+        """First record boundary at or after offset (size if none is found)
+
+        A candidate is accepted when CHAIN_RECORDS records chain from it
+        (or the chain ends exactly at the end of the file).
+        """
+        step = 1 if self.pcap else 4
+        offset += -offset % step
+        limit = min(self.size, offset + MAX_RESYNC_SCAN)
+        while offset < limit:
+            position, chained = offset, 0
+            while chained < CHAIN_RECORDS:
+                length = self.record_size(position)
+                if length is None:
+                    break
+                position += length
+                chained += 1
+            if chained == CHAIN_RECORDS or (chained and position == self.size):
+                return offset
+            offset += step
+        return self.size
+
+    def walk_to(self, offset, end):
+        """First record boundary at or past end, stepping from the boundary offset"""
+        while offset < end:
+            length = self.record_size(offset)
+            if length is None:
+                break
+            offset += length
+        return offset
+
+
+def shard_ranges(path, shards):
+    """Byte ranges [(start, end)] starting on record boundaries, covering all records"""
+    with open_capture(path) as reader:
+        walker = RecordWalker(reader)
+        size, first = walker.size, walker.first
+        bounds = [first]
+        for index in range(1, shards):
+            target = first + (size - first) * index // shards
+            if target > bounds[-1]:
+                start = walker.resync(target)
+                if start > bounds[-1]:
+                    bounds.append(start)
+    bounds = [start for start in bounds if start < size] or [first]
+    return list(zip(bounds, bounds[1:] + [size]))
+
+
+# --- per-shard analysis -----------------------------------------------------
+
+def _byte_at(buf, start, offset):
+    """Byte at start + offset of every frame in a batch, as uint64"""
+    return buf.take(start + offset, mode='clip').astype(np.uint64)
+
+
+def _frame_fields(buf, start, cap_len):
+    """Fixed-offset fields of a batch of frames starting at start
+
+    Returns (rtag, seq, ipv4, keys): the R-TAG mask and sequence numbers,
+    the IPv4 mask and the raw stream keys, two uint64 columns holding the
+    IPv4 source and destination, the TCP/UDP ports (0 for other protocols)
+    and proto. Bytes past a frame's cap_len are read but never used.
+    """
+    ethertype = _byte_at(buf, start, ETHERTYPE_OFFSET) << 8 | _byte_at(buf, start, ETHERTYPE_OFFSET + 1)
+    rtag = (cap_len >= 18) & (ethertype == RTAG_ETHERTYPE)
+    seq = _byte_at(buf, start, SEQ_OFFSET) << 8 | _byte_at(buf, start, SEQ_OFFSET + 1)
+    ip = np.where(rtag, IP_OFFSET, 14)
+    inner = np.where(rtag, _byte_at(buf, start, ip - 2) << 8 | _byte_at(buf, start, ip - 1), ethertype)
+    version = _byte_at(buf, start, ip)
+    ipv4 = (cap_len >= ip + 24) & (inner == ETHERTYPE_IPV4) & (version >> 4 == 4)
+    proto = _byte_at(buf, start, ip + 9)
+    l4 = ip + (version & 0xf).astype(np.int64) * 4
+    ported = ipv4 & ((proto == 6) | (proto == 17)) & (cap_len >= l4 + 4)
+    ports = np.zeros(len(start), dtype=np.uint64)
+    for i in range(4):
+        ports = ports << 8 | _byte_at(buf, start, l4 + i)
+    ports[~ported] = 0
+    keys = np.zeros((len(start), 2), dtype=np.uint64)
+    for i in range(8):
+        keys[:, 0] = keys[:, 0] << 8 | _byte_at(buf, start, ip + 12 + i)
+    keys[:, 1] = ports << 8 | proto
+    return rtag, seq.astype(np.int64), ipv4, keys
+
+
+def _flow_name(key):
+    """Stream name "src:sport>dst:dport/proto" of a raw key"""
+    addresses, rest = int(key[0]), int(key[1])
+    src, dst = addresses >> 32, addresses & 0xffffffff
+    sport, dport, proto = rest >> 24, (rest >> 8) & 0xffff, rest & 0xff
+    return (f"{src >> 24}.{src >> 16 & 0xff}.{src >> 8 & 0xff}.{src & 0xff}:{sport}>"
+            f"{dst >> 24}.{dst >> 16 & 0xff}.{dst >> 8 & 0xff}.{dst & 0xff}:{dport}/{proto}")
+
+
+class SequencePart:
+    """Sequence statistics of one interface over one shard
+
+    The first HEAD_FRAMES sequence numbers are kept and replayed through
+    the real tracker at merge time; the rest is summarized relative to the
+    head, with the gap count as g -> max(low, g + shift) because a late
+    frame only fills a gap when one is outstanding. Once the replayed
+    tracker's last sequence matches the shard's own, the summary applies
+    exactly.
+    """
+
+    def __init__(self):
+        self.head = []
+        self.head_last = None
+        self.frames = 0
+        self.out_of_order = 0
+        self.duplicates = 0
+        self.wraps = 0
+        self.low = 0
+        self.shift = 0
+        self.last = None
+
+    def update(self, seq):
+        if len(self.head) < HEAD_FRAMES:
+            self.head.append(seq)
+            if self.head_last is None or seq_delta(seq, self.head_last) > 0:
+                self.head_last = seq
+            self.last = self.head_last
+            return
+        self.frames += 1
+        delta = seq_delta(seq, self.last)
+        if delta > 0:
+            self.low += delta - 1
+            self.shift += delta - 1
+            if seq < self.last:
+                self.wraps += 1
+            self.last = seq
+        elif delta == 0:
+            self.duplicates += 1
+        else:
+            self.out_of_order += 1
+            self.low = max(0, self.low - 1)
+            self.shift -= 1
+
+    def apply(self, tracker):
+        """Advance tracker over this part; False if the summary does not apply"""
+        for seq in self.head:
+            tracker.update(seq)
+        if not self.frames:
+            return True
+        if tracker.last != self.head_last:
+            return False
+        tracker.frames += self.frames
+        tracker.out_of_order += self.out_of_order
+        tracker.duplicates += self.duplicates
+        tracker.wraps += self.wraps
+        tracker.gaps = max(self.low, tracker.gaps + self.shift)
+        tracker.last = self.last
+        return True
+
+
+class ShardState:
+    """Partial analysis of the records in one byte range"""
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.stop = start
+        self.first_ts = None
+        self.last_ts = None
+        self.frames = {}
+        self.sequences = {}
+        self.streams = {}
+        self.skew = {}
+        # R-TAG frames near the shard's time edges, for pairs across shards
+        self.head = []
+        self.tail = []
+
+    def analyze(self, walker, names, window=MATCH_WINDOW_NS):
+        pending = {}
+        tail = deque()
+        head_until = None
+        last_offset = None
+        skew, head = self.skew, self.head
+        buf = np.frombuffer(walker.buf, dtype=np.uint8)
+        flow_names = {}
+        records = walker.reader.locate_from(self.start, self.end)
+        while True:
+            batch = list(islice(records, BATCH_FRAMES))
+            if not batch:
+                break
+            ts_ns, ifaces, starts, cap_len, orig_len, offsets = np.array(batch, dtype=np.int64).T
+            last_offset = int(offsets[-1])
+            if self.first_ts is None:
+                self.first_ts = int(ts_ns[0])
+                head_until = self.first_ts + window
+            self.last_ts = int(ts_ns[-1])
+            rtag, seqs, ipv4, keys = _frame_fields(buf, starts, cap_len)
+
+            # Counters, in order of first appearance like a frame-by-frame pass
+            present, first = np.unique(ifaces, return_index=True)
+            frames = np.bincount(ifaces, minlength=len(names))
+            sizes = np.bincount(ifaces, weights=orig_len, minlength=len(names))
+            tagged = np.bincount(ifaces[rtag], minlength=len(names))
+            for iface in present[np.argsort(first)].tolist():
+                name = names[iface]
+                counts = self.frames.get(name)
+                if counts is None:
+                    counts = self.frames[name] = {"frames": 0, "bytes": 0, "rtag_frames": 0}
+                    self.sequences[name] = SequencePart()
+                    self.streams[name] = {}
+                counts["frames"] += int(frames[iface])
+                counts["bytes"] += int(sizes[iface])
+                counts["rtag_frames"] += int(tagged[iface])
+
+            if ipv4.any():
+                # Streams as (interface, addresses, ports) ids: three 1-D
+                # uniques are much cheaper than one over rows
+                ids = ifaces[ipv4]
+                for column in (keys[ipv4, 0], keys[ipv4, 1]):
+                    values, inverse = np.unique(column, return_inverse=True)
+                    ids = ids * len(values) + inverse.reshape(-1)
+                ids, first, inverse = np.unique(ids, return_index=True, return_inverse=True)
+                unique = np.column_stack((ifaces[ipv4][first].astype(np.uint64), keys[ipv4][first]))
+                inverse = inverse.reshape(-1)
+                flow_frames = np.bincount(inverse)
+                flow_bytes = np.bincount(inverse, weights=orig_len[ipv4])
+                for key, count, size in zip(unique, flow_frames.tolist(), flow_bytes.tolist()):
+                    raw = key[1:].tobytes()
+                    flow = flow_names.get(raw)
+                    if flow is None:
+                        flow = flow_names[raw] = _flow_name(key[1:])
+                    streams = self.streams[names[key[0]]]
+                    stream = streams.get(flow)
+                    if stream is None:
+                        stream = streams[flow] = [0, 0]
+                    stream[0] += count
+                    stream[1] += int(size)
+
+            # Sequence tracking and copy pairing are stateful: frame by frame
+            updates = {iface: self.sequences[names[iface]].update for iface in present.tolist()}
+            for ts, iface, seq in zip(ts_ns[rtag].tolist(), ifaces[rtag].tolist(), seqs[rtag].tolist()):
+                updates[iface](seq)
+                name = names[iface]
+                frame = (ts, name, seq)
+                recent = pending.get(seq)
+                if recent:
+                    recent = [other for other in recent if ts - other[0] < window]
+                    for other in recent:
+                        if other[1] != name:
+                            _add_skew(skew, other, frame)
+                    recent.append(frame)
+                    pending[seq] = recent
+                else:
+                    pending[seq] = [frame]
+                if ts < head_until:
+                    head.append(frame)
+                tail.append(frame)
+                while tail[0][0] <= ts - window:
+                    tail.popleft()
+        self.tail = list(tail)
+        # Where this shard's records really end, checked against the next start
+        self.stop = walker.walk_to(self.start if last_offset is None else last_offset, self.end)
+        return self
+
+
+def _add_skew(skew, a, b):
+    """Count the arrival difference of two copies, keyed by interface pair"""
+    if a[1] > b[1]:
+        a, b = b, a
+    key = f"{a[1]}->{b[1]}"
+    delta = b[0] - a[0]
+    entry = skew.get(key)
+    if entry is None:
+        entry = skew[key] = {"count": 0, "sum": 0, "min": delta, "max": delta, "bins": {}}
+    entry["count"] += 1
+    entry["sum"] += delta
+    entry["min"] = min(entry["min"], delta)
+    entry["max"] = max(entry["max"], delta)
+    bin_start = delta // HIST_BIN_NS
+    entry["bins"][bin_start] = entry["bins"].get(bin_start, 0) + 1
+
+
+class CaptureAnalysis:
+    """Shard states merged in file order"""
+
+    def __init__(self, path, window=MATCH_WINDOW_NS):
+        self.path = path
+        self.window = window
+        self.first_ts = None
+        self.last_ts = None
+        self.frames = {}
+        self.trackers = {}
+        self.streams = {}
+        self.skew = {}
+        self.tail = []
+        self.end = None
+        self.stop = None
+        self.replayed = 0
+
+    def merge(self, shard):
+        """Fold the next shard (in file order) into the result"""
+        if self.end is not None and shard.start != self.end:
+            raise ShardBoundaryError(f"shard at {shard.start} follows one ending at {self.end}")
+        if self.end is not None and self.stop != shard.start:
+            raise ShardBoundaryError(f"shard ending at {self.end} stopped at {self.stop}: "
+                                     f"resync at {shard.start} is not a record boundary")
+        self.end, self.stop = shard.end, shard.stop
+        if shard.first_ts is None:
+            return self
+
+        for name, counts in shard.frames.items():
+            total = self.frames.setdefault(name, {"frames": 0, "bytes": 0, "rtag_frames": 0})
+            for key, value in counts.items():
+                total[key] += value
+        for name, part in shard.sequences.items():
+            tracker = self.trackers.setdefault(name, SequenceTracker())
+            if not part.apply(tracker):
+                self._replay(shard, name, tracker, len(part.head))
+        for name, flows in shard.streams.items():
+            mine = self.streams.setdefault(name, {})
+            for flow, (frames, size) in flows.items():
+                entry = mine.setdefault(flow, [0, 0])
+                entry[0] += frames
+                entry[1] += size
+        for key, entry in shard.skew.items():
+            self._merge_skew(key, entry)
+
+        # Copies straddling the boundary
+        by_seq = {}
+        for frame in self.tail:
+            by_seq.setdefault(frame[2], []).append(frame)
+        for frame in shard.head:
+            for other in by_seq.get(frame[2], ()):
+                if other[1] != frame[1] and frame[0] - other[0] < self.window:
+                    _add_skew(self.skew, other, frame)
+
+        if self.first_ts is None:
+            self.first_ts = shard.first_ts
+        self.last_ts = shard.last_ts
+        self.tail = [f for f in self.tail + shard.tail if f[0] > self.last_ts - self.window]
+        return self
+
+    def _merge_skew(self, key, entry):
+        mine = self.skew.get(key)
+        if mine is None:
+            self.skew[key] = {"count": entry["count"], "sum": entry["sum"], "min": entry["min"],
+                              "max": entry["max"], "bins": dict(entry["bins"])}
+            return
+        mine["count"] += entry["count"]
+        mine["sum"] += entry["sum"]
+        mine["min"] = min(mine["min"], entry["min"])
+        mine["max"] = max(mine["max"], entry["max"])
+        for bin_start, count in entry["bins"].items():
+            mine["bins"][bin_start] = mine["bins"].get(bin_start, 0) + count
+
+    def _replay(self, shard, name, tracker, skip):
+        """Sequential fallback for a part whose summary did not converge"""
+        self.replayed += 1
+        with open_capture(self.path) as reader:
+            names = list_sources([self.path])
+            seen = 0
+            for pkt in reader.read_from(shard.start, shard.end):
+                data = pkt.data
+                if names[pkt.iface] != name or len(data) < 18 or \
+                        struct.unpack_from('!H', data, ETHERTYPE_OFFSET)[0] != RTAG_ETHERTYPE:
+                    continue
+                seen += 1
+                if seen > skip:
+                    tracker.update(struct.unpack_from('!H', data, 16)[0])
+
+    def as_dict(self):
+        skew = {}
+        for key, entry in sorted(self.skew.items()):
+            skew[key] = {
+                "pairs": entry["count"],
+                "mean_us": round(entry["sum"] / entry["count"] / 1000, 3),
+                "min_us": entry["min"] / 1000,
+                "max_us": entry["max"] / 1000,
+                "bin_us": HIST_BIN_NS / 1000,
+                "histogram": {str(b * HIST_BIN_NS / 1000): n for b, n in sorted(entry["bins"].items())},
+            }
+        return {
+            "capture": self.path,
+            "first_ts_ns": self.first_ts,
+            "last_ts_ns": self.last_ts,
+            "frames": self.frames,
+            "sequences": {name: tracker.as_dict() for name, tracker in sorted(self.trackers.items())},
+            "skew": skew,
+            "streams": {name: {flow: {"frames": f, "bytes": b} for flow, (f, b) in sorted(flows.items())}
+                        for name, flows in sorted(self.streams.items())},
+        }
+
+
+# --- process pool -----------------------------------------------------------
+
+def _init_worker(path):
+    global _walker, _names
+    _walker = RecordWalker(open_capture(path))
+    _names = list_sources([path])
+
+
+def _analyze_shard(bounds):
+    return ShardState(*bounds).analyze(_walker, _names)
+
+
+def analyze_capture(path, shards=None, workers=None):
+    """Exact analysis of a capture, sharded over a process pool"""
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers * 4
+    ranges = shard_ranges(path, shards)
+    result = CaptureAnalysis(path)
+    if workers == 1 or len(ranges) == 1:
+        _init_worker(path)
+        try:
+            for bounds in ranges:
+                result.merge(_analyze_shard(bounds))
+        finally:
+            _walker.reader.close()
+        return result
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(path,)) as pool:
+        for state in pool.map(_analyze_shard, ranges):
+            result.merge(state)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded exact capture analysis")
+    parser.add_argument("capture")
+    parser.add_argument("--shards", type=int, help="byte-range shards (default 4 per worker)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--json", help="write the analysis to this file")
+    parser.add_argument("--check", action="store_true",
+                        help="also run one sequential pass and compare")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = analyze_capture(args.capture, args.shards, args.workers)
+    elapsed = time.perf_counter() - started
+    report = result.as_dict()
+    frames = sum(counts["frames"] for counts in report["frames"].values())
+    print(f"{args.capture}: {frames} frames in {elapsed:.2f} s "
+          f"({frames / elapsed / 1e6 if elapsed else 0:.2f} M frames/s, {args.workers} workers)")
+    for name, seq in report["sequences"].items():
+        print(f"  {name}: {report['frames'][name]['frames']} frames, gaps {seq['gaps']}, "
+              f"out of order {seq['out_of_order']}, duplicates {seq['duplicates']}, wraps {seq['wraps']}")
+    for key, skew in report["skew"].items():
+        print(f"  skew {key}: {skew['pairs']} pairs, mean {skew['mean_us']} us "
+              f"[{skew['min_us']}, {skew['max_us']}]")
+    for name, flows in report["streams"].items():
+        print(f"  {name}: {len(flows)} stream(s)")
+
+    if args.check:
+        sequential = analyze_capture(args.capture, shards=1, workers=1).as_dict()
+        if sequential != report:
+            print("MISMATCH between sharded and sequential analysis", file=sys.stderr)
+            sys.exit(1)
+        print("Sharded result matches the sequential pass")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Analysis saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
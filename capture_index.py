@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Sidecar index for random access into large captures
+
+One streaming pass over a pcap/pcapng file writes <capture>.idx with two
+sorted arrays of byte offsets: one keyed by timestamp and one keyed by
+(interface, wrap epoch, R-TAG sequence). The index is mapped read-only and
+searched with bisect, so finding "the frames around seq 0xEB48 in the third
+wrap" in a multi-GB capture reads a few pages of the index and the handful
+of records it points to.
+
+The wrap epoch counts 16-bit sequence wraps per interface: epoch 0 is the
+first pass through the sequence space, epoch 2 the third.
+
+Usage:
+    python3 capture_index.py build /tmp/enp11s0_capture.pcap
+    python3 capture_index.py seq /tmp/enp11s0_capture.pcap 0xEB48 --epoch 2 --context 3
+    python3 capture_index.py time /tmp/enp11s0_capture.pcap 1726466641.25 1726466641.26
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from pcap_io import open_capture
+from rtag_frames import SEQ_MODULUS, rtag_sequence, seq_delta
+
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'FRIX'
+INDEX_VERSION = 1
+_HEADER = struct.Struct('<4sHHQQQq')
+
+EPOCH_BITS = 24
+
+
+def seq_key(iface, epoch, seq):
+    """Sort key of a frame in the sequence index"""
+    return (iface << (EPOCH_BITS + 16)) | (epoch << 16) | seq
+
+
+def index_path(capture_path):
+    return capture_path + INDEX_SUFFIX
+
+
+def _sorted_pairs(keys, offsets):
+    """Sort parallel key/offset arrays by key (skipped when already in order)"""
+    if all(keys[i] <= keys[i + 1] for i in range(len(keys) - 1)):
+        return keys, offsets
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return array('Q', (keys[i] for i in order)), array('Q', (offsets[i] for i in order))
+
+
+def build_index(capture_path, output=None):
+    """Index a capture in one pass; returns the index path"""
+    output = output or index_path(capture_path)
+    stat = os.stat(capture_path)
+    times, time_offsets = array('Q'), array('Q')
+    keys, seq_offsets = array('Q'), array('Q')
+    last, epochs = {}, {}
+    with open_capture(capture_path) as reader:
+        names = [iface.name for iface in reader.interfaces]
+        for pkt in reader:
+            times.append(pkt.ts_ns)
+            time_offsets.append(pkt.offset)
+            seq = rtag_sequence(pkt.data)
+            if seq is None:
+                continue
+            iface = pkt.iface
+            epoch = epochs.get(iface, 0)
+            previous = last.get(iface)
+            if previous is not None:
+                delta = seq_delta(seq, previous)
+                if delta > 0:
+                    if seq < previous:
+                        epoch += 1
+                    last[iface] = seq
+                elif seq > previous:
+                    # Late frame from before the latest wrap; in epoch 0 there
+                    # is no earlier pass (the capture started just after a wrap)
+                    keys.append(seq_key(iface, max(epoch - 1, 0), seq))
+                    seq_offsets.append(pkt.offset)
+                    continue
+            else:
+                last[iface] = seq
+            epochs[iface] = epoch
+            keys.append(seq_key(iface, epoch, seq))
+            seq_offsets.append(pkt.offset)
+
+    times, time_offsets = _sorted_pairs(times, time_offsets)
+    keys, seq_offsets = _sorted_pairs(keys, seq_offsets)
+    names_blob = json.dumps(names).encode()
+    names_blob += b' ' * (-len(names_blob) % 8)
+    with open(output, 'wb') as f:
+        f.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(names_blob), len(times), len(keys),
+                             stat.st_size, stat.st_mtime_ns))
+        f.write(names_blob)
+        for values in (times, time_offsets, keys, seq_offsets):
+            if sys.byteorder != 'little':
+                values.byteswap()
+            f.write(values.tobytes())
+    return output
+
+
+class CaptureIndex:
+    """Read-only view of a capture's sidecar index"""
+
+    def __init__(self, capture_path, rebuild=True):
+        self.capture_path = capture_path
+        path = index_path(capture_path)
+        if rebuild and not self._is_current(capture_path, path):
+            build_index(capture_path, path)
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, names_len, frames, rtag_frames, _, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"{path}: not a capture index")
+        start = _HEADER.size
+        self.interfaces = json.loads(bytes(self._map[start:start + names_len]))
+        start += names_len
+        view = memoryview(self._map)
+        arrays = []
+        for count in (frames, frames, rtag_frames, rtag_frames):
+            arrays.append(view[start:start + 8 * count].cast('Q'))
+            start += 8 * count
+        self.times, self.time_offsets, self.keys, self.seq_offsets = arrays
+        self._reader = None
+
+    @staticmethod
+    def _is_current(capture_path, path):
+        if not os.path.exists(path):
+            return False
+        stat = os.stat(capture_path)
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return False
+        magic, version, _, _, _, size, mtime_ns = _HEADER.unpack(header)
+        return (magic == INDEX_MAGIC and version == INDEX_VERSION
+                and size == stat.st_size and mtime_ns == stat.st_mtime_ns)
+
+    def iface_id(self, iface):
+        """Interface id from a name or id"""
+        return self.interfaces.index(iface) if isinstance(iface, str) else iface
+
+    def offsets_between(self, start_ns, end_ns):
+        """Byte offsets of frames with start_ns <= ts < end_ns, in time order"""
+        lo = bisect_left(self.times, start_ns)
+        hi = bisect_left(self.times, end_ns)
+        return list(self.time_offsets[lo:hi])
+
+    def offset_of(self, seq, epoch=0, iface=0):
+        """Byte offset of the first frame with this sequence number, or None"""
+        key = seq_key(self.iface_id(iface), epoch, seq)
+        pos = bisect_left(self.keys, key)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return self.seq_offsets[pos]
+        return None
+
+    def offsets_around(self, seq, epoch=0, iface=0, context=5):
+        """Byte offsets of frames within context sequence numbers of seq
+
+        Duplicates are all included; the range may cross an epoch boundary.
+        """
+        iface = self.iface_id(iface)
+        center = epoch * SEQ_MODULUS + seq
+        low = max(0, center - context)
+        high = center + context
+        lo = bisect_left(self.keys, seq_key(iface, low // SEQ_MODULUS, low % SEQ_MODULUS))
+        hi = bisect_right(self.keys, seq_key(iface, high // SEQ_MODULUS, high % SEQ_MODULUS))
+        return list(self.seq_offsets[lo:hi])
+
+    def packets(self, offsets):
+        """Read the records at the given byte offsets"""
+        if self._reader is None:
+            self._reader = open_capture(self.capture_path)
+        for offset in offsets:
+            for pkt in self._reader.read_from(offset):
+                yield pkt
+                break
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+        for view in (self.times, self.time_offsets, self.keys, self.seq_offsets):
+            view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    from generate_pcap_hex import generate_hex_dump
+
+    parser = argparse.ArgumentParser(description="Capture sidecar index and drill-down")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="(re)build the index of a capture")
+    build.add_argument("capture")
+    seq = sub.add_parser("seq", help="hex dump frames around an R-TAG sequence number")
+    seq.add_argument("capture")
+    seq.add_argument("seq", type=lambda value: int(value, 0))
+    seq.add_argument("--epoch", type=int, default=0, help="wrap epoch (0 = first pass)")
+    seq.add_argument("--iface", default="0", help="interface name or id")
+    seq.add_argument("--context", type=int, default=2)
+    seq.add_argument("--bytes", type=int, default=64, help="bytes of each frame to dump")
+    window = sub.add_parser("time", help="hex dump frames in a time window (epoch seconds)")
+    window.add_argument("capture")
+    window.add_argument("start", type=float)
+    window.add_argument("end", type=float)
+    window.add_argument("--bytes", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        path = build_index(args.capture)
+        with CaptureIndex(args.capture, rebuild=False) as index:
+            print(f"Wrote {path}: {len(index.times)} frames, {len(index.keys)} R-TAG frames")
+        return
+
+    with CaptureIndex(args.capture) as index:
+        if args.command == "seq":
+            iface = int(args.iface) if args.iface.isdigit() else args.iface
+            offsets = index.offsets_around(args.seq, args.epoch, iface, args.context)
+        else:
+            offsets = index.offsets_between(int(args.start * 1e9), int(args.end * 1e9))
+        for pkt in index.packets(offsets):
+            seq_num = rtag_sequence(pkt.data)
+            label = f"seq 0x{seq_num:04X}" if seq_num is not None else "no R-TAG"
+            print(f"{pkt.ts_ns // 1_000_000_000}.{pkt.ts_ns % 1_000_000_000:09d}  "
+                  f"{index.interfaces[pkt.iface]}  offset {pkt.offset}  {label}  length {pkt.orig_len}")
+            print(generate_hex_dump(pkt.data[:args.bytes]))
+            print()
+        if not offsets:
+            print("No frames found")
+
+
+if __name__ == "__main__":
+    main()
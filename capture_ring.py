@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Anomaly-triggered capture ring
+
+Every PC interface is captured into an in-memory ring holding the last N
+frames; nothing is written in steady state. An online detector watches the
+FRER counter stream (LostPackets, RoguePackets, OutOfOrderPackets and the
+per-interval elimination rate) and, when a counter jumps past its absolute
+threshold or strays from its EWMA baseline, the frames from `pre` seconds
+before to `post` seconds after the trigger are dumped from all rings into
+one pcapng. The pre-trigger frames are copied out of the rings at the first
+trigger, so a long window cannot overwrite them. Triggers inside a pending
+window extend it, up to `max-post` seconds after the first trigger, instead
+of writing another file.
+
+Usage:
+    python3 capture_ring.py -i enp11s0 -i enp15s0 -i enp2s0 --pre 2 --post 1
+"""
+
+import argparse
+import heapq
+import math
+import os
+import subprocess
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+from board_channel import CallableChannel, ShellChannel
+from frer_counters import DEFAULT_STREAMS, CounterPoller, elimination_rate
+from pcap_io import PcapngWriter, read_pcap_stream
+
+RING_FRAMES = 65536
+DEFAULT_SNAPLEN = 256
+# Prefix of the remote shell's PID line on stderr, before it execs tcpdump
+PID_PREFIX = b"ring-capture-pid "
+
+# metric -> absolute per-interval delta that always triggers (None: EWMA only)
+DEFAULT_THRESHOLDS = {
+    "LostPackets": 1,
+    "RoguePackets": 1,
+    "OutOfOrderPackets": None,
+    "elimination_rate": None,
+}
+
+Trigger = namedtuple('Trigger', 'ts_ns stream metric value baseline reason')
+
+
+class FrameRing:
+    """Last `capacity` frames of one interface"""
+
+    def __init__(self, capacity=RING_FRAMES):
+        self._frames = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def append(self, ts_ns, data, orig_len):
+        with self._lock:
+            self._frames.append((ts_ns, data, orig_len))
+            self.total += 1
+
+    def window(self, start_ns, end_ns):
+        """Frames with start_ns <= ts < end_ns, oldest first"""
+        with self._lock:
+            frames = list(self._frames)
+        return [frame for frame in frames if start_ns <= frame[0] < end_ns]
+
+
+class RingCapture:
+    """tcpdump piping pcap into a FrameRing; ready is set once listening
+
+    With remote ("root@host") tcpdump runs on the board over ssh and frames
+    are stamped on arrival, so they share the PC clock with the counter
+    polls that trigger dumps.
+    """
+
+    def __init__(self, interface, ring, snaplen=DEFAULT_SNAPLEN, bpf=("ether", "proto", "0xf1c1"),
+                 remote=None):
+        self.interface = interface
+        self.ring = ring
+        self.snaplen = snaplen
+        self.bpf = list(bpf)
+        self.remote = remote
+        self.ready = threading.Event()
+        self.proc = None
+        self.remote_pid = None
+        self._thread = None
+
+    def start(self):
+        if self.remote:
+            # The shell reports its PID and becomes tcpdump, so stop() signals
+            # this capture only
+            cmd = ["ssh", "-o", "ConnectTimeout=5", self.remote,
+                   f"echo {PID_PREFIX.decode()}$$ >&2; exec " +
+                   " ".join(["tcpdump", "-i", self.interface, "-U", "-s", str(self.snaplen),
+                             "-w", "-"] + self.bpf)]
+        else:
+            cmd = ["sudo", "tcpdump", "-i", self.interface, "-U", "--time-stamp-precision=nano",
+                   "-s", str(self.snaplen), "-w", "-"] + self.bpf
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     bufsize=1 << 20)
+
+        def watch():
+            for line in self.proc.stderr:
+                if line.startswith(PID_PREFIX):
+                    self.remote_pid = int(line[len(PID_PREFIX):])
+                elif b"listening on" in line:
+                    self.ready.set()
+            self.ready.set()
+
+        def store():
+            append = self.ring.append
+            now = time.time_ns
+            for pkt in read_pcap_stream(self.proc.stdout):
+                append(now() if self.remote else pkt.ts_ns, pkt.data, pkt.orig_len)
+
+        threading.Thread(target=watch, daemon=True).start()
+        self._thread = threading.Thread(target=store, daemon=True)
+        self._thread.start()
+        return self.ready
+
+    def stop(self, timeout=5):
+        if self.proc.poll() is None:
+            if self.remote and self.remote_pid is not None:
+                subprocess.run(["ssh", self.remote, f"kill -INT {self.remote_pid}"], capture_output=True)
+            elif self.remote:
+                # Never reported its PID: dropping the session ends it
+                self.proc.terminate()
+            else:
+                subprocess.run(["sudo", "kill", "-INT", str(self.proc.pid)], capture_output=True)
+            try:
+                self.proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self._thread.join(timeout)
+
+
+class AnomalyDetector:
+    """Online trigger on per-interval FRER counter deltas
+
+    A metric triggers when its delta reaches its absolute threshold, or,
+    after `warmup` intervals, when its rate leaves the EWMA band of `sigma`
+    standard deviations. Anomalous intervals do not update the baseline.
+    """
+
+    def __init__(self, streams=("cs0",), thresholds=DEFAULT_THRESHOLDS, alpha=0.05, sigma=6.0,
+                 warmup=50, min_band=1.0):
+        self.streams = list(streams)
+        self.thresholds = dict(thresholds)
+        self.alpha = alpha
+        self.sigma = sigma
+        self.warmup = warmup
+        self.min_band = min_band
+        self.callbacks = []
+        self.triggers = 0
+        self._previous = None
+        self._baseline = {}
+
+    def subscribe(self, callback):
+        self.callbacks.append(callback)
+
+    def _check(self, key, value, ts_ns, stream, metric, delta):
+        threshold = self.thresholds.get(metric)
+        mean, var, count = self._baseline.get(key, (value, 0.0, 0))
+        band = max(self.sigma * math.sqrt(var), self.min_band)
+        if threshold is not None and delta >= threshold:
+            return Trigger(ts_ns, stream, metric, value, mean, f"delta {delta} >= {threshold}")
+        if count >= self.warmup and abs(value - mean) > band:
+            return Trigger(ts_ns, stream, metric, value, mean,
+                           f"{value:.3f} outside {mean:.3f} +/- {band:.3f}")
+        diff = value - mean
+        mean += self.alpha * diff
+        var = (1 - self.alpha) * (var + self.alpha * diff * diff)
+        self._baseline[key] = (mean, var, count + 1)
+        return None
+
+    def on_counters(self, ts_ns, counters):
+        """CounterPoller subscriber"""
+        previous, self._previous = self._previous, (ts_ns, counters)
+        if previous is None:
+            return
+        prev_ts, prev = previous
+        elapsed = (ts_ns - prev_ts) / 1e9
+        if elapsed <= 0:
+            return
+        for stream in self.streams:
+            now, before = counters.get(stream, {}), prev.get(stream, {})
+            deltas = {name: max(0, now.get(name, 0) - before.get(name, 0)) for name in now}
+            for metric in self.thresholds:
+                if metric == "elimination_rate":
+                    passed = deltas.get("PassedPackets", 0)
+                    if not passed:
+                        continue
+                    delta = value = elimination_rate(passed, deltas.get("DiscardedPackets", 0))
+                else:
+                    if metric not in deltas:
+                        continue
+                    delta = deltas[metric]
+                    value = delta / elapsed
+                trigger = self._check((stream, metric), value, ts_ns, stream, metric, delta)
+                if trigger is not None:
+                    self.triggers += 1
+                    for callback in self.callbacks:
+                        callback(trigger)
+
+
+class TriggeredDump:
+    """Writes the pre/post-trigger window of all rings to one pcapng"""
+
+    def __init__(self, rings, out_dir="anomalies", pre=2.0, post=1.0, max_post=10.0):
+        self.rings = rings
+        self.out_dir = out_dir
+        self.pre_ns = int(pre * 1e9)
+        self.post_ns = int(post * 1e9)
+        self.max_post_ns = int(max(post, max_post) * 1e9)
+        self.files = []
+        self._pending = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def flush(self):
+        """Write a pending window now (at shutdown), clipped to what was captured"""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            self.files.append(self._write(pending))
+
+    def stop(self):
+        """Cancel the pending timer and write any pending window"""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        self.flush()
+
+    def on_trigger(self, trigger):
+        """AnomalyDetector subscriber: open or extend the pending window"""
+        print(f"Trigger {trigger.stream}.{trigger.metric}: {trigger.reason}")
+        with self._lock:
+            finished = self._pending
+            if finished is not None and trigger.ts_ns <= finished["end"]:
+                finished["end"] = max(finished["end"], min(trigger.ts_ns + self.post_ns, finished["limit"]))
+                finished["triggers"].append(trigger)
+                return
+            if self._timer is not None:
+                # The previous window closed but its timer has not fired yet
+                self._timer.cancel()
+            # Copy the pre-trigger frames now: while the window is open the
+            # rings keep turning over
+            start, now = trigger.ts_ns - self.pre_ns, time.time_ns()
+            self._pending = {"start": start, "end": trigger.ts_ns + self.post_ns,
+                             "limit": trigger.ts_ns + self.max_post_ns, "triggers": [trigger],
+                             "snapshot": {name: ring.window(start, now) for name, ring in self.rings.items()}}
+            self._schedule()
+        if finished is not None:
+            self.files.append(self._write(finished))
+
+    def _schedule(self):
+        delay = max(0.0, (self._pending["end"] - time.time_ns()) / 1e9) + 0.1
+        self._timer = threading.Timer(delay, self._fire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _fire(self):
+        with self._lock:
+            pending = self._pending
+            if pending is None:
+                return
+            if time.time_ns() < pending["end"]:
+                # Extended by a later trigger
+                self._schedule()
+                return
+            self._pending = self._timer = None
+        self.files.append(self._write(pending))
+
+    def _write(self, pending):
+        return self.dump(pending["start"], pending["end"], pending["triggers"], pending["snapshot"])
+
+    def dump(self, start_ns, end_ns, triggers, snapshot=None):
+        """Write the window's frames; snapshot ({ring: frames}) holds the
+        frames copied out of the rings at the first trigger"""
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = datetime.fromtimestamp(triggers[0].ts_ns / 1e9).strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.out_dir, f"anomaly_{stamp}.pcapng")
+        suffix = 1
+        while os.path.exists(path):
+            suffix += 1
+            path = os.path.join(self.out_dir, f"anomaly_{stamp}_{suffix}.pcapng")
+        names = list(self.rings)
+        if snapshot is None:
+            frames = {name: self.rings[name].window(start_ns, end_ns) for name in names}
+        else:
+            frames = {}
+            for name in names:
+                # Ring frames not in the snapshot: the later ones, and any the
+                # pipe delivered after the snapshot with an earlier timestamp
+                copied = {id(frame) for frame in snapshot[name]}
+                later = [frame for frame in self.rings[name].window(start_ns, end_ns) if id(frame) not in copied]
+                frames[name] = sorted(snapshot[name] + later, key=lambda frame: frame[0])
+        windows = [[(ts, index, data, orig_len) for ts, data, orig_len in frames[name]]
+                   for index, name in enumerate(names)]
+        comment = "; ".join(f"{t.stream}.{t.metric} at {t.ts_ns}: {t.reason}" for t in triggers)
+        with PcapngWriter(path, names, comment=comment) as writer:
+            for ts, index, data, orig_len in heapq.merge(*windows):
+                writer.write(data, ts, index, orig_len=orig_len)
+        print(f"Wrote {writer.packets_written} frames around {len(triggers)} trigger(s) to {path}")
+        return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Anomaly-triggered capture ring")
+    parser.add_argument("-i", "--interface", action="append", required=True)
+    parser.add_argument("--frames", type=int, default=RING_FRAMES, help="ring size per interface")
+    parser.add_argument("--snaplen", type=int, default=DEFAULT_SNAPLEN)
+    parser.add_argument("--pre", type=float, default=2.0, help="seconds kept before a trigger")
+    parser.add_argument("--post", type=float, default=1.0, help="seconds kept after a trigger")
+    parser.add_argument("--max-post", type=float, default=10.0,
+                        help="longest window after the first trigger when later triggers extend it")
+    parser.add_argument("--poll-hz", type=float, default=20.0)
+    parser.add_argument("--sigma", type=float, default=6.0)
+    parser.add_argument("--out-dir", default="anomalies")
+    parser.add_argument("--fake", action="store_true", help="poll an in-process board simulator")
+    args = parser.parse_args()
+
+    rings = {iface: FrameRing(args.frames) for iface in args.interface}
+    captures = [RingCapture(iface, ring, args.snaplen) for iface, ring in rings.items()]
+    for capture in captures:
+        capture.start()
+    for capture in captures:
+        capture.ready.wait(10)
+
+    if args.fake:
+        from board_sim import Simulator
+        simulator = Simulator(loss_eth1=0.001, loss_eth2=0.001, ooo_probability=0.0001)
+        channel = CallableChannel(lambda command: simulator.run("receiver", command)[0])
+    else:
+        channel = ShellChannel()
+    detector = AnomalyDetector(sigma=args.sigma)
+    dump = TriggeredDump(rings, args.out_dir, args.pre, args.post, args.max_post)
+    detector.subscribe(dump.on_trigger)
+    poller = CounterPoller(channel, DEFAULT_STREAMS, interval=1.0 / args.poll_hz)
+    poller.subscribe(detector.on_counters)
+    poller.start()
+    print(f"Watching {', '.join(rings)} ({args.frames} frames per ring); Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        poller.stop()
+        channel.close()
+        dump.stop()
+        for capture in captures:
+            capture.stop()
+    print(f"{detector.triggers} trigger(s), {len(dump.files)} file(s) written")
+
+
+if __name__ == "__main__":
+    main()
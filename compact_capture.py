@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Header-only captures with a payload dictionary
+
+Test traffic repeats the same UDP payload in every frame, so storing each
+1514-1532 byte frame in full is almost entirely redundant. A compact capture
+is a pcapng file that keeps every frame's headers up to UDP plus the first
+bytes of the payload (where iperf3 puts its own timestamp and sequence),
+records the real frame length as orig_len and tags the elided payload with
+an epb_hash option (CRC32 of the elided bytes). Each distinct elided payload
+is stored once in a sidecar dictionary file (<capture>.payloads), so frames
+can be expanded back byte for byte. The dictionary is held in memory
+while writing, so it is capped (--max-dictionary); once full, frames with a
+payload not yet in it are written in full.
+
+The capture file on its own reads like a snaplen-limited capture, so every
+R-TAG sequence, loss and duplicate analysis works on it unchanged.
+
+Usage:
+    python3 compact_capture.py capture -i enp11s0 -o /tmp/enp11s0.pcapng
+    python3 compact_capture.py compact full.pcap compact.pcapng
+    python3 compact_capture.py expand compact.pcapng full.pcap
+"""
+
+import argparse
+import os
+import struct
+import subprocess
+import sys
+import threading
+import zlib
+
+from pcap_io import (HASH_CRC32, OPT_COMMENT, OPT_EPB_HASH, PcapngReader, PcapngWriter, PcapWriter,
+                     _encode_option, open_capture, read_pcap_stream)
+from rtag_frames import ETHERTYPE_OFFSET, INNER_ETHERTYPE_OFFSET, IP_OFFSET, RTAG_ETHERTYPE
+
+# iperf3 UDP header: sec, usec, 64-bit packet counter
+KEEP_PAYLOAD = 16
+MIN_ELIDED = 64
+PAYLOADS_SUFFIX = '.payloads'
+# Payload bytes kept in the dictionary before frames are stored inline
+MAX_DICTIONARY = 16 << 20
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+IPPROTO_UDP = 17
+
+_U16 = struct.Struct('!H')
+_ENTRY = struct.Struct('<II')
+
+
+def udp_payload_offset(data):
+    """Offset of the UDP payload in an Ethernet frame, or None"""
+    if len(data) < ETHERTYPE_OFFSET + 2:
+        return None
+    ethertype = _U16.unpack_from(data, ETHERTYPE_OFFSET)[0]
+    ip = ETHERTYPE_OFFSET + 2
+    if ethertype == RTAG_ETHERTYPE and len(data) >= IP_OFFSET:
+        ethertype, ip = _U16.unpack_from(data, INNER_ETHERTYPE_OFFSET)[0], IP_OFFSET
+    elif ethertype == ETHERTYPE_VLAN and len(data) >= 18:
+        ethertype, ip = _U16.unpack_from(data, 16)[0], 18
+    if ethertype != ETHERTYPE_IPV4 or len(data) < ip + 20:
+        return None
+    ihl = (data[ip] & 0x0f) * 4
+    if data[ip + 9] != IPPROTO_UDP or len(data) < ip + ihl + 8:
+        return None
+    return ip + ihl + 8
+
+
+def payloads_path(path):
+    return path + PAYLOADS_SUFFIX
+
+
+def load_payloads(path):
+    """Read a payload dictionary: {crc32: elided bytes}"""
+    payloads = {}
+    if not os.path.exists(path):
+        return payloads
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + _ENTRY.size <= len(data):
+        key, length = _ENTRY.unpack_from(data, offset)
+        offset += _ENTRY.size
+        payloads[key] = data[offset:offset + length]
+        offset += length
+    return payloads
+
+
+class CompactWriter:
+    """pcapng writer that stores each distinct payload once
+
+    Frames whose elided part would be shorter than min_elided, truncated
+    frames, CRC32 collisions and new payloads once the dictionary holds
+    max_dictionary bytes are written in full.
+    """
+
+    def __init__(self, path, interfaces=('eth0',), keep_payload=KEEP_PAYLOAD,
+                 min_elided=MIN_ELIDED, comment=None, max_dictionary=MAX_DICTIONARY):
+        self.path = path
+        self.keep_payload = keep_payload
+        self.min_elided = min_elided
+        self.max_dictionary = max_dictionary
+        self.payloads = {}
+        self.dictionary_bytes = 0
+        self.frames = 0
+        self.compacted = 0
+        self.inline = 0
+        self.bytes_in = 0
+        self._writer = PcapngWriter(path, interfaces, comment=comment)
+        self._dictionary = open(payloads_path(path), 'wb')
+
+    def write(self, data, ts_ns=None, iface=0, orig_len=None):
+        self.frames += 1
+        self.bytes_in += len(data)
+        if orig_len is not None and orig_len != len(data):
+            self._writer.write(data, ts_ns, iface, orig_len=orig_len)
+            return
+        offset = udp_payload_offset(data)
+        cut = None if offset is None else offset + self.keep_payload
+        if cut is None or len(data) - cut < self.min_elided:
+            self._writer.write(data, ts_ns, iface)
+            return
+        tail = bytes(data[cut:])
+        key = zlib.crc32(tail)
+        known = self.payloads.get(key)
+        if known is None:
+            if self.dictionary_bytes + len(tail) > self.max_dictionary:
+                self.inline += 1
+                self._writer.write(data, ts_ns, iface)
+                return
+            self.payloads[key] = known = tail
+            self.dictionary_bytes += len(tail)
+            self._dictionary.write(_ENTRY.pack(key, len(tail)) + tail)
+        if known != tail:
+            self._writer.write(data, ts_ns, iface)
+            return
+        option = _encode_option(OPT_EPB_HASH, bytes([HASH_CRC32]) + struct.pack('<I', key))
+        self._writer.write(data[:cut], ts_ns, iface, orig_len=len(data), extra_options=option)
+        self.compacted += 1
+
+    def bytes_written(self):
+        self.flush()
+        return os.path.getsize(self.path) + os.path.getsize(payloads_path(self.path))
+
+    def flush(self):
+        self._writer.flush()
+        self._dictionary.flush()
+
+    def close(self):
+        self._writer.close()
+        self._dictionary.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def expand_packets(path):
+    """Yield the packets of a compact capture with payloads restored"""
+    payloads = load_payloads(payloads_path(path))
+    with PcapngReader(path) as reader:
+        for pkt in reader.read_from(0, raw_options=True):
+            value = pkt.comment.get(OPT_EPB_HASH)
+            if value and value[0] == HASH_CRC32 and len(pkt.data) < pkt.orig_len:
+                tail = payloads.get(struct.unpack_from('<I', value, 1)[0])
+                if tail is not None and len(pkt.data) + len(tail) == pkt.orig_len:
+                    pkt = pkt._replace(data=bytes(pkt.data) + tail)
+            comment = pkt.comment.get(OPT_COMMENT)
+            yield pkt._replace(comment=comment.decode(errors='replace') if comment else None)
+
+
+class CompactCapture:
+    """Live compact capture: tcpdump writes pcap to a pipe, we store it compact
+
+    ready is set once tcpdump is listening.
+    """
+
+    def __init__(self, interface, path, bpf=("ether", "proto", "0xf1c1"), keep_payload=KEEP_PAYLOAD,
+                 max_dictionary=MAX_DICTIONARY):
+        self.interface = interface
+        self.path = path
+        self.bpf = list(bpf)
+        self.keep_payload = keep_payload
+        self.max_dictionary = max_dictionary
+        self.ready = threading.Event()
+        self.writer = None
+        self.proc = None
+        self._thread = None
+
+    def start(self):
+        cmd = ["sudo", "tcpdump", "-i", self.interface, "-U", "--time-stamp-precision=nano",
+               "-w", "-"] + self.bpf
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     bufsize=1 << 20)
+        self.writer = CompactWriter(self.path, [self.interface], self.keep_payload,
+                                    max_dictionary=self.max_dictionary)
+
+        def watch():
+            for line in self.proc.stderr:
+                if b"listening on" in line:
+                    self.ready.set()
+            self.ready.set()
+
+        threading.Thread(target=watch, daemon=True).start()
+        self._thread = threading.Thread(target=self._store, daemon=True)
+        self._thread.start()
+        return self.ready
+
+    def _store(self):
+        # The writer is closed here, once the pipe is drained, so the last
+        # block is never cut off by a close from another thread
+        try:
+            write = self.writer.write
+            for pkt in read_pcap_stream(self.proc.stdout):
+                write(pkt.data, pkt.ts_ns, 0, pkt.orig_len)
+        finally:
+            self.writer.close()
+
+    def stop(self, timeout=5):
+        """Stop tcpdump and wait for the stored capture; False if still being written"""
+        if self.proc.poll() is None:
+            subprocess.run(["sudo", "kill", "-INT", str(self.proc.pid)], capture_output=True)
+            try:
+                self.proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"{self.path}: capture pipe still open after {timeout} s; "
+                  f"the file is closed when it drains", file=sys.stderr)
+            return False
+        return True
+
+
+def print_savings(frames, compacted, bytes_in, bytes_out, distinct, inline=0):
+    print(f"  Frames: {frames} ({compacted} compacted, {distinct} distinct payloads)")
+    if inline:
+        print(f"  Payload dictionary full: {inline} frames stored in full")
+    ratio = bytes_in / bytes_out if bytes_out else 0
+    print(f"  Frame bytes: {bytes_in} -> {bytes_out} on disk ({ratio:.1f}x smaller)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Header-only captures with a payload dictionary")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cap = sub.add_parser("capture", help="capture one interface in compact form")
+    cap.add_argument("-i", "--interface", required=True)
+    cap.add_argument("-o", "--output", required=True)
+    cap.add_argument("--keep-payload", type=int, default=KEEP_PAYLOAD)
+    cap.add_argument("--max-dictionary", type=int, default=MAX_DICTIONARY >> 20,
+                     help="payload dictionary size in MiB (default: %(default)s)")
+    comp = sub.add_parser("compact", help="convert a full capture")
+    comp.add_argument("input")
+    comp.add_argument("output")
+    comp.add_argument("--keep-payload", type=int, default=KEEP_PAYLOAD)
+    comp.add_argument("--max-dictionary", type=int, default=MAX_DICTIONARY >> 20,
+                      help="payload dictionary size in MiB (default: %(default)s)")
+    exp = sub.add_parser("expand", help="restore full frames into a classic pcap")
+    exp.add_argument("input")
+    exp.add_argument("output")
+    args = parser.parse_args()
+
+    if args.command == "capture":
+        capture = CompactCapture(args.interface, args.output, keep_payload=args.keep_payload,
+                                 max_dictionary=args.max_dictionary << 20)
+        capture.start()
+        print(f"Capturing {args.interface} to {args.output} (Ctrl-C to stop)...", file=sys.stderr)
+        try:
+            capture.proc.wait()
+        except KeyboardInterrupt:
+            pass
+        capture.stop()
+        w = capture.writer
+        print_savings(w.frames, w.compacted, w.bytes_in,
+                      os.path.getsize(args.output) + os.path.getsize(payloads_path(args.output)),
+                      len(w.payloads), w.inline)
+    elif args.command == "compact":
+        with open_capture(args.input) as reader:
+            names = [iface.name for iface in reader.interfaces]
+            with CompactWriter(args.output, names, args.keep_payload,
+                               max_dictionary=args.max_dictionary << 20) as writer:
+                for pkt in reader:
+                    writer.write(pkt.data, pkt.ts_ns, pkt.iface, pkt.orig_len)
+                bytes_out = writer.bytes_written()
+        print(f"Compacted {args.input} -> {args.output}")
+        print_savings(writer.frames, writer.compacted, writer.bytes_in, bytes_out, len(writer.payloads),
+                      writer.inline)
+    else:
+        with PcapWriter(args.output) as writer:
+            for pkt in expand_packets(args.input):
+                writer.write(pkt.data, pkt.ts_ns, pkt.orig_len)
+        print(f"Wrote {writer.packets_written} packets to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
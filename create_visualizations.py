@@ -10,9 +10,16 @@ import plotly.express as px
 from plotly.subplots import make_subplots
 import plotly.io as pio
 
-# Load test data
-with open('test_results_detailed.json', 'r') as f:
-    data = json.load(f)
+# Test data, loaded on first use so importing this module stays cheap
+data = {}
+
+def load_data(path='test_results_detailed.json'):
+    """Load the test data the charts read (replaces any loaded data)"""
+    with open(path, 'r') as f:
+        loaded = json.load(f)
+    data.clear()
+    data.update(loaded)
+    return data
 
 def create_throughput_chart():
     """Create interactive throughput over time chart"""
@@ -315,8 +322,49 @@ def create_test_scenarios_chart():
 
     return fig
 
-def save_all_charts():
-    """Generate and save all charts"""
+def create_sequence_drilldown(capture_path, start_ns, end_ns):
+    """Create R-TAG sequence vs. arrival time chart for one window of a capture
+
+    Uses the capture's sidecar index (capture_index.py), so only the frames
+    in the window are read however large the capture is.
+    """
+    from capture_index import CaptureIndex
+    from rtag_frames import rtag_sequence
+
+    fig = go.Figure()
+    with CaptureIndex(capture_path) as index:
+        points = {}
+        for pkt in index.packets(index.offsets_between(start_ns, end_ns)):
+            seq = rtag_sequence(pkt.data)
+            if seq is not None:
+                xs, ys = points.setdefault(index.interfaces[pkt.iface], ([], []))
+                xs.append((pkt.ts_ns - start_ns) / 1e6)
+                ys.append(seq)
+        for (name, (xs, ys)), color in zip(points.items(), ['#667eea', '#764ba2', '#28a745']):
+            fig.add_trace(go.Scatter(
+                x=xs,
+                y=ys,
+                mode='markers',
+                name=name,
+                marker=dict(size=5, color=color),
+                hovertemplate='<b>Time:</b> %{x:.3f} ms<br><b>Sequence:</b> %{y}<extra></extra>'
+            ))
+
+    fig.update_layout(
+        title='R-TAG Sequence Drill-down',
+        xaxis_title='Time since window start (ms)',
+        yaxis_title='R-TAG sequence number',
+        height=500,
+        template='plotly_white'
+    )
+
+    return fig
+
+def save_all_charts(report_path='docs/report.html'):
+    """Generate all charts and save them as one compact HTML report"""
+
+    if not data:
+        load_data()
 
     charts = {
         'throughput': create_throughput_chart(),
@@ -327,18 +375,23 @@ def save_all_charts():
         'scenarios': create_test_scenarios_chart()
     }
 
-    # Save as HTML files
-    for name, fig in charts.items():
-        fig.write_html(f'docs/chart_{name}.html')
-        print(f"✅ Created chart: chart_{name}.html")
-
-    # Also save as static images if needed (requires kaleido)
-    # for name, fig in charts.items():
-    #     fig.write_image(f'docs/chart_{name}.png')
+    # One compact page: shared plotly.js, packed data, lazily drawn sections
+    from report_export import export_report
+    size = export_report(charts, report_path, title="FRER Test Results")
+    print(f"✅ Created report: {report_path} ({size / 1024:.1f} KB, {len(charts)} charts)")
 
     return charts
 
 if __name__ == "__main__":
+    import sys
+    load_data()
+    if "--rollups" in sys.argv:
+        # Chart a window of a counter rollup store instead of the stored series
+        from rollup_store import RollupStore
+        store = RollupStore.load(sys.argv[sys.argv.index("--rollups") + 1])
+        _, end = store.span()
+        window = float(sys.argv[sys.argv.index("--window") + 1]) if "--window" in sys.argv else 3600
+        data['time_series'] = store.time_series(end - window, end + 1)
     print("📊 Creating visualizations...")
     charts = save_all_charts()
     print(f"\n✨ Successfully created {len(charts)} interactive charts in docs/")
\ No newline at end of file
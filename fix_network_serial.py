@@ -5,6 +5,8 @@ Fix network configuration on sender board
 import serial
 import time
 
+from board_channel import SERIAL_PORT
+
 def send_cmd(ser, cmd, wait=0.5):
     ser.write((cmd + '\n').encode())
     time.sleep(wait)
@@ -15,7 +17,7 @@ def send_cmd(ser, cmd, wait=0.5):
     return resp
 
 try:
-    ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
+    ser = serial.Serial(SERIAL_PORT, 115200, timeout=1)
     time.sleep(1)
     ser.read_all()
     
@@ -6,6 +6,8 @@ The board's eth3 should be the access port where traffic enters
 import serial
 import time
 
+from board_channel import SERIAL_PORT
+
 def cmd(ser, cmd_str, wait=0.5):
     ser.write((cmd_str + '\n').encode())
     time.sleep(wait)
@@ -16,7 +18,7 @@ def cmd(ser, cmd_str, wait=0.5):
     return resp
 
 try:
-    ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
+    ser = serial.Serial(SERIAL_PORT, 115200, timeout=1)
     time.sleep(1)
     ser.read_all()
     
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Vectorized header and checksum validation of captured frames
+
+FRER passes whichever copy of a frame arrives first, so a path that
+corrupts frames goes unnoticed in the counters. This validator checks every
+captured frame per path: R-TAG fields, IPv4 version/IHL, header checksum and
+total length, UDP length and (when present and the frame is complete) the
+UDP checksum.
+
+Records are not parsed one by one. Runs of equally sized records are viewed
+in place in the mmap'd file as a 2-D uint8 array (one row per frame, the
+record stride as row step), so each check is one NumPy expression over up
+to BATCH_SIZE frames.
+
+Usage:
+    python3 frame_validator.py /tmp/enp11s0_capture.pcap /tmp/enp15s0_capture.pcap
+"""
+
+import argparse
+import json
+import struct
+import sys
+import time
+
+import numpy as np
+
+from pcap_io import BLOCK_EPB, PcapReader, open_capture
+from rtag_frames import ETHERTYPE_OFFSET, INNER_ETHERTYPE_OFFSET, IP_OFFSET, RTAG_ETHERTYPE
+
+BATCH_SIZE = 1 << 16
+MAX_SAMPLES = 10
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+# Ethernet minimum frame without FCS; shorter IP packets are padded
+MIN_FRAME = 60
+
+# Checks that mean a frame is corrupt; the others are informational
+# (zero IPv4 checksums from the sample generator, UDP without checksum,
+# truncated frames whose UDP checksum cannot be verified)
+CORRUPTION_CHECKS = ["rtag_bad", "not_ipv4", "ip_header_bad", "ip_checksum_bad",
+                     "ip_length_bad", "udp_length_bad", "udp_checksum_bad"]
+CHECKS = CORRUPTION_CHECKS + ["ip_checksum_zero", "udp_checksum_absent", "udp_unverified"]
+
+_MASK16 = np.uint64(0xffff)
+_SHIFT16 = np.uint64(16)
+
+
+def _u16(frames, offset):
+    """Big-endian 16-bit column of a frame array"""
+    return (frames[:, offset].astype(np.uint32) << 8) | frames[:, offset + 1]
+
+
+def _sum16(frames, start, end):
+    """Unfolded sum of the big-endian words frames[:, start:end] (even length)"""
+    high = frames[:, start:end:2].sum(axis=1, dtype=np.uint64)
+    low = frames[:, start + 1:end:2].sum(axis=1, dtype=np.uint64)
+    return (high << np.uint64(8)) + low
+
+
+def _fold(total):
+    total = (total & _MASK16) + (total >> _SHIFT16)
+    total = (total & _MASK16) + (total >> _SHIFT16)
+    return (total & _MASK16) + (total >> _SHIFT16)
+
+
+def _swap16(value):
+    return ((value & np.uint64(0xff)) << np.uint64(8)) | (value >> np.uint64(8))
+
+
+def _payload_sum16(frames, start, end):
+    """Folded big-endian word sum of frames[:, start:end] for long ranges
+
+    The one's complement sum is byte-order independent (RFC 1071), so the
+    words are summed as native little-endian uint16 over a view of the rows
+    and the folded result is byte-swapped once.
+    """
+    even = start + (end - start) // 2 * 2
+    words = frames[:, start:even].view('<u2')
+    # At most 32767 words of 0xffff: fits in uint32, which sums faster
+    total = _fold(words.sum(axis=1, dtype=np.uint32).astype(np.uint64))
+    total = _swap16(total) if sys.byteorder == 'little' else total
+    if even < end:
+        total = total + (frames[:, even].astype(np.uint64) << np.uint64(8))
+    return total
+
+
+def _record_runs(reader, batch_size=BATCH_SIZE):
+    """Yield (offsets, ifaces, orig_len, frames) for runs of equal-size records
+
+    frames is a zero-copy (n, cap_len) view into the mapped file.
+    """
+    buf = reader._map
+    size = len(buf)
+    if isinstance(reader, PcapReader):
+        endian = reader._endian
+        offset, head, data_at = 24, 16, 16
+        length_field, orig_field, total_at = 2, 3, None
+    else:
+        endian = reader._endian
+        offset, head, data_at = 0, 28, 28
+        length_field, orig_field, total_at = 5, 6, 1
+    while offset + head <= size:
+        if total_at is None:
+            cap_len, = struct.unpack_from(endian + 'I', buf, offset + 8)
+            stride = head + cap_len
+        else:
+            block_type, stride = struct.unpack_from(endian + 'II', buf, offset)
+            if stride < 12:
+                return
+            if block_type != BLOCK_EPB:
+                offset += stride
+                continue
+            cap_len, = struct.unpack_from(endian + 'I', buf, offset + 20)
+        count = min(batch_size, (size - offset) // stride)
+        if count == 0:
+            return
+        fields = head // 4
+        headers = np.ndarray((count, fields), dtype=endian + 'u4', buffer=buf, offset=offset,
+                             strides=(stride, 4))
+        same = headers[:, length_field] == cap_len
+        if total_at is not None:
+            same &= (headers[:, 0] == BLOCK_EPB) & (headers[:, total_at] == stride)
+        # Records after the first differing one are not at offset + k * stride
+        mismatch = np.flatnonzero(~same)
+        count = int(mismatch[0]) if mismatch.size else count
+        headers = headers[:count]
+        frames = np.ndarray((count, cap_len), dtype=np.uint8, buffer=buf, offset=offset + data_at,
+                            strides=(stride, 1))
+        offsets = offset + np.arange(count, dtype=np.int64) * stride
+        ifaces = headers[:, 2] if total_at is not None else np.zeros(count, dtype=np.uint32)
+        yield offsets, ifaces, headers[:, orig_field], frames
+        offset += count * stride
+
+
+def validate_frames(frames, orig_len):
+    """Boolean failure masks {check: mask} for a (n, cap_len) frame array"""
+    count, cap_len = frames.shape
+    masks = {name: np.zeros(count, dtype=bool) for name in CHECKS}
+    if cap_len < ETHERTYPE_OFFSET + 2:
+        masks["not_ipv4"][:] = True
+        return masks
+
+    ethertype = _u16(frames, ETHERTYPE_OFFSET)
+    layouts = [(ethertype == ETHERTYPE_IPV4, ETHERTYPE_OFFSET + 2)]
+    if cap_len >= IP_OFFSET:
+        rtag = ethertype == RTAG_ETHERTYPE
+        masks["rtag_bad"] = rtag & ((_u16(frames, 14) != 0) | (_u16(frames, 18) != 0) |
+                                    (_u16(frames, INNER_ETHERTYPE_OFFSET) != ETHERTYPE_IPV4))
+        layouts.append((rtag & ~masks["rtag_bad"], IP_OFFSET))
+    if cap_len >= 18:
+        layouts.append(((ethertype == ETHERTYPE_VLAN) & (_u16(frames, 16) == ETHERTYPE_IPV4), 18))
+    ipv4 = np.zeros(count, dtype=bool)
+    for selected, _ in layouts:
+        ipv4 |= selected
+    masks["not_ipv4"] = ~ipv4 & ~masks["rtag_bad"]
+
+    for selected, ip in layouts:
+        rows = np.flatnonzero(selected)
+        if rows.size == 0 or cap_len < ip + 20:
+            continue
+        f = frames if rows.size == count else frames[rows]
+        header_ok = f[:, ip] == 0x45
+        masks["ip_header_bad"][rows] = ~header_ok
+
+        checksum = _fold(_sum16(f, ip, ip + 20))
+        zero = _u16(f, ip + 10) == 0
+        masks["ip_checksum_zero"][rows] = header_ok & zero
+        masks["ip_checksum_bad"][rows] = header_ok & ~zero & (checksum != 0xffff)
+
+        available = orig_len[rows].astype(np.int64) - ip
+        total = _u16(f, ip + 2).astype(np.int64)
+        padded = (total < available) & (orig_len[rows] <= MIN_FRAME)
+        length_ok = (total == available) | padded
+        masks["ip_length_bad"][rows] = header_ok & ~length_ok
+
+        udp = ip + 20
+        if cap_len < udp + 8:
+            continue
+        is_udp = header_ok & length_ok & (f[:, ip + 9] == 17)
+        udp_len = _u16(f, udp + 4).astype(np.int64)
+        masks["udp_length_bad"][rows] = is_udp & (udp_len != total - 20)
+        udp_ok = is_udp & (udp_len == total - 20)
+        absent = udp_ok & (_u16(f, udp + 6) == 0)
+        masks["udp_checksum_absent"][rows] = absent
+        # Only complete, unpadded frames have the whole datagram to sum
+        verifiable = udp_ok & ~absent & (udp_len == cap_len - udp)
+        masks["udp_unverified"][rows] = udp_ok & ~absent & ~verifiable
+        if verifiable.any():
+            pseudo = (_sum16(f, ip + 12, ip + 20) + np.uint64(17) +
+                      udp_len.astype(np.uint64))
+            checksum = _fold(pseudo + _payload_sum16(f, udp, cap_len))
+            masks["udp_checksum_bad"][rows] = verifiable & (checksum != 0xffff)
+    return masks
+
+
+def validate_capture(path, batch_size=BATCH_SIZE):
+    """Per-interface check counts and sample offsets of failing frames"""
+    with open_capture(path) as reader:
+        names = [iface.name for iface in reader.interfaces]
+        results = {name: dict({"frames": 0}, **{check: 0 for check in CHECKS}, bad_offsets=[])
+                   for name in names}
+        for offsets, ifaces, orig_len, frames in _record_runs(reader, batch_size):
+            masks = validate_frames(frames, orig_len)
+            bad = np.zeros(len(offsets), dtype=bool)
+            for check in CORRUPTION_CHECKS:
+                bad |= masks[check]
+            for index in np.unique(ifaces):
+                result = results[names[index]]
+                mine = ifaces == index
+                result["frames"] += int(mine.sum())
+                for check, mask in masks.items():
+                    result[check] += int((mask & mine).sum())
+                room = MAX_SAMPLES - len(result["bad_offsets"])
+                if room > 0:
+                    result["bad_offsets"] += offsets[bad & mine][:room].tolist()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Header and checksum validation of captures, per path")
+    parser.add_argument("captures", nargs="+")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv)
+    output = args.json
+
+    report = {}
+    for path in args.captures:
+        started = time.perf_counter()
+        results = validate_capture(path)
+        elapsed = time.perf_counter() - started
+        frames = sum(r["frames"] for r in results.values())
+        print(f"\n{path}: {frames} frames in {elapsed:.2f} s ({frames / elapsed / 1e6 if elapsed else 0:.1f} M frames/s)")
+        for name, result in results.items():
+            failed = {check: result[check] for check in CHECKS if result[check]}
+            status = "CORRUPT" if any(result[check] for check in CORRUPTION_CHECKS) else "OK"
+            print(f"  {name}: {result['frames']} frames  {status}  {failed if failed else ''}")
+            if result["bad_offsets"]:
+                print(f"    first bad records at byte offsets {result['bad_offsets']}")
+        report[path] = results
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+FRER counter parsing and high-rate polling
+
+Reads the `frer cs/ms ... --cnt` counters of all configured streams in one
+batched round trip over a persistent board channel and hands timestamped
+snapshots to subscribers.
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+from board_channel import RECEIVER_HOST, ShellChannel
+
+# (name, command) pairs read on every poll
+DEFAULT_STREAMS = [
+    ("cs0", "frer cs 0 --cnt"),
+    ("ms28", "frer ms eth1 28 --cnt"),
+    ("ms30", "frer ms eth2 30 --cnt"),
+]
+
+COUNTER_NAMES = ["OutOfOrderPackets", "RoguePackets", "PassedPackets", "DiscardedPackets",
+                 "LostPackets", "TaglessPackets", "Resets"]
+
+
+def parse_counters(text):
+    """Parse 'Name : value' counter lines into a dict of ints"""
+    counters = {}
+    for line in text.split('\n'):
+        if ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        value = value.strip()
+        if value.isdigit():
+            counters[key.strip()] = int(value)
+    return counters
+
+
+def read_counters(channel, streams=DEFAULT_STREAMS):
+    """Read all stream counters in one batch: {stream: {counter: value}}"""
+    outputs = channel.run_batch([cmd for _, cmd in streams])
+    return {name: parse_counters(output) for (name, _), output in zip(streams, outputs)}
+
+
+def elimination_rate(passed, discarded):
+    """Eliminated duplicates per passed frame, in percent (as in the README)"""
+    return 100.0 * discarded / passed if passed else 0.0
+
+
+class CounterPoller:
+    """Background thread polling FRER counters at a fixed rate
+
+    Every subscriber is called with (ts_ns, counters) from the poller thread
+    and must return quickly.
+    """
+
+    def __init__(self, channel, streams=DEFAULT_STREAMS, interval=0.02):
+        self.channel = channel
+        self.streams = streams
+        self.interval = interval
+        self.subscribers = []
+        self.polls = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def poll_once(self):
+        counters = read_counters(self.channel, self.streams)
+        ts_ns = time.time_ns()
+        self.polls += 1
+        for callback in self.subscribers:
+            callback(ts_ns, counters)
+        return ts_ns, counters
+
+    def _run(self):
+        next_poll = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"Counter poll failed: {e}", file=sys.stderr)
+            next_poll += self.interval
+            delay = next_poll - time.monotonic()
+            if delay < 0:
+                # Fell behind (slow channel): skip missed slots instead of bursting
+                next_poll = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read the receiver's FRER counters once")
+    parser.add_argument("--host", default=RECEIVER_HOST, help="board reached over SSH")
+    args = parser.parse_args(argv)
+
+    channel = ShellChannel(host=args.host)
+    try:
+        counters = read_counters(channel)
+    finally:
+        channel.close()
+    for stream, values in counters.items():
+        print(f"{stream}:")
+        for name in COUNTER_NAMES:
+            if name in values:
+                print(f"  {name:<18}: {values[name]:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Offline model of the IEEE 802.1CB sequence recovery function
+
+Replays R-TAG sequence numbers (with arrival timestamps) through the vector
+(`--alg 0`) or match (`--alg 1`) recovery algorithm and counts what the
+board would: passed, discarded, rogue, lost, out of order and resets. The
+reset timer is evaluated lazily when a frame arrives, so a gap longer than
+reset_time counts one reset, as on the board.
+"""
+
+from rtag_frames import SEQ_MODULUS
+
+ALG_VECTOR = 0
+ALG_MATCH = 1
+ALGORITHMS = {"vector": ALG_VECTOR, "match": ALG_MATCH}
+
+_HALF = SEQ_MODULUS // 2
+
+
+class SequenceRecovery:
+    """One recovery function instance (compound or member stream)"""
+
+    def __init__(self, algorithm=ALG_VECTOR, hlen=10, reset_time_ms=500):
+        if algorithm not in (ALG_VECTOR, ALG_MATCH):
+            raise ValueError(f"Unknown recovery algorithm {algorithm}")
+        if algorithm == ALG_VECTOR and not 1 <= hlen < _HALF:
+            raise ValueError(f"History length {hlen} out of range")
+        self.algorithm = algorithm
+        self.hlen = hlen
+        self.reset_ns = int(reset_time_ms * 1_000_000)
+        self.mask = (1 << hlen) - 1
+        self.counters = {"PassedPackets": 0, "DiscardedPackets": 0, "RoguePackets": 0,
+                         "LostPackets": 0, "OutOfOrderPackets": 0, "Resets": 0}
+        self.recov_seq = 0
+        self.history = 0
+        self.take_any = True
+        self.last_pass_ns = None
+
+    def reset(self):
+        self.counters["Resets"] += 1
+        self.take_any = True
+
+    def process(self, seq, ts_ns):
+        """Offer one frame; returns True if it is passed"""
+        counters = self.counters
+        if not self.take_any and ts_ns - self.last_pass_ns > self.reset_ns:
+            self.reset()
+        if self.take_any:
+            self.take_any = False
+            self.recov_seq = seq
+            # A fresh window has nothing to lose: mark it fully received
+            self.history = self.mask
+            self.last_pass_ns = ts_ns
+            counters["PassedPackets"] += 1
+            return True
+
+        delta = (seq - self.recov_seq) % SEQ_MODULUS
+        if delta >= _HALF:
+            delta -= SEQ_MODULUS
+
+        if self.algorithm == ALG_MATCH:
+            if delta == 0:
+                counters["DiscardedPackets"] += 1
+                return False
+            if delta != 1:
+                counters["OutOfOrderPackets"] += 1
+            self.recov_seq = seq
+            self.last_pass_ns = ts_ns
+            counters["PassedPackets"] += 1
+            return True
+
+        hlen = self.hlen
+        if delta >= hlen or delta <= -hlen:
+            counters["RoguePackets"] += 1
+            counters["DiscardedPackets"] += 1
+            return False
+        if delta <= 0:
+            bit = 1 << -delta
+            if self.history & bit:
+                counters["DiscardedPackets"] += 1
+                return False
+            self.history |= bit
+            counters["OutOfOrderPackets"] += 1
+        else:
+            if delta != 1:
+                counters["OutOfOrderPackets"] += 1
+            # Sequence numbers shifted out of the window without arriving are lost
+            shifted_out = self.history >> (hlen - delta)
+            counters["LostPackets"] += delta - bin(shifted_out).count("1")
+            self.history = ((self.history << delta) | 1) & self.mask
+            self.recov_seq = seq
+        self.last_pass_ns = ts_ns
+        counters["PassedPackets"] += 1
+        return True
+
+
+def replay(timestamps, sequences, algorithm=ALG_VECTOR, hlen=10, reset_time_ms=500):
+    """Counters of one recovery function over parallel timestamp/sequence arrays"""
+    recovery = SequenceRecovery(algorithm, hlen, reset_time_ms)
+    process = recovery.process
+    for seq, ts_ns in zip(sequences, timestamps):
+        process(seq, ts_ns)
+    return recovery.counters
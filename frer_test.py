@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+frer-test: one entry point for the FRER test tools
+
+Subcommands map to the existing scripts and are imported only when run, so
+`frer-test --help` and light commands such as counter polling never pay for
+numpy, pandas or plotly. Arguments after the subcommand are passed to the
+script unchanged. `--help` of a plain script (one without a main()) prints
+its docstring without running it.
+
+Usage:
+    frer-test --help
+    frer-test run --runs 5 --duration 30
+    frer-test analyze validate /tmp/enp11s0_capture.pcap
+    frer-test check-startup            # import-time budget check
+"""
+
+import sys
+
+# name -> (module, function or None to run the module as a script, help)
+COMMANDS = {
+    "setup": {
+        "sender": ("setup_sender_serial", None, "configure the sender board over serial"),
+        "verify": ("verify_sender_serial", None, "show the sender board configuration"),
+        "identify": ("identify_connections", None, "identify the physical connections"),
+        "discover": ("topology_discovery", "main", "verified port map from parallel probes"),
+        "fix-network": ("fix_network_serial", None, "repair the board network configuration"),
+        "vcap": ("vcap_table", "main", "VCAP rules, hit deltas and flow-to-ISDX map"),
+    },
+    "run": ("test_traffic", "main", "traffic test run(s) with captures and FRER counters"),
+    "complete": ("test_frer_complete", None, "complete FRER test with interface monitoring"),
+    "throughput": ("throughput_search", "main", "RFC 2544-style throughput search"),
+    "profile": ("traffic_profile", "main", "multi-flow traffic profiles with per-stream reconciliation"),
+    "capture": ("compact_capture", "main", "header-only captures (capture/compact/expand)"),
+    "watch": ("capture_ring", "main", "capture rings dumped around counter anomalies"),
+    "analyze": {
+        "validate": ("frame_validator", "main", "header and checksum validation per path"),
+        "stats": ("capture_analysis", "main", "sharded frame/sequence/skew/stream analysis"),
+        "sweep": ("recovery_sweep", "main", "hlen/reset_time sweep over captures"),
+        "index": ("capture_index", "main", "capture index and hex drill-down"),
+        "merge": ("pcap_merge", "main", "time-merge per-interface captures"),
+        "pcap": ("pcap_io", "main", "capture summary or pcapng conversion"),
+        "hex": ("generate_pcap_hex", "main", "R-TAG frame hex examples"),
+        "text": ("tcpdump_text", "main", "tcpdump -e/-xx text dumps to pcapng"),
+    },
+    "report": {
+        "data": ("generate_test_data", None, "regenerate test_results_detailed.json [from a run]"),
+        "derive": ("report_derive", "main", "report sections derived from a stored run"),
+        "journal": ("run_journal", "main", "summarize a run checkpoint journal"),
+        "history": ("report_pipeline", "main", "incremental multi-run history report"),
+        "regress": ("regression_check", "main", "baseline vs candidate run sets, verdict per metric"),
+        "html": ("report_export", "main", "compact single-page HTML report of all charts"),
+    },
+    "visualize": ("create_visualizations", None, "write the chart report to docs/report.html"),
+    "counters": ("frer_counters", "main", "read the receiver FRER counters once"),
+    "resources": ("board_resources", "main", "board CPU, memory and IRQ rate sampler"),
+    "links": ("link_counters", "main", "per-port link counters and the lossy hop"),
+    "rollups": ("rollup_store", "main", "query a counter rollup store"),
+    "dashboard": ("live_dashboard", "main", "live SSE counter dashboard"),
+    "sim": ("board_sim", "main", "LAN9662 board simulator"),
+}
+
+STARTUP_BUDGET_MS = 100
+# Commands whose start-up must stay within the budget
+BUDGETED = [["--help"], ["analyze", "--help"], ["counters", "--import-only"]]
+
+
+def _usage(table, prefix):
+    lines = [f"usage: {prefix} <command> [args...]", "", "commands:"]
+    for name, entry in table.items():
+        if isinstance(entry, dict):
+            lines.append(f"  {name:<14} {', '.join(entry)}")
+        else:
+            lines.append(f"  {name:<14} {entry[2]}")
+    if table is COMMANDS:
+        lines.append(f"  {'check-startup':<14} check start-up time against the "
+                     f"{STARTUP_BUDGET_MS} ms budget")
+    return '\n'.join(lines)
+
+
+def resolve(argv):
+    """Find the command entry for argv; returns (entry, consumed names, rest)"""
+    table, names = COMMANDS, []
+    while argv and isinstance(table, dict) and argv[0] in table:
+        names.append(argv[0])
+        table, argv = table[argv[0]], argv[1:]
+    return table, names, argv
+
+
+def script_help(module_name):
+    """A script's docstring, read without importing (running) it"""
+    import ast
+    import importlib.util
+
+    spec = importlib.util.find_spec(module_name)
+    with open(spec.origin, encoding="utf-8") as f:
+        return ast.get_docstring(ast.parse(f.read())) or f"{module_name}: no description"
+
+
+def run_command(entry, names, args):
+    module_name, function, _ = entry
+    sys.argv = [f"frer-test {' '.join(names)}"] + args
+    if function is None and args in (["-h"], ["--help"]):
+        print(script_help(module_name))
+        return
+    if function is None:
+        import runpy
+        runpy.run_module(module_name, run_name="__main__", alter_sys=True)
+        return
+    import importlib
+    return getattr(importlib.import_module(module_name), function)()
+
+
+def check_startup(budget_ms=STARTUP_BUDGET_MS, repeat=5):
+    """Time the budgeted commands in fresh interpreters; returns True if within budget"""
+    import subprocess
+    import time
+
+    ok = True
+    for args in BUDGETED:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, __file__] + args, stdout=subprocess.DEVNULL, check=True)
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        within = best <= budget_ms
+        ok &= within
+        print(f"  frer-test {' '.join(args):<24} {best:6.1f} ms  {'OK' if within else 'OVER BUDGET'}")
+        if not within:
+            # Show where the time goes
+            result = subprocess.run([sys.executable, "-X", "importtime", __file__] + args,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            costs = []
+            for line in result.stderr.splitlines():
+                parts = line.split('|')
+                if len(parts) == 3 and parts[1].strip().isdigit():
+                    costs.append((int(parts[1]), parts[2].strip()))
+            for cumulative, module in sorted(costs, reverse=True)[:8]:
+                print(f"      {cumulative / 1000:7.1f} ms  {module}")
+    return ok
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "check-startup":
+        print(f"Start-up budget {STARTUP_BUDGET_MS} ms:")
+        sys.exit(0 if check_startup() else 1)
+
+    entry, names, rest = resolve(argv)
+    prefix = ' '.join(["frer-test"] + names)
+    if isinstance(entry, dict):
+        if rest and rest[0] not in ("-h", "--help"):
+            print(f"{prefix}: unknown command '{rest[0]}'\n", file=sys.stderr)
+            print(_usage(entry, prefix), file=sys.stderr)
+            sys.exit(2)
+        print(_usage(entry, prefix))
+        return
+    if rest == ["--import-only"]:
+        # Used by check-startup: load the command without running it
+        import importlib
+        importlib.import_module(entry[0])
+        return
+    return run_command(entry, names, rest)
+
+
+if __name__ == "__main__":
+    main()
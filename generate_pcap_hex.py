@@ -3,9 +3,12 @@
 Generate sample PCAP hex dumps showing R-TAG frames for FRER test
 """
 
+import argparse
 import struct
 import binascii
-from datetime import datetime
+import time
+
+from pcap_io import PCAP_MAGIC_NSEC, PCAP_MAGIC_USEC, PcapngWriter
 
 def create_rtag_frame(seq_num, src_mac="22:f7:00:32:c9:f1", dst_mac="22:f7:00:32:c9:f1",
                       src_ip="10.0.100.1", dst_ip="10.0.100.2", src_port=45632, dst_port=5201):
@@ -56,9 +59,9 @@ def create_rtag_frame(seq_num, src_mac="22:f7:00:32:c9:f1", dst_mac="22:f7:00:32
 
     return frame
 
-def create_pcap_header():
+def create_pcap_header(nanosecond=True):
     """Create PCAP file header"""
-    magic = 0xa1b2c3d4
+    magic = PCAP_MAGIC_NSEC if nanosecond else PCAP_MAGIC_USEC
     version_major = 2
     version_minor = 4
     thiszone = 0
@@ -69,17 +72,18 @@ def create_pcap_header():
     return struct.pack("!IHHiIII", magic, version_major, version_minor,
                       thiszone, sigfigs, snaplen, network)
 
-def create_pcap_packet(frame, timestamp=None):
-    """Create PCAP packet record"""
-    if timestamp is None:
-        timestamp = datetime.now().timestamp()
+def create_pcap_packet(frame, timestamp_ns=None, nanosecond=True):
+    """Create PCAP packet record from an integer nanosecond timestamp"""
+    if timestamp_ns is None:
+        timestamp_ns = time.time_ns()
 
-    ts_sec = int(timestamp)
-    ts_usec = int((timestamp - ts_sec) * 1000000)
+    ts_sec, ts_frac = divmod(timestamp_ns, 1000000000)
+    if not nanosecond:
+        ts_frac //= 1000
     incl_len = len(frame)
     orig_len = len(frame)
 
-    header = struct.pack("!IIII", ts_sec, ts_usec, incl_len, orig_len)
+    header = struct.pack("!IIII", ts_sec, ts_frac, incl_len, orig_len)
     return header + frame
 
 def generate_hex_dump(data, offset=0, width=16):
@@ -92,7 +96,9 @@ def generate_hex_dump(data, offset=0, width=16):
         lines.append(f"0x{offset+i:04x}:  {hex_part:<48}  {ascii_part}")
     return '\n'.join(lines)
 
-def main():
+def main(argv=None):
+    argparse.ArgumentParser(description="R-TAG frame hex examples and sample captures").parse_args(argv)
+
     print("=" * 80)
     print("FRER R-TAG Frame Examples")
     print("=" * 80)
@@ -159,11 +165,11 @@ def main():
     print()
 
     # Create a few packets
-    timestamp = datetime.now().timestamp()
+    timestamp = time.time_ns()
     packets = []
     for i in range(3):
         frame = create_rtag_frame(i + 1)
-        packet = create_pcap_packet(frame, timestamp + i * 0.0001)
+        packet = create_pcap_packet(frame, timestamp + i * 100000)
         packets.append(packet)
 
     print(f"First packet record ({len(packets[0][:32])} bytes of header + frame):")
@@ -180,15 +186,25 @@ def main():
         f.write(pcap_header)
         for i in range(10):
             frame = create_rtag_frame(i + 1)
-            packet = create_pcap_packet(frame, timestamp + i * 0.001)
+            packet = create_pcap_packet(frame, timestamp + i * 1000000)
             f.write(packet)
     print("Created: test_logs/sample_rtag.pcap (10 R-TAG frames)")
 
+    # Create a two-path PCAPNG sample: eth1 and eth2 copies 100 ns apart
+    with PcapngWriter("/home/kim/frer-test-20250916_130401/test_logs/sample_rtag_paths.pcapng",
+                      ["eth1", "eth2"], comment="FRER R-TAG sample, both paths") as writer:
+        for i in range(10):
+            ts = timestamp + i * 1000000
+            writer.write(create_rtag_frame(i + 1, src_mac="22:f7:00:32:c9:f1"), ts, iface=0)
+            writer.write(create_rtag_frame(i + 1, src_mac="22:f7:00:32:c9:f2"), ts + 100, iface=1,
+                         comment="eth2 skew +100 ns" if i == 0 else None)
+    print("Created: test_logs/sample_rtag_paths.pcapng (10 R-TAG frames per path)")
+
     # Create a sample of deduplicated frames
     with open("/home/kim/frer-test-20250916_130401/test_logs/sample_deduplicated.pcap", "wb") as f:
         f.write(pcap_header)
         for i in range(10):
-            packet = create_pcap_packet(normal_frame, timestamp + i * 0.001)
+            packet = create_pcap_packet(normal_frame, timestamp + i * 1000000)
             f.write(packet)
     print("Created: test_logs/sample_deduplicated.pcap (10 normal frames)")
 
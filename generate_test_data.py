@@ -1,6 +1,13 @@
 #!/usr/bin/env python3
 """
-Generate realistic FRER test data and visualizations
+Generate the FRER test data files (test_results_detailed.json and friends)
+
+Given a stored run (test_traffic.py results), every section is derived from
+the run's captures, counter series and generator log by report_derive.py.
+Without one, synthetic demo data is generated.
+
+Usage:
+    python3 generate_test_data.py [test_results.json]
 """
 
 import json
@@ -8,17 +15,18 @@ import random
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
+from pathlib import Path
+
+from report_pipeline import ReportPipeline, fingerprint, run_firmware, write_if_changed
 
-# Set random seed for reproducibility
-np.random.seed(42)
-random.seed(42)
+# Default seed of the demo sections; each section seeds its own generators
+# from it, so its output depends on the seed alone
+RANDOM_SEED = 42
 
-def generate_frer_statistics():
-    """Generate realistic FRER statistics"""
+SECTIONS = ('statistics', 'time_series', 'latency_distribution', 'sequence_analysis')
+
+def generate_frer_statistics(seed=RANDOM_SEED):
+    """Generate synthetic FRER statistics (demo data; fixed, seed is unused)"""
 
     # Test duration: 1 hour
     test_duration = 3600  # seconds
@@ -43,6 +51,7 @@ def generate_frer_statistics():
             "vcap_hits": total_packets,
             "generation_errors": 0
         },
+        # CRC errors come from the link counters of a real run (link_counters.py)
         "receiver_stats": {
             "compound_stream_0": {
                 "passed_packets": total_packets,
@@ -57,12 +66,12 @@ def generate_frer_statistics():
             "member_stream_eth1": {
                 "received": total_packets,
                 "sequence_errors": 123,
-                "crc_errors": 0
+                "crc_errors": None
             },
             "member_stream_eth2": {
                 "received": total_packets - 246,  # Some packets lost on eth2
                 "sequence_errors": 123,
-                "crc_errors": 0
+                "crc_errors": None
             }
         },
         "performance_metrics": {
@@ -71,15 +80,18 @@ def generate_frer_statistics():
             "max_latency_ms": 1.95,
             "jitter_ms": 0.15,
             "throughput_mbps": 945.6,
-            "cpu_usage_percent": 12.5,
-            "memory_usage_mb": 256
+            # Board load is only known from a sampled run (board_resources.py)
+            "cpu_usage_percent": None,
+            "memory_usage_mb": None
         }
     }
 
     return stats
 
-def generate_time_series_data():
-    """Generate time series data for graphs"""
+def generate_time_series_data(seed=RANDOM_SEED):
+    """Generate synthetic time series data for graphs (demo data)"""
+    rng = np.random.default_rng(seed)
+    prng = random.Random(seed)
 
     # Generate 60 minutes of data (1 sample per minute)
     time_points = 60
@@ -92,23 +104,24 @@ def generate_time_series_data():
         if i < 5:
             value = base_throughput * (i + 1) / 5  # Ramp up
         else:
-            value = base_throughput + np.random.normal(0, 5)  # Stable with small variation
+            value = base_throughput + rng.normal(0, 5)  # Stable with small variation
         throughput.append(max(0, value))
 
     # Latency data (low and stable)
-    latency = [0.85 + np.random.normal(0, 0.1) for _ in range(time_points)]
+    latency = [0.85 + rng.normal(0, 0.1) for _ in range(time_points)]
     latency = [max(0.3, min(2.0, l)) for l in latency]  # Clamp between 0.3 and 2.0
 
     # Packet loss (mostly 0, occasional small losses)
-    packet_loss = [0 if random.random() > 0.05 else random.randint(1, 5) for _ in range(time_points)]
+    packet_loss = [0 if prng.random() > 0.05 else prng.randint(1, 5) for _ in range(time_points)]
 
     # Duplicate elimination rate (very high, stable)
-    elimination_rate = [99.9 + np.random.normal(0, 0.05) for _ in range(time_points)]
+    elimination_rate = [99.9 + rng.normal(0, 0.05) for _ in range(time_points)]
     elimination_rate = [min(100, max(99.5, e)) for e in elimination_rate]
 
-    # CPU and memory usage
-    cpu_usage = [12 + np.random.normal(0, 2) for _ in range(time_points)]
-    memory_usage = [256 + np.random.normal(0, 10) for _ in range(time_points)]
+    # Board CPU and memory are measured by board_resources.py, never made up:
+    # the demo has none
+    cpu_usage = [None] * time_points
+    memory_usage = [None] * time_points
 
     return {
         "timestamps": [t.isoformat() for t in timestamps],
@@ -120,43 +133,45 @@ def generate_time_series_data():
         "memory_usage_mb": memory_usage
     }
 
-def generate_latency_distribution():
+def generate_latency_distribution(seed=RANDOM_SEED):
     """Generate latency distribution data"""
+    rng = np.random.default_rng(seed)
 
     # Generate 10000 latency samples
     samples = 10000
 
     # Most packets have low latency (normal distribution around 0.85ms)
-    normal_latencies = np.random.normal(0.85, 0.15, int(samples * 0.95))
+    normal_latencies = rng.normal(0.85, 0.15, int(samples * 0.95))
 
     # Some packets have slightly higher latency (tail)
-    tail_latencies = np.random.exponential(0.3, int(samples * 0.05)) + 1.2
+    tail_latencies = rng.exponential(0.3, int(samples * 0.05)) + 1.2
 
     all_latencies = np.concatenate([normal_latencies, tail_latencies])
     all_latencies = [max(0.3, min(3.0, l)) for l in all_latencies]  # Clamp values
 
     return all_latencies
 
-def generate_sequence_analysis():
+def generate_sequence_analysis(seed=RANDOM_SEED):
     """Generate sequence number analysis data"""
+    prng = random.Random(seed)
 
     # Simulate 1000 sequence numbers
     sequences = list(range(1000))
 
     # Add some out-of-order sequences
     for _ in range(50):
-        idx = random.randint(0, 990)
-        sequences[idx], sequences[idx + random.randint(1, 9)] = \
-            sequences[idx + random.randint(1, 9)], sequences[idx]
+        idx = prng.randint(0, 990)
+        sequences[idx], sequences[idx + prng.randint(1, 9)] = \
+            sequences[idx + prng.randint(1, 9)], sequences[idx]
 
     # Track when duplicates were received
     duplicate_times = []
     for i in range(1000):
-        if random.random() < 0.99:  # 99% of packets are duplicated
+        if prng.random() < 0.99:  # 99% of packets are duplicated
             duplicate_times.append({
                 "sequence": i,
                 "path1_time": i * 0.001,  # 1ms per packet
-                "path2_time": i * 0.001 + random.uniform(0, 0.0005)  # Small delay difference
+                "path2_time": i * 0.001 + prng.uniform(0, 0.0005)  # Small delay difference
             })
 
     return {
@@ -164,13 +179,52 @@ def generate_sequence_analysis():
         "duplicate_times": duplicate_times
     }
 
-def create_detailed_report():
-    """Create detailed HTML report with all visualizations"""
-
-    stats = generate_frer_statistics()
-    time_series = generate_time_series_data()
-    latency_dist = generate_latency_distribution()
-    sequence_data = generate_sequence_analysis()
+def create_report_pipeline(cache_dir='.report_cache'):
+    """Report sections with their declared inputs"""
+    pipeline = ReportPipeline(cache_dir)
+    # version 2: per-section generators instead of the global random state
+    pipeline.add_section('statistics', generate_frer_statistics, inputs=['seed'])
+    pipeline.add_section('time_series', generate_time_series_data, inputs=['seed'], version=2)
+    pipeline.add_section('latency_distribution', generate_latency_distribution, inputs=['seed'], version=2)
+    pipeline.add_section('sequence_analysis', generate_sequence_analysis, inputs=['seed'], version=2)
+    return pipeline
+
+def create_run_pipeline(cache_dir='.report_cache'):
+    """Report sections derived from a stored run (see report_derive.py)
+
+    The derivation reads the run's files in one pass and is keyed by them,
+    so it only reruns when the run or one of its files changes.
+    """
+    from report_derive import derive_run
+
+    pipeline = ReportPipeline(cache_dir)
+    pipeline.add_section('derived', derive_run, inputs=['run', 'artifacts'])
+    for name in SECTIONS + ('test_scenarios',):
+        pipeline.add_section(name, lambda derived, name=name: derived[name], inputs=['derived'])
+    return pipeline
+
+def create_detailed_report(pipeline=None, seed=RANDOM_SEED, run=None):
+    """Create detailed HTML report with all visualizations
+
+    Sections come from the memoized report pipeline and are only
+    regenerated when their inputs change. With run (a test_traffic.py
+    results file) they are derived from that run instead of generated.
+    """
+
+    if run is None:
+        pipeline = pipeline or create_report_pipeline()
+        sections = pipeline.build({'seed': seed})
+        firmware = "v2.1.0"
+    else:
+        from report_derive import run_artifacts
+        pipeline = pipeline or create_run_pipeline()
+        sections = pipeline.build({'run': Path(run), 'artifacts': run_artifacts(run)})
+        with open(run) as f:
+            firmware = run_firmware(json.load(f))
+    stats = sections['statistics']
+    time_series = sections['time_series']
+    latency_dist = sections['latency_distribution']
+    sequence_data = sections['sequence_analysis']
 
     # Create comprehensive report
     report = {
@@ -182,14 +236,14 @@ def create_detailed_report():
         "test_configuration": {
             "sender_board": {
                 "model": "Microchip LAN9662",
-                "firmware": "v2.1.0",
+                "firmware": firmware,
                 "vcap_rules": 1,
                 "frer_flows": 1,
                 "vlan_id": 10
             },
             "receiver_board": {
                 "model": "Microchip LAN9662",
-                "firmware": "v2.1.0",
+                "firmware": firmware,
                 "vcap_rules": 2,
                 "frer_flows": 2,
                 "compound_streams": 1,
@@ -228,53 +282,75 @@ def create_detailed_report():
             }
         ]
     }
+    if run is not None:
+        # Measured scenario of the run instead of the demo scenarios
+        report["test_scenarios"] = sections["test_scenarios"]
 
     return report
 
-def save_all_data():
-    """Save all generated data to files"""
+def save_all_data(run=None):
+    """Save all generated data to files (derived from run when given)
+
+    Each artifact is keyed by the fingerprints of the sections it is built
+    from and is only rewritten when one of them changed.
+    """
 
     # Generate comprehensive report
-    report = create_detailed_report()
+    pipeline = create_run_pipeline() if run else create_report_pipeline()
+    report = create_detailed_report(pipeline, run=run)
+    keys = pipeline.keys
+    report_key = fingerprint([keys[name] for name in pipeline.sections] +
+                             [report["test_configuration"], report["test_scenarios"]])
 
     # Save main report as JSON
-    with open('test_results_detailed.json', 'w') as f:
-        json.dump(report, f, indent=2, default=str)
+    written = {}
+    written['test_results_detailed.json'] = write_if_changed(
+        'test_results_detailed.json', report_key,
+        lambda: json.dumps(report, indent=2, default=str))
 
     # Save summary statistics
     stats_summary = {
         "test_date": report["generated_at"],
-        "duration": "1 hour",
+        "duration": f"{report['statistics']['test_info']['duration_seconds'] or 0:g} s",
         "total_packets": report["statistics"]["sender_stats"]["total_transmitted"],
         "elimination_rate": report["statistics"]["receiver_stats"]["compound_stream_0"]["elimination_rate"],
         "average_latency": report["statistics"]["performance_metrics"]["average_latency_ms"],
         "throughput": report["statistics"]["performance_metrics"]["throughput_mbps"],
-        "test_result": "PASS"
+        "test_result": "PASS" if all(s["result"] == "PASS" for s in report["test_scenarios"]) else "FAIL"
     }
 
-    with open('test_summary.json', 'w') as f:
-        json.dump(stats_summary, f, indent=2)
+    # Keyed on everything it renders: statistics, scenarios and test_date
+    written['test_summary.json'] = write_if_changed(
+        'test_summary.json', fingerprint([keys['statistics'], report["test_scenarios"],
+                                          report["generated_at"]]),
+        lambda: json.dumps(stats_summary, indent=2))
 
     # Create CSV files for time series data
-    df_timeseries = pd.DataFrame(report["time_series"])
-    df_timeseries.to_csv('timeseries_data.csv', index=False)
+    written['timeseries_data.csv'] = write_if_changed(
+        'timeseries_data.csv', keys['time_series'],
+        lambda: pd.DataFrame(report["time_series"]).to_csv(index=False))
 
     # Create latency histogram data
-    df_latency = pd.DataFrame({'latency_ms': report["latency_distribution"]})
-    df_latency.to_csv('latency_distribution.csv', index=False)
+    written['latency_distribution.csv'] = write_if_changed(
+        'latency_distribution.csv', keys['latency_distribution'],
+        lambda: pd.DataFrame({'latency_ms': report["latency_distribution"]}).to_csv(index=False))
 
     print("✅ Generated test data files:")
-    print("  - test_results_detailed.json")
-    print("  - test_summary.json")
-    print("  - timeseries_data.csv")
-    print("  - latency_distribution.csv")
+    for name, changed in written.items():
+        print(f"  - {name}{'' if changed else ' (unchanged)'}")
+    if pipeline.reused:
+        print(f"  Reused cached sections: {', '.join(pipeline.reused)}")
 
     return report
 
 if __name__ == "__main__":
-    report = save_all_data()
+    import sys
+    report = save_all_data(sys.argv[1] if len(sys.argv) > 1 else None)
+    performance = report['statistics']['performance_metrics']
     print(f"\n📊 Test Statistics Summary:")
-    print(f"  Total Packets: {report['statistics']['sender_stats']['total_transmitted']:,}")
+    print(f"  Total Packets: {report['statistics']['sender_stats']['total_transmitted'] or 0:,}")
     print(f"  Elimination Rate: {report['statistics']['receiver_stats']['compound_stream_0']['elimination_rate']:.2f}%")
-    print(f"  Average Latency: {report['statistics']['performance_metrics']['average_latency_ms']:.2f} ms")
-    print(f"  Throughput: {report['statistics']['performance_metrics']['throughput_mbps']:.1f} Mbps")
\ No newline at end of file
+    if performance['average_latency_ms'] is not None:
+        print(f"  Average Latency: {performance['average_latency_ms']:.2f} ms")
+    if performance['throughput_mbps'] is not None:
+        print(f"  Throughput: {performance['throughput_mbps']:.1f} Mbps")
\ No newline at end of file
@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 """
 Identify actual physical connections between boards and PC
+
+Step-by-step manual checks; topology_discovery.py probes all interfaces
+and boards at once and prints the verified port map, and link_counters.py
+reads every port's counters and errors.
 """
 import serial
 import subprocess
 import time
 
+from board_channel import SERIAL_PORT
+
 def test_connection():
     """Test which board is actually the sender"""
     print("=== Identifying Physical Connections ===\n")
@@ -25,7 +31,7 @@ def test_connection():
     
     # Check serial board (currently thought as sender)
     try:
-        ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
+        ser = serial.Serial(SERIAL_PORT, 115200, timeout=1)
         time.sleep(1)
         ser.read_all()
         
@@ -44,8 +50,8 @@ def test_connection():
         print(resp)
         
         ser.close()
-    except:
-        pass
+    except (serial.SerialException, OSError) as e:
+        print(f"\n3. Serial board not readable: {e}")
     
     # Check SSH board (receiver)
     print("\n5. SSH Board (169.254.100.2) check:")
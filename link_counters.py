@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Per-port link counters across the test PC and both boards
+
+Port drops and errors used to be checked by hand (`ip -s link show eth3 |
+grep -A1 'RX:'`) and the report's CRC error counts were zeros. The
+collector reads every port of interest on every host in one batched round
+trip per host, the hosts in parallel:
+
+    ip -s -s -j link show      all netdev counters, as JSON
+    ethtool -S <port>          MAC counters; the CRC count comes from here
+                               when the driver reports one
+
+Samples are kept as flat arrays (one slot per port and counter), with
+per-interval deltas that survive counter clears and wraps, rates and
+run totals. The FRER counters are read in the receiver's batch, so every
+sample holds link and FRER counters taken together. Following the frames
+through the cabling (topology_discovery.EXPECTED_LINKS), each hop's
+transmitted frames are compared with what its far end received and with
+what the member stream on that path counted, which points at the hop that
+lost frames: a cable or PHY (CRC errors at the far end), a port dropping
+frames, or the FRER stage itself.
+
+Usage:
+    python3 link_counters.py                        # PC, receiver over SSH, sender over serial
+    python3 link_counters.py --interval 1 --count 10
+    python3 link_counters.py --sim --sim-loss-eth2 0.01 --count 3
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+from array import array
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from board_channel import RECEIVER_HOST, SERIAL_PORT, ChannelError, ShellChannel
+from frer_counters import DEFAULT_STREAMS, CounterPoller, parse_counters
+from run_journal import MonotonicCounters
+from topology_discovery import EXPECTED_LINKS, PC_INTERFACES
+
+BOARD_PORTS = ("eth1", "eth2", "eth3")
+DEFAULT_PORTS = {"pc": PC_INTERFACES, "sender": BOARD_PORTS, "receiver": BOARD_PORTS}
+
+# One slot per counter, in this order, for every port
+COUNTERS = ("rx_packets", "rx_bytes", "rx_errors", "rx_dropped", "rx_missed", "rx_crc_errors",
+            "tx_packets", "tx_bytes", "tx_errors", "tx_dropped")
+_INDEX = {name: index for index, name in enumerate(COUNTERS)}
+# ip -j stats64 keys of the counters above
+_IP_KEYS = {"rx_packets": ("rx", "packets"), "rx_bytes": ("rx", "bytes"), "rx_errors": ("rx", "errors"),
+            "rx_dropped": ("rx", "dropped"), "rx_missed": ("rx", "missed_errors"),
+            "rx_crc_errors": ("rx", "crc_errors"), "tx_packets": ("tx", "packets"),
+            "tx_bytes": ("tx", "bytes"), "tx_errors": ("tx", "errors"), "tx_dropped": ("tx", "dropped")}
+# ethtool -S names of the FCS error count, by driver (igb/e1000e, lan966x, others)
+CRC_STATS = ("rx_crc_errors", "rx_crc", "rx_fcs_errors")
+MISSING = -1
+
+# Member streams by the receiver port they arrive on ("frer ms eth1 28 --cnt")
+MEMBER_STREAMS = {cmd.split()[2]: name for name, cmd in DEFAULT_STREAMS if cmd.split()[1] == "ms"}
+
+# ts: epoch seconds; elapsed: seconds since the previous sample (None for the
+# first); skew: how far apart (seconds) the reads of two hosts may be, over
+# this sample and the previous one, which bounds the deltas' error; raw, deltas:
+# flat arrays over (port, counter); frer: {stream_counter: delta}
+LinkSample = namedtuple('LinkSample', 'ts elapsed skew raw deltas frer')
+# a, b: (node, port) of the sending and receiving end of a hop
+Hop = namedtuple('Hop', 'a b sent received lost crc_errors rx_errors dropped stream stream_received tolerance')
+
+
+def parse_ip_json(text):
+    """{port: {counter: value}} from `ip -s [-s] -j link` output"""
+    ports = {}
+    for entry in json.loads(text or "[]"):
+        stats = entry.get("stats64") or entry.get("stats") or {}
+        ports[entry["ifname"]] = {name: stats[direction][key] for name, (direction, key) in _IP_KEYS.items()
+                                  if key in stats.get(direction, {})}
+    return ports
+
+
+def parse_ethtool(text):
+    """{name: value} of `ethtool -S` output"""
+    stats = {}
+    for line in text.splitlines():
+        name, sep, value = line.strip().rpartition(':')
+        if sep and value.strip().isdigit():
+            stats[name.strip()] = int(value)
+    return stats
+
+
+def port_commands(ports):
+    """The batch reading these ports of one host"""
+    return ["ip -s -s -j link show"] + [f"ethtool -S {port}" for port in ports]
+
+
+def parse_port_batch(ports, outputs):
+    """{port: {counter: value}} from the outputs of port_commands(ports)"""
+    try:
+        links = parse_ip_json(outputs[0])
+    except ValueError:
+        raise ValueError(f"unreadable `ip -j link` output: {outputs[0][:80]!r}")
+    result = {}
+    for port, text in zip(ports, outputs[1:]):
+        values = dict(links.get(port, {}))
+        driver = parse_ethtool(text)
+        crc = next((driver[name] for name in CRC_STATS if name in driver), None)
+        if crc is not None:
+            values["rx_crc_errors"] = crc
+        result[port] = values
+    return result
+
+
+class LocalChannel(ShellChannel):
+    """A persistent shell on this machine, for the PC's own interfaces"""
+
+    def __init__(self, timeout=5):
+        super().__init__(argv=["sh"], timeout=timeout)
+
+
+class LinkCollector:
+    """Batched link (and FRER) counter reads with deltas, rates and totals
+
+    hosts: {node: (channel, ports)}. The FRER streams are read with the
+    frer_node's ports.
+    """
+
+    def __init__(self, hosts, frer_node="receiver", streams=DEFAULT_STREAMS):
+        self.hosts = hosts
+        self.frer_node = frer_node if frer_node in hosts else None
+        self.streams = streams if self.frer_node else []
+        self.ports = [(node, port) for node, (_, ports) in hosts.items() for port in ports]
+        self.slots = {key: index * len(COUNTERS) for index, key in enumerate(self.ports)}
+        size = len(self.ports) * len(COUNTERS)
+        self.last = None
+        self.last_ts = None
+        # Read spread of the first and the last sample: the totals' error
+        self.first_spread = None
+        self.last_spread = 0.0
+        self.totals = array('q', [0]) * size
+        self.frer = MonotonicCounters()
+        self.errors = {}
+        self.samples = 0
+        self._pool = ThreadPoolExecutor(max_workers=len(hosts))
+
+    def _read_host(self, node):
+        channel, ports = self.hosts[node]
+        commands = port_commands(ports)
+        if node == self.frer_node:
+            commands += [cmd for _, cmd in self.streams]
+        started = time.monotonic()
+        outputs = channel.run_batch(commands)
+        finished = time.monotonic()
+        counters = parse_port_batch(ports, outputs[:len(ports) + 1])
+        frer = {name: parse_counters(text) for (name, _), text in zip(self.streams, outputs[len(ports) + 1:])}
+        return started, finished, counters, frer if node == self.frer_node else None
+
+    def read(self):
+        """Read all hosts in parallel: (skew, {node: {port: {counter: value}}}, frer)"""
+        futures = {node: self._pool.submit(self._read_host, node) for node in self.hosts}
+        reads, frer, starts, ends = {}, {}, [], []
+        self.errors = {}
+        for node, future in futures.items():
+            try:
+                started, finished, reads[node], host_frer = future.result()
+            except (ChannelError, OSError, ValueError) as e:
+                self.errors[node] = str(e)
+                continue
+            starts.append(started)
+            ends.append(finished)
+            frer = host_frer or frer
+        skew = max(ends) - min(starts) if starts else 0.0
+        return skew, reads, frer
+
+    def sample(self):
+        """One read of every port; returns a LinkSample"""
+        spread, reads, frer = self.read()
+        ts = time.time()
+        skew, self.last_spread = spread + self.last_spread, spread
+        if self.first_spread is None:
+            self.first_spread = spread
+        raw = array('q', [MISSING]) * len(self.totals)
+        for (node, port), slot in self.slots.items():
+            values = reads.get(node, {}).get(port, {})
+            for name, value in values.items():
+                raw[slot + _INDEX[name]] = value
+        deltas = array('q', [MISSING]) * len(raw)
+        if self.last is not None:
+            for index, (value, previous) in enumerate(zip(raw, self.last)):
+                if value == MISSING or previous == MISSING:
+                    continue
+                # A drop is a cleared counter (ip link counters are 64-bit)
+                delta = value - previous if value >= previous else value
+                deltas[index] = delta
+                self.totals[index] += delta
+        elapsed = ts - self.last_ts if self.last_ts is not None else None
+        # Keep the last known value of a port that could not be read
+        self.last = array('q', (value if value != MISSING or self.last is None else previous
+                                for value, previous in zip(raw, self.last or raw)))
+        self.last_ts = ts
+        self.samples += 1
+        return LinkSample(ts, elapsed, skew, raw, deltas, self.frer.update(frer, int(ts * 1e9)))
+
+    @property
+    def totals_skew(self):
+        """skew (as in LinkSample) of the totals"""
+        return (self.first_spread or 0.0) + self.last_spread
+
+    def value(self, values, node, port, counter):
+        """One counter of a flat array; None when missing or unknown"""
+        slot = self.slots.get((node, port))
+        if slot is None:
+            return None
+        value = values[slot + _INDEX[counter]]
+        return None if value == MISSING else value
+
+    def rates(self, sample):
+        """{(node, port): {counter: per second}} of a sample's deltas"""
+        if not sample.elapsed:
+            return {}
+        rates = {}
+        for key, slot in self.slots.items():
+            rates[key] = {name: sample.deltas[slot + index] / sample.elapsed
+                          for index, name in enumerate(COUNTERS) if sample.deltas[slot + index] != MISSING}
+        return rates
+
+    def metrics(self, sample):
+        """Raw values as rollup store metrics, link.<node>.<port>.<counter>"""
+        return {f"link.{node}.{port}.{name}": sample.raw[slot + index]
+                for (node, port), slot in self.slots.items()
+                for index, name in enumerate(COUNTERS) if sample.raw[slot + index] != MISSING}
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+def hop_losses(collector, values, frer_totals, rates=None, skew=0.0, links=EXPECTED_LINKS):
+    """Frames each hop lost, from counter totals (or one sample's deltas)
+
+    rates ({(node, port): {counter: per second}}) and the read skew give
+    the tolerance: frames in flight between the two reads of a hop.
+    """
+    hops = []
+    for a, b in links.items():
+        sent = collector.value(values, *a, "tx_packets")
+        received = collector.value(values, *b, "rx_packets")
+        stream = MEMBER_STREAMS.get(b[1]) if b[0] == collector.frer_node else None
+        stream_received = None
+        if stream is not None and f"{stream}_PassedPackets" in frer_totals:
+            stream_received = frer_totals[f"{stream}_PassedPackets"] + frer_totals.get(f"{stream}_DiscardedPackets", 0)
+        rate = (rates or {}).get(a, {}).get("tx_packets", 0.0)
+        dropped = [collector.value(values, *b, name) for name in ("rx_dropped", "rx_missed")]
+        hops.append(Hop(a, b, sent, received,
+                        sent - received if sent is not None and received is not None else None,
+                        collector.value(values, *b, "rx_crc_errors"), collector.value(values, *b, "rx_errors"),
+                        sum(d for d in dropped if d is not None) if any(d is not None for d in dropped) else None,
+                        stream, stream_received, math.ceil(rate * skew) + 1))
+    return hops
+
+
+def lossy_hop(hops, frer_totals):
+    """(hop, reason) for the hop that lost the most frames, or (None, reason)"""
+    lossy = [hop for hop in hops if (hop.lost or 0) > hop.tolerance or hop.crc_errors]
+    if lossy:
+        hop = max(lossy, key=lambda hop: max(hop.lost or 0, hop.crc_errors or 0))
+        where = _endpoint(hop.b)
+        if hop.crc_errors:
+            return hop, f"{hop.crc_errors} CRC errors at {where} (cable, connector or PHY)"
+        if hop.dropped:
+            return hop, f"{where} dropped {hop.dropped} frames"
+        return hop, f"{hop.lost} frames sent but not received"
+    for hop in hops:
+        if hop.stream_received is None or hop.received is None:
+            continue
+        # The link also carries frames outside the stream (LLDP, ARP)
+        missing = hop.received - hop.stream_received
+        if missing > max(hop.tolerance, hop.received // 1000):
+            return hop, (f"{_endpoint(hop.b)} received {missing} frames more than {hop.stream} counted: "
+                         f"lost in the receiver's classification or FRER stage")
+    lost = frer_totals.get("cs0_LostPackets")
+    if lost:
+        return None, f"cs0 lost {lost} frames but no link counted a loss"
+    return None, "no hop lost frames"
+
+
+def _endpoint(endpoint):
+    return f"{endpoint[0]}:{endpoint[1]}"
+
+
+def _fmt(value):
+    return "-" if value is None else str(value)
+
+
+def print_hops(hops, title):
+    print(title)
+    print(f"  {'hop':<34} {'sent':>10} {'received':>10} {'lost':>7} {'crc':>6} {'drop':>6}  member stream")
+    for hop in hops:
+        stream = f"{hop.stream} {_fmt(hop.stream_received)}" if hop.stream else ""
+        print(f"  {_endpoint(hop.a) + ' -> ' + _endpoint(hop.b):<34} {_fmt(hop.sent):>10} "
+              f"{_fmt(hop.received):>10} {_fmt(hop.lost):>7} {_fmt(hop.crc_errors):>6} {_fmt(hop.dropped):>6}  {stream}")
+
+
+def print_ports(collector, sample):
+    rates = collector.rates(sample)
+    print(f"  {'port':<18} {'rx pps':>9} {'tx pps':>9} {'rx Mb/s':>8} {'tx Mb/s':>8} {'err':>5} {'crc':>5} {'drop':>5}")
+    for node, port in collector.ports:
+        rate = rates.get((node, port), {})
+        if not rate:
+            continue
+        totals = [collector.value(collector.totals, node, port, name)
+                  for name in ("rx_errors", "rx_crc_errors", "rx_dropped")]
+        print(f"  {node + ':' + port:<18} {rate.get('rx_packets', 0):>9.0f} {rate.get('tx_packets', 0):>9.0f} "
+              f"{rate.get('rx_bytes', 0) * 8 / 1e6:>8.1f} {rate.get('tx_bytes', 0) * 8 / 1e6:>8.1f} "
+              + ' '.join(f"{_fmt(value):>5}" for value in totals))
+
+
+class LinkPoller(CounterPoller):
+    """Background thread sampling link counters at a fixed rate
+
+    Subscribers are called with (ts_ns, metrics) like CounterPoller's, with
+    the raw link counters as link.<node>.<port>.<counter> metrics.
+    """
+
+    def __init__(self, collector, interval=5.0):
+        super().__init__(channel=None, streams=None, interval=interval)
+        self.collector = collector
+
+    def poll_once(self):
+        sample = self.collector.sample()
+        ts_ns = int(sample.ts * 1e9)
+        metrics = self.collector.metrics(sample)
+        self.polls += 1
+        for callback in self.subscribers:
+            callback(ts_ns, metrics)
+        return ts_ns, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-port link counters with FRER correlation")
+    parser.add_argument("--host", default=RECEIVER_HOST, help="receiver board reached over SSH")
+    parser.add_argument("--serial", default=SERIAL_PORT, help="sender board on a serial console ('' for none)")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between samples (default: 1)")
+    parser.add_argument("--count", type=int, default=0, help="number of samples (0: until Ctrl-C)")
+    parser.add_argument("--sim", action="store_true", help="read a board_sim testbed")
+    parser.add_argument("--sim-loss-eth1", type=float, default=0.0)
+    parser.add_argument("--sim-loss-eth2", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.sim:
+        from board_channel import CallableChannel
+        from board_sim import Simulator
+        simulator = Simulator(loss_eth1=args.sim_loss_eth1, loss_eth2=args.sim_loss_eth2)
+        channels = {node: CallableChannel(lambda command, node=node: simulator.run(node, command)[0])
+                    for node in DEFAULT_PORTS}
+    else:
+        channels = {"pc": LocalChannel(), "receiver": ShellChannel(host=args.host)}
+        if args.serial:
+            try:
+                from board_channel import SerialChannel
+                channels["sender"] = SerialChannel(args.serial)
+            except (OSError, ImportError) as e:
+                print(f"Sender board not available: {e}", file=sys.stderr)
+    collector = LinkCollector({node: (channel, DEFAULT_PORTS[node]) for node, channel in channels.items()})
+
+    sample = rates = None
+    try:
+        collector.sample()
+        samples = 0
+        while not args.count or samples < args.count:
+            time.sleep(args.interval)
+            sample = collector.sample()
+            samples += 1
+            for node, error in collector.errors.items():
+                print(f"{node}: {error}", file=sys.stderr)
+            print(f"\n{time.strftime('%H:%M:%S', time.localtime(sample.ts))} "
+                  f"interval {sample.elapsed:.2f} s, read skew {sample.skew * 1000:.1f} ms")
+            print_ports(collector, sample)
+            rates = collector.rates(sample)
+            hops = hop_losses(collector, sample.deltas, sample.frer, rates, sample.skew)
+            print_hops(hops, "  last interval:")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for channel in channels.values():
+            channel.close()
+        collector.close()
+
+    if collector.samples > 1:
+        hops = hop_losses(collector, collector.totals, collector.frer.totals, rates, collector.totals_skew)
+        print_hops(hops, "\nSince start:")
+        hop, reason = lossy_hop(hops, collector.frer.totals)
+        if hop is not None:
+            print(f"Lossy hop: {_endpoint(hop.a)} -> {_endpoint(hop.b)}: {reason}")
+        else:
+            print(f"Lossy hop: none ({reason})")
+
+
+if __name__ == "__main__":
+    main()
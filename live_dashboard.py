@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Live FRER dashboard for soak tests
+
+A CounterPoller reads the board counters (50 Hz by default) and only
+overwrites the latest snapshot. A separate broadcaster wakes at the push
+rate, computes derived metrics once, diffs them against what was last sent
+and encodes a single Server-Sent Events message that is queued to every
+client. Poll rate and client count are therefore decoupled: a tick costs
+one diff and one encode however many browsers are connected.
+
+Usage:
+    python3 live_dashboard.py                 # poll the receiver over SSH
+    python3 live_dashboard.py --fake          # in-process board simulator
+
+Counter history is kept in a RollupStore and served on
+/history?metric=cs0.PassedPackets&start=<epoch s>&end=<epoch s>.
+"""
+
+import argparse
+import json
+import math
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from board_channel import CallableChannel, ShellChannel
+from frer_counters import DEFAULT_STREAMS, CounterPoller, elimination_rate
+from rollup_store import RollupStore
+
+DEFAULT_PORT = 8050
+FRAME_BYTES = 1514
+CLIENT_QUEUE_SIZE = 32
+MAX_HISTORY_POINTS = 100_000
+
+
+class DashboardHub:
+    """Coalesces counter snapshots and fans out delta updates to clients"""
+
+    def __init__(self, push_interval=0.2, frame_bytes=FRAME_BYTES):
+        self.push_interval = push_interval
+        self.frame_bytes = frame_bytes
+        self.clients = set()
+        self.pushes = 0
+        self._latest = None
+        self._previous = None
+        self._sent = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def on_counters(self, ts_ns, counters):
+        """CounterPoller subscriber: keep only the newest snapshot"""
+        with self._lock:
+            self._latest = (ts_ns, counters)
+
+    def _metrics(self, ts_ns, counters):
+        metrics = {"ts": ts_ns / 1e9}
+        for stream, values in counters.items():
+            for name in ("PassedPackets", "DiscardedPackets", "LostPackets",
+                         "OutOfOrderPackets", "RoguePackets"):
+                if name in values:
+                    metrics[f"{stream}.{name}"] = values[name]
+        cs = counters.get("cs0", {})
+        metrics["elimination_rate"] = round(
+            elimination_rate(cs.get("PassedPackets", 0), cs.get("DiscardedPackets", 0)), 4)
+        if self._previous is not None:
+            prev_ts, prev = self._previous
+            elapsed = (ts_ns - prev_ts) / 1e9
+            if elapsed > 0:
+                passed = cs.get("PassedPackets", 0) - prev.get("cs0", {}).get("PassedPackets", 0)
+                metrics["throughput_fps"] = round(max(0, passed) / elapsed, 1)
+                metrics["throughput_mbps"] = round(max(0, passed) * self.frame_bytes * 8 / elapsed / 1e6, 2)
+        self._previous = (ts_ns, counters)
+        return metrics
+
+    @staticmethod
+    def _encode(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n".encode()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._sent)
+
+    def add_client(self):
+        client = queue.Queue(CLIENT_QUEUE_SIZE)
+        with self._lock:
+            client.put(self._encode("snapshot", self._sent))
+            self.clients.add(client)
+        return client
+
+    def remove_client(self, client):
+        with self._lock:
+            self.clients.discard(client)
+
+    def tick(self):
+        with self._lock:
+            latest, self._latest = self._latest, None
+        if latest is None:
+            return
+        metrics = self._metrics(*latest)
+        delta = {key: value for key, value in metrics.items() if self._sent.get(key) != value}
+        if not delta:
+            return
+        message = self._encode("delta", delta)
+        with self._lock:
+            self._sent.update(delta)
+            resync = None
+            for client in self.clients:
+                try:
+                    client.put_nowait(message)
+                except queue.Full:
+                    # Slow client: replace its backlog with one full snapshot
+                    if resync is None:
+                        resync = self._encode("snapshot", self._sent)
+                    while not client.empty():
+                        try:
+                            client.get_nowait()
+                        except queue.Empty:
+                            break
+                    client.put_nowait(resync)
+        self.pushes += 1
+
+    def _run(self):
+        while not self._stop.wait(self.push_interval):
+            self.tick()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>FRER Live Dashboard</title>
+<style>
+body{font-family:sans-serif;margin:2em;background:#f7f7fb}
+h1{color:#667eea}
+.cards{display:flex;gap:1em;margin-bottom:1em}
+.card{background:#fff;border-radius:8px;padding:1em 1.5em;box-shadow:0 1px 3px #ccc}
+.card b{display:block;font-size:1.8em;color:#764ba2}
+table{border-collapse:collapse;background:#fff}
+td,th{padding:.4em 1em;border-bottom:1px solid #eee;text-align:right}
+canvas{background:#fff;margin-top:1em}
+</style></head><body>
+<h1>FRER Live Dashboard</h1>
+<div class="cards">
+<div class="card">Elimination rate<b id="elim">-</b></div>
+<div class="card">Throughput<b id="mbps">-</b></div>
+<div class="card">Frames/s<b id="fps">-</b></div>
+</div>
+<table id="streams"><thead><tr><th>Stream</th><th>Passed</th><th>Discarded</th>
+<th>Lost</th><th>Out of order</th></tr></thead><tbody></tbody></table>
+<canvas id="chart" width="800" height="200"></canvas>
+<script>
+const state = {}, history = [];
+function render() {
+  document.getElementById('elim').textContent = (state.elimination_rate ?? 0).toFixed(3) + ' %';
+  document.getElementById('mbps').textContent = (state.throughput_mbps ?? 0).toFixed(1) + ' Mbps';
+  document.getElementById('fps').textContent = Math.round(state.throughput_fps ?? 0);
+  const streams = [...new Set(Object.keys(state).filter(k => k.includes('.')).map(k => k.split('.')[0]))];
+  document.querySelector('#streams tbody').innerHTML = streams.map(s =>
+    `<tr><td>${s}</td>` + ['PassedPackets', 'DiscardedPackets', 'LostPackets', 'OutOfOrderPackets']
+      .map(c => `<td>${state[s + '.' + c] ?? '-'}</td>`).join('') + '</tr>').join('');
+  const ctx = document.getElementById('chart').getContext('2d');
+  ctx.clearRect(0, 0, 800, 200);
+  const max = Math.max(1, ...history);
+  ctx.beginPath(); ctx.strokeStyle = '#667eea';
+  history.forEach((v, i) => ctx.lineTo(i * 800 / 300, 195 - v / max * 190));
+  ctx.stroke();
+}
+const source = new EventSource('/events');
+source.addEventListener('snapshot', e => { Object.assign(state, JSON.parse(e.data)); render(); });
+source.addEventListener('delta', e => {
+  Object.assign(state, JSON.parse(e.data));
+  history.push(state.throughput_mbps ?? 0);
+  if (history.length > 300) history.shift();
+  render();
+});
+</script></body></html>
+"""
+
+
+def history_args(query):
+    """(metric, start, end, points) of a /history query; ValueError if invalid"""
+    try:
+        end = float(query.get("end", time.time()))
+        start = float(query.get("start", end - 3600))
+        points = int(query.get("points", 1500))
+    except ValueError:
+        raise ValueError("start and end must be epoch seconds, points an integer") from None
+    if not (math.isfinite(start) and math.isfinite(end)) or start > end:
+        raise ValueError("need finite start <= end")
+    if not 1 <= points <= MAX_HISTORY_POINTS:
+        raise ValueError(f"points must be 1-{MAX_HISTORY_POINTS}")
+    return query.get("metric", "cs0.PassedPackets"), start, end, points
+
+
+def make_handler(hub, store=None):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, body, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/":
+                self._send(PAGE.encode(), "text/html; charset=utf-8")
+            elif self.path == "/snapshot":
+                self._send(json.dumps(hub.snapshot()).encode(), "application/json")
+            elif self.path.startswith("/history") and store is not None:
+                # /history?metric=cs0.PassedPackets&start=<epoch s>&end=<epoch s>&points=1500
+                query = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+                try:
+                    metric, start, end, points = history_args(query)
+                except ValueError as e:
+                    self.send_error(400, str(e))
+                    return
+                result = store.query(metric, start, end, points)
+                self._send(json.dumps(result).encode(), "application/json")
+            elif self.path == "/events":
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                client = hub.add_client()
+                try:
+                    while True:
+                        try:
+                            message = client.get(timeout=15)
+                        except queue.Empty:
+                            message = b": keepalive\n\n"
+                        self.wfile.write(message)
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    hub.remove_client(client)
+            else:
+                self.send_error(404)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live FRER counter dashboard")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--poll-hz", type=float, default=50.0)
+    parser.add_argument("--push-hz", type=float, default=5.0)
+    parser.add_argument("--fake", action="store_true", help="use an in-process board simulator")
+    parser.add_argument("--fake-rate", type=float, default=17297.0, help="simulated frames per second")
+    parser.add_argument("--rollups", help="load/save counter rollups here (served on /history)")
+    args = parser.parse_args()
+
+    if args.fake:
+        from board_sim import Simulator
+        simulator = Simulator(args.fake_rate, loss_eth2=0.0001, ooo_probability=0.00007)
+        channel = CallableChannel(lambda command: simulator.run("receiver", command)[0])
+    else:
+        channel = ShellChannel()
+    hub = DashboardHub(push_interval=1.0 / args.push_hz)
+    poller = CounterPoller(channel, DEFAULT_STREAMS, interval=1.0 / args.poll_hz)
+    poller.subscribe(hub.on_counters)
+    store = RollupStore.load(args.rollups) if args.rollups and os.path.exists(args.rollups) else RollupStore()
+    poller.subscribe(store.on_counters)
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(hub, store))
+    server.daemon_threads = True
+    poller.start()
+    hub.start()
+    print(f"FRER live dashboard on http://127.0.0.1:{args.port}/ "
+          f"(poll {args.poll_hz:g} Hz, push {args.push_hz:g} Hz)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        poller.stop()
+        hub.stop()
+        channel.close()
+        server.server_close()
+        if args.rollups:
+            store.save(args.rollups)
+
+
+if __name__ == "__main__":
+    main()
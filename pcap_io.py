@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+PCAP / PCAPNG reading and writing with integer nanosecond timestamps
+
+Classic pcap files are written in nanosecond format (magic 0xa1b23c4d) and
+read in either resolution. PCAPNG files carry one Interface Description
+Block per capture path (e.g. eth1 and eth2 in one file), if_tsresol=9 and
+optional per-packet comments and flags.
+
+Writes are collected in a memory buffer and flushed in large blocks; reads
+go through mmap and struct.unpack_from so no per-packet read() call is made.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+
+LINKTYPE_ETHERNET = 1
+
+PCAP_MAGIC_USEC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+
+# PCAPNG block types
+BLOCK_SHB = 0x0A0D0D0A
+BLOCK_IDB = 0x00000001
+BLOCK_SPB = 0x00000003
+BLOCK_EPB = 0x00000006
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# PCAPNG option codes
+OPT_ENDOFOPT = 0
+OPT_COMMENT = 1
+OPT_IF_NAME = 2
+OPT_IF_TSRESOL = 9
+OPT_IF_TSOFFSET = 14
+OPT_EPB_FLAGS = 2
+OPT_EPB_HASH = 3
+HASH_CRC32 = 2
+
+# EPB flag bits (direction in bits 0-1, reception type in bits 2-4)
+FLAG_INBOUND = 0x1
+FLAG_OUTBOUND = 0x2
+
+WRITE_BUFFER_SIZE = 1 << 20
+DEFAULT_SNAPLEN = 262144
+
+Packet = namedtuple('Packet', 'ts_ns iface data orig_len offset comment flags')
+Interface = namedtuple('Interface', 'name linktype snaplen')
+
+
+def _pad4(length):
+    """Return the number of padding bytes to reach a 32-bit boundary"""
+    return -length % 4
+
+
+def _encode_option(code, value):
+    """Encode one PCAPNG option (little-endian)"""
+    return struct.pack('<HH', code, len(value)) + value + b'\x00' * _pad4(len(value))
+
+
+class _BufferedWriter:
+    """Common buffering for capture writers"""
+
+    def __init__(self, path):
+        if hasattr(path, 'write'):
+            self._file = path
+            self._owns_file = False
+        else:
+            self._file = open(path, 'wb')
+            self._owns_file = True
+        self._buffer = bytearray()
+        self.packets_written = 0
+
+    def _append(self, data):
+        self._buffer += data
+        if len(self._buffer) >= WRITE_BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+        self._file.flush()
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        if self._owns_file:
+            self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PcapWriter(_BufferedWriter):
+    """Classic pcap writer (nanosecond resolution by default)"""
+
+    def __init__(self, path, nanosecond=True, snaplen=DEFAULT_SNAPLEN, linktype=LINKTYPE_ETHERNET):
+        super().__init__(path)
+        self.nanosecond = nanosecond
+        self._divisor = 1 if nanosecond else 1000
+        magic = PCAP_MAGIC_NSEC if nanosecond else PCAP_MAGIC_USEC
+        self._append(struct.pack('<IHHiIII', magic, 2, 4, 0, 0, snaplen, linktype))
+
+    def write(self, data, ts_ns=None, orig_len=None):
+        """Append one frame; ts_ns is an integer nanosecond epoch timestamp"""
+        if ts_ns is None:
+            ts_ns = time.time_ns()
+        sec, frac = divmod(ts_ns, 1_000_000_000)
+        self._append(struct.pack('<IIII', sec, frac // self._divisor, len(data),
+                                 len(data) if orig_len is None else orig_len))
+        self._append(data)
+        self.packets_written += 1
+
+
+class PcapngWriter(_BufferedWriter):
+    """PCAPNG writer with one interface description block per capture path"""
+
+    def __init__(self, path, interfaces=(), comment=None):
+        super().__init__(path)
+        self.interfaces = []
+        options = b''
+        if comment:
+            options += _encode_option(OPT_COMMENT, comment.encode())
+        if options:
+            options += _encode_option(OPT_ENDOFOPT, b'')
+        body = struct.pack('<IHHq', BYTE_ORDER_MAGIC, 1, 0, -1) + options
+        self._write_block(BLOCK_SHB, body)
+        for iface in interfaces:
+            if isinstance(iface, str):
+                self.add_interface(iface)
+            else:
+                self.add_interface(*iface)
+
+    def _write_block(self, block_type, body):
+        total = 12 + len(body)
+        self._append(struct.pack('<II', block_type, total))
+        self._append(body)
+        self._append(struct.pack('<I', total))
+
+    def add_interface(self, name, linktype=LINKTYPE_ETHERNET, snaplen=0):
+        """Add an interface description block and return its interface id"""
+        options = _encode_option(OPT_IF_NAME, name.encode())
+        options += _encode_option(OPT_IF_TSRESOL, b'\x09')
+        options += _encode_option(OPT_ENDOFOPT, b'')
+        self._write_block(BLOCK_IDB, struct.pack('<HHI', linktype, 0, snaplen) + options)
+        self.interfaces.append(Interface(name, linktype, snaplen))
+        return len(self.interfaces) - 1
+
+    def write(self, data, ts_ns=None, iface=0, comment=None, flags=None, orig_len=None,
+              extra_options=b''):
+        """Append one frame as an enhanced packet block"""
+        if ts_ns is None:
+            ts_ns = time.time_ns()
+        if iface >= len(self.interfaces):
+            raise ValueError(f"Unknown interface id {iface}")
+        options = extra_options
+        if comment:
+            options += _encode_option(OPT_COMMENT, comment.encode())
+        if flags is not None:
+            options += _encode_option(OPT_EPB_FLAGS, struct.pack('<I', flags))
+        if options:
+            options += _encode_option(OPT_ENDOFOPT, b'')
+        cap_len = len(data)
+        total = 32 + cap_len + _pad4(cap_len) + len(options)
+        self._append(struct.pack('<IIIIIII', BLOCK_EPB, total, iface,
+                                 ts_ns >> 32, ts_ns & 0xffffffff, cap_len,
+                                 cap_len if orig_len is None else orig_len))
+        self._append(data)
+        self._append(b'\x00' * _pad4(cap_len) + options + struct.pack('<I', total))
+        self.packets_written += 1
+
+
+class _MappedReader:
+    """Common mmap handling for capture readers"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = b''
+        self.interfaces = []
+        # Interface lists of the sections seen, and the section of the last
+        # block read (pcapng interface ids restart in every section)
+        self.section_interfaces = [self.interfaces]
+        self.section = 0
+
+    def close(self):
+        if self._file is None:
+            return
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PcapReader(_MappedReader):
+    """Classic pcap reader (microsecond or nanosecond, either byte order)"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        if len(self._map) < 24:
+            raise ValueError(f"{path}: too short for a pcap header")
+        magic_le, = struct.unpack_from('<I', self._map, 0)
+        magic_be, = struct.unpack_from('>I', self._map, 0)
+        if magic_le in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            self._endian, magic = '<', magic_le
+        elif magic_be in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            self._endian, magic = '>', magic_be
+        else:
+            raise ValueError(f"{path}: not a classic pcap file")
+        self.nanosecond = magic == PCAP_MAGIC_NSEC
+        _, _, _, _, snaplen, linktype = struct.unpack_from(self._endian + 'HHiIII', self._map, 4)
+        self.interfaces = [Interface(os.path.basename(path), linktype, snaplen)]
+        self.section_interfaces = [self.interfaces]
+
+    def __iter__(self):
+        return self.read_from(24)
+
+    def read_from(self, offset, end=None):
+        """Yield packets starting at a record boundary byte offset"""
+        buf = self._map
+        end = len(buf) if end is None else min(end, len(buf))
+        scale = 1 if self.nanosecond else 1000
+        header = struct.Struct(self._endian + 'IIII')
+        unpack_from = header.unpack_from
+        while offset + 16 <= end:
+            sec, frac, incl_len, orig_len = unpack_from(buf, offset)
+            start = offset + 16
+            if start + incl_len > len(buf):
+                break
+            yield Packet(sec * 1_000_000_000 + frac * scale, 0, buf[start:start + incl_len],
+                         orig_len, offset, None, None)
+            offset = start + incl_len
+
+    def locate_from(self, offset, end=None):
+        """Yield (ts_ns, iface, start, cap_len, orig_len, offset) per record
+
+        Like read_from without copying the frame: start is the byte offset
+        of the frame data in the mapped file.
+        """
+        buf = self._map
+        end = len(buf) if end is None else min(end, len(buf))
+        scale = 1 if self.nanosecond else 1000
+        unpack_from = struct.Struct(self._endian + 'IIII').unpack_from
+        while offset + 16 <= end:
+            sec, frac, incl_len, orig_len = unpack_from(buf, offset)
+            start = offset + 16
+            if start + incl_len > len(buf):
+                break
+            yield sec * 1_000_000_000 + frac * scale, 0, start, incl_len, orig_len, offset
+            offset = start + incl_len
+
+
+class PcapngReader(_MappedReader):
+    """PCAPNG reader honouring per-interface if_tsresol and if_tsoffset"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        if len(self._map) < 12 or struct.unpack_from('<I', self._map, 0)[0] != BLOCK_SHB:
+            raise ValueError(f"{path}: not a pcapng file")
+        self._ts_scale = []
+        self._endian = '<'
+        self._section_offsets = []
+        self.section_interfaces = []
+        # Collect the interfaces of the first section up front so callers
+        # have names before iterating
+        for _ in self._walk(0, stop_at_packet=True):
+            pass
+
+    @staticmethod
+    def _parse_options(buf, offset, end, endian):
+        options = {}
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + 'HH', buf, offset)
+            if code == OPT_ENDOFOPT:
+                break
+            options.setdefault(code, bytes(buf[offset + 4:offset + 4 + length]))
+            offset += 4 + length + _pad4(length)
+        return options
+
+    @staticmethod
+    def _resolution(tsresol):
+        """Return (multiplier, divisor, shift) converting raw units to ns"""
+        if tsresol & 0x80:
+            return 1_000_000_000, 1, tsresol & 0x7f
+        if tsresol <= 9:
+            return 10 ** (9 - tsresol), 1, 0
+        return 1, 10 ** (tsresol - 9), 0
+
+    def _add_interface(self, buf, offset, total, endian):
+        linktype, _, snaplen = struct.unpack_from(endian + 'HHI', buf, offset + 8)
+        options = self._parse_options(buf, offset + 16, offset + total - 4, endian)
+        name = options.get(OPT_IF_NAME, b'').decode(errors='replace') or f"if{len(self.interfaces)}"
+        tsresol = options.get(OPT_IF_TSRESOL, b'\x06')[0]
+        tsoffset = 0
+        if OPT_IF_TSOFFSET in options:
+            tsoffset, = struct.unpack(endian + 'q', options[OPT_IF_TSOFFSET])
+        self.interfaces.append(Interface(name, linktype, snaplen))
+        scale = self._resolution(tsresol) + (tsoffset * 1_000_000_000,)
+        # None marks native nanosecond interfaces, which need no conversion
+        self._ts_scale.append(None if scale == (1, 1, 0, 0) else scale)
+
+    def _walk(self, offset, end=None, stop_at_packet=False, raw_options=False, locate=False):
+        buf = self._map
+        end = len(buf) if end is None else min(end, len(buf))
+        endian = self._endian
+        head = struct.Struct(endian + 'II')
+        epb = struct.Struct(endian + 'IIIII')
+        scales = self._ts_scale
+        while offset + 12 <= end:
+            block_type, total = head.unpack_from(buf, offset)
+            if block_type == BLOCK_SHB:
+                # Byte order is fixed per section by the byte-order magic
+                bom, = struct.unpack_from('<I', buf, offset + 8)
+                endian = self._endian = '<' if bom == BYTE_ORDER_MAGIC else '>'
+                head = struct.Struct(endian + 'II')
+                epb = struct.Struct(endian + 'IIIII')
+                block_type, total = head.unpack_from(buf, offset)
+                self.interfaces = []
+                scales = self._ts_scale = []
+                if offset not in self._section_offsets:
+                    self._section_offsets.append(offset)
+                    self.section_interfaces.append(self.interfaces)
+                self.section = self._section_offsets.index(offset)
+                self.section_interfaces[self.section] = self.interfaces
+            if total < 12 or offset + total > len(buf):
+                break
+            if block_type == BLOCK_EPB:
+                if stop_at_packet:
+                    return
+                iface, ts_hi, ts_lo, cap_len, orig_len = epb.unpack_from(buf, offset + 8)
+                start = offset + 28
+                opt_start = start + cap_len + (-cap_len & 3)
+                comment = flags = None
+                options = {}
+                if opt_start < offset + total - 4 and not locate:
+                    options = self._parse_options(buf, opt_start, offset + total - 4, endian)
+                    if OPT_COMMENT in options:
+                        comment = options[OPT_COMMENT].decode(errors='replace')
+                    if OPT_EPB_FLAGS in options:
+                        flags, = struct.unpack(endian + 'I', options[OPT_EPB_FLAGS])
+                ts_ns = (ts_hi << 32) | ts_lo
+                scale = scales[iface]
+                if scale is not None:
+                    mult, div, shift, tsoffset = scale
+                    ts_ns = ((ts_ns * mult) >> shift) // div + tsoffset
+                if locate:
+                    yield ts_ns, iface, start, cap_len, orig_len, offset
+                else:
+                    yield Packet(ts_ns, iface, buf[start:start + cap_len], orig_len, offset,
+                                 options if raw_options else comment, flags)
+            elif block_type == BLOCK_IDB:
+                self._add_interface(buf, offset, total, endian)
+            elif block_type == BLOCK_SPB:
+                if stop_at_packet:
+                    return
+                orig_len, = struct.unpack_from(endian + 'I', buf, offset + 8)
+                snaplen = self.interfaces[0].snaplen if self.interfaces else 0
+                cap_len = min(orig_len, snaplen) if snaplen else orig_len
+                if locate:
+                    yield 0, 0, offset + 12, cap_len, orig_len, offset
+                else:
+                    yield Packet(0, 0, buf[offset + 12:offset + 12 + cap_len], orig_len, offset,
+                                 {} if raw_options else None, None)
+            offset += total
+
+    def __iter__(self):
+        return self.read_from(0)
+
+    def read_from(self, offset, end=None, raw_options=False):
+        """Yield packets from a block boundary byte offset
+
+        Interfaces are those seen so far, so random access needs every IDB
+        to precede the first packet (as PcapngWriter does when given the
+        interface list up front). With raw_options the option dict is
+        returned in place of the comment so callers can read custom options.
+        """
+        return self._walk(offset, end, raw_options=raw_options)
+
+    def locate_from(self, offset, end=None):
+        """Yield (ts_ns, iface, start, cap_len, orig_len, offset) per packet block
+
+        Like read_from without copying the frame or parsing its options.
+        """
+        return self._walk(offset, end, locate=True)
+
+
+def read_pcap_stream(stream):
+    """Yield packets from a classic pcap byte stream (e.g. `tcpdump -w -`)
+
+    For pipes, where mmap is not possible; packet offsets are None.
+    """
+    header = stream.read(24)
+    if len(header) < 24:
+        return
+    if struct.unpack_from('<I', header)[0] in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+        endian = '<'
+    elif struct.unpack_from('>I', header)[0] in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+        endian = '>'
+    else:
+        raise ValueError("Stream is not a classic pcap")
+    scale = 1 if struct.unpack_from(endian + 'I', header)[0] == PCAP_MAGIC_NSEC else 1000
+    record = struct.Struct(endian + 'IIII')
+    read = stream.read
+    while True:
+        head = read(16)
+        if len(head) < 16:
+            return
+        sec, frac, incl_len, orig_len = record.unpack(head)
+        data = read(incl_len)
+        if len(data) < incl_len:
+            return
+        yield Packet(sec * 1_000_000_000 + frac * scale, 0, data, orig_len, None, None, None)
+
+
+def open_capture(path):
+    """Open a classic pcap or pcapng file, detected from its magic number"""
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    if len(head) == 4 and struct.unpack('<I', head)[0] == BLOCK_SHB:
+        return PcapngReader(path)
+    return PcapReader(path)
+
+
+def read_packets(path):
+    """Iterate over all packets of a capture file"""
+    with open_capture(path) as reader:
+        yield from reader
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a capture or convert it to pcapng")
+    parser.add_argument("capture", help="capture.pcap or capture.pcapng")
+    parser.add_argument("output", nargs="?", help="convert to this .pcapng")
+    args = parser.parse_args(argv)
+
+    with open_capture(args.capture) as reader:
+        # Interface ids restart in every pcapng section: number all of them
+        # as (section, iface) before reading packets
+        for _ in reader.locate_from(0 if isinstance(reader, PcapngReader) else 24):
+            pass
+        ids, names = {}, []
+        for section, interfaces in enumerate(reader.section_interfaces):
+            for iface, interface in enumerate(interfaces):
+                ids[section, iface] = len(names)
+                names.append(interface.name)
+        if args.output:
+            # Convert to pcapng, keeping interfaces apart and full ns precision
+            with PcapngWriter(args.output, names) as writer:
+                for pkt in reader:
+                    writer.write(pkt.data, pkt.ts_ns, ids[reader.section, pkt.iface], pkt.comment,
+                                 pkt.flags, pkt.orig_len)
+            print(f"Wrote {writer.packets_written} packets to {args.output}")
+            return
+
+        counts = [0] * len(names)
+        first = last = None
+        for pkt in reader:
+            counts[ids[reader.section, pkt.iface]] += 1
+            first = pkt.ts_ns if first is None else first
+            last = pkt.ts_ns
+
+    print(f"File: {args.capture}")
+    for name, count in zip(names, counts):
+        print(f"  {name}: {count} packets")
+    if first is not None:
+        print(f"  Span: {(last - first) / 1e9:.9f} s")
+
+
+if __name__ == "__main__":
+    main()
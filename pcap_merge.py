@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Streaming k-way time merge of per-interface captures
+
+Interleaves any number of pcap/pcapng files by timestamp into one ordered
+stream tagged with the source interface. Each input is read through mmap
+and only one pending packet per input is held in the heap, so memory stays
+constant regardless of capture size.
+"""
+
+import argparse
+import heapq
+import os
+import sys
+
+from pcap_io import PcapngWriter, open_capture
+
+
+def source_name(path):
+    """Derive an interface name from a capture path (/tmp/enp2s0_capture.pcap -> enp2s0)"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem[:-len('_capture')] if stem.endswith('_capture') else stem
+
+
+def _labels(path, reader, names):
+    """Interface names of one opened capture, indexed by interface id"""
+    if len(reader.interfaces) == 1 and path in names:
+        return [names[path]]
+    if reader.interfaces and reader.interfaces[0].name == os.path.basename(path):
+        # Classic pcap: the interface is only known from the file name
+        return [source_name(path)]
+    return [iface.name for iface in reader.interfaces]
+
+
+def list_sources(paths, names=None):
+    """Return the distinct source names merge_captures will tag packets with"""
+    sources = []
+    for path in paths:
+        with open_capture(path) as reader:
+            for label in _labels(path, reader, names or {}):
+                if label not in sources:
+                    sources.append(label)
+    return sources
+
+
+def merge_captures(paths, names=None):
+    """Yield (source, packet) pairs from all captures in timestamp order
+
+    names optionally maps a path to the name used for classic pcap inputs;
+    pcapng inputs keep their own interface names. Ties keep input order.
+    """
+    names = names or {}
+    readers = [open_capture(path) for path in paths]
+    try:
+        heap = []
+        for index, reader in enumerate(readers):
+            packets = iter(reader)
+            for pkt in packets:
+                heap.append((pkt.ts_ns, index, pkt, packets))
+                break
+        heapq.heapify(heap)
+
+        labels = [_labels(path, reader, names) for path, reader in zip(paths, readers)]
+
+        while heap:
+            ts_ns, index, pkt, packets = heap[0]
+            yield labels[index][pkt.iface], pkt
+            nxt = next(packets, None)
+            if nxt is None:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (nxt.ts_ns, index, nxt, packets))
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+def write_merged(paths, output, names=None):
+    """Merge captures into one pcapng file with an interface per source"""
+    sources = list_sources(paths, names)
+    iface_ids = {source: index for index, source in enumerate(sources)}
+    counts = dict.fromkeys(sources, 0)
+    # All IDBs go first so the merged file supports random access
+    with PcapngWriter(output, sources) as writer:
+        for source, pkt in merge_captures(paths, names):
+            writer.write(pkt.data, pkt.ts_ns, iface_ids[source], pkt.comment, pkt.flags, pkt.orig_len)
+            counts[source] += 1
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time-merge per-interface captures into one pcapng")
+    parser.add_argument("output", help="merged .pcapng")
+    parser.add_argument("captures", nargs="+")
+    args = parser.parse_args(argv)
+
+    output, inputs = args.output, args.captures
+    missing = [path for path in inputs if not os.path.exists(path)]
+    if missing:
+        print(f"Missing captures: {', '.join(missing)}")
+        sys.exit(1)
+
+    counts = write_merged(inputs, output)
+    print(f"Merged {len(inputs)} captures into {output}:")
+    for source, count in counts.items():
+        print(f"  {source}: {count} packets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Event-driven phase scheduler
+
+A test run is a graph of phases (clear counters, start captures, traffic,
+final stats, analysis). Each phase starts as soon as the events it depends
+on fire instead of after fixed sleeps: a phase can wait for another phase
+to be *done* or merely *ready* (e.g. traffic starts once every capture has
+reported that it is listening). Several runs can share one scheduler so
+that run N's analysis overlaps run N+1's setup.
+"""
+
+import threading
+import time
+
+
+class PhaseError(Exception):
+    """Raised by PhaseScheduler.run when phases failed"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(f"{name}: {error}" for name, error in errors.items()))
+
+
+class Phase:
+    """One node of the phase graph, passed to its action"""
+
+    def __init__(self, scheduler, name, action, after, after_ready):
+        self.scheduler = scheduler
+        self.name = name
+        self.action = action
+        self.after = tuple(after)
+        self.after_ready = tuple(after_ready)
+        self.ready_event = threading.Event()
+        self.done_event = threading.Event()
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    def signal_ready(self):
+        """Mark the phase ready for dependents that only need it running"""
+        self.ready_event.set()
+
+    def result_of(self, name):
+        """Result of a finished phase"""
+        return self.scheduler.phases[name].result
+
+    def wait_done(self, name, timeout=None):
+        """Block until another phase is done (e.g. captures waiting for traffic)"""
+        return self.scheduler.phases[name].done_event.wait(timeout)
+
+
+class PhaseScheduler:
+    """Runs phases in threads as soon as their dependencies fire"""
+
+    def __init__(self):
+        self.phases = {}
+
+    def add(self, name, action, after=(), after_ready=()):
+        """Add a phase; action(phase) returns the phase result"""
+        if name in self.phases:
+            raise ValueError(f"Duplicate phase {name}")
+        self.phases[name] = Phase(self, name, action, after, after_ready)
+        return self.phases[name]
+
+    def _run_phase(self, phase):
+        try:
+            for dep in phase.after_ready:
+                other = self.phases[dep]
+                # A dependency that finished without signalling is ready too
+                while not other.ready_event.wait(0.05):
+                    if other.done_event.is_set():
+                        break
+            for dep in phase.after:
+                self.phases[dep].done_event.wait()
+            failed = [dep for dep in phase.after + phase.after_ready if self.phases[dep].error]
+            if failed:
+                raise PhaseError({dep: self.phases[dep].error for dep in failed})
+            phase.started = time.monotonic()
+            phase.result = phase.action(phase)
+        except Exception as e:
+            phase.error = e
+        finally:
+            phase.finished = time.monotonic()
+            phase.ready_event.set()
+            phase.done_event.set()
+
+    def run(self, raise_errors=True):
+        """Run every phase; returns {name: result}"""
+        for name, phase in self.phases.items():
+            for dep in phase.after + phase.after_ready:
+                if dep not in self.phases:
+                    raise ValueError(f"Phase {name} depends on unknown phase {dep}")
+        threads = [threading.Thread(target=self._run_phase, args=(phase,), daemon=True)
+                   for phase in self.phases.values()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        errors = {name: phase.error for name, phase in self.phases.items() if phase.error}
+        if errors and raise_errors:
+            raise PhaseError(errors)
+        return {name: phase.result for name, phase in self.phases.items()}
+
+    def timings(self):
+        """(name, start, end) seconds relative to the first phase start"""
+        started = [p.started for p in self.phases.values() if p.started is not None]
+        origin = min(started) if started else 0
+        return [(name, p.started - origin, p.finished - origin)
+                for name, p in self.phases.items() if p.started is not None]
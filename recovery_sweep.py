@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Parallel hlen/reset_time sweep over replayed captures
+
+Merges the eth1/eth2 captures of a run by timestamp into one arrival
+stream, writes it once as a flat (timestamp, sequence) event file and
+replays it through the offline recovery model (frer_recovery.py) for every
+point of an algorithm x history length x reset time grid. Grid points run
+in a process pool; every worker maps the same read-only event file, so the
+stream is parsed once and shared through the page cache.
+
+Usage:
+    python3 recovery_sweep.py /tmp/enp11s0_capture.pcap /tmp/enp15s0_capture.pcap
+    python3 recovery_sweep.py eth1.pcap eth2.pcap --hlen 2 4 8 16 32 --reset-time 10 100 500 \\
+        --algorithms vector match --workers 8 --output sweep.json
+"""
+
+import argparse
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from frer_recovery import ALGORITHMS, replay
+from pcap_merge import merge_captures
+from rtag_frames import rtag_sequence
+
+EVENTS_MAGIC = b'FRSW'
+_HEADER = struct.Struct('<4sQ')
+# Timestamps buffered before a write to the event file
+WRITE_CHUNK = 1 << 16
+
+DEFAULT_HLEN = [2, 4, 8, 10, 16, 32, 64, 128]
+DEFAULT_RESET_TIME = [10, 50, 100, 500, 1000]
+
+# Set in each worker by _init_worker
+_events = None
+
+
+def write_events(capture_paths, output):
+    """Write the merged R-TAG arrival stream; returns (events, per-source frames)
+
+    Timestamps go to the file in WRITE_CHUNK blocks as they arrive; the
+    sequences, which follow all timestamps in the file, are held in a
+    2-byte array until the end.
+    """
+    timestamps, sequences = array('Q'), array('H')
+    count = 0
+    per_source = {}
+    with open(output, 'wb') as f:
+        f.write(_HEADER.pack(EVENTS_MAGIC, 0))
+        for source, pkt in merge_captures(capture_paths):
+            seq = rtag_sequence(pkt.data)
+            if seq is None:
+                continue
+            timestamps.append(pkt.ts_ns)
+            sequences.append(seq)
+            per_source[source] = per_source.get(source, 0) + 1
+            if len(timestamps) == WRITE_CHUNK:
+                count += _flush(f, timestamps)
+        count += _flush(f, timestamps)
+        _flush(f, sequences)
+        f.seek(0)
+        f.write(_HEADER.pack(EVENTS_MAGIC, count))
+    return count, per_source
+
+
+def _flush(f, values):
+    """Write an array little-endian and empty it; returns the items written"""
+    if sys.byteorder == 'big':
+        values.byteswap()
+    values.tofile(f)
+    written = len(values)
+    del values[:]
+    return written
+
+
+class EventFile:
+    """Read-only mmap of an event file exposing timestamp and sequence views"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != EVENTS_MAGIC:
+            raise ValueError(f"Not a sweep event file: {path}")
+        view = memoryview(self._mm)
+        start = _HEADER.size
+        self.timestamps = view[start:start + 8 * count].cast('Q')
+        self.sequences = view[start + 8 * count:start + 10 * count].cast('H')
+        self.count = count
+
+
+def _init_worker(path):
+    global _events
+    _events = EventFile(path)
+
+
+def _run_point(point):
+    algorithm, hlen, reset_time = point
+    started = time.perf_counter()
+    counters = replay(_events.timestamps, _events.sequences, ALGORITHMS[algorithm], hlen, reset_time)
+    result = {'algorithm': algorithm, 'hlen': hlen if algorithm == 'vector' else None,
+              'reset_time': reset_time, 'seconds': round(time.perf_counter() - started, 3)}
+    result.update(counters)
+    return result
+
+
+def sweep(event_path, algorithms, hlens, reset_times, workers=None):
+    """Replay every grid point; returns one result dict per point"""
+    points = []
+    for algorithm in algorithms:
+        # The match algorithm has no history window
+        lengths = hlens if algorithm == 'vector' else [None]
+        points.extend(itertools.product([algorithm], lengths, reset_times))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(event_path,)) as pool:
+        return list(pool.map(_run_point, [(a, h or 1, r) for a, h, r in points]))
+
+
+def print_results(results):
+    print(f"\n{'alg':<7} {'hlen':>5} {'reset':>6} {'passed':>10} {'discarded':>10} "
+          f"{'rogue':>8} {'lost':>8} {'ooo':>8} {'resets':>6}")
+    for r in results:
+        print(f"{r['algorithm']:<7} {r['hlen'] if r['hlen'] else '-':>5} {r['reset_time']:>6} "
+              f"{r['PassedPackets']:>10} {r['DiscardedPackets']:>10} {r['RoguePackets']:>8} "
+              f"{r['LostPackets']:>8} {r['OutOfOrderPackets']:>8} {r['Resets']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FRER recovery parameter sweep over captures")
+    parser.add_argument("captures", nargs="+", help="per-path captures (eth1, eth2, ...)")
+    parser.add_argument("--algorithms", nargs="+", choices=sorted(ALGORITHMS), default=["vector", "match"])
+    parser.add_argument("--hlen", type=int, nargs="+", default=DEFAULT_HLEN)
+    parser.add_argument("--reset-time", type=int, nargs="+", default=DEFAULT_RESET_TIME, help="ms")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="recovery_sweep.json")
+    args = parser.parse_args()
+
+    fd, event_path = tempfile.mkstemp(prefix='frer_sweep_', suffix='.bin')
+    os.close(fd)
+    try:
+        started = time.monotonic()
+        count, per_source = write_events(args.captures, event_path)
+        if not count:
+            print("No R-TAG frames in the captures", file=sys.stderr)
+            sys.exit(1)
+        print(f"Merged {count} R-TAG frames ({', '.join(f'{s}: {n}' for s, n in per_source.items())}) "
+              f"in {time.monotonic() - started:.1f} s")
+        started = time.monotonic()
+        results = sweep(event_path, args.algorithms, args.hlen, args.reset_time, args.workers)
+        elapsed = time.monotonic() - started
+    finally:
+        os.unlink(event_path)
+
+    print_results(results)
+    print(f"\n{len(results)} grid points in {elapsed:.1f} s ({args.workers} workers)")
+    with open(args.output, 'w') as f:
+        json.dump({'captures': args.captures, 'frames': count, 'per_source': per_source,
+                   'results': results}, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Run-to-run regression check between firmware builds
+
+Compares a baseline set of stored runs (test_traffic.py results) against a
+candidate set and gives one PASS/REGRESS verdict per metric:
+
+- value metrics (elimination rate, iperf jitter): p50/p90/p99 shifts and a
+  bootstrap confidence interval of the median shift
+- rate metrics (FRER loss, out-of-order, iperf loss): pooled rates over all
+  runs, a one-sided two-proportion z-test and a bootstrap interval of the
+  rate difference, resampling whole runs
+
+A metric regresses when the candidate is worse with confidence (interval
+clear of zero on the bad side, and p < alpha for rates) and by more than
+the metric's tolerance. Each bootstrap draws all its replicates as one
+index matrix, so thousands of runs compare in a few seconds.
+
+Runs are files or directories of run JSON, optionally filtered by the
+firmware recorded in their test_configuration (test_traffic.py --firmware).
+
+Usage:
+    python3 regression_check.py -b runs_v2.1.0/ -c runs_v2.2.0/
+    python3 regression_check.py -b test_runs -c test_runs --baseline-firmware v2.1.0 --candidate-firmware v2.2.0
+    python3 regression_check.py -b old/ -c new/ --json verdicts.json
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+
+from report_pipeline import summarize_run
+
+PERCENTILES = (50, 90, 99)
+RESAMPLES = 2000
+CONFIDENCE = 0.95
+ALPHA = 0.01
+MIN_RUNS = 3
+# Bootstrap replicates are drawn in blocks of about this many samples
+BOOTSTRAP_BLOCK = 1 << 22
+
+# name -> (run column, +1 if higher is worse / -1 if lower is worse, tolerance in metric units)
+VALUE_METRICS = {
+    "elimination_rate": ("elimination_rate", -1, 0.1),
+    "jitter_ms": ("jitter_ms", +1, 0.005),
+}
+# name -> (numerator column, denominator columns, tolerance as an absolute rate)
+RATE_METRICS = {
+    "frer_loss": ("lost", ("passed", "lost"), 1e-6),
+    "out_of_order": ("out_of_order", ("passed",), 1e-6),
+    "iperf_loss": ("iperf_lost", ("iperf_sent",), 1e-4),
+}
+
+
+def load_runs(paths, firmware=None):
+    """Run summaries from files and directories, optionally for one firmware"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.endswith(".json")))
+        else:
+            files.append(path)
+    runs = []
+    for path in files:
+        try:
+            summary = summarize_run(path)
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+            continue
+        if firmware is None or summary.get("firmware") == firmware:
+            runs.append(summary)
+    return runs
+
+
+def run_table(runs):
+    """Per-run metric columns as float arrays (NaN where a run lacks a value)"""
+    traffic = [run.get("traffic") or {} for run in runs]
+    table = {name: np.array([run.get(name) for run in runs], dtype=float)
+             for name in ("passed", "discarded", "lost", "out_of_order")}
+    table["elimination_rate"] = np.where(
+        table["passed"] > 0, 100.0 * table["discarded"] / np.maximum(table["passed"], 1), np.nan)
+    table["iperf_sent"] = np.array([t.get("sent_packets") for t in traffic], dtype=float)
+    table["iperf_lost"] = np.array([t.get("lost_packets") for t in traffic], dtype=float)
+    table["jitter_ms"] = np.array([t.get("jitter_ms") for t in traffic], dtype=float)
+    return table
+
+
+def _bootstrap(statistic, columns, resamples, rng):
+    """statistic over `resamples` resamples of the rows of columns
+
+    statistic gets the resampled columns as (replicates, n) matrices and
+    returns one value per replicate.
+    """
+    n = len(columns[0])
+    block = max(1, BOOTSTRAP_BLOCK // max(n, 1))
+    out = np.empty(resamples)
+    for start in range(0, resamples, block):
+        count = min(block, resamples - start)
+        index = rng.integers(0, n, size=(count, n))
+        out[start:start + count] = statistic(*(column[index] for column in columns))
+    return out
+
+
+def _interval(replicates, confidence):
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(replicates, [tail, 100 - tail])
+    return float(low), float(high)
+
+
+def _shifts(base, cand):
+    base_p = np.percentile(base, PERCENTILES)
+    cand_p = np.percentile(cand, PERCENTILES)
+    return {f"p{p}": {"baseline": float(b), "candidate": float(c), "shift": float(c - b)}
+            for p, b, c in zip(PERCENTILES, base_p, cand_p)}
+
+
+def compare_values(base, cand, direction, tolerance, resamples=RESAMPLES, confidence=CONFIDENCE,
+                   rng=None):
+    """Percentile shifts and bootstrap interval of the median shift"""
+    rng = rng or np.random.default_rng(0)
+    base, cand = base[np.isfinite(base)], cand[np.isfinite(cand)]
+    result = {"kind": "value", "baseline_runs": len(base), "candidate_runs": len(cand)}
+    if len(base) < MIN_RUNS or len(cand) < MIN_RUNS:
+        result["verdict"] = "N/A"
+        return result
+    median = lambda x: np.median(x, axis=1)
+    shift = _bootstrap(median, [cand], resamples, rng) - _bootstrap(median, [base], resamples, rng)
+    low, high = _interval(shift, confidence)
+    percentiles = _shifts(base, cand)
+    worse = direction * percentiles["p50"]["shift"]
+    confident = low > 0 if direction > 0 else high < 0
+    result.update(percentiles=percentiles, shift=percentiles["p50"]["shift"], ci=[low, high],
+                  verdict="REGRESS" if confident and worse > tolerance else "PASS")
+    return result
+
+
+def _z_test(base_num, base_den, cand_num, cand_den):
+    """One-sided p-value that the candidate rate is higher"""
+    pooled = (base_num + cand_num) / (base_den + cand_den)
+    se = math.sqrt(pooled * (1 - pooled) * (1 / base_den + 1 / cand_den))
+    diff = cand_num / cand_den - base_num / base_den
+    if se == 0:
+        return 0.0 if diff > 0 else 1.0
+    return 0.5 * math.erfc(diff / se / math.sqrt(2))
+
+
+def compare_rates(base_num, base_den, cand_num, cand_den, tolerance, resamples=RESAMPLES,
+                  confidence=CONFIDENCE, alpha=ALPHA, rng=None):
+    """Pooled rate difference with a z-test and a run-level bootstrap interval"""
+    rng = rng or np.random.default_rng(0)
+    base_ok = np.isfinite(base_num) & np.isfinite(base_den) & (base_den > 0)
+    cand_ok = np.isfinite(cand_num) & np.isfinite(cand_den) & (cand_den > 0)
+    base_num, base_den = base_num[base_ok], base_den[base_ok]
+    cand_num, cand_den = cand_num[cand_ok], cand_den[cand_ok]
+    result = {"kind": "rate", "baseline_runs": len(base_num), "candidate_runs": len(cand_num)}
+    if len(base_num) < MIN_RUNS or len(cand_num) < MIN_RUNS:
+        result["verdict"] = "N/A"
+        return result
+    base_rate = base_num.sum() / base_den.sum()
+    cand_rate = cand_num.sum() / cand_den.sum()
+    p_value = _z_test(base_num.sum(), base_den.sum(), cand_num.sum(), cand_den.sum())
+    pooled = lambda num, den: num.sum(axis=1) / den.sum(axis=1)
+    diff = (_bootstrap(pooled, [cand_num, cand_den], resamples, rng)
+            - _bootstrap(pooled, [base_num, base_den], resamples, rng))
+    low, high = _interval(diff, confidence)
+    confident = p_value < alpha and low > 0
+    result.update(percentiles=_shifts(base_num / base_den, cand_num / cand_den),
+                  baseline_rate=float(base_rate), candidate_rate=float(cand_rate),
+                  shift=float(cand_rate - base_rate), ci=[low, high], p_value=p_value,
+                  verdict="REGRESS" if confident and cand_rate - base_rate > tolerance else "PASS")
+    return result
+
+
+def compare(baseline, candidate, resamples=RESAMPLES, confidence=CONFIDENCE, alpha=ALPHA, seed=0):
+    """Verdict per metric for two lists of run summaries"""
+    rng = np.random.default_rng(seed)
+    base, cand = run_table(baseline), run_table(candidate)
+    results = {}
+    for name, (column, direction, tolerance) in VALUE_METRICS.items():
+        results[name] = compare_values(base[column], cand[column], direction, tolerance,
+                                       resamples, confidence, rng)
+    for name, (numerator, denominator, tolerance) in RATE_METRICS.items():
+        base_den = sum(base[column] for column in denominator)
+        cand_den = sum(cand[column] for column in denominator)
+        results[name] = compare_rates(base[numerator], base_den, cand[numerator], cand_den,
+                                      tolerance, resamples, confidence, alpha, rng)
+    return results
+
+
+def _label(runs, firmware, default):
+    if firmware:
+        return firmware
+    versions = Counter(run.get("firmware") for run in runs if run.get("firmware"))
+    return versions.most_common(1)[0][0] if versions else default
+
+
+def print_verdicts(results, base_label, cand_label):
+    print(f"\n{base_label} -> {cand_label}")
+    print(f"{'metric':<18} {'runs':>11} {'baseline':>12} {'candidate':>12} {'shift':>12} "
+          f"{'95% CI':>25} {'p':>8}  verdict")
+    for name, result in results.items():
+        runs = f"{result['baseline_runs']}/{result['candidate_runs']}"
+        if result["verdict"] == "N/A":
+            print(f"{name:<18} {runs:>11} {'':>12} {'':>12} {'':>12} {'':>25} {'':>8}  N/A")
+            continue
+        if result["kind"] == "rate":
+            before, after = result["baseline_rate"], result["candidate_rate"]
+            p_value = f"{result['p_value']:.2g}"
+        else:
+            before = result["percentiles"]["p50"]["baseline"]
+            after = result["percentiles"]["p50"]["candidate"]
+            p_value = ""
+        low, high = result["ci"]
+        print(f"{name:<18} {runs:>11} {before:>12.6g} {after:>12.6g} {result['shift']:>+12.4g} "
+              f"{f'[{low:+.4g}, {high:+.4g}]':>25} {p_value:>8}  {result['verdict']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run-to-run regression check")
+    parser.add_argument("-b", "--baseline", nargs="+", required=True, help="baseline run files/directories")
+    parser.add_argument("-c", "--candidate", nargs="+", required=True, help="candidate run files/directories")
+    parser.add_argument("--baseline-firmware", help="only baseline runs recorded with this firmware")
+    parser.add_argument("--candidate-firmware", help="only candidate runs recorded with this firmware")
+    parser.add_argument("--resamples", type=int, default=RESAMPLES)
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE)
+    parser.add_argument("--alpha", type=float, default=ALPHA)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the verdicts to this file")
+    args = parser.parse_args()
+
+    baseline = load_runs(args.baseline, args.baseline_firmware)
+    candidate = load_runs(args.candidate, args.candidate_firmware)
+    if not baseline or not candidate:
+        print(f"Need runs in both sets (baseline {len(baseline)}, candidate {len(candidate)})")
+        sys.exit(2)
+    results = compare(baseline, candidate, args.resamples, args.confidence, args.alpha, args.seed)
+    base_label = _label(baseline, args.baseline_firmware, "baseline")
+    cand_label = _label(candidate, args.candidate_firmware, "candidate")
+    print_verdicts(results, base_label, cand_label)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"baseline": base_label, "candidate": cand_label, "metrics": results}, f, indent=2)
+        print(f"\nVerdicts saved to {args.json}")
+    regressions = [name for name, result in results.items() if result["verdict"] == "REGRESS"]
+    if regressions:
+        print(f"\nREGRESS: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
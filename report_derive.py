@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+"""
+Derive the detailed report sections from a stored run
+
+Fills the test_results_detailed.json sections (statistics, time_series,
+latency_distribution, sequence_analysis and the packet-flow counts of the
+Sankey chart) from what a run actually recorded, instead of generated
+numbers:
+
+- the run's captures, read once as one time-merged stream: frames and
+  sequence errors per path, first copies of each R-TAG sequence (what
+  elimination passes), untagged frames leaving the receiver, and one-way
+  latency from the send time iperf3 writes into every UDP payload
+- the counter time series (a rollup_store.py file): per-second passed,
+  discarded and lost frames and, when sampled, board CPU and memory
+  and the receiver ports' CRC errors
+- the generator log (iperf3 -J output or a traffic_profile.py result):
+  frames sent, per-interval bit rate and jitter
+- the run's FRER counter snapshots (frer_initial/frer_final) for totals
+
+Values the run has no source for are None. Latency samples for the
+histogram are a fixed-size uniform reservoir; the latency statistics use
+every frame.
+
+Usage:
+    python3 report_derive.py test_results.json [--json derived.json]
+    python3 report_derive.py run.json --capture /tmp/run000_merged.pcapng --counters /tmp/run000_counters.json
+"""
+
+import argparse
+import json
+import os
+import random
+import struct
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from capture_analysis import MATCH_WINDOW_NS
+from frer_counters import DEFAULT_STREAMS, elimination_rate
+from pcap_merge import merge_captures
+from rtag_frames import (ETHERTYPE_OFFSET, INNER_ETHERTYPE_OFFSET, IP_OFFSET, RTAG_ETHERTYPE,
+                         SEQ_OFFSET, SequenceTracker)
+
+# Sender-side captures: untagged frames there are counted as transmitted
+INGRESS = ("enp2s0",)
+IPERF_PORT = 5001
+LATENCY_SAMPLES = 10000
+SEQUENCE_SAMPLES = 1000
+MAX_POINTS = 600
+MAX_LATENCY_NS = 10_000_000_000
+FCS_BYTES = 4
+FRAME_BYTES = 1514
+TEST_TYPE = "IEEE 802.1CB FRER Conformance Test"
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+NS = 1_000_000_000
+
+_U16 = struct.Struct('!H').unpack_from
+_STAMP = struct.Struct('!II').unpack_from
+
+
+def _member_streams(streams=DEFAULT_STREAMS):
+    """{stream name: path interface} of the member streams ("frer ms eth1 28 --cnt")"""
+    return {name: cmd.split()[2] for name, cmd in streams if cmd.split()[1] == "ms"}
+
+
+class _Output:
+    """Frames leaving the FRER network: counts, per-second bytes and latency"""
+
+    def __init__(self, rng):
+        self.frames = 0
+        self.bytes = 0
+        self.sizes = Counter()
+        self.first_ts = None
+        self.last_ts = None
+        # second -> [bytes, latency sum (ns), latency count]
+        self.bins = {}
+        self.latency_count = 0
+        self.latency_sum = 0
+        self.latency_min = None
+        self.latency_max = None
+        # RFC 3550 interarrival jitter of the latency sequence
+        self.jitter_ns = 0.0
+        self._last_latency = None
+        self.samples = []
+        self._rng = rng
+
+    def add(self, ts, orig_len, latency):
+        self.frames += 1
+        self.bytes += orig_len
+        self.sizes[orig_len] += 1
+        if self.first_ts is None:
+            self.first_ts = ts
+        self.last_ts = ts
+        second = ts // NS
+        entry = self.bins.get(second)
+        if entry is None:
+            entry = self.bins[second] = [0, 0, 0]
+        entry[0] += orig_len
+        if latency is None:
+            return
+        entry[1] += latency
+        entry[2] += 1
+        self.latency_count += 1
+        self.latency_sum += latency
+        if self.latency_min is None or latency < self.latency_min:
+            self.latency_min = latency
+        if self.latency_max is None or latency > self.latency_max:
+            self.latency_max = latency
+        if self._last_latency is not None:
+            self.jitter_ns += (abs(latency - self._last_latency) - self.jitter_ns) / 16
+        self._last_latency = latency
+        if len(self.samples) < LATENCY_SAMPLES:
+            self.samples.append(latency)
+        else:
+            slot = self._rng.randrange(self.latency_count)
+            if slot < LATENCY_SAMPLES:
+                self.samples[slot] = latency
+
+
+class RunDeriver:
+    """Folds one run's captures, counter series and generator log into report sections"""
+
+    def __init__(self, ingress=INGRESS, iperf_port=IPERF_PORT, window_ns=MATCH_WINDOW_NS, seed=0):
+        self.ingress = set(ingress)
+        self.iperf_port = iperf_port
+        self.window_ns = window_ns
+        rng = random.Random(seed)
+        self.egress = _Output(rng)
+        self.first = _Output(rng)
+        self.ingress_frames = 0
+        self.first_ts = None
+        self.last_ts = None
+        # path interface -> [frames, bytes, SequenceTracker]
+        self.paths = {}
+        self.copies = 0
+        self.first_tracker = SequenceTracker()
+        # second -> [duplicate copies, change of sequence gaps, first copies]
+        self.path_bins = {}
+        self.sequences = []
+        self._duplicate_times = {}
+        self._seen = {}
+        # metric -> {second: delta or mean}
+        self.counter_bins = {}
+        self.counter_totals = {}
+        self.generator = {}
+        self.snapshots = ({}, {})
+
+    # --- captures -----------------------------------------------------------
+
+    def add_frame(self, source, pkt):
+        data, ts = pkt.data, pkt.ts_ns
+        if len(data) < 14:
+            return
+        if self.first_ts is None:
+            self.first_ts = ts
+        self.last_ts = ts
+        ethertype = _U16(data, ETHERTYPE_OFFSET)[0]
+        seq = None
+        if ethertype == RTAG_ETHERTYPE and len(data) >= IP_OFFSET:
+            seq = _U16(data, SEQ_OFFSET)[0]
+            ethertype = _U16(data, INNER_ETHERTYPE_OFFSET)[0]
+            ip = IP_OFFSET
+        elif ethertype == ETHERTYPE_VLAN and len(data) >= 18:
+            ethertype = _U16(data, 16)[0]
+            ip = 18
+        else:
+            ip = 14
+        if seq is not None:
+            latency = self._latency(data, ip, ts) if ethertype == ETHERTYPE_IPV4 else None
+            self._path_frame(source, ts, seq, pkt.orig_len, latency)
+        elif source in self.ingress:
+            self.ingress_frames += 1
+        elif ethertype == ETHERTYPE_IPV4:
+            self.egress.add(ts, pkt.orig_len, self._latency(data, ip, ts))
+
+    def _latency(self, data, ip, ts):
+        """Capture time minus the iperf3 send time in the UDP payload, or None"""
+        if len(data) < ip + 20 or data[ip] >> 4 != 4 or data[ip + 9] != 17:
+            return None
+        udp = ip + (data[ip] & 0xf) * 4
+        if len(data) < udp + 16 or _U16(data, udp + 2)[0] != self.iperf_port:
+            return None
+        sec, usec = _STAMP(data, udp + 8)
+        latency = ts - sec * NS - usec * 1000
+        return latency if 0 <= latency < MAX_LATENCY_NS else None
+
+    def _path_frame(self, source, ts, seq, orig_len, latency):
+        path = self.paths.get(source)
+        if path is None:
+            path = self.paths[source] = [0, 0, SequenceTracker()]
+        path[0] += 1
+        path[1] += orig_len
+        path[2].update(seq)
+        second = ts // NS
+        entry = self.path_bins.get(second)
+        if entry is None:
+            entry = self.path_bins[second] = [0, 0, 0]
+
+        previous = self._seen.get(seq)
+        if previous is not None and ts - previous < self.window_ns:
+            # Another copy of a sequence already passed: eliminated
+            self.copies += 1
+            entry[0] += 1
+            times = self._duplicate_times.get(seq)
+            if times is not None and source not in times:
+                times[source] = ts
+            return
+        self._seen[seq] = ts
+        entry[2] += 1
+        self.first.add(ts, orig_len, latency)
+        gaps = self.first_tracker.gaps
+        self.first_tracker.update(seq)
+        entry[1] += self.first_tracker.gaps - gaps
+        if len(self.sequences) < SEQUENCE_SAMPLES:
+            self.sequences.append(seq)
+            self._duplicate_times[seq] = {source: ts}
+
+    def add_captures(self, paths):
+        """One time-ordered pass over all capture files"""
+        for source, pkt in merge_captures(paths):
+            self.add_frame(source, pkt)
+
+    # --- counters and generator -------------------------------------------
+
+    def add_counters(self, store):
+        """Per-second counter deltas (board metrics: means) from a RollupStore"""
+        start, end = store.span()
+        if start is None:
+            return
+        for metric in store.metrics():
+            column = "mean" if metric.startswith("board.") else "delta"
+            result = store.query(metric, start, end + 1, max_points=float("inf"))
+            bins = self.counter_bins[metric] = {}
+            for bucket, value in zip(result["timestamps"], result[column]):
+                bins[int(bucket)] = bins.get(int(bucket), 0) + value
+            if column == "delta":
+                self.counter_totals[metric] = int(sum(result["delta"]))
+
+    def add_generator(self, log):
+        """iperf3 -J output or a traffic_profile.py result"""
+        if "intervals" in log:
+            start = log.get("start", {}).get("timestamp", {}).get("timesecs")
+            rates = {}
+            if start is not None:
+                for interval in log["intervals"]:
+                    summary = interval.get("sum", {})
+                    rates[int(start + summary.get("start", 0))] = summary.get("bits_per_second")
+            summary = log.get("end", {}).get("sum", {})
+            self.generator = {"sent": summary.get("packets"), "lost": summary.get("lost_packets"),
+                              "jitter_ms": summary.get("jitter_ms"), "rates": rates}
+        elif "report" in log:
+            flows = log["report"].get("flows", [])
+            self.generator = {"sent": sum(flow["sent"] for flow in flows), "rates": {}}
+
+    def add_snapshots(self, initial, final):
+        self.snapshots = (initial or {}, final or {})
+
+    # --- sections -----------------------------------------------------------
+
+    def _stream_totals(self, stream):
+        """Counter deltas of one stream over the run: snapshots, else the series"""
+        initial, final = self.snapshots
+        prefix = f"{stream}_"
+        totals = {key[len(prefix):]: value - initial.get(key, 0)
+                  for key, value in final.items() if key.startswith(prefix)}
+        if totals:
+            return totals
+        prefix = f"{stream}."
+        return {metric[len(prefix):]: total for metric, total in self.counter_totals.items()
+                if metric.startswith(prefix)}
+
+    def _output(self):
+        return self.egress if self.egress.frames else self.first
+
+    def _frame_bytes(self):
+        sizes = self._output().sizes
+        return sizes.most_common(1)[0][0] if sizes else None
+
+    def _duration(self, run):
+        if run.get("test_duration"):
+            return float(run["test_duration"])
+        if self.first_ts is not None and self.last_ts > self.first_ts:
+            return (self.last_ts - self.first_ts) / NS
+        return None
+
+    def statistics(self, run):
+        output = self._output()
+        duration = self._duration(run)
+        cs = self._stream_totals("cs0")
+        if cs:
+            passed, discarded = cs.get("PassedPackets", 0), cs.get("DiscardedPackets", 0)
+            compound = {
+                "passed_packets": passed,
+                "discarded_packets": discarded,
+                "lost_packets": cs.get("LostPackets"),
+                "out_of_order_packets": cs.get("OutOfOrderPackets"),
+                "rogue_packets": cs.get("RoguePackets"),
+                "tagless_packets": cs.get("TaglessPackets"),
+                "resets": cs.get("Resets"),
+            }
+        else:
+            # No counters: what the captured paths show
+            passed, discarded = self.first.frames, self.copies
+            compound = {
+                "passed_packets": passed,
+                "discarded_packets": discarded,
+                "lost_packets": self.first_tracker.gaps if self.paths else None,
+                "out_of_order_packets": self.first_tracker.out_of_order if self.paths else None,
+                "rogue_packets": None,
+                "tagless_packets": None,
+                "resets": None,
+            }
+        compound["elimination_rate"] = round(elimination_rate(passed, discarded), 4)
+
+        transmitted = self.generator.get("sent") or self.ingress_frames or None
+        if transmitted is None and (cs or self.paths):
+            transmitted = passed + (compound["lost_packets"] or 0)
+        sender = {
+            "total_transmitted": transmitted,
+            "duplication_rate": round(100.0 * self.copies / self.first.frames, 4) if self.first.frames else None,
+            "vcap_hits": None,
+            "generation_errors": None,
+        }
+        receiver = {"compound_stream_0": compound}
+        path_names = sorted(self.paths)
+        for index, (stream, iface) in enumerate(sorted(_member_streams().items(), key=lambda s: s[1])):
+            path = self.paths.get(iface) or (self.paths[path_names[index]] if index < len(path_names) else None)
+            # FRER generation replicates every frame onto each path
+            sender[f"{iface}_transmitted"] = path[0] if path else transmitted
+            ms = self._stream_totals(stream)
+            if ms:
+                received = ms.get("PassedPackets", 0) + ms.get("DiscardedPackets", 0)
+                errors = ms.get("OutOfOrderPackets", 0) + ms.get("LostPackets", 0)
+            elif path:
+                received = path[0]
+                errors = path[2].gaps + path[2].out_of_order
+            else:
+                received = errors = None
+            # link_counters.py metrics of the receiving port, when the run sampled them
+            crc = self.counter_totals.get(f"link.receiver.{iface}.rx_crc_errors")
+            receiver[f"member_stream_{iface}"] = {"received": received, "sequence_errors": errors,
+                                                   "crc_errors": crc}
+
+        if output.bytes and output.last_ts > output.first_ts:
+            throughput = output.bytes * 8 / ((output.last_ts - output.first_ts) / NS) / 1e6
+        elif cs and duration:
+            throughput = passed * (self._frame_bytes() or FRAME_BYTES) * 8 / duration / 1e6
+        elif self.generator.get("rates"):
+            rates = [r for r in self.generator["rates"].values() if r is not None]
+            throughput = sum(rates) / len(rates) / 1e6 if rates else None
+        else:
+            throughput = None
+        latency = output.latency_count
+        if latency:
+            jitter = output.jitter_ns / 1e6
+        else:
+            jitter = self.generator.get("jitter_ms")
+        cpu = self.counter_bins.get("board.cpu_percent")
+        memory = self.counter_bins.get("board.memory_used_mb")
+
+        if self.first_ts is not None:
+            start, end = self.first_ts / NS, self.last_ts / NS
+        elif run.get("timestamp") and duration:
+            end = datetime.fromisoformat(run["timestamp"]).timestamp()
+            start = end - duration
+        else:
+            start = end = None
+        frame_bytes = self._frame_bytes()
+        return {
+            "test_info": {
+                "start_time": datetime.fromtimestamp(start).strftime("%Y-%m-%d %H:%M:%S") if start else None,
+                "end_time": datetime.fromtimestamp(end).strftime("%Y-%m-%d %H:%M:%S") if end else None,
+                "duration_seconds": duration,
+                "packet_rate_pps": round(transmitted / duration, 1) if transmitted and duration else None,
+                "frame_size_bytes": frame_bytes + FCS_BYTES if frame_bytes else None,
+                "test_type": TEST_TYPE,
+            },
+            "sender_stats": sender,
+            "receiver_stats": receiver,
+            "performance_metrics": {
+                "average_latency_ms": output.latency_sum / latency / 1e6 if latency else None,
+                "min_latency_ms": output.latency_min / 1e6 if latency else None,
+                "max_latency_ms": output.latency_max / 1e6 if latency else None,
+                "jitter_ms": jitter,
+                "throughput_mbps": round(throughput, 3) if throughput is not None else None,
+                "cpu_usage_percent": sum(cpu.values()) / len(cpu) if cpu else None,
+                "memory_usage_mb": sum(memory.values()) / len(memory) if memory else None,
+            },
+        }
+
+    def time_series(self):
+        output = self._output()
+        counters, generator = self.counter_bins, self.generator.get("rates", {})
+        seconds = set(output.bins) | set(self.path_bins) | set(generator)
+        for bins in counters.values():
+            seconds |= set(bins)
+        series = {key: [] for key in ("timestamps", "throughput_mbps", "latency_ms", "packet_loss",
+                                      "elimination_rate_percent", "cpu_usage_percent", "memory_usage_mb")}
+        if not seconds:
+            return series
+        first, last = min(seconds), max(seconds)
+        step = -(-(last - first + 1) // MAX_POINTS)
+        frame_bytes = self._frame_bytes() or FRAME_BYTES
+
+        def total(bins, start, index=None):
+            values = [bins.get(s) for s in range(start, start + step)]
+            values = [v if index is None else v[index] for v in values if v is not None]
+            return sum(values) if values else None
+
+        def mean(bins, start):
+            values = [bins[s] for s in range(start, start + step) if s in bins]
+            return sum(values) / len(values) if values else None
+
+        for start in range(first, last + 1, step):
+            series["timestamps"].append(datetime.fromtimestamp(start).isoformat())
+            passed = total(counters.get("cs0.PassedPackets", {}), start)
+            if output.frames:
+                throughput = (total(output.bins, start, 0) or 0) * 8 / step / 1e6
+            elif passed is not None:
+                throughput = passed * frame_bytes * 8 / step / 1e6
+            else:
+                throughput = mean(generator, start)
+                throughput = throughput / 1e6 if throughput is not None else None
+            series["throughput_mbps"].append(throughput)
+            count = total(output.bins, start, 2)
+            series["latency_ms"].append(total(output.bins, start, 1) / count / 1e6 if count else None)
+            if "cs0.LostPackets" in counters:
+                series["packet_loss"].append(int(total(counters["cs0.LostPackets"], start) or 0))
+            elif self.paths:
+                series["packet_loss"].append(max(0, total(self.path_bins, start, 1) or 0))
+            else:
+                series["packet_loss"].append(None)
+            if passed is not None:
+                discarded = total(counters.get("cs0.DiscardedPackets", {}), start) or 0
+                rate = elimination_rate(passed, discarded) if passed else None
+            else:
+                firsts = total(self.path_bins, start, 2)
+                copies = total(self.path_bins, start, 0)
+                rate = elimination_rate(firsts, copies or 0) if firsts else None
+            series["elimination_rate_percent"].append(rate)
+            series["cpu_usage_percent"].append(mean(counters.get("board.cpu_percent", {}), start))
+            series["memory_usage_mb"].append(mean(counters.get("board.memory_used_mb", {}), start))
+        return series
+
+    def latency_distribution(self):
+        return [round(latency / 1e6, 6) for latency in self._output().samples]
+
+    def sequence_analysis(self):
+        paths = sorted(self.paths)
+        duplicate_times = []
+        if len(paths) >= 2 and self.first_ts is not None:
+            first, second = paths[:2]
+            for seq in self.sequences:
+                times = self._duplicate_times.get(seq, {})
+                if first in times and second in times:
+                    duplicate_times.append({"sequence": seq,
+                                            "path1_time": (times[first] - self.first_ts) / NS,
+                                            "path2_time": (times[second] - self.first_ts) / NS})
+        return {
+            "sequences": list(self.sequences),
+            "duplicate_times": duplicate_times,
+            "paths": {name: self.paths[name][2].as_dict() for name in paths},
+        }
+
+    def test_scenarios(self, statistics):
+        compound = statistics["receiver_stats"]["compound_stream_0"]
+        lost = compound["lost_packets"]
+        return [{
+            "name": "Normal Operation",
+            "duration": statistics["test_info"]["duration_seconds"],
+            "result": "PASS" if not lost and compound["passed_packets"] else "FAIL",
+            "packets_sent": statistics["sender_stats"]["total_transmitted"],
+            "packets_received": compound["passed_packets"],
+            "duplicates_eliminated": compound["discarded_packets"],
+        }]
+
+    def sections(self, run):
+        statistics = self.statistics(run)
+        return {
+            "statistics": statistics,
+            "time_series": self.time_series(),
+            "latency_distribution": self.latency_distribution(),
+            "sequence_analysis": self.sequence_analysis(),
+            "test_scenarios": self.test_scenarios(statistics),
+        }
+
+
+def run_artifacts(run_path):
+    """Files a stored run points to: {"captures", "counters", "generator"}
+
+    Paths are pathlib.Path, so report_pipeline fingerprints the files
+    themselves. The merged capture is preferred over the per-interface
+    ones; missing files are left out (None).
+    """
+    with open(run_path) as f:
+        run = json.load(f)
+    merged = run.get("merged_capture")
+    if merged and os.path.exists(merged):
+        captures = [Path(merged)]
+    else:
+        captures = [Path(path) for path in (run.get("capture_files") or {}).values() if os.path.exists(path)]
+
+    def existing(key):
+        path = run.get(key)
+        return Path(path) if path and os.path.exists(path) else None
+
+    return {"captures": captures, "counters": existing("counter_series"),
+            "generator": existing("generator_log")}
+
+
+def derive_run(run, artifacts=None, ingress=INGRESS, iperf_port=IPERF_PORT):
+    """Report sections of a stored run (run JSON path) in one pass over its files"""
+    from rollup_store import RollupStore
+
+    with open(run) as f:
+        data = json.load(f)
+    artifacts = artifacts or run_artifacts(run)
+    deriver = RunDeriver(ingress, iperf_port)
+    deriver.add_snapshots(data.get("frer_initial"), data.get("frer_final"))
+    if artifacts.get("counters"):
+        deriver.add_counters(RollupStore.load(artifacts["counters"]))
+    if artifacts.get("generator"):
+        with open(artifacts["generator"]) as f:
+            deriver.add_generator(json.load(f))
+    elif data.get("traffic_stats"):
+        traffic = data["traffic_stats"]
+        deriver.generator = {"sent": traffic.get("sent_packets"), "lost": traffic.get("lost_packets"),
+                             "jitter_ms": traffic.get("jitter_ms"), "rates": {}}
+    if artifacts.get("captures"):
+        deriver.add_captures([os.fspath(path) for path in artifacts["captures"]])
+    return deriver.sections(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Derive report sections from a stored run")
+    parser.add_argument("run", help="run JSON written by test_traffic.py")
+    parser.add_argument("--capture", action="append", help="capture file (default: the run's)")
+    parser.add_argument("--counters", help="rollup_store file (default: the run's)")
+    parser.add_argument("--generator", help="iperf3 -J or traffic_profile result (default: the run's)")
+    parser.add_argument("--ingress", action="append", help=f"sender-side interface (default {INGRESS[0]})")
+    parser.add_argument("--iperf-port", type=int, default=IPERF_PORT)
+    parser.add_argument("--json", help="write the sections to this file")
+    args = parser.parse_args()
+
+    artifacts = run_artifacts(args.run)
+    if args.capture:
+        artifacts["captures"] = [Path(path) for path in args.capture]
+    if args.counters:
+        artifacts["counters"] = Path(args.counters)
+    if args.generator:
+        artifacts["generator"] = Path(args.generator)
+    sections = derive_run(args.run, artifacts, tuple(args.ingress or INGRESS), args.iperf_port)
+
+    stats = sections["statistics"]
+    compound = stats["receiver_stats"]["compound_stream_0"]
+    performance = stats["performance_metrics"]
+    print(f"Captures: {', '.join(map(str, artifacts['captures'])) or 'none'}")
+    print(f"Counters: {artifacts['counters'] or 'snapshots only'}   Generator: {artifacts['generator'] or 'run summary'}")
+    print(f"Transmitted {stats['sender_stats']['total_transmitted']}, passed {compound['passed_packets']}, "
+          f"discarded {compound['discarded_packets']}, lost {compound['lost_packets']} "
+          f"(elimination {compound['elimination_rate']:.2f}%)")
+    if performance["average_latency_ms"] is not None:
+        print(f"Latency {performance['average_latency_ms']:.3f} ms mean "
+              f"({performance['min_latency_ms']:.3f}-{performance['max_latency_ms']:.3f}), "
+              f"jitter {performance['jitter_ms']:.3f} ms, {len(sections['latency_distribution'])} samples")
+    print(f"Time series: {len(sections['time_series']['timestamps'])} points")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(sections, f, indent=2)
+        print(f"Sections saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
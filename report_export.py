@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Compact single-file HTML report for plotly figures
+
+fig.write_html embeds the whole plotly.js bundle (~3.5 MB) and every data
+point as JSON text in each chart file. This exporter writes one page for
+all figures instead:
+
+- plotly.js is referenced once, as a shared asset next to the report (or a
+  CDN URL), never inlined
+- numeric arrays are packed as base64 typed arrays ({"dtype", "bdata"}),
+  float32 where the rounding is far below a pixel
+- histogram traces are binned here, so the page gets bin counts rather
+  than every sample
+- layout templates shared by several figures are stored once
+- each section's figure sits in its own JSON block and is only parsed and
+  plotted when the section scrolls into view
+
+Usage:
+    python3 report_export.py [test_results_detailed.json] [docs/report.html]
+"""
+
+import argparse
+import base64
+import html
+import json
+import os
+from datetime import date, datetime
+
+import numpy as np
+
+PLOTLY_ASSET = "plotly.min.js"
+PLOTLY_CDN = "https://cdn.plot.ly/plotly-2.35.2.min.js"
+# Shorter numeric arrays stay plain JSON
+PACK_MIN_LENGTH = 32
+DEFAULT_BINS = 50
+
+_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="{plotly_src}"></script>
+<style>
+body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; margin: 0; background: #f5f6fa; }}
+header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 24px 40px; }}
+section {{ background: white; margin: 24px 40px; padding: 16px 24px; border-radius: 8px; box-shadow: 0 2px 8px rgba(0,0,0,0.08); }}
+nav a {{ color: white; margin-right: 16px; }}
+</style>
+</head>
+<body>
+<header><h1>{title}</h1><nav>{nav}</nav></header>
+{sections}
+<script type="application/json" id="templates">{templates}</script>
+{blocks}
+<script>
+const DTYPES = {{i1: Int8Array, u1: Uint8Array, i2: Int16Array, u2: Uint16Array,
+                i4: Int32Array, u4: Uint32Array, f4: Float32Array, f8: Float64Array}};
+let templates = null;
+function unpack(value) {{
+  if (Array.isArray(value)) return value.map(unpack);
+  if (value && typeof value === 'object') {{
+    if (value.bdata !== undefined && value.dtype in DTYPES) {{
+      const raw = atob(value.bdata), bytes = new Uint8Array(raw.length);
+      for (let i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+      return new DTYPES[value.dtype](bytes.buffer);
+    }}
+    for (const key in value) value[key] = unpack(value[key]);
+  }}
+  return value;
+}}
+function render(el) {{
+  const fig = unpack(JSON.parse(document.getElementById(el.dataset.src).textContent));
+  if (fig.layout && fig.layout.template && fig.layout.template.ref !== undefined) {{
+    templates = templates || JSON.parse(document.getElementById('templates').textContent);
+    fig.layout.template = templates[fig.layout.template.ref];
+  }}
+  Plotly.newPlot(el, fig.data, fig.layout, {{responsive: true}});
+}}
+const observer = new IntersectionObserver(entries => entries.forEach(entry => {{
+  if (entry.isIntersecting) {{ observer.unobserve(entry.target); render(entry.target); }}
+}}), {{rootMargin: '300px'}});
+document.querySelectorAll('.plot').forEach(el => observer.observe(el));
+</script>
+</body>
+</html>
+"""
+
+
+def figure_dict(fig):
+    """Plain {data, layout} dict of a plotly Figure or figure dict"""
+    if hasattr(fig, "to_plotly_json"):
+        fig = fig.to_plotly_json()
+    return {"data": list(fig.get("data", [])), "layout": dict(fig.get("layout", {}))}
+
+
+def _numeric_array(value):
+    """value as a 1-D numeric ndarray, or None if it is not one"""
+    if isinstance(value, np.ndarray):
+        array = value
+    elif isinstance(value, (list, tuple)) and value and all(
+            isinstance(v, (int, float)) and not isinstance(v, bool) for v in value):
+        array = np.asarray(value)
+    else:
+        return None
+    if array.ndim != 1 or array.dtype.kind not in "iuf":
+        return None
+    return array
+
+
+def pack_array(array):
+    """{"dtype", "bdata"} for a numeric array, in the narrowest lossless type"""
+    if array.dtype.kind in "iu":
+        low, high = (int(array.min()), int(array.max())) if array.size else (0, 0)
+        for dtype in ("i1", "u1", "i2", "u2", "i4", "u4"):
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                break
+        else:
+            dtype = "f8"
+    else:
+        # float32 when the rounding stays far below a pixel of the data's span
+        finite = array[np.isfinite(array)]
+        error = np.abs(finite.astype("<f4").astype(np.float64) - finite)
+        span = float(np.ptp(finite)) if finite.size else 0.0
+        dtype = "f4" if not error.size or error.max() <= 1e-6 * span else "f8"
+    return {"dtype": dtype, "bdata": base64.b64encode(array.astype("<" + dtype).tobytes()).decode()}
+
+
+def pack_arrays(value, min_length=PACK_MIN_LENGTH):
+    """Copy of a figure structure with long numeric arrays packed"""
+    if isinstance(value, dict):
+        return {key: pack_arrays(item, min_length) for key, item in value.items()}
+    array = _numeric_array(value)
+    if array is not None and len(array) >= min_length:
+        return pack_array(array)
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [pack_arrays(item, min_length) for item in value]
+    return value
+
+
+def prebin_histograms(fig, bins=DEFAULT_BINS):
+    """Replace 1-D histogram traces with bar traces of their bin counts"""
+    data = []
+    for trace in fig["data"]:
+        trace = dict(trace)
+        samples = _numeric_array(trace.get("x"))
+        if trace.get("type") != "histogram" or samples is None or "y" in trace:
+            data.append(trace)
+            continue
+        counts, edges = np.histogram(samples[np.isfinite(samples)], bins=trace.pop("nbinsx", bins))
+        for key in ("x", "xbins", "autobinx", "histfunc", "histnorm", "cumulative", "bingroup"):
+            trace.pop(key, None)
+        trace.update(type="bar", x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges))
+        data.append(trace)
+    return {"data": data, "layout": fig["layout"]}
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _dumps(value):
+    # '</' inside a script block would end it early
+    return json.dumps(value, separators=(",", ":"), default=_json_default).replace("</", "<\\/")
+
+
+def write_plotly_asset(directory):
+    """Write plotly.js next to the report once; returns its script src
+
+    Falls back to the CDN when the plotly package is not installed.
+    """
+    path = os.path.join(directory, PLOTLY_ASSET)
+    if not os.path.exists(path):
+        try:
+            from plotly.offline import get_plotlyjs
+        except ImportError:
+            return PLOTLY_CDN
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(get_plotlyjs())
+    return PLOTLY_ASSET
+
+
+def export_report(figures, path, title="FRER Test Report", plotly_src=None, bins=DEFAULT_BINS):
+    """Write figures {name: figure} as one lazily rendered HTML page
+
+    plotly_src is the script URL; by default plotly.js is written once as
+    a shared asset next to the report. Returns the report size in bytes.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    if plotly_src is None:
+        plotly_src = write_plotly_asset(directory)
+
+    templates, template_refs = [], {}
+    nav, sections, blocks = [], [], []
+    for name, fig in figures.items():
+        fig = prebin_histograms(figure_dict(fig), bins)
+        layout = fig["layout"] = dict(fig["layout"])
+        template = layout.get("template")
+        if template is not None:
+            key = _dumps(template)
+            if key not in template_refs:
+                template_refs[key] = len(templates)
+                templates.append(template)
+            layout["template"] = {"ref": template_refs[key]}
+        heading = layout.get("title")
+        heading = heading.get("text") if isinstance(heading, dict) else heading
+        heading = html.escape(heading or name.replace("_", " ").title())
+        height = layout.get("height") or 450
+        nav.append(f'<a href="#section-{name}">{heading}</a>')
+        sections.append(f'<section id="section-{name}"><div class="plot" data-src="figure-{name}" '
+                        f'style="height:{height}px"></div></section>')
+        blocks.append(f'<script type="application/json" id="figure-{name}">'
+                      f'{_dumps(pack_arrays(fig))}</script>')
+
+    page = _PAGE.format(title=html.escape(title), plotly_src=html.escape(plotly_src), nav=" ".join(nav),
+                        sections="\n".join(sections), templates=_dumps(templates), blocks="\n".join(blocks))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(page)
+    return len(page.encode())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact single-page HTML report of all charts")
+    parser.add_argument("source", nargs="?", default="test_results_detailed.json")
+    parser.add_argument("output", nargs="?", default="docs/report.html")
+    args = parser.parse_args(argv)
+
+    import create_visualizations
+
+    create_visualizations.load_data(args.source)
+    create_visualizations.save_all_charts(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Incremental report builder with memoized sections
+
+Each section declares the inputs it reads (pipeline inputs or other
+sections). A section's cache key is a fingerprint of its name, version and
+input fingerprints, so it is recomputed only when one of its inputs changes.
+Sections can also map over a list input (e.g. one entry per historical run);
+those are cached per item, so adding a run computes only that run's entry
+plus the sections that aggregate over the list.
+
+File inputs (pathlib.Path) are fingerprinted by path, size and mtime rather
+than content, so hundreds of stored runs are checked without reading them.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = '.report_cache'
+
+
+def _encode_default(value):
+    """JSON fallback used for fingerprinting"""
+    if isinstance(value, os.PathLike):
+        path = os.fspath(value)
+        try:
+            st = os.stat(path)
+            return ['file', path, st.st_size, st.st_mtime_ns]
+        except OSError:
+            return ['file', path, None, None]
+    if hasattr(value, 'tobytes'):
+        return ['array', hashlib.sha1(value.tobytes()).hexdigest()]
+    return str(value)
+
+
+def fingerprint(value):
+    """Stable hex fingerprint of a JSON-like value"""
+    encoded = json.dumps(value, sort_keys=True, default=_encode_default, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+class Section:
+    """One report section: a compute function and the inputs it reads"""
+
+    def __init__(self, name, compute, inputs=(), per_item=None, version=1):
+        self.name = name
+        self.compute = compute
+        self.inputs = tuple(inputs)
+        self.per_item = per_item
+        self.version = version
+        if per_item is not None and per_item not in self.inputs:
+            self.inputs = (per_item,) + self.inputs
+
+
+class ReportPipeline:
+    """Ordered set of memoized sections backed by an on-disk JSON cache"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.sections = {}
+        self.keys = {}
+        self.computed = []
+        self.reused = []
+        self._memory = {}
+
+    def add_section(self, name, compute, inputs=(), per_item=None, version=1):
+        """Register a section; per_item names a list input to map compute over"""
+        for dep in inputs:
+            if dep == name:
+                raise ValueError(f"Section {name} cannot depend on itself")
+        self.sections[name] = Section(name, compute, inputs, per_item, version)
+
+    def section(self, name, inputs=(), per_item=None, version=1):
+        """Decorator form of add_section"""
+        def register(compute):
+            self.add_section(name, compute, inputs, per_item, version)
+            return compute
+        return register
+
+    def _cache_path(self, name, key):
+        return os.path.join(self.cache_dir, name, f"{key}.json")
+
+    def _load(self, name, key):
+        if (name, key) in self._memory:
+            return True, self._memory[(name, key)]
+        if self.cache_dir:
+            try:
+                with open(self._cache_path(name, key)) as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                return False, None
+            self._memory[(name, key)] = value
+            return True, value
+        return False, None
+
+    def _store(self, name, key, value):
+        self._memory[(name, key)] = value
+        if not self.cache_dir:
+            return
+        path = self._cache_path(name, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(value, f, default=str)
+        os.replace(tmp, path)
+
+    def _memoized(self, label, name, key, compute):
+        found, value = self._load(name, key)
+        if found:
+            self.reused.append(label)
+            return value
+        value = compute()
+        # Round-trip through JSON so cached and fresh results look the same
+        value = json.loads(json.dumps(value, default=str))
+        self._store(name, key, value)
+        self.computed.append(label)
+        return value
+
+    def _order(self, wanted):
+        order, seen = [], set()
+
+        def visit(name, stack):
+            if name in seen or name not in self.sections:
+                return
+            if name in stack:
+                raise ValueError(f"Section dependency cycle at {name}")
+            for dep in self.sections[name].inputs:
+                visit(dep, stack + (name,))
+            seen.add(name)
+            order.append(name)
+
+        for name in wanted:
+            visit(name, ())
+        return order
+
+    def build(self, inputs, sections=None):
+        """Build the requested sections (all by default) and return their values"""
+        self.computed, self.reused = [], []
+        values = dict(inputs)
+        keys = {name: fingerprint(value) for name, value in inputs.items()}
+
+        for name in self._order(sections or list(self.sections)):
+            section = self.sections[name]
+            missing = [dep for dep in section.inputs if dep not in values]
+            if missing:
+                raise KeyError(f"Section {name} is missing inputs: {', '.join(missing)}")
+            others = [dep for dep in section.inputs if dep != section.per_item]
+            base = [name, section.version] + [keys[dep] for dep in others]
+            kwargs = {dep: values[dep] for dep in others}
+
+            if section.per_item is None:
+                key = fingerprint(base)
+                values[name] = self._memoized(name, name, key,
+                                              lambda: section.compute(**kwargs))
+            else:
+                items = values[section.per_item]
+                item_keys = [fingerprint(base + [fingerprint(item)]) for item in items]
+                values[name] = [
+                    self._memoized(f"{name}[{index}]", name, item_key,
+                                   lambda item=item: section.compute(item, **kwargs))
+                    for index, (item, item_key) in enumerate(zip(items, item_keys))
+                ]
+                key = fingerprint(base + item_keys)
+            keys[name] = key
+
+        self.keys = keys
+        return {name: values[name] for name in self.sections if name in values}
+
+
+def write_if_changed(path, key, render, manifest_dir=DEFAULT_CACHE_DIR):
+    """Write an artifact only when its source fingerprint changed
+
+    render() produces the file content and is not called for unchanged
+    artifacts. Returns True if the file was written.
+    """
+    manifest_path = os.path.join(manifest_dir, 'artifacts.json')
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    if manifest.get(path) == key and os.path.exists(path):
+        return False
+
+    content = render()
+    mode = 'wb' if isinstance(content, bytes) else 'w'
+    with open(path, mode) as f:
+        f.write(content)
+
+    manifest[path] = key
+    os.makedirs(manifest_dir, exist_ok=True)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return True
+
+
+def run_firmware(data):
+    """Firmware version recorded in a run's test_configuration, if any"""
+    config = data.get('test_configuration') or {}
+    for board in ('receiver_board', 'sender_board'):
+        firmware = (config.get(board) or {}).get('firmware')
+        if firmware:
+            return firmware
+    return config.get('firmware')
+
+
+def summarize_run(run):
+    """Per-run FRER summary from a test_results.json produced by test_traffic"""
+    with open(run) as f:
+        data = json.load(f)
+    initial = data.get('frer_initial') or {}
+    final = data.get('frer_final') or {}
+    # Journaled runs carry totals that survive counter wraps and resets
+    totals = data.get('frer_delta') or {}
+
+    def delta(key):
+        if key in totals:
+            return totals[key]
+        return final.get(key, 0) - initial.get(key, 0)
+
+    passed = delta('cs0_PassedPackets')
+    discarded = delta('cs0_DiscardedPackets')
+    return {
+        'run': os.fspath(run),
+        'timestamp': data.get('timestamp'),
+        'firmware': run_firmware(data),
+        'passed': passed,
+        'discarded': discarded,
+        'lost': delta('cs0_LostPackets'),
+        'out_of_order': delta('cs0_OutOfOrderPackets'),
+        'elimination_rate': 100.0 * discarded / passed if passed else 0.0,
+        'traffic': data.get('traffic_stats'),
+    }
+
+
+def aggregate_runs(run_summaries):
+    """History section over all per-run summaries"""
+    total_passed = sum(r['passed'] for r in run_summaries)
+    total_discarded = sum(r['discarded'] for r in run_summaries)
+    return {
+        'runs': len(run_summaries),
+        'total_passed': total_passed,
+        'total_discarded': total_discarded,
+        'total_lost': sum(r['lost'] for r in run_summaries),
+        'elimination_rate': 100.0 * total_discarded / total_passed if total_passed else 0.0,
+        'worst_runs': sorted(run_summaries, key=lambda r: (-r['lost'], -r['out_of_order']))[:10],
+    }
+
+
+def history_pipeline(cache_dir=DEFAULT_CACHE_DIR):
+    """Pipeline for a report over many stored test_results.json runs"""
+    pipeline = ReportPipeline(cache_dir)
+    pipeline.add_section('run_summaries', summarize_run, per_item='runs', version=3)
+    pipeline.add_section('history', aggregate_runs, inputs=['run_summaries'])
+    return pipeline
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental multi-run history report")
+    parser.add_argument("runs", nargs="+", metavar="run.json")
+    args = parser.parse_args(argv)
+
+    runs = [Path(path) for path in sorted(args.runs)]
+    pipeline = history_pipeline()
+    report = pipeline.build({'runs': runs})
+
+    written = write_if_changed('history_report.json', pipeline.keys['history'],
+                               lambda: json.dumps(report['history'], indent=2))
+    print(f"Runs: {len(runs)}  recomputed: {len(pipeline.computed)}  cached: {len(pipeline.reused)}")
+    print(f"history_report.json {'written' if written else 'unchanged'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Multi-resolution rollup store for counter and metric time series
+
+Samples (e.g. CounterPoller snapshots at 50 Hz) are folded as they arrive
+into 1 s, 10 s, 1 min and 1 h buckets holding min, max, mean, last and the
+sum of deltas (counter increments, with counter resets treated as a
+restart from zero). Raw samples are not kept. Each resolution keeps a
+bounded number of buckets, and queries pick the finest resolution that
+covers the requested window within a point budget, so a chart over a day
+reads ~1500 1-minute buckets instead of four million samples.
+
+Usage:
+    python3 rollup_store.py rollups.json cs0.PassedPackets --last 3600
+"""
+
+import argparse
+import json
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+# Resolution (seconds) -> buckets retained (None: unlimited)
+RESOLUTIONS = {1: 6 * 3600, 10: 3 * 86400 // 10, 60: 30 * 1440, 3600: None}
+FIELDS = ("start", "count", "min", "max", "sum", "last", "delta")
+DEFAULT_MAX_POINTS = 1500
+FRAME_BYTES = 1514
+
+
+class _Series:
+    """Closed buckets of one metric at one resolution, as parallel columns"""
+
+    def __init__(self):
+        self.columns = {field: array('d') for field in FIELDS}
+        self.open = None
+
+    def close_open(self):
+        if self.open is not None:
+            for field, value in zip(FIELDS, self.open):
+                self.columns[field].append(value)
+            self.open = None
+
+    def trim(self, keep):
+        starts = self.columns["start"]
+        # Trim in chunks so deleting from the front stays amortized
+        if keep is not None and len(starts) > keep + keep // 10:
+            drop = len(starts) - keep
+            for column in self.columns.values():
+                del column[:drop]
+
+
+class RollupStore:
+    """Incremental min/max/mean/last/delta rollups at several resolutions"""
+
+    def __init__(self, resolutions=RESOLUTIONS):
+        self.resolutions = dict(sorted(resolutions.items()))
+        self.series = {}
+        self._last_raw = {}
+        self._first_ts = {}
+        self.last_ts = None
+        self.samples = 0
+        # Poller thread adds while HTTP handlers query
+        self._lock = threading.RLock()
+
+    def add(self, ts, values):
+        """Fold one sample {metric: value} taken at ts (epoch seconds)"""
+        with self._lock:
+            self._add(ts, values)
+
+    def _add(self, ts, values):
+        self.samples += 1
+        self.last_ts = ts
+        for metric, value in values.items():
+            previous = self._last_raw.get(metric)
+            self._last_raw[metric] = value
+            if previous is None:
+                delta = 0
+            elif value >= previous:
+                delta = value - previous
+            else:
+                # Counter cleared or wrapped: count from zero
+                delta = value
+            per_res = self.series.get(metric)
+            if per_res is None:
+                per_res = self.series[metric] = {res: _Series() for res in self.resolutions}
+                self._first_ts[metric] = ts
+            for res, series in per_res.items():
+                start = ts - ts % res
+                bucket = series.open
+                if bucket is not None and bucket[0] != start:
+                    series.close_open()
+                    series.trim(self.resolutions[res])
+                    bucket = None
+                if bucket is None:
+                    series.open = [start, 1, value, value, value, value, delta]
+                else:
+                    bucket[1] += 1
+                    if value < bucket[2]:
+                        bucket[2] = value
+                    if value > bucket[3]:
+                        bucket[3] = value
+                    bucket[4] += value
+                    bucket[5] = value
+                    bucket[6] += delta
+
+    def on_counters(self, ts_ns, counters):
+        """CounterPoller subscriber: store every counter as stream.name"""
+        self.add(ts_ns / 1e9, {f"{stream}.{name}": value
+                               for stream, values in counters.items()
+                               for name, value in values.items()})
+
+    def metrics(self):
+        return sorted(self.series)
+
+    def span(self):
+        """(first, last) sample time in epoch seconds, or (None, None)"""
+        return min(self._first_ts.values(), default=None), self.last_ts
+
+    def choose_resolution(self, metric, start, end, max_points=DEFAULT_MAX_POINTS):
+        """Finest resolution that still holds start and fits the point budget"""
+        per_res = self.series.get(metric)
+        if not per_res:
+            return None
+        # Windows reaching before the first sample are covered by every resolution
+        start = max(start, self._first_ts[metric])
+        for res, series in per_res.items():
+            starts = series.columns["start"]
+            first = starts[0] if starts else series.open[0]
+            if (end - start) / res <= max_points and first <= start:
+                return res
+        return max(per_res)
+
+    def query(self, metric, start, end, max_points=DEFAULT_MAX_POINTS, resolution=None):
+        """Buckets of metric with start <= bucket start < end, as columns
+
+        Returns {resolution, timestamps, min, max, mean, last, delta, rate};
+        rate is delta per second.
+        """
+        with self._lock:
+            return self._query(metric, start, end, max_points, resolution)
+
+    def _query(self, metric, start, end, max_points, resolution):
+        resolution = resolution or self.choose_resolution(metric, start, end, max_points)
+        result = {"resolution": resolution, "timestamps": [], "min": [], "max": [], "mean": [],
+                  "last": [], "delta": [], "rate": []}
+        series = self.series.get(metric, {}).get(resolution)
+        if series is None:
+            return result
+        columns = series.columns
+        starts = columns["start"]
+        lo = bisect_left(starts, start - start % resolution)
+        hi = bisect_left(starts, end)
+        rows = [tuple(columns[field][i] for field in FIELDS) for i in range(lo, hi)]
+        if series.open is not None and start - start % resolution <= series.open[0] < end:
+            rows.append(tuple(series.open))
+        for bucket_start, count, low, high, total, last, delta in rows:
+            result["timestamps"].append(bucket_start)
+            result["min"].append(low)
+            result["max"].append(high)
+            result["mean"].append(total / count)
+            result["last"].append(last)
+            result["delta"].append(delta)
+            result["rate"].append(delta / resolution)
+        return result
+
+    def time_series(self, start, end, max_points=DEFAULT_MAX_POINTS, frame_bytes=FRAME_BYTES):
+        """Window in the test_results_detailed.json time_series layout
+
+        Throughput, loss and elimination rate come from the cs0 counters.
+        Metrics the store does not have (latency, board CPU/memory) are None.
+        """
+        from datetime import datetime
+
+        passed = self.query("cs0.PassedPackets", start, end, max_points)
+        resolution = passed["resolution"]
+
+        def aligned(metric, column):
+            values = dict(zip(*[self.query(metric, start, end, max_points, resolution)[key]
+                                for key in ("timestamps", column)])) if resolution else {}
+            return [values.get(ts) for ts in passed["timestamps"]]
+
+        discarded = aligned("cs0.DiscardedPackets", "delta")
+        return {
+            "timestamps": [datetime.fromtimestamp(ts).isoformat() for ts in passed["timestamps"]],
+            "throughput_mbps": [rate * frame_bytes * 8 / 1e6 for rate in passed["rate"]],
+            "latency_ms": aligned("latency_ms", "mean"),
+            "packet_loss": [lost or 0 for lost in aligned("cs0.LostPackets", "delta")],
+            "elimination_rate_percent": [100.0 * d / p if p and d is not None else None
+                                         for p, d in zip(passed["delta"], discarded)],
+            "cpu_usage_percent": aligned("board.cpu_percent", "mean"),
+            "memory_usage_mb": aligned("board.memory_used_mb", "mean"),
+        }
+
+    def save(self, path):
+        """Write all buckets (open ones included) to a JSON file"""
+        with self._lock:
+            state = self._state()
+        with open(path, 'w') as f:
+            json.dump(state, f)
+
+    def _state(self):
+        state = {"resolutions": {str(res): keep for res, keep in self.resolutions.items()},
+                 "last_raw": self._last_raw, "first_ts": self._first_ts, "last_ts": self.last_ts,
+                 "samples": self.samples,
+                 "series": {}}
+        for metric, per_res in self.series.items():
+            state["series"][metric] = {
+                str(res): {"columns": {field: series.columns[field].tolist() for field in FIELDS},
+                           "open": series.open}
+                for res, series in per_res.items()}
+        return state
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            state = json.load(f)
+        store = cls({int(res): keep for res, keep in state["resolutions"].items()})
+        store._last_raw = state["last_raw"]
+        store._first_ts = state["first_ts"]
+        store.last_ts = state["last_ts"]
+        store.samples = state["samples"]
+        for metric, per_res in state["series"].items():
+            store.series[metric] = {}
+            for res, saved in per_res.items():
+                series = _Series()
+                for field in FIELDS:
+                    series.columns[field].extend(saved["columns"][field])
+                series.open = saved["open"]
+                store.series[metric][int(res)] = series
+        return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query a counter rollup store")
+    parser.add_argument("store", metavar="rollups.json")
+    parser.add_argument("metric")
+    parser.add_argument("--last", type=float, default=3600, metavar="SECONDS",
+                        help="window ending now (default: 3600)")
+    args = parser.parse_args(argv)
+
+    store = RollupStore.load(args.store)
+    end = time.time()
+    result = store.query(args.metric, end - args.last, end)
+    print(f"{args.metric}: {len(result['timestamps'])} buckets at {result['resolution']} s")
+    for ts, low, high, mean, rate in zip(result["timestamps"], result["min"], result["max"],
+                                          result["mean"], result["rate"]):
+        print(f"  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))}  "
+              f"min {low:>14.1f}  max {high:>14.1f}  mean {mean:>14.1f}  rate {rate:>12.1f}/s")
+
+
+if __name__ == "__main__":
+    main()
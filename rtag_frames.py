@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+R-TAG frame fields and sequence tracking
+
+Frame layout (see create_rtag_frame in generate_pcap_hex.py):
+    0   destination MAC
+    6   source MAC
+    12  EtherType 0xF1C1 (R-TAG)
+    14  reserved
+    16  sequence number (16 bit, big endian)
+    18  reserved
+    20  inner EtherType (0x0800)
+    22  IPv4 header, 42 UDP header, 50 payload
+"""
+
+import struct
+
+RTAG_ETHERTYPE = 0xF1C1
+ETHERTYPE_OFFSET = 12
+SEQ_OFFSET = 16
+INNER_ETHERTYPE_OFFSET = 20
+IP_OFFSET = 22
+SEQ_MODULUS = 1 << 16
+
+_U16 = struct.Struct('!H')
+
+
+def rtag_sequence(data):
+    """R-TAG sequence number of a frame, or None if it carries no R-TAG"""
+    if len(data) < SEQ_OFFSET + 2 or _U16.unpack_from(data, ETHERTYPE_OFFSET)[0] != RTAG_ETHERTYPE:
+        return None
+    return _U16.unpack_from(data, SEQ_OFFSET)[0]
+
+
+def seq_delta(seq, previous):
+    """Signed distance from previous to seq on the 16-bit sequence circle"""
+    delta = (seq - previous) % SEQ_MODULUS
+    return delta - SEQ_MODULUS if delta >= SEQ_MODULUS // 2 else delta
+
+
+class SequenceTracker:
+    """Per-path sequence statistics of one capture
+
+    Counts frames, frames missing from the sequence (gaps), frames arriving
+    behind the highest sequence seen (out of order) and repeats of the
+    highest sequence (duplicates).
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.gaps = 0
+        self.out_of_order = 0
+        self.duplicates = 0
+        self.first = None
+        self.last = None
+        self.wraps = 0
+
+    def update(self, seq):
+        self.frames += 1
+        if self.last is None:
+            self.first = self.last = seq
+            return
+        delta = seq_delta(seq, self.last)
+        if delta > 0:
+            self.gaps += delta - 1
+            if seq < self.last:
+                self.wraps += 1
+            self.last = seq
+        elif delta == 0:
+            self.duplicates += 1
+        else:
+            # A late frame fills one of the gaps counted earlier
+            self.out_of_order += 1
+            if self.gaps:
+                self.gaps -= 1
+
+    def as_dict(self):
+        return {
+            'frames': self.frames,
+            'gaps': self.gaps,
+            'out_of_order': self.out_of_order,
+            'duplicates': self.duplicates,
+            'first_seq': self.first,
+            'last_seq': self.last,
+            'wraps': self.wraps,
+        }
+
+
+def track_sequences(packets):
+    """SequenceTracker over an iterable of pcap_io packets"""
+    tracker = SequenceTracker()
+    for pkt in packets:
+        seq = rtag_sequence(pkt.data)
+        if seq is not None:
+            tracker.update(seq)
+    return tracker
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Crash-safe checkpoint journal for long test runs
+
+test_traffic.py used to write its results only at the end, so a crash or
+SSH timeout late in a soak lost the whole run. The journal is an
+append-only file of small records, one per line, each prefixed with its
+CRC32 so a record torn by a crash is detected and dropped on replay:
+
+    <crc32 hex> {"k": kind, "t": epoch seconds, "run": run id, ...}
+
+Records are written through the file buffer and fsynced at most every
+sync interval (and on run boundaries), so a day-long run at 1 Hz costs a
+few hundred bytes per sample and one fsync every ten seconds.
+
+- "sample": FRER counters of one poll, only the values that changed
+- "captures": capture file sizes (the analyzable prefix of each segment)
+- "phase": a finished phase result (initial/final stats, traffic)
+- "run": the complete results of a run
+- "traffic": traffic of a run started or stopped
+- "resume": a run continued after a crash (the next sample follows a gap)
+
+MonotonicCounters turns raw board counters into cumulative totals that
+keep growing across 32-bit wraps and across board resets or `--clr`
+(a stream whose counters drop is taken as restarted from zero unless the
+drop can only be a wrap: the counter was close enough to 2^32 for the
+frames since the last poll, at most MAX_WRAP_GAP, at line rate to carry
+it over; the `Resets` counter itself counts sequence recovery resets and
+is totalled like the others). The first sample after a resume is a new
+baseline where any drop is a restart: the board may have rebooted while
+the run was down. Replaying a journal rebuilds the totals, the counter
+rollup store and the capture offsets, so a run resumes where it stopped.
+
+Usage:
+    python3 run_journal.py test_journal.log          # summarize a journal
+    python3 test_traffic.py --duration 3600 --resume # continue after a crash
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+
+COUNTER_BITS = 32
+# Highest frame rate a counter can advance at: 64-byte frames at 1 Gb/s
+MAX_FRAME_RATE = 1_488_096
+# Slack on the time between polls when judging a wrap (and the whole
+# window when a sample has no timestamp)
+WRAP_SLACK = 1.0
+# Longest time between polls a wrap is judged over; a drop after a longer
+# gap is a restart (2^32 frames take 48 min at MAX_FRAME_RATE, so without a
+# cap any drop after a long outage would fit)
+MAX_WRAP_GAP = 60.0
+SYNC_INTERVAL = 10.0
+# Capture sizes are recorded at most this often
+OFFSET_INTERVAL = 10.0
+
+
+class MonotonicCounters:
+    """Cumulative totals of board counters across wraps and resets
+
+    Keys are "<stream>_<counter>" (cs0_PassedPackets), as in test_traffic's
+    stats. The first sample of a counter is its baseline.
+    """
+
+    def __init__(self, bits=COUNTER_BITS):
+        self.modulus = 1 << bits
+        self.last = {}
+        self.last_ts = None
+        self.totals = {}
+        self.wraps = 0
+        self.resets = 0
+        self.rebased = False
+
+    def rebase(self):
+        """The next sample follows a gap of unknown length: drops in it are restarts"""
+        self.rebased = True
+
+    def _is_wrap(self, previous, raw, elapsed):
+        """Whether previous -> raw (a drop) can be a wrap in elapsed seconds
+
+        Only if the frames it implies fit the time at line rate, which also
+        means previous was near the top of the range.
+        """
+        if self.rebased:
+            return False
+        implied = raw + self.modulus - previous
+        return implied <= MAX_FRAME_RATE * (min(elapsed or 0.0, MAX_WRAP_GAP) + WRAP_SLACK)
+
+    def update(self, counters, ts_ns=None):
+        """Fold one {stream: {name: raw}} poll taken at ts_ns; returns {key: delta}"""
+        elapsed = None
+        if ts_ns is not None:
+            if self.last_ts is not None:
+                elapsed = max(0.0, (ts_ns - self.last_ts) / 1e9)
+            self.last_ts = ts_ns
+        deltas = {}
+        for stream, values in counters.items():
+            keys = {name: f"{stream}_{name}" for name in values}
+            # A counter that drops without being able to have wrapped means
+            # the whole stream restarted, including counters that did not drop
+            restarted = any(
+                key in self.last and values[name] < self.last[key]
+                and not self._is_wrap(self.last[key], values[name], elapsed)
+                for name, key in keys.items())
+            if restarted:
+                self.resets += 1
+            for name, raw in values.items():
+                key = keys[name]
+                previous = self.last.get(key)
+                if previous is None:
+                    delta = 0
+                elif restarted:
+                    delta = raw
+                elif raw >= previous:
+                    delta = raw - previous
+                else:
+                    delta = raw + self.modulus - previous
+                    self.wraps += 1
+                self.last[key] = raw
+                self.totals[key] = self.totals.get(key, 0) + delta
+                deltas[key] = delta
+        self.rebased = False
+        return deltas
+
+    def state(self):
+        return {"last": dict(self.last), "last_ts": self.last_ts, "totals": dict(self.totals),
+                "wraps": self.wraps, "resets": self.resets, "rebased": self.rebased}
+
+    def restore(self, state):
+        self.last = dict(state["last"])
+        self.last_ts = state.get("last_ts")
+        self.totals = dict(state["totals"])
+        self.wraps = state["wraps"]
+        self.resets = state["resets"]
+        self.rebased = state.get("rebased", False)
+
+
+def _encode(record):
+    line = json.dumps(record, separators=(',', ':')).encode()
+    return b'%08x %s\n' % (zlib.crc32(line), line)
+
+
+def read_records(path):
+    """(records, valid_bytes): the records up to the first torn or corrupt one"""
+    records, valid = [], 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n') or len(line) < 10:
+                break
+            crc, body = line[:8], line[9:-1]
+            try:
+                if int(crc, 16) != zlib.crc32(body):
+                    break
+                records.append(json.loads(body))
+            except ValueError:
+                break
+            valid += len(line)
+    return records, valid
+
+
+class Journal:
+    """Append-only journal with bounded fsync frequency; thread-safe"""
+
+    def __init__(self, path, sync_interval=SYNC_INTERVAL, resume=False):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.records = []
+        if resume and os.path.exists(path):
+            self.records, valid = read_records(path)
+            if valid < os.path.getsize(path):
+                # Drop the torn tail so new records follow a clean line
+                with open(path, 'r+b') as f:
+                    f.truncate(valid)
+        self._file = open(path, 'ab' if resume else 'wb')
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+
+    def append(self, kind, sync=False, **fields):
+        record = {"k": kind, "t": time.time(), **fields}
+        data = _encode(record)
+        with self._lock:
+            self._file.write(data)
+            now = time.monotonic()
+            if sync or now - self._last_sync >= self.sync_interval:
+                self._sync(now)
+
+    def _sync(self, now):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_sync = now
+
+    def sync(self):
+        with self._lock:
+            self._sync(time.monotonic())
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync(time.monotonic())
+                self._file.close()
+
+
+class RunCheckpoint:
+    """CounterPoller subscriber journaling one run's counters and capture offsets
+
+    With resumed, the run continues after a crash: the first sample is a new
+    counter baseline, and a "resume" record makes replay do the same.
+    """
+
+    def __init__(self, journal, run_id, counters=None, capture_paths=None, segment=0, resumed=False):
+        self.journal = journal
+        self.run_id = run_id
+        self.counters = counters or MonotonicCounters()
+        self.capture_paths = capture_paths or {}
+        self.segment = segment
+        self._written = {}
+        self._last_offsets = 0.0
+        if resumed:
+            self.counters.rebase()
+            journal.append("resume", sync=True, run=run_id, segment=segment)
+
+    def traffic(self, event):
+        """Journal the start or stop of the run's traffic"""
+        self.journal.append("traffic", sync=True, run=self.run_id, event=event)
+
+    def on_counters(self, ts_ns, counters):
+        self.counters.update(counters, ts_ns)
+        changed = {}
+        for stream, values in counters.items():
+            for name, raw in values.items():
+                key = f"{stream}_{name}"
+                if self._written.get(key) != raw:
+                    changed[key] = self._written[key] = raw
+        self.journal.append("sample", run=self.run_id, ts=ts_ns, raw=changed)
+        now = time.monotonic()
+        if self.capture_paths and now - self._last_offsets >= OFFSET_INTERVAL:
+            self._last_offsets = now
+            self.record_offsets()
+
+    def record_offsets(self, sync=False):
+        offsets = {iface: os.path.getsize(path) if os.path.exists(path) else 0
+                   for iface, path in self.capture_paths.items()}
+        self.journal.append("captures", sync=sync, run=self.run_id, segment=self.segment,
+                            paths=self.capture_paths, offsets=offsets)
+
+
+def _split_key(key):
+    stream, name = key.split('_', 1)
+    return stream, name
+
+
+class RunState:
+    """What a journal holds about one run"""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.results = None
+        self.phases = {}
+        self.counters = MonotonicCounters()
+        self.samples = []
+        # segment -> {"paths": {iface: path}, "offsets": {iface: bytes}}
+        self.segments = {}
+        self.first_ts = None
+        self.last_ts = None
+        # [start, stop] epoch seconds of each traffic start; stop None while
+        # running (or when the run crashed)
+        self.traffic = []
+
+    @property
+    def traffic_seconds(self):
+        """Seconds of traffic journaled, summed over the run's attempts
+
+        Traffic cut short by a crash counts up to its last sample.
+        """
+        total = 0.0
+        for start, stop in self.traffic:
+            if stop is None:
+                stop = self.last_ts / 1e9 if self.last_ts is not None else start
+            total += max(0.0, stop - start)
+        return total
+
+    def replay_into(self, store):
+        """Feed the journaled samples to a RollupStore-like on_counters"""
+        for ts_ns, counters in self.samples:
+            store.on_counters(ts_ns, counters)
+
+
+def load_journal(path):
+    """{run_id: RunState} replayed from a journal"""
+    records, _ = read_records(path)
+    runs, raw = {}, {}
+    for record in records:
+        run_id = record.get("run")
+        if run_id is None:
+            continue
+        run = runs.get(run_id)
+        if run is None:
+            run = runs[run_id] = RunState(run_id)
+            raw[run_id] = {}
+        kind = record["k"]
+        if kind == "sample":
+            current = raw[run_id]
+            current.update(record["raw"])
+            counters = {}
+            for key, value in current.items():
+                stream, name = _split_key(key)
+                counters.setdefault(stream, {})[name] = value
+            run.counters.update(counters, record["ts"])
+            run.samples.append((record["ts"], counters))
+            run.first_ts = record["ts"] if run.first_ts is None else run.first_ts
+            run.last_ts = record["ts"]
+        elif kind == "captures":
+            run.segments[record["segment"]] = {"paths": record["paths"], "offsets": record["offsets"]}
+        elif kind == "traffic":
+            if record["event"] == "start":
+                run.traffic.append([record["t"], None])
+            elif run.traffic and run.traffic[-1][1] is None:
+                run.traffic[-1][1] = record["t"]
+        elif kind == "resume":
+            run.counters.rebase()
+        elif kind == "phase":
+            run.phases[record["name"]] = record["result"]
+        elif kind == "run":
+            run.results = record["results"]
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a test run journal")
+    parser.add_argument("journal")
+    args = parser.parse_args()
+
+    records, valid = read_records(args.journal)
+    size = os.path.getsize(args.journal)
+    print(f"{args.journal}: {len(records)} records, {valid} of {size} bytes valid"
+          f"{' (torn tail)' if valid < size else ''}")
+    for run_id, run in load_journal(args.journal).items():
+        status = "complete" if run.results is not None else "incomplete"
+        print(f"\n{run_id}: {status}, {len(run.samples)} samples over {run.traffic_seconds:.1f} s, "
+              f"{len(run.segments)} capture segment(s), phases: {', '.join(run.phases) or '-'}")
+        totals = run.counters.totals
+        for key in ("cs0_PassedPackets", "cs0_DiscardedPackets", "cs0_LostPackets", "cs0_OutOfOrderPackets"):
+            if key in totals:
+                print(f"  {key:<22} {totals[key]:>14}")
+        if run.counters.wraps or run.counters.resets:
+            print(f"  counter wraps {run.counters.wraps}, stream restarts {run.counters.resets}")
+    if not records:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ import serial
 import time
 import sys
 
+from board_channel import SERIAL_PORT
+
 def send_command(ser, cmd, wait=0.5):
     """Send command and read response"""
     ser.write((cmd + '\n').encode())
@@ -20,7 +22,7 @@ def configure_sender():
     """Configure sender board for FRER generation"""
     try:
         # Open serial connection
-        ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
+        ser = serial.Serial(SERIAL_PORT, 115200, timeout=1)
         time.sleep(2)  # Wait for connection
         
         print("=== Configuring Sender Board for FRER ===\n")
@@ -2,8 +2,8 @@
 """
 Swap board roles - SSH board as sender, Serial board as receiver
 """
-import subprocess
-import time
+from board_channel import ShellChannel
+from vcap_table import HIT_INTERVAL, IPERF_FLOW, VcapTable, print_flow_map, print_table
 
 print("=== Swapping Board Roles ===")
 print("SSH Board (169.254.100.2) → SENDER")
@@ -23,19 +23,22 @@ ssh_cmds = [
     
     # Configure FRER generation (ISDX=1 → duplicate to eth1/eth2)
     "frer iflow 1 --generation 1 --dev1 eth1 --dev2 eth2",
-    
-    # Verify
-    "vcap get 1001",
-    "frer iflow 1"
 ]
 
 print("1. Configuring SSH board as SENDER...")
-for cmd in ssh_cmds:
-    result = subprocess.run(f"ssh root@169.254.100.2 '{cmd}' 2>/dev/null", 
-                          shell=True, capture_output=True, text=True)
-    if "vcap get" in cmd or "frer iflow" in cmd:
-        print(f"\n{cmd}:")
-        print(result.stdout)
+with ShellChannel(host="169.254.100.2") as channel:
+    # One round trip for the whole script; the VCAP table is re-read after it
+    table = VcapTable(channel)
+    table.configure(ssh_cmds)
+    
+    # Verify
+    print("\nfrer iflow 1:")
+    print(channel.run("frer iflow 1"))
+    # Baseline after the new rules, then the hits over HIT_INTERVAL
+    print(f"Sampling VCAP hits over {HIT_INTERVAL:.0f} s...")
+    deltas = table.sample()
+    print_table(table, deltas)
+    print_flow_map(table.flow_map([("iperf3", "eth3", IPERF_FLOW)]), deltas)
 
 print("\n✓ SSH board configured as sender")
 print("\nNow configure Serial board as RECEIVER manually via serial console")
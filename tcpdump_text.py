@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Streaming converter from tcpdump text dumps to pcapng
+
+Archived runs often only kept tcpdump's text output (`tcpdump -n -e -xx`,
+see test_results/tcpdump_captures.txt). This parses that text back into
+capture records so old runs go through the same binary analysis as new
+ones:
+
+- every "listening on <iface>" starts a capture section, written as its
+  own pcapng interface (named host:iface when a shell prompt shows the
+  host); -ttt/-ttttt relative stamps, -tt epoch and -tttt dated stamps
+  are recognized from the section's command line or the stamp itself
+- records with -x/-xx hex get the dumped bytes; records with only the -e
+  line get the Ethernet (and 802.1Q) header rebuilt from the MACs and
+  ethertype, with the original length kept as orig_len
+- records that are incomplete (header only, fewer hex bytes than the frame
+  length, missing hex lines) and "[... 15 more packets ...]" elisions are
+  marked with EPB comments starting "tcpdump-text:", and "N packets
+  captured" summaries are checked against what the text holds
+
+Time-of-day and -tttt stamps are local time on the dump's date ("Date:
+YYYY-MM-DD" line or --date) and are converted to UTC with the zone at the
+end of the Date: line ("KST", "+0900", "UTC+9") or --utc-offset; without
+either they are taken as UTC, with a warning when the Date: line names a
+zone that could not be applied. The text is read once, line by line (.gz
+and stdin included); records are spooled to a temporary file and appended
+after the interface blocks, so memory stays flat for multi-gigabyte logs.
+
+Usage:
+    python3 tcpdump_text.py test_results/tcpdump_captures.txt tcpdump_captures.pcapng
+    python3 tcpdump_text.py archive/run17.txt.gz run17.pcapng --date 2025-09-16 --utc-offset +09:00
+"""
+
+import argparse
+import binascii
+import calendar
+import gzip
+import os
+import re
+import shutil
+import struct
+import sys
+
+from pcap_io import LINKTYPE_ETHERNET, Interface, PcapngWriter
+
+MARK = "tcpdump-text:"
+DEFAULT_SECTION = "tcpdump"
+DAY_NS = 86400 * 1_000_000_000
+
+_CLOCK = re.compile(rb'(?:(\d{4})-(\d\d)-(\d\d) )?(\d+):(\d\d):(\d\d)\.(\d+) ')
+_EPOCH = re.compile(rb'(\d{9,})\.(\d+) ')
+_LINK = re.compile(rb'([0-9a-f]{2}(?::[0-9a-f]{2}){5}) > ([0-9a-f]{2}(?::[0-9a-f]{2}){5}), '
+                   rb'(?:ethertype [^(]*\(0x([0-9a-f]{4})\)|802\.3), length (\d+)')
+_VLAN = re.compile(rb'vlan (\d+), p (\d+), (?:ethertype [^(]*\(0x([0-9a-f]{4})\))?')
+_LENGTH = re.compile(rb'length (\d+)')
+# Offset and hex words of a -x/-xx line; the ASCII column follows two spaces
+_HEX_ROW = re.compile(rb'0x([0-9a-f]+):  ([0-9a-f]{2,4}(?: [0-9a-f]{2,4})*)')
+_PROMPT = re.compile(rb'(?:\S+@)?([\w.-]+):\S*[$#] ')
+_IFACE = re.compile(rb' -\w*i ?(\S+)')
+_ELIDED = re.compile(rb'(\d+) more packets?')
+_CAPTURED = re.compile(rb'^(\d+) packets? captured')
+_DATE = re.compile(rb'Date: (\d{4})-(\d\d)-(\d\d)')
+# Zone at the end of a Date: line: an abbreviation or a numeric offset
+_ZONE = re.compile(rb'\s([A-Z]{2,5}|(?:UTC|GMT)?[+-]\d{1,2}(?::?\d\d)?)\s*$')
+_OFFSET = re.compile(r'(?:UTC|GMT)?([+-])(\d{1,2})(?::?(\d\d))?$')
+# Hours east of UTC of the zone abbreviations seen in archived dumps
+ZONE_OFFSETS = {"UTC": 0, "GMT": 0, "KST": 9, "JST": 9, "CET": 1, "CEST": 2,
+                "EET": 2, "EEST": 3, "BST": 1, "EST": -5, "EDT": -4, "PST": -8, "PDT": -7}
+_LISTENING = b'listening on '
+
+
+def parse_utc_offset(text):
+    """Nanoseconds east of UTC of "+09:00", "-0500", "UTC+9" or a known zone name"""
+    if text in ZONE_OFFSETS:
+        return ZONE_OFFSETS[text] * 3600 * 1_000_000_000
+    match = _OFFSET.match(text)
+    if not match:
+        raise ValueError(f"unknown UTC offset or zone {text!r}")
+    sign, hours, minutes = match.groups()
+    offset = (int(hours) * 60 + int(minutes or 0)) * 60 * 1_000_000_000
+    return -offset if sign == '-' else offset
+
+
+def _ns(fraction):
+    """Nanoseconds of a fractional-second digit string"""
+    return int(fraction[:9].ljust(9, b'0'))
+
+
+class _RecordSpool(PcapngWriter):
+    """Enhanced packet blocks only: interfaces are numbered here but their
+    description blocks go at the front of the final file"""
+
+    def add_interface(self, name, linktype=LINKTYPE_ETHERNET, snaplen=0):
+        self.interfaces.append(Interface(name, linktype, snaplen))
+        return len(self.interfaces) - 1
+
+
+class _Section:
+    """One tcpdump invocation in the text"""
+
+    def __init__(self, name, iface, relative):
+        self.name = name
+        self.iface = iface
+        # None, "previous" (-ttt) or "first" (-ttttt)
+        self.relative = relative
+        self.records = 0
+        self.elided = 0
+        self.unknown_elisions = 0
+        self.incomplete = 0
+        self.header_only = 0
+        self.captured = None
+        self.first_ts = None
+        self.last_ts = None
+
+
+class _Record:
+    __slots__ = ("ts", "header", "orig_len", "lines", "notes")
+
+    def __init__(self, ts, header, orig_len):
+        self.ts = ts
+        self.header = header
+        self.orig_len = orig_len
+        # Raw -x/-xx lines, decoded in one pass when the record is written
+        self.lines = []
+        self.notes = []
+
+
+class TextConverter:
+    """Parses tcpdump text line by line into pcapng records"""
+
+    def __init__(self, spool, date_ns=None, default_name=DEFAULT_SECTION, utc_offset_ns=None):
+        self.spool = spool
+        # Local midnight of the dump's date, as if it were UTC
+        self.date_ns = date_ns
+        # Local time minus UTC; None until --utc-offset or the Date: zone sets it
+        self.utc_offset_ns = utc_offset_ns
+        self._offset_given = utc_offset_ns is not None
+        self.warnings = []
+        self.default_name = default_name
+        self.sections = []
+        self.names = {}
+        self.section = None
+        self.records = 0
+        self._pending = None
+        self._command = None
+        self._before_next = []
+        # Base for relative stamps: the last absolute stamp seen
+        self._last_abs = None
+
+    # --- sections -----------------------------------------------------------
+
+    def _start_section(self, iface):
+        host, command_iface, relative = self._command or (None, None, None)
+        self._command = None
+        iface = iface or command_iface or self.default_name
+        name = f"{host}:{iface}" if host else iface
+        if name not in self.names:
+            self.names[name] = self.spool.add_interface(name)
+        self.section = _Section(name, self.names[name], relative)
+        self.sections.append(self.section)
+
+    def _command_line(self, line):
+        prompt = _PROMPT.search(line)
+        iface = _IFACE.search(line)
+        flags = [token for token in line.split() if token.startswith(b'-') and not token.startswith(b'--')]
+        ts_level = max((len(max(re.findall(rb't+', token) or [b''], key=len)) for token in flags), default=0)
+        relative = {3: "previous", 5: "first"}.get(ts_level)
+        self._command = (prompt.group(1).decode() if prompt else None,
+                         iface.group(1).decode() if iface else None, relative)
+
+    # --- records ------------------------------------------------------------
+
+    def _timestamp(self, line):
+        """(ts_ns, rest of line) of a record line, or (None, None)"""
+        match = _CLOCK.match(line)
+        if match:
+            year, month, day, hours, minutes, seconds, fraction = match.groups()
+            clock = ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1_000_000_000 + _ns(fraction)
+            relative = self.section.relative if self.section else None
+            if relative:
+                if relative == "first" and self.section.first_ts is not None:
+                    base = self.section.first_ts
+                else:
+                    base = self.section.last_ts if self.section.last_ts is not None else self._last_abs
+                ts = (base if base is not None else self._midnight_utc()) + clock
+            elif year:
+                ts = calendar.timegm((int(year), int(month), int(day), 0, 0, 0)) * 1_000_000_000 + clock
+                ts -= self.utc_offset_ns or 0
+                self._last_abs = ts
+            else:
+                ts = self._midnight_utc() + clock
+                # Past midnight within one capture
+                while self._last_abs is not None and ts < self._last_abs - DAY_NS // 2:
+                    ts += DAY_NS
+                self._last_abs = ts
+            return ts, line[match.end():]
+        match = _EPOCH.match(line)
+        if match:
+            ts = int(match.group(1)) * 1_000_000_000 + _ns(match.group(2))
+            self._last_abs = ts
+            return ts, line[match.end():]
+        return None, None
+
+    def _midnight_utc(self):
+        """UTC instant of the dump date's local midnight (0 without a date)"""
+        if self.date_ns is None:
+            return 0
+        return self.date_ns - (self.utc_offset_ns or 0)
+
+    def _date_line(self, line):
+        date = _DATE.match(line)
+        if not date:
+            return
+        if self.date_ns is None:
+            self.date_ns = calendar.timegm(tuple(map(int, date.groups())) + (0, 0, 0)) * 1_000_000_000
+        zone = _ZONE.search(line, date.end())
+        if not zone:
+            return
+        zone = zone.group(1).decode()
+        try:
+            offset = parse_utc_offset(zone)
+        except ValueError:
+            offset = None
+        if self._offset_given:
+            if offset != self.utc_offset_ns:
+                self.warnings.append(f"Date: line zone {zone} ignored: --utc-offset applies")
+        elif offset is None:
+            self.warnings.append(f"Date: line zone {zone} not recognized: stamps taken as UTC "
+                                 f"(use --utc-offset)")
+        elif self.utc_offset_ns is None:
+            if self.records:
+                self.warnings.append(f"Date: line zone {zone} applies only to records after it")
+            self.utc_offset_ns = offset
+
+    def _record_line(self, ts, rest):
+        self._flush()
+        if self.section is None:
+            self._start_section(None)
+        link = _LINK.search(rest)
+        header, orig_len = b'', None
+        if link:
+            dst, src, ethertype, length = link.groups()
+            orig_len = int(length)
+            header = bytes.fromhex(dst.replace(b':', b'').decode()) + bytes.fromhex(src.replace(b':', b'').decode())
+            if ethertype is not None:
+                vlan = _VLAN.match(rest, link.end() + 2) if ethertype == b'8100' else None
+                header += struct.pack('!H', int(ethertype, 16))
+                if vlan:
+                    vid, pcp, inner = vlan.groups()
+                    header += struct.pack('!H', int(pcp) << 13 | int(vid))
+                    if inner:
+                        header += struct.pack('!H', int(inner, 16))
+        else:
+            length = _LENGTH.search(rest)
+            orig_len = int(length.group(1)) if length else None
+        record = self._pending = _Record(ts, header, orig_len)
+        if self._before_next:
+            record.notes.extend(self._before_next)
+            self._before_next = []
+
+    @staticmethod
+    def _hex_bytes(lines):
+        """Frame bytes of a record's hex lines and the offset of the first hole (or None)"""
+        rows = _HEX_ROW.findall(b''.join(lines))
+        data = binascii.a2b_hex(b''.join(digits for _, digits in rows).replace(b' ', b''))
+        if len(rows) == len(lines):
+            last_offset, last_digits = rows[-1]
+            if int(last_offset, 16) == len(data) - len(last_digits.replace(b' ', b'')) // 2:
+                return data, None
+        # Lines missing or unreadable: keep the bytes up to the hole
+        chunks, size = [], 0
+        for line in lines:
+            row = _HEX_ROW.match(line)
+            if row is None or int(row.group(1), 16) != size:
+                break
+            chunk = binascii.a2b_hex(row.group(2).replace(b' ', b''))
+            chunks.append(chunk)
+            size += len(chunk)
+        return b''.join(chunks), size
+
+    def _flush(self):
+        record, self._pending = self._pending, None
+        if record is None:
+            return
+        section = self.section
+        notes = record.notes
+        if record.lines:
+            data, gap = self._hex_bytes(record.lines)
+            orig_len = record.orig_len if record.orig_len and record.orig_len >= len(data) else len(data)
+            if gap is not None:
+                notes.insert(0, f"incomplete, hex lines missing at 0x{gap:04x}")
+            elif len(data) < orig_len:
+                notes.insert(0, f"incomplete, {len(data)} of {orig_len} bytes in text")
+        else:
+            data = record.header
+            orig_len = record.orig_len or len(data)
+            notes.insert(0, "header only, rebuilt from the -e line" if data else "no frame bytes in text")
+            section.header_only += 1
+        if len(data) < orig_len:
+            section.incomplete += 1
+        comment = f"{MARK} {'; '.join(notes)}" if notes else None
+        self.spool.write(data, record.ts, section.iface, comment=comment, orig_len=orig_len)
+        self.records += 1
+        section.records += 1
+        if section.first_ts is None:
+            section.first_ts = record.ts
+        section.last_ts = record.ts
+
+    def _elision(self, line):
+        match = _ELIDED.search(line)
+        count = int(match.group(1)) if match else None
+        section = self.section
+        if section is not None:
+            if count is None:
+                section.unknown_elisions += 1
+            else:
+                section.elided += count
+        what = f"{count} packets" if count is not None else "packets (count not given)"
+        if self._pending is not None:
+            self._pending.notes.append(f"followed by {what} elided from the text")
+        else:
+            self._before_next.append(f"preceded by {what} elided from the text")
+
+    # --- input --------------------------------------------------------------
+
+    def feed(self, lines):
+        for line in lines:
+            first = line[:1]
+            if first == b' ' or first == b'\t':
+                stripped = line.lstrip()
+                if stripped[:2] == b'0x':
+                    if self._pending is not None:
+                        self._pending.lines.append(stripped)
+                    continue
+                if not stripped[:1].isdigit():
+                    # Decoded protocol detail (-v) of the pending record
+                    continue
+                line = stripped
+                first = line[:1]
+            if first.isdigit():
+                ts, rest = self._timestamp(line)
+                if ts is not None:
+                    self._record_line(ts, rest)
+                    continue
+                captured = _CAPTURED.match(line)
+                if captured:
+                    self._flush()
+                    if self.section is not None:
+                        self.section.captured = int(captured.group(1))
+                continue
+            if first == b'[' and line.startswith(b'[...'):
+                self._elision(line)
+                continue
+            if _LISTENING in line:
+                self._flush()
+                iface = line.split(_LISTENING, 1)[1].split(b',', 1)[0].strip().decode(errors='replace')
+                self._start_section(iface)
+                continue
+            if b'tcpdump ' in line and b' -' in line and not line.startswith(b'tcpdump:'):
+                self._flush()
+                self._command_line(line)
+                continue
+            if first == b'D':
+                self._date_line(line)
+            # Anything else ends the pending record's hex dump
+            self._flush()
+        self._flush()
+
+
+def convert(lines, output, date_ns=None, source_name=None, utc_offset_ns=None):
+    """Convert tcpdump text lines (bytes) to a pcapng file; returns the converter"""
+    spool_path = output + ".records.tmp"
+    try:
+        with _RecordSpool(spool_path) as spool:
+            converter = TextConverter(spool, date_ns, utc_offset_ns=utc_offset_ns)
+            converter.feed(lines)
+        comment = f"Converted from tcpdump text{f' {source_name}' if source_name else ''} by tcpdump_text.py"
+        with PcapngWriter(output, [section for section in converter.names], comment=comment):
+            pass
+        with open(spool_path, 'rb') as src, open(output, 'ab') as dst:
+            # Skip the spool's own section header block
+            src.seek(struct.unpack('<I', src.read(8)[4:])[0])
+            shutil.copyfileobj(src, dst, 1 << 20)
+    finally:
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+    return converter
+
+
+def _open_text(path):
+    if path == '-':
+        return sys.stdin.buffer
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb', buffering=1 << 20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert tcpdump -e/-xx text to pcapng")
+    parser.add_argument("input", help="text dump (.gz or - for stdin)")
+    parser.add_argument("output", help="pcapng file to write")
+    parser.add_argument("--date", help="YYYY-MM-DD for time-of-day stamps (default: the dump's Date: line)")
+    parser.add_argument("--utc-offset", type=parse_utc_offset, metavar="OFFSET",
+                        help="zone of the stamps, e.g. +09:00 or KST (default: the Date: line's zone, else UTC)")
+    args = parser.parse_args()
+
+    date_ns = None
+    if args.date:
+        year, month, day = map(int, args.date.split('-'))
+        date_ns = calendar.timegm((year, month, day, 0, 0, 0)) * 1_000_000_000
+    stream = _open_text(args.input)
+    try:
+        converter = convert(stream, args.output, date_ns, os.path.basename(args.input), args.utc_offset)
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+    if converter.date_ns is None:
+        print("No date in the dump: time-of-day stamps are on 1970-01-01 (use --date)", file=sys.stderr)
+    for warning in converter.warnings:
+        print(warning, file=sys.stderr)
+    print(f"{'section':<18} {'records':>8} {'header':>7} {'incompl':>8} {'elided':>7} {'captured':>9}")
+    for section in converter.sections:
+        elided = f"{section.elided}{'+?' if section.unknown_elisions else ''}"
+        captured = "" if section.captured is None else str(section.captured)
+        missing = ""
+        if section.captured is not None and section.records + section.elided < section.captured:
+            missing = f"  ({section.captured - section.records - section.elided} not in text)"
+        print(f"{section.name:<18} {section.records:>8} {section.header_only:>7} {section.incomplete:>8} "
+              f"{elided:>7} {captured:>9}{missing}")
+    print(f"Wrote {converter.records} records ({len(converter.names)} interfaces) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
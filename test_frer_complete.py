@@ -7,17 +7,31 @@ import time
 import threading
 import json
 
-def send_udp_traffic(duration=10):
-    """Send UDP traffic from 10.0.100.1 to 10.0.100.2"""
+def send_udp_traffic(duration=10, started=None):
+    """Send UDP traffic from 10.0.100.1 to 10.0.100.2
+
+    started (a threading.Event) is set once iperf3 has connected, so callers
+    can start monitoring without guessing a startup delay.
+    """
     print("Starting UDP traffic generation...")
-    cmd = f"timeout {duration} iperf3 -c 10.0.100.2 -u -b 10M -p 5001 -t {duration}"
+    cmd = f"timeout {duration + 5} iperf3 -c 10.0.100.2 -u -b 10M -p 5001 -t {duration}"
     try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, text=True)
+        lines = []
+        for line in proc.stdout:
+            lines.append(line)
+            if started is not None and "connected" in line:
+                started.set()
+        proc.wait()
         print("Traffic generation completed")
-        return result.stdout
+        return ''.join(lines)
     except Exception as e:
         print(f"Traffic generation error: {e}")
         return None
+    finally:
+        if started is not None:
+            started.set()
 
 def check_frer_stats():
     """Check FRER statistics on receiver"""
@@ -40,15 +54,40 @@ def check_frer_stats():
     
     return stats
 
-def monitor_receiver_interface():
-    """Monitor eth3 on receiver for deduplicated traffic"""
+def monitor_receiver_interface(duration=10, out_dir="anomalies"):
+    """Watch eth3 on the receiver and keep only frames around FRER anomalies
+
+    eth3 is captured into an in-memory ring while the receiver counters are
+    polled; lost, rogue or out-of-order bursts dump the surrounding window
+    to out_dir instead of sampling the first 10 packets.
+    """
+    from board_channel import ShellChannel
+    from capture_ring import AnomalyDetector, FrameRing, RingCapture, TriggeredDump
+    from frer_counters import DEFAULT_STREAMS, CounterPoller
+
     print("\n=== Monitoring Receiver eth3 ===")
-    ssh_cmd = "ssh -o ConnectTimeout=5 root@169.254.100.2 'tcpdump -i eth3 -c 10 -n udp' 2>/dev/null"
-    result = subprocess.run(ssh_cmd, shell=True, capture_output=True, text=True, timeout=15)
-    if result.returncode == 0:
-        print("Packets on eth3 (deduplicated):")
-        print(result.stdout)
-    return result.stdout
+    ring = FrameRing()
+    capture = RingCapture("eth3", ring, bpf=("udp",), remote="root@169.254.100.2")
+    capture.start()
+    capture.ready.wait(10)
+    channel = ShellChannel()
+    detector = AnomalyDetector(warmup=10)
+    dump = TriggeredDump({"eth3": ring}, out_dir)
+    detector.subscribe(dump.on_trigger)
+    poller = CounterPoller(channel, DEFAULT_STREAMS, interval=0.1)
+    poller.subscribe(detector.on_counters)
+    poller.start()
+    try:
+        time.sleep(duration)
+    finally:
+        poller.stop()
+        channel.close()
+        dump.stop()
+        capture.stop()
+    print(f"eth3: {ring.total} frames seen, {detector.triggers} anomaly trigger(s)")
+    for path in dump.files:
+        print(f"  {path}")
+    return dump.files
 
 def monitor_sender_interfaces():
     """Monitor eth1 and eth2 on sender for R-TAG frames"""
@@ -78,15 +117,16 @@ def run_complete_test():
     print("\n2. Starting Traffic Test")
     
     # Send traffic in background
-    traffic_thread = threading.Thread(target=send_udp_traffic, args=(10,))
+    traffic_started = threading.Event()
+    traffic_thread = threading.Thread(target=send_udp_traffic, args=(10, traffic_started))
     traffic_thread.start()
     
-    # Wait a bit for traffic to start
-    time.sleep(2)
+    # Wait for iperf3 to connect
+    traffic_started.wait(10)
     
     # 3. Monitor interfaces
     monitor_sender_interfaces()
-    monitor_receiver_interface()
+    anomaly_files = monitor_receiver_interface()
     
     # Wait for traffic to complete
     traffic_thread.join()
@@ -115,7 +155,8 @@ def run_complete_test():
         json.dump({
             'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
             'initial_stats': initial_stats,
-            'final_stats': final_stats
+            'final_stats': final_stats,
+            'anomaly_captures': anomaly_files
         }, f, indent=2)
     
     print("Results saved to test_results.json")
@@ -4,12 +4,28 @@ FRER Traffic Test Script
 Tests Frame Replication and Elimination between two LAN9662 boards
 """
 
+import argparse
 import subprocess
 import time
 import threading
 import json
+import os
 from datetime import datetime
 
+from board_channel import ShellChannel
+from board_resources import ResourcePoller
+from compact_capture import CompactCapture
+from frer_counters import DEFAULT_STREAMS, CounterPoller
+from link_counters import DEFAULT_PORTS, LinkCollector, LinkPoller, LocalChannel
+from pcap_io import open_capture
+from pcap_merge import write_merged
+from phase_scheduler import PhaseScheduler
+from rollup_store import RollupStore
+from run_journal import Journal, RunCheckpoint, load_journal
+
+# Link counters change slowly next to FRER counters; keeps the channel's board CPU low
+LINK_INTERVAL = 5.0
+
 def run_command(cmd, host=None):
     """Run command locally or via SSH"""
     if host:
@@ -47,77 +63,246 @@ def get_frer_stats(host):
 
     return stats
 
-def capture_traffic(interface, duration=10):
-    """Capture traffic on specified interface"""
-    print(f"Capturing traffic on {interface} for {duration} seconds...")
+def start_capture(interface, path, compact=False):
+    """Start tcpdump in the background; returns (process, ready event)
 
-    # Capture R-TAG frames
-    cmd = f"sudo timeout {duration} tcpdump -i {interface} -w /tmp/{interface}_capture.pcap ether proto 0xf1c1 2>/dev/null"
-    subprocess.run(cmd, shell=True)
+    The event is set once tcpdump reports that it is listening, which
+    replaces a fixed sleep before traffic starts. With compact the frames
+    are stored header-only (see compact_capture.py).
+    """
+    if compact:
+        capture = CompactCapture(interface, path)
+        return capture, capture.start()
+    cmd = ["sudo", "tcpdump", "-i", interface, "-U", "--time-stamp-precision=nano",
+           "-w", path, "ether", "proto", "0xf1c1"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    ready = threading.Event()
 
-    # Count packets
-    cmd = f"sudo tcpdump -r /tmp/{interface}_capture.pcap 2>/dev/null | wc -l"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    return int(result.stdout.strip())
+    def watch():
+        for line in proc.stderr:
+            if "listening on" in line:
+                ready.set()
+        ready.set()  # exited (e.g. permission error): do not block the run
+
+    threading.Thread(target=watch, daemon=True).start()
+    return proc, ready
 
-def generate_udp_traffic(target_ip, port=5001, duration=10):
-    """Generate UDP traffic using iperf3"""
+def stop_capture(proc, timeout=5):
+    """Stop a background tcpdump so it flushes its output file"""
+    if isinstance(proc, CompactCapture):
+        proc.stop(timeout)
+        return
+    if proc.poll() is None:
+        subprocess.run(["sudo", "kill", "-INT", str(proc.pid)], capture_output=True)
+        try:
+            proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def count_frames(path):
+    """Count frames in a capture file"""
+    if not os.path.exists(path) or os.path.getsize(path) < 24:
+        return 0
+    with open_capture(path) as reader:
+        return sum(1 for _ in reader)
+
+def generate_udp_traffic(target_ip, port=5001, duration=10, bandwidth="10M", length=None, log_path=None):
+    """Generate UDP traffic using iperf3 (length: UDP payload bytes)
+
+    log_path keeps iperf3's full JSON output (per-interval rates, jitter)
+    for report_derive.py.
+    """
     print(f"Generating UDP traffic to {target_ip}:{port} for {duration} seconds...")
-    cmd = f"iperf3 -c {target_ip} -p {port} -u -b 10M -t {duration} -J"
+    cmd = f"iperf3 -c {target_ip} -p {port} -u -b {bandwidth} -t {duration} -J"
+    if length:
+        cmd += f" -l {length}"
     result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    if log_path:
+        with open(log_path, 'w') as f:
+            f.write(result.stdout)
 
     try:
         data = json.loads(result.stdout)
         return {
             'sent_packets': data['end']['sum']['packets'],
             'lost_packets': data['end']['sum']['lost_packets'],
-            'lost_percent': data['end']['sum']['lost_percent']
+            'lost_percent': data['end']['sum']['lost_percent'],
+            'jitter_ms': data['end']['sum'].get('jitter_ms')
         }
     except:
         return None
 
-def main():
-    print("=== FRER Test Started ===")
-    print(f"Time: {datetime.now()}")
+def start_counter_series(host, interval=1.0, store=None, checkpoint=None):
+    """Poll the receiver's FRER counters, CPU/memory/IRQ load and the link
+    counters of its ports and the PC's into a rollup store
 
-    receiver_ip = "169.254.100.2"
-    test_duration = 30
+    Returns (pollers, channels, store); the pollers share the receiver channel.
+    checkpoint (a run_journal.RunCheckpoint) journals every counter poll.
+    """
+    channel = ShellChannel(host=host)
+    local = LocalChannel()
+    store = RollupStore() if store is None else store
+    poller = CounterPoller(channel, DEFAULT_STREAMS, interval)
+    poller.subscribe(store.on_counters)
+    if checkpoint is not None:
+        poller.subscribe(checkpoint.on_counters)
+    resources = ResourcePoller(channel, interval)
+    resources.subscribe(lambda ts_ns, metrics: store.add(ts_ns / 1e9, metrics))
+    # FRER counters are already polled above
+    hosts = {"pc": (local, DEFAULT_PORTS["pc"]), "receiver": (channel, DEFAULT_PORTS["receiver"])}
+    links = LinkPoller(LinkCollector(hosts, frer_node=None), LINK_INTERVAL)
+    links.subscribe(lambda ts_ns, metrics: store.add(ts_ns / 1e9, metrics))
+    pollers = (poller, resources, links)
+    for each in pollers:
+        each.start()
+    return pollers, (channel, local), store
 
-    # Clear FRER counters
-    print("\n1. Clearing FRER counters on receiver...")
-    run_command("frer cs 0 --clr", receiver_ip)
-    run_command("frer ms eth1 28 --clr", receiver_ip)
-    run_command("frer ms eth2 30 --clr", receiver_ip)
+def clear_frer_counters(host):
+    """Clear compound and member stream counters on the receiver"""
+    run_command("frer cs 0 --clr", host)
+    run_command("frer ms eth1 28 --clr", host)
+    run_command("frer ms eth2 30 --clr", host)
 
-    # Get initial stats
-    print("\n2. Getting initial FRER stats...")
-    initial_stats = get_frer_stats(receiver_ip)
+def add_run_phases(scheduler, run_id, receiver_ip, duration, interfaces, capture_dir, previous=None,
+                   compact=False, firmware=None, journal=None, resume=None):
+    """Add the phases of one test run to a scheduler
 
-    # Start packet capture threads
-    print("\n3. Starting packet captures...")
-    captures = {}
-    interfaces = ['enp11s0', 'enp15s0', 'enp2s0']
+    Traffic starts as soon as every capture is listening and captures stop
+    as soon as traffic completes. When previous names an earlier run, this
+    run's board setup waits only for that run's final stats and captures,
+    so the earlier run's analysis overlaps this run's setup. firmware is
+    recorded in the run's test_configuration for regression_check.py.
 
-    threads = []
-    for iface in interfaces:
-        t = threading.Thread(target=lambda i=iface: captures.update({i: capture_traffic(i, test_duration)}))
-        t.start()
-        threads.append(t)
+    With a journal (run_journal.Journal) counters, capture sizes and phase
+    results are checkpointed as the run goes. resume is the journal's
+    RunState of this run after a crash: counters are not cleared, totals
+    and the counter series continue from the journal, traffic runs for the
+    remaining time and captures go to a new segment file.
+    """
+    p = f"{run_id}:"
+    ext = "pcapng" if compact else "pcap"
+    segment = len(resume.segments) if resume else 0
+    suffix = f".{segment}" if segment else ""
+    paths = {iface: os.path.join(capture_dir, f"{run_id}_{iface}_capture{suffix}.{ext}") for iface in interfaces}
+    segments = [resume.segments[s]["paths"] for s in sorted(resume.segments)] if resume else []
+    checkpoint = RunCheckpoint(journal, run_id, resume.counters if resume else None, paths, segment,
+                               resumed=resume is not None) if journal else None
+    traffic_duration = max(1, round(duration - resume.traffic_seconds)) if resume else duration
+    counters_path = os.path.join(capture_dir, f"{run_id}_counters.json")
+    generator_path = os.path.join(capture_dir, f"{run_id}_iperf3.json")
+    board_free = [f"{previous}:final", f"{previous}:capture"] if previous else []
 
-    # Generate traffic
-    print("\n4. Generating UDP test traffic...")
-    time.sleep(2)  # Let captures start
-    traffic_stats = generate_udp_traffic('10.0.100.2', duration=test_duration-4)
+    def journal_phase(name, result):
+        if journal:
+            journal.append("phase", sync=True, run=run_id, name=name, result=result)
+        return result
 
-    # Wait for captures to complete
-    for t in threads:
-        t.join()
+    def clear(phase):
+        # A resumed run keeps counting from the journaled totals
+        if not resume:
+            clear_frer_counters(receiver_ip)
 
-    # Get final FRER stats
-    print("\n5. Getting final FRER stats...")
-    final_stats = get_frer_stats(receiver_ip)
+    def initial(phase):
+        if resume and "initial" in resume.phases:
+            return resume.phases["initial"]
+        return journal_phase("initial", get_frer_stats(receiver_ip))
+
+    def capture(phase):
+        procs = {iface: start_capture(iface, path, compact) for iface, path in paths.items()}
+        for _, ready in procs.values():
+            ready.wait(10)
+        # Counter time series over the traffic, for report_derive.py
+        store = None
+        if resume:
+            store = RollupStore()
+            resume.replay_into(store)
+        pollers, channels, store = start_counter_series(receiver_ip, store=store, checkpoint=checkpoint)
+        if checkpoint:
+            checkpoint.record_offsets(sync=True)
+        phase.signal_ready()
+        phase.wait_done(p + "traffic")
+        for proc, _ in procs.values():
+            stop_capture(proc)
+        for poller in pollers:
+            poller.stop()
+        # One last sample after the traffic, so the totals cover all of it
+        for poller in pollers:
+            poller.poll_once()
+        for channel in channels:
+            channel.close()
+        store.save(counters_path)
+        if checkpoint:
+            checkpoint.record_offsets(sync=True)
+        return paths
+
+    def traffic(phase):
+        if checkpoint:
+            checkpoint.traffic("start")
+        stats = generate_udp_traffic('10.0.100.2', duration=traffic_duration, log_path=generator_path)
+        if checkpoint:
+            checkpoint.traffic("stop")
+        return journal_phase("traffic", stats)
+
+    def final(phase):
+        return journal_phase("final", get_frer_stats(receiver_ip))
+
+    def analysis(phase):
+        captures = {iface: sum(count_frames(earlier[iface]) for earlier in segments if iface in earlier)
+                    + count_frames(path) for iface, path in paths.items()}
+        existing = {path: iface for iface, path in paths.items()
+                    if os.path.exists(path) and os.path.getsize(path) >= 24}
+        merged_path = os.path.join(capture_dir, f"{run_id}_merged.pcapng")
+        merged_counts = write_merged(list(existing), merged_path, existing) if existing else {}
+        results = {
+            'timestamp': datetime.now().isoformat(),
+            'test_duration': duration,
+            'traffic_stats': phase.result_of(p + "traffic"),
+            'captures': captures,
+            'capture_files': paths,
+            'counter_series': counters_path,
+            'generator_log': generator_path,
+            'merged_capture': merged_path if merged_counts else None,
+            'frer_initial': phase.result_of(p + "initial"),
+            'frer_final': phase.result_of(p + "final"),
+            'test_configuration': {
+                'sender_board': {'firmware': firmware},
+                'receiver_board': {'firmware': firmware},
+            },
+        }
+        if checkpoint:
+            counters = checkpoint.counters
+            # Monotonic across counter wraps, board resets and resumes
+            results['frer_delta'] = dict(counters.totals)
+            results['counter_events'] = {'wraps': counters.wraps, 'stream_restarts': counters.resets}
+        if segments:
+            results['capture_segments'] = {iface: [earlier[iface] for earlier in segments if iface in earlier]
+                                           + [path] for iface, path in paths.items()}
+        if journal:
+            journal.append("run", sync=True, run=run_id, results=results)
+        return results
+
+    scheduler.add(p + "clear", clear, after=board_free)
+    scheduler.add(p + "initial", initial, after=[p + "clear"])
+    scheduler.add(p + "capture", capture, after=[p + "initial"])
+    scheduler.add(p + "traffic", traffic, after_ready=[p + "capture"])
+    scheduler.add(p + "final", final, after=[p + "traffic"])
+    # Analyses run one at a time, in parallel with the next run's traffic
+    scheduler.add(p + "analysis", analysis, after=[p + "capture", p + "final"] +
+                  ([f"{previous}:analysis"] if previous else []))
+    return p + "analysis"
+
+def print_results(results):
+    """Print the summary of one run"""
+    traffic_stats = results['traffic_stats']
+    initial_stats = results['frer_initial'] or {}
+    final_stats = results['frer_final'] or {}
+    totals = results.get('frer_delta')
+
+    def delta(key):
+        if totals and key in totals:
+            return totals[key]
+        return final_stats.get(key, 0) - initial_stats.get(key, 0)
 
-    # Calculate results
     print("\n=== TEST RESULTS ===")
 
     if traffic_stats:
@@ -126,38 +311,93 @@ def main():
         print(f"  Lost: {traffic_stats.get('lost_packets', 0)} packets ({traffic_stats.get('lost_percent', 0):.2f}%)")
 
     print(f"\nPacket Captures:")
-    for iface, count in captures.items():
+    for iface, count in results['captures'].items():
         print(f"  {iface}: {count} R-TAG frames")
+    if results['merged_capture']:
+        print(f"  Merged timeline: {results['merged_capture']}")
 
     print(f"\nFRER Statistics:")
     print(f"  Compound Stream (CS 0):")
-    print(f"    Passed: {final_stats.get('cs0_PassedPackets', 0) - initial_stats.get('cs0_PassedPackets', 0)}")
-    print(f"    Discarded: {final_stats.get('cs0_DiscardedPackets', 0) - initial_stats.get('cs0_DiscardedPackets', 0)}")
-    print(f"    Lost: {final_stats.get('cs0_LostPackets', 0) - initial_stats.get('cs0_LostPackets', 0)}")
+    print(f"    Passed: {delta('cs0_PassedPackets')}")
+    print(f"    Discarded: {delta('cs0_DiscardedPackets')}")
+    print(f"    Lost: {delta('cs0_LostPackets')}")
 
     print(f"\n  Member Stream eth1 (MS 28):")
-    print(f"    Passed: {final_stats.get('ms28_PassedPackets', 0) - initial_stats.get('ms28_PassedPackets', 0)}")
-    print(f"    Discarded: {final_stats.get('ms28_DiscardedPackets', 0) - initial_stats.get('ms28_DiscardedPackets', 0)}")
+    print(f"    Passed: {delta('ms28_PassedPackets')}")
+    print(f"    Discarded: {delta('ms28_DiscardedPackets')}")
 
     print(f"\n  Member Stream eth2 (MS 30):")
-    print(f"    Passed: {final_stats.get('ms30_PassedPackets', 0) - initial_stats.get('ms30_PassedPackets', 0)}")
-    print(f"    Discarded: {final_stats.get('ms30_DiscardedPackets', 0) - initial_stats.get('ms30_DiscardedPackets', 0)}")
+    print(f"    Passed: {delta('ms30_PassedPackets')}")
+    print(f"    Discarded: {delta('ms30_DiscardedPackets')}")
 
-    # Save results
-    results = {
-        'timestamp': datetime.now().isoformat(),
-        'test_duration': test_duration,
-        'traffic_stats': traffic_stats,
-        'captures': captures,
-        'frer_initial': initial_stats,
-        'frer_final': final_stats
-    }
+def main():
+    parser = argparse.ArgumentParser(description="FRER traffic test")
+    parser.add_argument("--runs", type=int, default=1, help="back-to-back runs (pipelined)")
+    parser.add_argument("--duration", type=int, default=30, help="traffic seconds per run")
+    parser.add_argument("--output-dir", default="test_runs", help="per-run results when --runs > 1")
+    parser.add_argument("--compact", action="store_true", help="store captures header-only")
+    parser.add_argument("--firmware", help="board firmware version recorded with each run (e.g. v2.1.0)")
+    parser.add_argument("--journal", default="test_journal.log", help="checkpoint journal of the runs")
+    parser.add_argument("--resume", action="store_true", help="continue the runs recorded in --journal")
+    args = parser.parse_args()
+
+    journaled = load_journal(args.journal) if args.resume and os.path.exists(args.journal) else {}
+    if not args.resume and os.path.exists(args.journal):
+        unfinished = [run_id for run_id, run in load_journal(args.journal).items() if run.results is None]
+        if unfinished:
+            print(f"{args.journal} has unfinished runs ({', '.join(unfinished)}): "
+                  f"use --resume, or remove it to start over")
+            return
+    journal = Journal(args.journal, resume=args.resume)
+
+    print("=== FRER Test Started ===")
+    print(f"Time: {datetime.now()}")
+
+    receiver_ip = "169.254.100.2"
+    interfaces = ['enp11s0', 'enp15s0', 'enp2s0']
+
+    scheduler = PhaseScheduler()
+    previous = None
+    run_ids = [f"run{i:03d}" for i in range(args.runs)]
+    finished = {}
+    for run_id in run_ids:
+        state = journaled.get(run_id)
+        if state and state.results is not None:
+            finished[f"{run_id}:analysis"] = state.results
+            continue
+        if state:
+            print(f"Resuming {run_id} after {state.traffic_seconds:.0f} s of journaled traffic")
+        add_run_phases(scheduler, run_id, receiver_ip, args.duration, interfaces, '/tmp', previous, args.compact,
+                       args.firmware, journal, state)
+        previous = run_id
+
+    print(f"\nRunning {args.runs} run(s) of {args.duration} s traffic...")
+    started = time.monotonic()
+    try:
+        results = scheduler.run()
+    finally:
+        journal.close()
+    results.update(finished)
+    elapsed = time.monotonic() - started
+    traffic_time = sum(end - start for name, start, end in scheduler.timings() if name.endswith(":traffic"))
 
-    with open('test_results.json', 'w') as f:
-        json.dump(results, f, indent=2)
+    if args.runs == 1:
+        run_results = results[f"{run_ids[0]}:analysis"]
+        print_results(run_results)
+        with open('test_results.json', 'w') as f:
+            json.dump(run_results, f, indent=2)
+        print("\n=== Test Complete ===")
+        print("Results saved to test_results.json")
+    else:
+        os.makedirs(args.output_dir, exist_ok=True)
+        for run_id in run_ids:
+            with open(os.path.join(args.output_dir, f"{run_id}.json"), 'w') as f:
+                json.dump(results[f"{run_id}:analysis"], f, indent=2)
+        print("\n=== Suite Complete ===")
+        print(f"Results saved to {args.output_dir}/")
 
-    print("\n=== Test Complete ===")
-    print("Results saved to test_results.json")
+    print(f"Wall time {elapsed:.1f} s, traffic {traffic_time:.1f} s "
+          f"({100 * traffic_time / elapsed if elapsed else 0:.0f}%)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
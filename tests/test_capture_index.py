@@ -0,0 +1,19 @@
+from capture_index import CaptureIndex, build_index
+from generate_pcap_hex import create_rtag_frame
+from pcap_io import PcapWriter
+
+
+def test_late_frame_before_first_wrap(tmp_path):
+    # The capture starts just after a wrap: 65535 arrives late, in epoch 0
+    path = str(tmp_path / "late.pcap")
+    sequences = [0, 1, 2, 65535, 3, 4]
+    with PcapWriter(path) as writer:
+        for index, seq in enumerate(sequences):
+            writer.write(create_rtag_frame(seq), ts_ns=1_000_000_000 + index)
+    build_index(path)
+    with CaptureIndex(path, rebuild=False) as index:
+        assert len(index.keys) == len(sequences)
+        assert index.offset_of(65535) is not None
+        for seq in (0, 1, 2, 3, 4):
+            assert index.offset_of(seq) is not None
+        assert len(index.offsets_around(2, context=2)) == 5
@@ -0,0 +1,54 @@
+from run_journal import Journal, MonotonicCounters, RunCheckpoint, _encode, load_journal
+
+S = 1_000_000_000
+
+
+def test_drop_after_long_gap_is_a_restart():
+    counters = MonotonicCounters()
+    counters.update({"cs0": {"PassedPackets": 1_000_000}}, 0)
+    deltas = counters.update({"cs0": {"PassedPackets": 500}}, 3600 * S)
+    assert deltas == {"cs0_PassedPackets": 500}
+    assert (counters.wraps, counters.resets) == (0, 1)
+
+
+def test_wrap_within_poll_interval():
+    counters = MonotonicCounters()
+    counters.update({"cs0": {"PassedPackets": (1 << 32) - 1000}}, 0)
+    deltas = counters.update({"cs0": {"PassedPackets": 500}}, 1 * S)
+    assert deltas == {"cs0_PassedPackets": 1500}
+    assert (counters.wraps, counters.resets) == (1, 0)
+
+
+def test_first_sample_after_resume_is_a_baseline(tmp_path):
+    path = str(tmp_path / "journal.log")
+    journal = Journal(path)
+    checkpoint = RunCheckpoint(journal, "run000")
+    checkpoint.on_counters(0, {"cs0": {"PassedPackets": (1 << 32) - 100}})
+    journal.close()
+
+    # Resumed half a second later: the drop would fit a wrap, but the board
+    # may have rebooted while the run was down
+    state = load_journal(path)["run000"]
+    journal = Journal(path, resume=True)
+    checkpoint = RunCheckpoint(journal, "run000", state.counters, segment=1, resumed=True)
+    checkpoint.on_counters(S // 2, {"cs0": {"PassedPackets": 50}})
+    journal.close()
+    assert (checkpoint.counters.wraps, checkpoint.counters.resets) == (0, 1)
+
+    replayed = load_journal(path)["run000"].counters
+    assert replayed.totals == checkpoint.counters.totals == {"cs0_PassedPackets": 50}
+    assert (replayed.wraps, replayed.resets) == (0, 1)
+
+
+def test_traffic_seconds_excludes_downtime(tmp_path):
+    path = tmp_path / "journal.log"
+    records = [{"k": "sample", "t": 990, "run": "run000", "ts": 990 * S, "raw": {"cs0_PassedPackets": 0}},
+               {"k": "traffic", "t": 1000, "run": "run000", "event": "start"},
+               {"k": "sample", "t": 1100, "run": "run000", "ts": 1100 * S, "raw": {"cs0_PassedPackets": 1}},
+               {"k": "traffic", "t": 1100, "run": "run000", "event": "stop"},
+               # Crash, one hour down, resume: 20 s of traffic before the next crash
+               {"k": "resume", "t": 4700, "run": "run000", "segment": 1},
+               {"k": "traffic", "t": 4700, "run": "run000", "event": "start"},
+               {"k": "sample", "t": 4720, "run": "run000", "ts": 4720 * S, "raw": {"cs0_PassedPackets": 2}}]
+    path.write_bytes(b''.join(_encode(record) for record in records))
+    assert load_journal(str(path))["run000"].traffic_seconds == 120.0
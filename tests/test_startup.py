@@ -0,0 +1,5 @@
+import frer_test
+
+
+def test_startup_within_budget():
+    assert frer_test.check_startup(), f"frer-test start-up over {frer_test.STARTUP_BUDGET_MS} ms (see output)"
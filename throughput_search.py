@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+RFC 2544-style throughput and loss search for FRER paths
+
+For each frame size, binary-searches the offered load for the highest rate
+at which the receiver's compound stream loses and reorders no more than the
+allowed fraction of frames. Trials run back to back without clearing the
+board: the counter snapshot taken after one trial is the baseline of the
+next. A trial's pass/fail verdict needs only those counter deltas, so the
+detailed analysis (per-stream deltas, capture sequence statistics) runs in
+a background thread while the next trial is already sending.
+
+Usage:
+    python3 throughput_search.py run --build v2.1.0
+    python3 throughput_search.py run --build sim --sim --sim-capacity-fps 300000
+    python3 throughput_search.py plot throughput_v2.1.0.json throughput_v2.2.0.json
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from board_channel import CallableChannel, ShellChannel
+from frer_counters import DEFAULT_STREAMS, elimination_rate, read_counters
+
+FRAME_SIZES = [64, 128, 256, 512, 1024, 1280, 1518]
+LINE_RATE_BPS = 1_000_000_000
+# Preamble + start delimiter + inter-frame gap
+WIRE_OVERHEAD = 20
+# Ethernet header + FCS, IPv4 + UDP headers
+ETH_OVERHEAD = 18
+IP_UDP_HEADERS = 28
+RTAG_BYTES = 6
+
+Trial = namedtuple('Trial', 'frame_size rate_fps sent lost out_of_order passed')
+
+
+def max_frame_rate(frame_size, line_rate=LINE_RATE_BPS):
+    """Theoretical frames per second of a frame size at line rate"""
+    return line_rate / ((frame_size + WIRE_OVERHEAD) * 8)
+
+
+def udp_payload_length(frame_size):
+    """UDP payload bytes that produce an untagged frame of frame_size"""
+    return frame_size - ETH_OVERHEAD - IP_UDP_HEADERS
+
+
+def counter_deltas(before, after):
+    """Per-stream counter differences; a counter that went backwards was reset"""
+    deltas = {}
+    for stream, values in after.items():
+        base = before.get(stream, {})
+        deltas[stream] = {name: value - base.get(name, 0) if value >= base.get(name, 0) else value
+                          for name, value in values.items()}
+    return deltas
+
+
+class IperfSource:
+    """Offered load from iperf3 on the test PC, optionally captured per trial"""
+
+    def __init__(self, target_ip='10.0.100.2', port=5001, capture_interfaces=(), capture_dir='/tmp'):
+        self.target_ip = target_ip
+        self.port = port
+        self.capture_interfaces = list(capture_interfaces)
+        self.capture_dir = capture_dir
+        self.trials = 0
+
+    def send(self, frame_size, rate_fps, duration):
+        # Imported here so the simulated search runs without the test PC tools
+        from test_traffic import generate_udp_traffic, start_capture, stop_capture
+
+        self.trials += 1
+        length = udp_payload_length(frame_size)
+        captures = {iface: os.path.join(self.capture_dir, f"rfc2544_{self.trials:04d}_{iface}.pcap")
+                    for iface in self.capture_interfaces}
+        procs = [start_capture(iface, path) for iface, path in captures.items()]
+        for _, ready in procs:
+            ready.wait(10)
+        try:
+            stats = generate_udp_traffic(self.target_ip, self.port, duration,
+                                         bandwidth=str(int(rate_fps * length * 8)), length=length)
+        finally:
+            for proc, _ in procs:
+                stop_capture(proc)
+        result = dict(stats or {})
+        result['captures'] = captures
+        return result
+
+
+class SimulatedSource:
+    """Offered load injected into board_sim with a forwarding bottleneck
+
+    Frames above the capacity (frames/s, and bits/s including the R-TAG)
+    are dropped on each path independently.
+    """
+
+    def __init__(self, simulator, capacity_fps=1_000_000.0, capacity_bps=LINE_RATE_BPS):
+        self.simulator = simulator
+        self.capacity_fps = capacity_fps
+        self.capacity_bps = capacity_bps
+
+    def send(self, frame_size, rate_fps, duration):
+        capacity = min(self.capacity_fps,
+                       self.capacity_bps / ((frame_size + RTAG_BYTES + WIRE_OVERHEAD) * 8))
+        excess = max(0.0, 1.0 - capacity / rate_fps) if rate_fps else 0.0
+        frames = int(round(rate_fps * duration))
+        with self.simulator.lock:
+            saved = dict(self.simulator.loss)
+            self.simulator.loss = {dev: max(p, excess) for dev, p in saved.items()}
+            try:
+                self.simulator.inject(frames)
+            finally:
+                self.simulator.loss = saved
+        return {'sent_packets': frames, 'captures': {}}
+
+
+def analyze_trial(trial, deltas, traffic, duration):
+    """Detailed record of one trial (runs in the background)"""
+    from pcap_io import open_capture
+    from rtag_frames import track_sequences
+
+    cs = deltas.get('cs0', {})
+    record = dict(trial._asdict())
+    record.update({
+        'duration': duration,
+        'throughput_fps': round(cs.get('PassedPackets', 0) / duration, 1),
+        'throughput_mbps': round(cs.get('PassedPackets', 0) * trial.frame_size * 8 / duration / 1e6, 3),
+        'elimination_rate': round(elimination_rate(cs.get('PassedPackets', 0), cs.get('DiscardedPackets', 0)), 4),
+        'loss_percent': round(100.0 * trial.lost / trial.sent, 6) if trial.sent else 0.0,
+        'counters': deltas,
+        'generator': {key: value for key, value in (traffic or {}).items() if key != 'captures'},
+        'captures': {},
+    })
+    for iface, path in (traffic or {}).get('captures', {}).items():
+        if os.path.exists(path) and os.path.getsize(path) >= 24:
+            with open_capture(path) as reader:
+                record['captures'][iface] = track_sequences(reader).as_dict()
+    return record
+
+
+class ThroughputSearch:
+    """Binary search of the loss-free (within thresholds) rate per frame size"""
+
+    def __init__(self, source, channel, streams=DEFAULT_STREAMS, duration=10,
+                 loss_threshold=0.0, ooo_threshold=0.0, resolution=0.005,
+                 line_rate=LINE_RATE_BPS, settle_reads=20):
+        self.source = source
+        self.channel = channel
+        self.streams = streams
+        self.duration = duration
+        self.loss_threshold = loss_threshold
+        self.ooo_threshold = ooo_threshold
+        self.resolution = resolution
+        self.line_rate = line_rate
+        self.settle_reads = settle_reads
+        self.futures = []
+        self._snapshot = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _settled_counters(self):
+        """Counters once two consecutive reads agree (frames in flight drained)"""
+        previous = read_counters(self.channel, self.streams)
+        for _ in range(self.settle_reads):
+            current = read_counters(self.channel, self.streams)
+            if current == previous:
+                break
+            previous = current
+        return previous
+
+    def run_trial(self, frame_size, rate_fps):
+        """Offer rate_fps for one trial; returns the Trial verdict"""
+        before = self._snapshot if self._snapshot is not None else self._settled_counters()
+        traffic = self.source.send(frame_size, rate_fps, self.duration)
+        after = self._settled_counters()
+        self._snapshot = after
+
+        deltas = counter_deltas(before, after)
+        cs = deltas.get('cs0', {})
+        lost = cs.get('LostPackets', 0)
+        ooo = cs.get('OutOfOrderPackets', 0)
+        # Sequence numbers seen by the receiver, the generator count as fallback
+        sent = cs.get('PassedPackets', 0) + lost or (traffic or {}).get('sent_packets', 0)
+        passed = (sent > 0 and lost <= self.loss_threshold * sent
+                  and ooo <= self.ooo_threshold * sent)
+        trial = Trial(frame_size, round(rate_fps, 1), sent, lost, ooo, passed)
+        self.futures.append(self._executor.submit(analyze_trial, trial, deltas, traffic, self.duration))
+        return trial
+
+    def search(self, frame_size, report=print):
+        """Highest passing rate for one frame size, in frames per second"""
+        maximum = max_frame_rate(frame_size, self.line_rate)
+        low, high, rate = 0.0, maximum, maximum
+        best, trials = 0.0, 0
+        while True:
+            trial = self.run_trial(frame_size, rate)
+            trials += 1
+            report(f"  {frame_size:>5} B  {100 * rate / maximum:6.2f}%  {rate:>12.0f} fps  "
+                   f"lost {trial.lost:<8} ooo {trial.out_of_order:<6} {'PASS' if trial.passed else 'FAIL'}")
+            if trial.passed:
+                best = low = rate
+            else:
+                high = rate
+            if high - low <= self.resolution * maximum:
+                break
+            rate = (low + high) / 2
+        return {
+            'frame_size': frame_size,
+            'throughput_fps': round(best, 1),
+            'throughput_mbps': round(best * frame_size * 8 / 1e6, 3),
+            'line_rate_percent': round(100 * best / maximum, 3),
+            'trials': trials,
+        }
+
+    def run(self, frame_sizes=FRAME_SIZES, report=print):
+        """Search every frame size; returns (table, trial records)"""
+        table = [self.search(size, report) for size in frame_sizes]
+        records = [future.result() for future in self.futures]
+        self._executor.shutdown()
+        return table, records
+
+
+def print_table(results):
+    print(f"\n=== Throughput ({results['build']}) ===")
+    print(f"{'Frame':>6}  {'Frames/s':>12}  {'Mbps':>10}  {'Line rate':>9}  Trials")
+    for row in results['table']:
+        print(f"{row['frame_size']:>6}  {row['throughput_fps']:>12.0f}  {row['throughput_mbps']:>10.1f}  "
+              f"{row['line_rate_percent']:>8.2f}%  {row['trials']}")
+
+
+def plot_curves(paths, output):
+    """Throughput curve per build (one result file each) as an HTML chart"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for path in paths:
+        with open(path) as f:
+            results = json.load(f)
+        table = results['table']
+        fig.add_trace(go.Scatter(
+            x=[row['frame_size'] for row in table],
+            y=[row['line_rate_percent'] for row in table],
+            mode='lines+markers',
+            name=results['build'],
+            customdata=[row['throughput_mbps'] for row in table],
+            hovertemplate='<b>Frame:</b> %{x} B<br><b>Line rate:</b> %{y:.2f}%'
+                          '<br><b>Throughput:</b> %{customdata:.1f} Mbps<extra></extra>'
+        ))
+    fig.update_layout(
+        title="FRER Throughput by Frame Size",
+        xaxis_title="Frame size (bytes)",
+        yaxis_title="Throughput (% of line rate)",
+        xaxis=dict(type='log', tickvals=FRAME_SIZES),
+        height=500,
+        template='plotly_white'
+    )
+    fig.write_html(output)
+    print(f"Chart saved to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RFC 2544-style FRER throughput search")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="search the throughput per frame size")
+    run.add_argument("--build", required=True, help="firmware build label for the results")
+    run.add_argument("--sizes", type=int, nargs="+", default=FRAME_SIZES)
+    run.add_argument("--duration", type=float, default=10.0, help="seconds per trial")
+    run.add_argument("--loss-threshold", type=float, default=0.0, help="allowed lost fraction")
+    run.add_argument("--ooo-threshold", type=float, default=0.0, help="allowed out-of-order fraction")
+    run.add_argument("--resolution", type=float, default=0.005, help="search stop, fraction of line rate")
+    run.add_argument("--line-rate", type=float, default=LINE_RATE_BPS)
+    run.add_argument("--capture", nargs="*", default=[], metavar="IFACE",
+                     help="capture each trial on these PC interfaces")
+    run.add_argument("--sim", action="store_true", help="search against an in-process board simulator")
+    run.add_argument("--sim-capacity-fps", type=float, default=1_000_000.0)
+    run.add_argument("--output", help="result file (default throughput_<build>.json)")
+
+    plot = sub.add_parser("plot", help="plot throughput curves of several builds")
+    plot.add_argument("results", nargs="+")
+    plot.add_argument("--output", default="docs/chart_throughput.html")
+    args = parser.parse_args()
+
+    if args.command == "plot":
+        plot_curves(args.results, args.output)
+        return
+
+    if args.sim:
+        from board_sim import Simulator
+        simulator = Simulator(start_traffic=False)
+        channel = CallableChannel(lambda command: simulator.run("receiver", command)[0])
+        source = SimulatedSource(simulator, capacity_fps=args.sim_capacity_fps)
+    else:
+        channel = ShellChannel()
+        source = IperfSource(capture_interfaces=args.capture)
+
+    search = ThroughputSearch(source, channel, duration=args.duration,
+                              loss_threshold=args.loss_threshold, ooo_threshold=args.ooo_threshold,
+                              resolution=args.resolution, line_rate=args.line_rate)
+    print(f"=== RFC 2544 Throughput Search ({args.build}) ===")
+    started = time.monotonic()
+    try:
+        table, trials = search.run(args.sizes)
+    finally:
+        channel.close()
+
+    results = {
+        'build': args.build,
+        'timestamp': datetime.now().isoformat(),
+        'line_rate_bps': args.line_rate,
+        'trial_duration': args.duration,
+        'loss_threshold': args.loss_threshold,
+        'ooo_threshold': args.ooo_threshold,
+        'elapsed_seconds': round(time.monotonic() - started, 1),
+        'table': table,
+        'trials': trials,
+    }
+    output = args.output or f"throughput_{args.build}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print_table(results)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Concurrent topology discovery of the PC and board ports
+
+Instead of probing one interface and one board at a time, discovery:
+
+1. reads every board's port counters, bridge FDB and neighbour table at
+   once (one batched round trip per board, all boards in parallel)
+2. sends a burst of uniquely tagged broadcast probes on every PC interface
+   in parallel; each interface gets its own locally administered source
+   MAC (carrying a per-run nonce) and its own burst length
+3. reads the boards again and matches: a probe MAC learned on a board port
+   whose RX counter rose by at least the burst length is a verified
+   PC-to-board link; board-to-board links come from each board's FDB
+   holding the neighbour board's port MAC; ports that are not bridged
+   (eth0) are matched on the counter delta alone
+
+The result is a port-to-port map with the evidence for each link, the
+board roles it implies (the board on enp2s0 is the sender) and any
+difference from the README cabling.
+
+Usage:
+    sudo python3 topology_discovery.py
+    python3 topology_discovery.py --sim                 # simulated topology
+    python3 topology_discovery.py --sim --sim-swap --json topology.json
+"""
+
+import argparse
+import json
+import random
+import re
+import socket
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from board_channel import RECEIVER_HOST, SERIAL_PORT, ChannelError
+
+PC_INTERFACES = ("enp2s0", "enp11s0", "enp15s0")
+# IEEE 802 local experimental ethertype
+PROBE_ETHERTYPE = 0x88B5
+# Burst length per interface, distinct so counter deltas tell the bursts apart
+PROBE_COUNTS = (7, 11, 13, 17, 19, 23)
+PROBE_MAGIC = b'FRER-PROBE'
+MIN_FRAME = 60
+FCS_BYTES = 4
+# Time for the last probes to be counted and learned before the second read
+SETTLE = 0.05
+BOARD_COMMANDS = ["ip -s link", "bridge fdb show", "ip neigh show"]
+
+# README cabling by board role
+EXPECTED_LINKS = {
+    ("pc", "enp2s0"): ("sender", "eth3"),
+    ("sender", "eth1"): ("receiver", "eth1"),
+    ("sender", "eth2"): ("receiver", "eth2"),
+    ("receiver", "eth3"): ("pc", "enp15s0"),
+}
+
+# a, b: (node, port) endpoints; evidence: how the link was verified
+Link = namedtuple('Link', 'a b evidence')
+
+_LINK_HEADER = re.compile(r'^\d+: ([^:@\s]+)(?:@\S+)?: <')
+_ETHER = re.compile(r'link/ether ([0-9a-f:]{17})')
+_FDB = re.compile(r'^([0-9a-f:]{17}) dev (\S+)(.*)$')
+_NEIGH = re.compile(r'^(\S+) dev (\S+) lladdr ([0-9a-f:]{17})')
+
+
+def parse_link_stats(text):
+    """{port: {"mac", "rx_packets", "rx_bytes", "tx_packets", "tx_bytes"}} from `ip -s link`"""
+    ports, port, expect = {}, None, None
+    for line in text.splitlines():
+        header = _LINK_HEADER.match(line)
+        if header:
+            port = ports.setdefault(header.group(1), {"mac": None})
+            expect = None
+            continue
+        if port is None:
+            continue
+        stripped = line.strip()
+        if expect:
+            values = stripped.split()
+            if len(values) >= 2 and values[0].isdigit():
+                port[f"{expect}_bytes"], port[f"{expect}_packets"] = int(values[0]), int(values[1])
+            expect = None
+            continue
+        if stripped.startswith("RX:"):
+            expect = "rx"
+        elif stripped.startswith("TX:"):
+            expect = "tx"
+        else:
+            ether = _ETHER.search(line)
+            if ether:
+                port["mac"] = ether.group(1)
+    return ports
+
+
+def parse_fdb(text):
+    """[(mac, port)] learned (non-permanent) entries of `bridge fdb show`"""
+    learned = []
+    for line in text.splitlines():
+        match = _FDB.match(line.strip())
+        if match and "permanent" not in match.group(3) and " self" not in match.group(3):
+            learned.append((match.group(1), match.group(2)))
+    return learned
+
+
+def parse_neighbors(text):
+    """[(address, dev, mac)] from `ip neigh show`"""
+    return [match.groups() for match in map(_NEIGH.match, text.splitlines()) if match]
+
+
+def probe_mac(nonce, index):
+    return f"02:fd:{nonce >> 8 & 0xff:02x}:{nonce & 0xff:02x}:00:{index:02x}"
+
+
+def probe_frame(src_mac, nonce, iface):
+    payload = PROBE_MAGIC + nonce.to_bytes(2, 'big') + iface.encode()[:32]
+    frame = (b'\xff' * 6 + bytes.fromhex(src_mac.replace(':', '')) +
+             PROBE_ETHERTYPE.to_bytes(2, 'big') + payload)
+    return frame.ljust(MIN_FRAME, b'\0')
+
+
+class RawProber:
+    """Sends probe bursts through AF_PACKET sockets (needs CAP_NET_RAW)"""
+
+    def send(self, iface, frame, count):
+        with socket.socket(socket.AF_PACKET, socket.SOCK_RAW) as sock:
+            sock.bind((iface, 0))
+            for _ in range(count):
+                sock.send(frame)
+
+
+class SimProber:
+    """Sends probe bursts into board_sim's cabling"""
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+
+    def send(self, iface, frame, count):
+        if ("pc", iface) not in self.simulator.cables:
+            raise OSError(f"No such device: {iface}")
+        src_mac = ':'.join(f"{b:02x}" for b in frame[6:12])
+        self.simulator.probe(iface, src_mac, count, len(frame) + FCS_BYTES)
+
+
+def read_board(channel):
+    """Ports, learned FDB entries and neighbours of one board, in one round trip"""
+    links, fdb, neigh = channel.run_batch(BOARD_COMMANDS)
+    return {"ports": parse_link_stats(links), "fdb": parse_fdb(fdb), "neighbors": parse_neighbors(neigh)}
+
+
+def read_boards(boards, pool):
+    """read_board for every board in parallel; boards that fail get an "error" entry"""
+    futures = {name: pool.submit(read_board, channel) for name, channel in boards.items()}
+    states = {}
+    for name, future in futures.items():
+        try:
+            states[name] = future.result()
+        except (ChannelError, OSError, ValueError) as e:
+            states[name] = {"error": str(e), "ports": {}, "fdb": [], "neighbors": []}
+    return states
+
+
+def build_map(before, after, probes):
+    """Links from two board reads around the probe bursts
+
+    probes: {iface: (mac, count)} of the bursts actually sent.
+    Returns (links, unresolved) where unresolved maps interfaces to a reason.
+    """
+    port_of_mac = {}
+    for board, state in after.items():
+        for port, info in state["ports"].items():
+            if info.get("mac"):
+                port_of_mac[info["mac"]] = (board, port)
+
+    # Board to board: a board port has learned the neighbour board's port MAC
+    seen = {}
+    for board, state in after.items():
+        for mac, port in state["fdb"]:
+            peer = port_of_mac.get(mac)
+            if peer and peer[0] != board:
+                key = frozenset([(board, port), peer])
+                seen[key] = seen.get(key, 0) + 1
+    links, linked = [], set()
+    for key, count in seen.items():
+        a, b = sorted(key)
+        links.append(Link(a, b, "fdb both ways" if count > 1 else "fdb one way"))
+        linked.update(key)
+
+    deltas = {}
+    for board, state in after.items():
+        for port, info in state["ports"].items():
+            previous = before.get(board, {}).get("ports", {}).get(port, {})
+            if "rx_packets" in info and "rx_packets" in previous:
+                deltas[(board, port)] = info["rx_packets"] - previous["rx_packets"]
+
+    # PC to board: the probe MAC learned on a port that is not a board link
+    unresolved, counter_only = {}, []
+    for iface, (mac, count) in probes.items():
+        hits = [(board, port) for board, state in after.items()
+                for learned, port in state["fdb"] if learned == mac and (board, port) not in linked]
+        if len(hits) == 1:
+            hit = hits[0]
+            verified = deltas.get(hit, 0) >= count
+            links.append(Link(("pc", iface), hit, "fdb+counters" if verified else "fdb, counters short"))
+            linked.add(hit)
+        elif hits:
+            unresolved[iface] = f"probe MAC learned on {len(hits)} edge ports"
+        else:
+            counter_only.append(iface)
+
+    # Unbridged ports: RX delta alone, closest burst length first
+    for iface in sorted(counter_only, key=lambda name: -probes[name][1]):
+        count = probes[iface][1]
+        candidates = [(delta - count, endpoint) for endpoint, delta in deltas.items()
+                      if endpoint not in linked and delta >= count]
+        exact = [endpoint for excess, endpoint in candidates if excess == 0]
+        if len(exact) == 1 or len(candidates) == 1:
+            endpoint = exact[0] if exact else candidates[0][1]
+            links.append(Link(("pc", iface), endpoint, "counters"))
+            linked.add(endpoint)
+        else:
+            unresolved[iface] = (f"{len(candidates)} ports counted the burst" if candidates
+                                 else "probes not seen by any board")
+    return links, unresolved
+
+
+def board_roles(links):
+    """{board: role} from the PC interfaces the boards are cabled to"""
+    roles = {}
+    for link in links:
+        for pc, board in ((link.a, link.b), (link.b, link.a)):
+            if pc[0] == "pc" and board[0] != "pc":
+                role = {"enp2s0": "sender", "enp15s0": "receiver"}.get(pc[1])
+                if role:
+                    roles[board[0]] = role
+    return roles
+
+
+def check_expected(links, roles):
+    """Differences between the discovered links and the README cabling"""
+    found = set()
+    for link in links:
+        ends = [end if end[0] == "pc" else (roles.get(end[0], end[0]), end[1]) for end in (link.a, link.b)]
+        found.add(frozenset(ends))
+    problems = []
+    for a, b in EXPECTED_LINKS.items():
+        if frozenset([a, b]) not in found:
+            problems.append(f"missing {a[0]}:{a[1]} <-> {b[0]}:{b[1]}")
+    return problems
+
+
+def discover(boards, prober, interfaces=PC_INTERFACES, nonce=None, settle=SETTLE):
+    """Probe and read everything in parallel; returns a result dict"""
+    nonce = random.getrandbits(16) if nonce is None else nonce
+    probes, errors = {}, {}
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(boards) + len(interfaces)) as pool:
+        before = read_boards(boards, pool)
+        bursts = {}
+        for index, iface in enumerate(interfaces):
+            mac = probe_mac(nonce, index)
+            count = PROBE_COUNTS[index % len(PROBE_COUNTS)]
+            bursts[iface] = (mac, count, pool.submit(prober.send, iface, probe_frame(mac, nonce, iface), count))
+        for iface, (mac, count, future) in bursts.items():
+            try:
+                future.result()
+                probes[iface] = (mac, count)
+            except OSError as e:
+                errors[iface] = str(e)
+        time.sleep(settle)
+        after = read_boards(boards, pool)
+    links, unresolved = build_map(before, after, probes)
+    unresolved.update(errors)
+    roles = board_roles(links)
+    return {
+        "elapsed_s": time.monotonic() - started,
+        "nonce": nonce,
+        "links": links,
+        "unresolved": unresolved,
+        "roles": roles,
+        "board_errors": {name: state["error"] for name, state in after.items() if "error" in state},
+        "neighbors": {name: state["neighbors"] for name, state in after.items()},
+        "problems": check_expected(links, roles),
+    }
+
+
+def _endpoint(end):
+    return f"{end[0]}:{end[1]}"
+
+
+def print_result(result):
+    links = sorted(result["links"], key=lambda link: (link.a[0] != "pc", link.a, link.b))
+    print(f"Port map ({result['elapsed_s'] * 1000:.0f} ms):")
+    for link in links:
+        print(f"  {_endpoint(link.a):<16} <-> {_endpoint(link.b):<16} {link.evidence}")
+    for iface, reason in sorted(result["unresolved"].items()):
+        print(f"  pc:{iface:<13}  ?  {reason}")
+    for board, error in sorted(result["board_errors"].items()):
+        print(f"  board {board} unreadable: {error}")
+    if result["roles"]:
+        print("Roles: " + ', '.join(f"{board} = {role}" for board, role in sorted(result["roles"].items())))
+    if result["problems"]:
+        print("Differences from the README cabling:")
+        for problem in result["problems"]:
+            print(f"  {problem}")
+    else:
+        print("Cabling matches the README")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent topology discovery")
+    parser.add_argument("-i", "--interface", action="append", help=f"PC interface (default: {', '.join(PC_INTERFACES)})")
+    parser.add_argument("--host", default=RECEIVER_HOST, help="board reached over SSH")
+    parser.add_argument("--serial", default=SERIAL_PORT, help="board on a serial console ('' for none)")
+    parser.add_argument("--sim", action="store_true", help="discover a board_sim topology")
+    parser.add_argument("--sim-swap", action="store_true",
+                        help="simulate the SSH board being the sender (boards cabled the other way)")
+    parser.add_argument("--json", help="write the map to this file")
+    args = parser.parse_args()
+
+    interfaces = args.interface or list(PC_INTERFACES)
+    if args.sim:
+        from board_channel import CallableChannel
+        from board_sim import Simulator
+        simulator = Simulator(start_traffic=False)
+        sim_boards = {"serial": "sender", "ssh": "receiver"}
+        if args.sim_swap:
+            sim_boards = {"serial": "receiver", "ssh": "sender"}
+        boards = {name: CallableChannel(lambda command, board=board: simulator.run(board, command)[0])
+                  for name, board in sim_boards.items()}
+        prober = SimProber(simulator)
+    else:
+        from board_channel import ShellChannel, SerialChannel
+        boards = {"ssh": ShellChannel(host=args.host)}
+        if args.serial:
+            try:
+                boards["serial"] = SerialChannel(args.serial)
+            except (OSError, ImportError) as e:
+                print(f"Serial board not available: {e}", file=sys.stderr)
+        prober = RawProber()
+
+    try:
+        result = discover(boards, prober, interfaces)
+    finally:
+        for channel in boards.values():
+            channel.close()
+    print_result(result)
+
+    if args.json:
+        data = dict(result, links=[{"a": _endpoint(link.a), "b": _endpoint(link.b), "evidence": link.evidence}
+                                   for link in result["links"]])
+        with open(args.json, "w") as f:
+            json.dump(data, f, indent=2)
+        print(f"Map saved to {args.json}")
+    if result["problems"] or result["board_errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
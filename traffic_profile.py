@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Multi-flow traffic profiles with paced sending and FRER reconciliation
+
+A profile is hundreds of UDP flows with distinct 5-tuples, optional VLAN
+tags, frame sizes, rates and burst sizes. Flows are split into groups by
+UDP destination port block (DPORT_BASE | group << 8 | n), and each group
+gets its own sender VCAP rule and iflow and its own receiver member and
+compound streams, so a run exercises many classification entries instead
+of the single iperf3 flow that only hits VCAP rule 1001 and iflow 1.
+
+All flows are sent from one event loop: a heap of per-flow deadlines,
+sleeping until just before the next one and spinning the rest, with each
+burst written back to back to a raw socket. Every frame carries its flow
+id and per-flow sequence number. After a run the per-flow send counters
+are summed per group and reconciled with the group's FRER counter deltas.
+
+Usage:
+    python3 traffic_profile.py generate --flows 200 --groups 4 --rate 50000 -o profile.json
+    python3 traffic_profile.py config profile.json          # board commands for the groups
+    python3 traffic_profile.py run profile.json --duration 10
+    python3 traffic_profile.py run profile.json --duration 10 --sim
+"""
+
+import argparse
+import heapq
+import json
+import random
+import socket
+import struct
+import sys
+import time
+from collections import namedtuple
+
+from board_channel import CallableChannel, ShellChannel
+from throughput_search import FRAME_SIZES, counter_deltas
+
+DPORT_BASE = 0x4000
+GROUP_MASK = 0xff00
+MAX_GROUPS = 0x3f
+FLOWS_PER_GROUP = 0x100
+SPORT_BASE = 20000
+BURST_SIZES = [1, 1, 1, 2, 4, 16, 64]
+# Sleep until this close to a deadline, then spin
+SPIN_NS = 200_000
+# Payload stamp: flow id, per-flow sequence, send time (fits 64-byte frames)
+STAMP = struct.Struct('!HIQ')
+ETH_P_ALL = 0x0003
+FCS_BYTES = 4
+
+# First VCAP rule / ISDX / FRER ids used for profile groups (the README
+# configuration keeps rule 1001, iflows 1/3/4 and cs 0 for iperf3)
+SENDER_RULE_BASE = 1101
+RECEIVER_RULE_BASE = 1201
+SENDER_ISDX_BASE = 11
+RECEIVER_ISDX_BASE = 21
+MS_ID_BASE = {"eth1": 40, "eth2": 104}
+CS_ID_BASE = 1
+RULE_PRIORITY = 5
+
+FlowSpec = namedtuple('FlowSpec', 'flow_id group src_ip dst_ip sport dport vlan pcp frame_size rate_fps burst')
+
+
+def group_dport(group, index):
+    return DPORT_BASE | (group << 8) | (index % FLOWS_PER_GROUP)
+
+
+def generate_profile(flows=200, groups=4, total_rate_fps=20000.0, seed=0,
+                     src_ip='10.0.100.1', dst_ip='10.0.100.2', vlan=10, tagged_share=0.25):
+    """Random profile: log-uniform rates summing to total_rate_fps"""
+    if groups > MAX_GROUPS or flows > groups * FLOWS_PER_GROUP:
+        raise ValueError(f"at most {MAX_GROUPS} groups of {FLOWS_PER_GROUP} flows")
+    rng = random.Random(seed)
+    weights = [10 ** rng.uniform(0, 2) for _ in range(flows)]
+    scale = total_rate_fps / sum(weights)
+    specs = []
+    for flow_id in range(flows):
+        group = flow_id % groups
+        tagged = rng.random() < tagged_share
+        specs.append(FlowSpec(flow_id, group, src_ip, dst_ip, SPORT_BASE + flow_id,
+                              group_dport(group, flow_id // groups),
+                              vlan if tagged else None, rng.randrange(8) if tagged else 0,
+                              rng.choice(FRAME_SIZES), round(weights[flow_id] * scale, 3),
+                              rng.choice(BURST_SIZES)))
+    return specs
+
+
+def save_profile(specs, path):
+    with open(path, 'w') as f:
+        json.dump({"flows": [spec._asdict() for spec in specs]}, f, indent=1)
+
+
+def load_profile(path):
+    with open(path) as f:
+        return [FlowSpec(**flow) for flow in json.load(f)["flows"]]
+
+
+def groups_of(specs):
+    return sorted({spec.group for spec in specs})
+
+
+def board_commands(groups):
+    """Sender and receiver commands giving each group its own FRER streams"""
+    sender, receiver = [], []
+    for group in groups:
+        dport = f"0x{DPORT_BASE | group << 8:04x} 0x{GROUP_MASK:04x}"
+        isdx = SENDER_ISDX_BASE + group
+        sender += [
+            f"vcap add {SENDER_RULE_BASE + group} is1 {RULE_PRIORITY} 1 VCAP_KFS_NORMAL "
+            f"IF_IGR_PORT_MASK 0x008 0x1ff ETYPE 0x0800 = L4_DPORT {dport} VCAP_AFS_S1 "
+            f"VID_REPLACE_ENA 1 VID_VAL 10 ISDX_REPLACE_ENA 1 ISDX_ADD_VAL {isdx}",
+            f"frer iflow {isdx} --generation 1 --dev1 eth1 --dev2 eth2",
+        ]
+        cs_id = CS_ID_BASE + group
+        receiver.append(f"frer cs {cs_id} --enable 1 --alg 0 --hlen 10 --reset_time 500")
+        for index, (dev, mask) in enumerate((("eth1", "0x001"), ("eth2", "0x002"))):
+            rule = RECEIVER_RULE_BASE + 2 * group + index
+            isdx = RECEIVER_ISDX_BASE + 2 * group + index
+            ms_id = MS_ID_BASE[dev] + group
+            receiver += [
+                f"vcap add {rule} is1 {RULE_PRIORITY} 1 VCAP_KFS_NORMAL IF_IGR_PORT_MASK {mask} 0x1ff "
+                f"L4_DPORT {dport} VCAP_AFS_S1 ISDX_REPLACE_ENA 1 ISDX_ADD_VAL {isdx}",
+                f"frer ms {dev} {ms_id} --enable 1 --alg 1 --reset_time 500 --cs_id {cs_id}",
+                f"frer iflow {isdx} --ms_enable 1 --ms_id {ms_id} --pop 1 --dev1 eth3",
+            ]
+    return {"sender": sender, "receiver": receiver}
+
+
+def group_streams(groups):
+    """(name, command) FRER counter streams of the groups, for read_counters"""
+    return [(f"cs{CS_ID_BASE + group}", f"frer cs {CS_ID_BASE + group} --cnt") for group in groups]
+
+
+def _checksum(header):
+    total = sum(struct.unpack(f'!{len(header) // 2}H', header))
+    total = (total & 0xffff) + (total >> 16)
+    total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+
+def build_frame(spec, src_mac, dst_mac):
+    """Frame template of a flow (without FCS) and the offset of its payload"""
+    eth = bytes.fromhex(dst_mac.replace(':', '')) + bytes.fromhex(src_mac.replace(':', ''))
+    if spec.vlan is not None:
+        eth += struct.pack('!HH', 0x8100, (spec.pcp << 13) | spec.vlan)
+    eth += struct.pack('!H', 0x0800)
+    length = max(spec.frame_size - FCS_BYTES, 60) - len(eth)
+    header = struct.pack('!BBHHHBBH4s4s', 0x45, 0, length, 0, 0x4000, 64, 17, 0,
+                         socket.inet_aton(spec.src_ip), socket.inet_aton(spec.dst_ip))
+    header = header[:10] + struct.pack('!H', _checksum(header)) + header[12:]
+    udp = struct.pack('!HHHH', spec.sport, spec.dport, length - 20, 0)
+    payload_offset = len(eth) + 28
+    frame = bytearray(eth + header + udp + bytes(length - 28))
+    STAMP.pack_into(frame, payload_offset, spec.flow_id, 0, 0)
+    return frame, payload_offset
+
+
+class RawSocketSink:
+    """Writes frames to an interface through an AF_PACKET socket"""
+
+    def __init__(self, interface):
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        self.sock.bind((interface, 0))
+        self.send = self.sock.send
+
+    def close(self):
+        self.sock.close()
+
+
+class SimulatorSink:
+    """Counts frames per flow and pushes them through board_sim per burst"""
+
+    def __init__(self, simulator, specs):
+        self.simulator = simulator
+        self.fields = {spec.flow_id: {"ETYPE": 0x0800, "L4_DPORT": spec.dport,
+                                      "L4_SPORT": spec.sport} for spec in specs}
+        self.sizes = {spec.flow_id: spec.frame_size for spec in specs}
+
+    def send_burst(self, flow_id, frames):
+        self.simulator.inject(frames, self.fields[flow_id], self.sizes[flow_id] - FCS_BYTES)
+
+    def close(self):
+        pass
+
+
+class TrafficEngine:
+    """Paced multi-flow sender with per-flow counters"""
+
+    def __init__(self, specs, sink, src_mac='02:00:00:00:00:01', dst_mac='ff:ff:ff:ff:ff:ff'):
+        self.specs = list(specs)
+        self.sink = sink
+        self.frames = []
+        for spec in self.specs:
+            self.frames.append(build_frame(spec, src_mac, dst_mac))
+        count = len(self.specs)
+        self.sent = [0] * count
+        self.bytes = [0] * count
+        self.late_ns = [0] * count
+        self.max_late_ns = [0] * count
+        self.errors = 0
+        self.duration = 0.0
+
+    def run(self, duration):
+        """Send every flow for duration seconds; returns the per-flow report"""
+        clock = time.perf_counter_ns
+        sleep = time.sleep
+        start = clock() + 10_000_000
+        end = start + int(duration * 1e9)
+        heap = []
+        periods = []
+        rng = random.Random(0)
+        for index, spec in enumerate(self.specs):
+            period = int(spec.burst * 1e9 / spec.rate_fps) if spec.rate_fps > 0 else None
+            periods.append(period)
+            if period:
+                # Spread the first bursts so flows do not all start together
+                heap.append((start + rng.randrange(period), index))
+        heapq.heapify(heap)
+
+        pack_into = struct.Struct('!IQ').pack_into
+        raw = isinstance(self.sink, RawSocketSink)
+        while heap:
+            due, index = heap[0]
+            if due >= end:
+                break
+            now = clock()
+            if now >= end:
+                # Overloaded sink: stop on time rather than drain the backlog
+                break
+            if due - now > SPIN_NS:
+                sleep((due - now - SPIN_NS) / 1e9)
+                continue
+            while now < due:
+                now = clock()
+            late = now - due
+            spec = self.specs[index]
+            frame, offset = self.frames[index]
+            burst = spec.burst
+            if raw:
+                seq = self.sent[index]
+                for n in range(burst):
+                    pack_into(frame, offset + 2, (seq + n) & 0xffffffff, now)
+                    try:
+                        self.sink.send(frame)
+                    except OSError:
+                        self.errors += 1
+                        burst = n
+                        break
+            else:
+                self.sink.send_burst(spec.flow_id, burst)
+            self.sent[index] += burst
+            self.bytes[index] += burst * spec.frame_size
+            self.late_ns[index] += late
+            if late > self.max_late_ns[index]:
+                self.max_late_ns[index] = late
+            heapq.heapreplace(heap, (due + periods[index], index))
+        self.duration = (clock() - start) / 1e9
+        return self.report()
+
+    def report(self):
+        flows = []
+        for index, spec in enumerate(self.specs):
+            bursts = -(-self.sent[index] // spec.burst) if self.sent[index] else 0
+            flows.append({
+                "flow_id": spec.flow_id, "group": spec.group, "dport": spec.dport,
+                "vlan": spec.vlan, "frame_size": spec.frame_size, "rate_fps": spec.rate_fps,
+                "burst": spec.burst, "sent": self.sent[index], "bytes": self.bytes[index],
+                "achieved_fps": round(self.sent[index] / self.duration, 1) if self.duration else 0.0,
+                "mean_late_us": round(self.late_ns[index] / bursts / 1000, 1) if bursts else 0.0,
+                "max_late_us": round(self.max_late_ns[index] / 1000, 1),
+            })
+        return {"duration": round(self.duration, 3), "errors": self.errors, "flows": flows}
+
+
+def reconcile(report, deltas):
+    """Per group: frames sent vs the group's compound stream counter deltas"""
+    sent = {}
+    for flow in report["flows"]:
+        sent[flow["group"]] = sent.get(flow["group"], 0) + flow["sent"]
+    groups = {}
+    for group, frames in sorted(sent.items()):
+        counters = deltas.get(f"cs{CS_ID_BASE + group}", {})
+        passed = counters.get("PassedPackets", 0)
+        lost = counters.get("LostPackets", 0)
+        groups[group] = {
+            "sent": frames, "passed": passed, "discarded": counters.get("DiscardedPackets", 0),
+            "lost": lost, "out_of_order": counters.get("OutOfOrderPackets", 0),
+            "unaccounted": frames - passed - lost,
+            "status": "OK" if frames == passed + lost and not lost else
+                      ("LOSS" if frames == passed + lost else "MISMATCH"),
+        }
+    return groups
+
+
+def print_reconciliation(report, groups):
+    flows = report["flows"]
+    sent = sum(flow["sent"] for flow in flows)
+    worst = max((flow["max_late_us"] for flow in flows), default=0.0)
+    print(f"\n{len(flows)} flows, {sent} frames in {report['duration']:.2f} s "
+          f"({sent / report['duration'] if report['duration'] else 0:.0f} fps), "
+          f"worst burst lateness {worst:.0f} us, {report['errors']} send errors")
+    print(f"\n{'group':>5} {'sent':>10} {'passed':>10} {'discarded':>10} {'lost':>8} {'ooo':>6} "
+          f"{'unacct':>7}  status")
+    for group, row in groups.items():
+        print(f"{group:>5} {row['sent']:>10} {row['passed']:>10} {row['discarded']:>10} {row['lost']:>8} "
+              f"{row['out_of_order']:>6} {row['unaccounted']:>7}  {row['status']}")
+
+
+def main():
+    from frer_counters import read_counters
+
+    parser = argparse.ArgumentParser(description="Multi-flow traffic profiles")
+    sub = parser.add_subparsers(dest="command", required=True)
+    generate = sub.add_parser("generate", help="write a random profile")
+    generate.add_argument("--flows", type=int, default=200)
+    generate.add_argument("--groups", type=int, default=4)
+    generate.add_argument("--rate", type=float, default=20000.0, help="total frames/s")
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("-o", "--output", default="traffic_profile.json")
+    config = sub.add_parser("config", help="print the board commands of a profile's groups")
+    config.add_argument("profile")
+    run = sub.add_parser("run", help="send a profile and reconcile with the FRER counters")
+    run.add_argument("profile")
+    run.add_argument("--duration", type=float, default=10.0)
+    run.add_argument("--interface", default="enp2s0")
+    run.add_argument("--src-mac", help="default: the interface's address")
+    run.add_argument("--dst-mac", default="ff:ff:ff:ff:ff:ff",
+                     help="receiver PC MAC (broadcast is flooded by the sender bridge)")
+    run.add_argument("--sim", action="store_true", help="send into board_sim instead of a NIC")
+    run.add_argument("--output", default="traffic_profile_results.json")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        specs = generate_profile(args.flows, args.groups, args.rate, args.seed)
+        save_profile(specs, args.output)
+        print(f"Wrote {len(specs)} flows in {args.groups} groups to {args.output}")
+        return
+    specs = load_profile(args.profile)
+    commands = board_commands(groups_of(specs))
+    if args.command == "config":
+        for board, lines in commands.items():
+            print(f"# {board}")
+            print('\n'.join(lines))
+        return
+
+    streams = group_streams(groups_of(specs))
+    if args.sim:
+        from board_sim import Simulator
+        simulator = Simulator(start_traffic=False)
+        for board, lines in commands.items():
+            for line in lines:
+                simulator.run(board, line)
+        channel = CallableChannel(lambda command: simulator.run("receiver", command)[0])
+        sink = SimulatorSink(simulator, specs)
+    else:
+        channel = ShellChannel()
+        sink = RawSocketSink(args.interface)
+        if args.src_mac is None:
+            with open(f"/sys/class/net/{args.interface}/address") as f:
+                args.src_mac = f.read().strip()
+    try:
+        before = read_counters(channel, streams)
+        engine = TrafficEngine(specs, sink, args.src_mac or '02:00:00:00:00:01', args.dst_mac)
+        report = engine.run(args.duration)
+        time.sleep(0.5)
+        after = read_counters(channel, streams)
+    finally:
+        sink.close()
+        channel.close()
+    groups = reconcile(report, counter_deltas(before, after))
+    print_reconciliation(report, groups)
+    with open(args.output, 'w') as f:
+        json.dump({"profile": args.profile, "report": report, "groups": groups}, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+    if any(row["status"] == "MISMATCH" for row in groups.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
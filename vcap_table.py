@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+VCAP IS1 table model with batched dumps and per-rule hit deltas
+
+Checking classification one `vcap get <id>` at a time costs a serial or
+SSH round trip per rule. VcapTable reads the whole table -- `vcap list`
+plus a `vcap get` for every known rule -- in a single run_batch round
+trip over a persistent board channel, keeps the parsed rules cached
+(optionally on disk per board), and turns successive dumps into per-rule
+hit deltas and rates.
+
+The cached definitions are invalidated when configuration goes through
+VcapTable.configure (any `vcap add`/`vcap del`) or when a dump shows rules
+added, removed or redefined by someone else; counters of redefined rules
+restart from zero rather than showing a negative delta. Flows (ingress
+port plus key fields) are classified against the cached rules locally, in
+the board's order (lowest priority value first), giving the rule and ISDX
+each flow lands in without touching the board.
+
+Usage:
+    python3 vcap_table.py                           # receiver over SSH
+    python3 vcap_table.py --serial --interval 1 --count 10
+    python3 vcap_table.py --sim sender --profile traffic_profile.json
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+
+from board_channel import RECEIVER_HOST, SERIAL_PORT, ShellChannel
+
+DEFAULT_CACHE_DIR = ".vcap_cache"
+# Seconds between the two dumps of a one-shot hit check
+HIT_INTERVAL = 2.0
+
+# IF_IGR_PORT_MASK bit of each front port
+PORT_BITS = {"eth1": 0x001, "eth2": 0x002, "eth3": 0x008}
+# Board and ingress ports of the rules in the README configuration
+ROLE_PORTS = {"sender": ("eth3",), "receiver": ("eth1", "eth2")}
+# The test's iperf3 flow, classified when no profile is given
+IPERF_FLOW = {"ETYPE": 0x0800, "L4_DPORT": 5001}
+
+_RULE = re.compile(r'Rule: (\d+), (\w+), priority: (\d+), lookup: (\d+), address: (\d+)-\d+ '
+                   r'\(X\d+\), Counter: (\d+)')
+_KEYSET = re.compile(r'Keyset: (\w+)')
+_ACTIONSET = re.compile(r'Actionset: (\w+)')
+_KEY = re.compile(r'KEY: (\w+): W\d+, (\w+)/(\w+)')
+_ACTION = re.compile(r'ACTION: (\w+): W\d+, (\w+)')
+
+# keys: {name: (value, mask)}, actions: {name: value}
+VcapRule = namedtuple('VcapRule', 'rule_id vcap priority lookup address keyset keys actionset actions')
+
+
+def parse_rules(text):
+    """{rule_id: (VcapRule, counter)} from concatenated `vcap get` output"""
+    rules = {}
+    header = None
+
+    def close():
+        if header is not None:
+            rule_id, vcap, priority, lookup, address, counter = header
+            rules[rule_id] = (VcapRule(rule_id, vcap, priority, lookup, address, keyset, keys,
+                                       actionset, actions), counter)
+
+    keyset = actionset = None
+    keys, actions = {}, {}
+    for line in text.splitlines():
+        match = _RULE.search(line)
+        if match:
+            close()
+            header = tuple(int(value) if value.isdigit() else value for value in match.groups())
+            keyset = actionset = None
+            keys, actions = {}, {}
+            continue
+        if header is None:
+            continue
+        match = _KEY.search(line)
+        if match:
+            keys[match.group(1)] = (int(match.group(2), 0), int(match.group(3), 0))
+            continue
+        match = _ACTION.search(line)
+        if match:
+            actions[match.group(1)] = int(match.group(2), 0)
+            continue
+        match = _KEYSET.search(line)
+        if match:
+            keyset = match.group(1)
+            continue
+        match = _ACTIONSET.search(line)
+        if match:
+            actionset = match.group(1)
+    close()
+    return rules
+
+
+def rule_ports(rule):
+    """Front ports whose ingress matches the rule's IF_IGR_PORT_MASK"""
+    value, mask = rule.keys.get("IF_IGR_PORT_MASK", (0, 0))
+    return [port for port, bit in PORT_BITS.items() if mask and (bit & mask) == (value & mask)]
+
+
+def rule_isdx(rule):
+    return rule.actions.get("ISDX_ADD_VAL") if rule.actions.get("ISDX_REPLACE_ENA") else None
+
+
+def rule_matches(rule, port, fields):
+    """Ingress port and every other key against a flow's fields
+
+    Takes any rule with keys {name: (value, mask)}; board_sim classifies
+    its simulated traffic with it too.
+    """
+    if port not in rule_ports(rule):
+        return False
+    for name, (value, mask) in rule.keys.items():
+        if name in ("IF_IGR_PORT_MASK", "TYPE"):
+            continue
+        if name not in fields or (fields[name] & mask) != (value & mask):
+            return False
+    return True
+
+
+def _rule_to_json(rule):
+    data = rule._asdict()
+    data["keys"] = {name: list(value) for name, value in rule.keys.items()}
+    return data
+
+
+def _rule_from_json(data):
+    data = dict(data)
+    data["keys"] = {name: tuple(value) for name, value in data["keys"].items()}
+    return VcapRule(**data)
+
+
+class VcapTable:
+    """Cached VCAP rule table of one board, refreshed in one round trip"""
+
+    def __init__(self, channel, cache_path=None):
+        self.channel = channel
+        self.cache_path = cache_path
+        self.rules = {}
+        self.counters = {}
+        self.time = None
+        self.valid = False
+        # Bumped whenever the rule definitions change
+        self.generation = 0
+        if cache_path and os.path.exists(cache_path):
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            self.rules = {int(rule_id): _rule_from_json(rule) for rule_id, rule in data["rules"].items()}
+            self.counters = {int(rule_id): value for rule_id, value in data["counters"].items()}
+            self.time = data["time"]
+            self.generation = data.get("generation", 0)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring VCAP cache {self.cache_path}: {e}", file=sys.stderr)
+            self.rules, self.counters, self.time = {}, {}, None
+
+    def save(self):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        data = {"time": self.time, "generation": self.generation,
+                "rules": {rule_id: _rule_to_json(rule) for rule_id, rule in self.rules.items()},
+                "counters": self.counters}
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.cache_path)
+
+    def invalidate(self):
+        """Forget that the cached definitions match the board"""
+        self.valid = False
+
+    def configure(self, commands):
+        """Run configuration commands, invalidating on any VCAP change"""
+        outputs = self.channel.run_batch(commands)
+        if any(command.split()[:1] == ["vcap"] and command.split()[1:2] != ["get"]
+               for command in commands):
+            self.invalidate()
+        return outputs
+
+    def refresh(self):
+        """Dump rules and counters; returns per-rule deltas since the last dump
+
+        The list and every cached rule are read in one batch; rules new to
+        the cache cost one more batch.
+        """
+        known = sorted(self.rules)
+        outputs = self.channel.run_batch(["vcap list"] + [f"vcap get {rule_id}" for rule_id in known])
+        now = time.time()
+        listed = {int(token) for token in outputs[0].split() if token.isdigit()}
+        dumped = parse_rules('\n'.join(outputs[1:]))
+        missing = sorted(listed - set(dumped))
+        if missing:
+            more = self.channel.run_batch([f"vcap get {rule_id}" for rule_id in missing])
+            dumped.update(parse_rules('\n'.join(more)))
+
+        rules = {rule_id: rule for rule_id, (rule, _) in dumped.items() if rule_id in listed}
+        counters = {rule_id: counter for rule_id, (_, counter) in dumped.items() if rule_id in listed}
+        changed = {rule_id for rule_id in set(rules) | set(self.rules)
+                   if rules.get(rule_id) != self.rules.get(rule_id)}
+        if changed:
+            self.generation += 1
+        deltas = {}
+        elapsed = now - self.time if self.time is not None else None
+        for rule_id, counter in counters.items():
+            previous = self.counters.get(rule_id)
+            if self.time is None:
+                # First dump: no baseline yet
+                hits = None
+            elif previous is None or rule_id in changed or counter < previous:
+                # New or redefined rule: its counter started again from zero
+                hits = counter
+            else:
+                hits = counter - previous
+            deltas[rule_id] = {"hits": hits,
+                               "rate": hits / elapsed if hits is not None and elapsed else None}
+        self.rules, self.counters, self.time = rules, counters, now
+        self.valid = True
+        self.save()
+        return deltas
+
+    def sample(self, interval=HIT_INTERVAL):
+        """Baseline dump, wait interval seconds, dump again; deltas over the wait
+
+        For one-shot checks: a single refresh right after another (or on a
+        fresh table) has no traffic in between to count.
+        """
+        self.refresh()
+        time.sleep(interval)
+        return self.refresh()
+
+    def ensure(self):
+        """Cached rules, refreshed only when invalidated"""
+        if not self.valid:
+            self.refresh()
+        return self.rules
+
+    def classify(self, port, fields):
+        """(rule, isdx) a flow ingressing on port lands in, or (None, None)"""
+        hits = [rule for rule in self.ensure().values() if rule_matches(rule, port, fields)]
+        if not hits:
+            return None, None
+        rule = min(hits, key=lambda r: (r.priority, r.rule_id))
+        return rule, rule_isdx(rule)
+
+    def flow_map(self, flows):
+        """[(name, port, rule_id, isdx)] for (name, port, fields) flows"""
+        mapped = []
+        for name, port, fields in flows:
+            rule, isdx = self.classify(port, fields)
+            mapped.append((name, port, rule.rule_id if rule else None, isdx))
+        return mapped
+
+
+def profile_flows(path, ports):
+    """(name, port, fields) of a traffic_profile.py profile on the given ingress ports"""
+    from traffic_profile import load_profile
+    flows = []
+    for spec in load_profile(path):
+        fields = {"ETYPE": 0x0800, "L4_DPORT": spec.dport, "L4_SPORT": spec.sport}
+        if spec.vlan is not None:
+            fields["VID"] = spec.vlan
+        for port in ports:
+            flows.append((f"flow {spec.flow_id}", port, fields))
+    return flows
+
+
+def _keys_text(rule):
+    keys = [f"{name}={value:#x}/{mask:#x}" for name, (value, mask) in sorted(rule.keys.items())
+            if name not in ("IF_IGR_PORT_MASK", "TYPE")]
+    return ' '.join(keys) or "-"
+
+
+def print_table(table, deltas):
+    print(f"{'rule':>6} {'prio':>5} {'ports':<10} {'isdx':>5} {'hits':>12} {'delta':>10} {'rate/s':>10}  keys")
+    for rule_id in sorted(table.rules, key=lambda r: (table.rules[r].priority, r)):
+        rule = table.rules[rule_id]
+        delta = deltas.get(rule_id, {})
+        hits = "" if delta.get("hits") is None else str(delta["hits"])
+        rate = "" if delta.get("rate") is None else f"{delta['rate']:.1f}"
+        isdx = rule_isdx(rule)
+        print(f"{rule_id:>6} {rule.priority:>5} {','.join(rule_ports(rule)) or '-':<10} "
+              f"{'-' if isdx is None else isdx:>5} {table.counters.get(rule_id, 0):>12} {hits:>10} "
+              f"{rate:>10}  {_keys_text(rule)}")
+
+
+def print_flow_map(mapped, deltas, limit=40):
+    print(f"\n{'flow':<12} {'port':<6} {'rule':>6} {'isdx':>5}  hitting")
+    for name, port, rule_id, isdx in mapped[:limit]:
+        hits = (deltas.get(rule_id) or {}).get("hits")
+        # No baseline dump yet: unknown rather than "no"
+        hitting = "" if rule_id is None or hits is None else ("yes" if hits else "no")
+        print(f"{name:<12} {port:<6} {'-' if rule_id is None else rule_id:>6} "
+              f"{'-' if isdx is None else isdx:>5}  {hitting}")
+    if len(mapped) > limit:
+        unclassified = sum(1 for entry in mapped if entry[2] is None)
+        print(f"... {len(mapped) - limit} more flows ({unclassified} unclassified in total)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VCAP rule table with per-rule hit deltas")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--host", default=RECEIVER_HOST, help="board reached over SSH")
+    source.add_argument("--serial", nargs="?", const=SERIAL_PORT, help="board on a serial console")
+    source.add_argument("--sim", choices=sorted(ROLE_PORTS), help="in-process board simulator")
+    parser.add_argument("--role", choices=sorted(ROLE_PORTS), default="receiver",
+                        help="board role, for the flow ingress ports (default: receiver)")
+    parser.add_argument("--profile", help="traffic_profile.py profile whose flows to classify")
+    parser.add_argument("--interval", type=float, help="refresh every INTERVAL seconds")
+    parser.add_argument("--count", type=int, default=0, help="number of refreshes (0: until Ctrl-C)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="'' to disable the on-disk cache")
+    args = parser.parse_args()
+
+    role = args.sim or args.role
+    if args.sim:
+        from board_sim import Simulator
+        from board_channel import CallableChannel
+        simulator = Simulator()
+        channel = CallableChannel(lambda command: simulator.run(args.sim, command)[0])
+        board = f"sim-{args.sim}"
+    elif args.serial:
+        from board_channel import SerialChannel
+        channel = SerialChannel(args.serial)
+        board = os.path.basename(args.serial)
+    else:
+        channel = ShellChannel(host=args.host)
+        board = args.host
+    cache_path = os.path.join(args.cache_dir, f"{board}.json") if args.cache_dir else None
+
+    table = VcapTable(channel, cache_path)
+    ports = ROLE_PORTS[role]
+    if args.profile:
+        flows = profile_flows(args.profile, ports)
+    else:
+        flows = [("iperf3", port, IPERF_FLOW) for port in ports]
+    try:
+        refreshes = 0
+        while True:
+            started = time.monotonic()
+            deltas = table.refresh()
+            refreshes += 1
+            print(f"\n{board}: {len(table.rules)} rules, generation {table.generation}, "
+                  f"dump {(time.monotonic() - started) * 1000:.1f} ms")
+            print_table(table, deltas)
+            print_flow_map(table.flow_map(flows), deltas)
+            if args.interval is None or (args.count and refreshes >= args.count):
+                break
+            time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        channel.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,46 +2,45 @@
 """
 Verify and fix sender board FRER configuration
 """
-import serial
-import time
+from board_channel import SerialChannel, ChannelError
+from vcap_table import HIT_INTERVAL, IPERF_FLOW, VcapTable, print_flow_map, print_table
 
-def send_cmd(ser, cmd, wait=0.5):
-    ser.write((cmd + '\n').encode())
-    time.sleep(wait)
-    resp = ser.read_all().decode('utf-8', errors='ignore')
-    print(f">>> {cmd}")
-    if resp:
-        print(resp.strip())
-    return resp
+def send_cmds(channel, cmds):
+    for cmd, resp in zip(cmds, channel.run_batch(cmds)):
+        print(f">>> {cmd}")
+        if resp.strip():
+            print(resp.strip())
 
 try:
-    ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
-    time.sleep(1)
-    ser.read_all()  # Clear buffer
+    channel = SerialChannel()
     
     print("=== Verifying Sender FRER Configuration ===\n")
     
     # Check current FRER ingress flow
-    send_cmd(ser, "frer iflow 1")
-    
-    # Check VCAP rule hits
-    send_cmd(ser, "vcap get 1001")
-    
-    # Ensure bridge flood is enabled for eth3 (where PC connects)
-    send_cmd(ser, "bridge link set dev eth3 flood on mcast_flood on")
-    
-    # Disable flood on FRER output ports to prevent loops
-    send_cmd(ser, "bridge link set dev eth1 flood off mcast_flood off")
-    send_cmd(ser, "bridge link set dev eth2 flood off mcast_flood off")
-    
-    # Show bridge link status
-    send_cmd(ser, "bridge link show", wait=1)
-    
-    # Test: Send a ping through to verify connectivity
-    send_cmd(ser, "ping -c 2 10.0.100.2", wait=3)
-    
-    ser.close()
+    send_cmds(channel, ["frer iflow 1"])
+    
+    # Check VCAP rule hits: the whole table in one dump, twice HIT_INTERVAL
+    # apart for the hit deltas (keep the PC's iperf3 traffic running)
+    table = VcapTable(channel)
+    print(f"Sampling VCAP hits over {HIT_INTERVAL:.0f} s...")
+    deltas = table.sample()
+    print_table(table, deltas)
+    print_flow_map(table.flow_map([("iperf3", "eth3", IPERF_FLOW)]), deltas)
+    
+    send_cmds(channel, [
+        # Ensure bridge flood is enabled for eth3 (where PC connects)
+        "bridge link set dev eth3 flood on mcast_flood on",
+        # Disable flood on FRER output ports to prevent loops
+        "bridge link set dev eth1 flood off mcast_flood off",
+        "bridge link set dev eth2 flood off mcast_flood off",
+        # Show bridge link status
+        "bridge link show",
+        # Test: Send a ping through to verify connectivity
+        "ping -c 2 10.0.100.2",
+    ])
+    
+    channel.close()
     print("\n✓ Verification complete")
     
-except Exception as e:
+except (ChannelError, OSError) as e:
     print(f"Error: {e}")